@@ -10,6 +10,7 @@
 use Illuminate\Http\JsonResponse;
 use Illuminate\Support\Facades\Auth;
 use Illuminate\Support\Facades\DB;
+use Illuminate\Support\Facades\Redis;
 use Illuminate\Support\Facades\Validator;
 use Illuminate\Support\Str;
 use Illuminate\Validation\Rule;
@@ -169,59 +170,19 @@ public function store(Request $request, string $postSlug): JsonResponse
                 ]
             ]);
 
-            // Integrate with ML service for sentiment analysis
-            if (config('services.ml.enabled', true)) {
-                try {
-                    $sentimentAnalysis = $this->analyzeSentiment($comment->content);
-
-                    if ($sentimentAnalysis && isset($sentimentAnalysis['sentiment'])) {
-                        // Map ML service sentiment to Comment model constants
-                        $sentimentLabel = $this->mapSentimentLabel($sentimentAnalysis['sentiment']);
-                        $sentimentScore = $this->calculateSentimentScore($sentimentAnalysis['sentiment'], $sentimentAnalysis['confidence'] ?? 0.5);
-
-                        $comment->update([
-                            'sentiment_score' => $sentimentScore,
-                            'sentiment_label' => $sentimentLabel,
-                            'sentiment_confidence' => $sentimentAnalysis['confidence'] ?? 0.5,
-                        ]);
-
-                        // Log ML service usage for analytics
-                        \Log::info('Sentiment analysis completed for comment ' . $comment->id, [
-                            'sentiment' => $sentimentAnalysis['sentiment'],
-                            'confidence' => $sentimentAnalysis['confidence'],
-                            'cached' => $sentimentAnalysis['cached'] ?? false,
-                            'word_count' => $comment->word_count,
-                        ]);
-                    } else {
-                        // Fallback to neutral if ML service fails
-                        $comment->update([
-                            'sentiment_score' => 0.5,
-                            'sentiment_label' => Comment::SENTIMENT_NEUTRAL,
-                            'sentiment_confidence' => 0.3, // Lower confidence for fallback
-                        ]);
-                    }
-                } catch (\Exception $e) {
-                    // Log the error but don't fail comment creation
-                    \Log::warning('Sentiment analysis failed for comment ' . $comment->id . ': ' . $e->getMessage());
-
-                    // Set neutral sentiment as fallback
-                    $comment->update([
-                        'sentiment_score' => 0.5,
-                        'sentiment_label' => Comment::SENTIMENT_NEUTRAL,
-                        'sentiment_confidence' => 0.3, // Lower confidence for fallback
-                    ]);
-                }
-            } else {
-                // ML service disabled, set neutral sentiment
-                $comment->update([
-                    'sentiment_score' => 0.5,
-                    'sentiment_label' => Comment::SENTIMENT_NEUTRAL,
-                    'sentiment_confidence' => 1.0, // High confidence for manual neutral assignment
-                ]);
+            // With async sentiment the ML service scores the comment after it is
+            // published to the stream, so posting never waits on inference
+            $queueSentiment = config('services.ml.enabled', true) && config('services.ml.async_sentiment', false);
+            if (!$queueSentiment) {
+                $this->scoreSentiment($comment);
             }
 
             DB::commit();
 
+            if ($queueSentiment && !$this->publishSentimentRequest($comment)) {
+                $this->scoreSentiment($comment);
+            }
+
             return response()->json([
                 'message' => 'Comment created successfully',
                 'comment' => $comment->load(['user:id,name', 'post:id,title,slug'])
@@ -513,6 +474,120 @@ public function adminIndex(Request $request): JsonResponse
         ]);
     }
 
+    /**
+     * Score a comment synchronously through the ML service (neutral fallback on failure).
+     */
+    private function scoreSentiment(Comment $comment): void
+    {
+        if (config('services.ml.enabled', true)) {
+            try {
+                $sentimentAnalysis = $this->analyzeSentiment($comment->content);
+
+                if ($sentimentAnalysis && isset($sentimentAnalysis['sentiment'])) {
+                    // Map ML service sentiment to Comment model constants
+                    $sentimentLabel = $this->mapSentimentLabel($sentimentAnalysis['sentiment']);
+                    $sentimentScore = $this->calculateSentimentScore($sentimentAnalysis['sentiment'], $sentimentAnalysis['confidence'] ?? 0.5);
+
+                    $comment->update([
+                        'sentiment_score' => $sentimentScore,
+                        'sentiment_label' => $sentimentLabel,
+                        'sentiment_confidence' => $sentimentAnalysis['confidence'] ?? 0.5,
+                    ]);
+
+                    // Log ML service usage for analytics
+                    \Log::info('Sentiment analysis completed for comment ' . $comment->id, [
+                        'sentiment' => $sentimentAnalysis['sentiment'],
+                        'confidence' => $sentimentAnalysis['confidence'],
+                        'cached' => $sentimentAnalysis['cached'] ?? false,
+                        'word_count' => $comment->word_count,
+                    ]);
+                } else {
+                    // Fallback to neutral if ML service fails
+                    $comment->update([
+                        'sentiment_score' => 0.5,
+                        'sentiment_label' => Comment::SENTIMENT_NEUTRAL,
+                        'sentiment_confidence' => 0.3, // Lower confidence for fallback
+                    ]);
+                }
+            } catch (\Exception $e) {
+                // Log the error but don't fail comment creation
+                \Log::warning('Sentiment analysis failed for comment ' . $comment->id . ': ' . $e->getMessage());
+
+                // Set neutral sentiment as fallback
+                $comment->update([
+                    'sentiment_score' => 0.5,
+                    'sentiment_label' => Comment::SENTIMENT_NEUTRAL,
+                    'sentiment_confidence' => 0.3, // Lower confidence for fallback
+                ]);
+            }
+        } else {
+            // ML service disabled, set neutral sentiment
+            $comment->update([
+                'sentiment_score' => 0.5,
+                'sentiment_label' => Comment::SENTIMENT_NEUTRAL,
+                'sentiment_confidence' => 1.0, // High confidence for manual neutral assignment
+            ]);
+        }
+    }
+
+    /**
+     * Queue a comment for the ML service's sentiment stream consumer.
+     */
+    private function publishSentimentRequest(Comment $comment): bool
+    {
+        try {
+            Redis::connection('ml')->xadd(config('services.ml.sentiment_stream', 'comments:sentiment'), '*', [
+                'comment_id' => (string) $comment->id,
+                'text' => $comment->content,
+            ]);
+            return true;
+        } catch (\Exception $e) {
+            \Log::warning('Queueing sentiment analysis failed for comment ' . $comment->id . ': ' . $e->getMessage());
+            return false;
+        }
+    }
+
+    /**
+     * ML service callback: store scores produced by the sentiment stream consumer.
+     */
+    public function applySentiment(Request $request): JsonResponse
+    {
+        $token = config('services.ml.callback_token');
+        if (!$token || !hash_equals($token, (string) $request->header('X-ML-Callback-Token'))) {
+            return response()->json([
+                'message' => 'Unauthorized'
+            ], 401);
+        }
+
+        $validator = Validator::make($request->all(), [
+            'results' => 'required|array',
+            'results.*.comment_id' => 'required|integer',
+            'results.*.sentiment' => 'required|string',
+            'results.*.confidence' => 'required|numeric|between:0,1',
+        ]);
+
+        if ($validator->fails()) {
+            return response()->json([
+                'message' => 'Validation failed',
+                'errors' => $validator->errors()
+            ], 422);
+        }
+
+        // Idempotent, so redelivered batches are harmless
+        $updated = 0;
+        foreach ($validator->validated()['results'] as $result) {
+            $updated += Comment::whereKey($result['comment_id'])->update([
+                'sentiment_score' => $this->calculateSentimentScore($result['sentiment'], (float) $result['confidence']),
+                'sentiment_label' => $this->mapSentimentLabel($result['sentiment']),
+                'sentiment_confidence' => $result['confidence'],
+            ]);
+        }
+
+        return response()->json([
+            'updated' => $updated
+        ]);
+    }
+
     /**
      * Analyze sentiment using ML service.
      */
@@ -522,9 +597,16 @@ private function analyzeSentiment(string $text): ?array
             $mlServiceUrl = config('services.ml.url', 'http://localhost:8000') . '/sentiment/';
             $timeout = config('services.ml.timeout', 10);
 
-            $response = \Http::timeout($timeout)->post($mlServiceUrl, [
-                'text' => $text
-            ]);
+            // X-Request-Timeout lets the ML service drop the work once we stop waiting;
+            // the commenter is waiting, so it goes ahead of backfills
+            $response = \Http::timeout($timeout)
+                ->withHeaders([
+                    'X-Request-Timeout' => (string) $timeout,
+                    'X-Priority' => 'interactive',
+                ])
+                ->post($mlServiceUrl, [
+                    'text' => $text
+                ]);
 
             if ($response->successful()) {
                 $data = $response->json();
@@ -165,6 +165,19 @@
             'backoff_cap' => env('REDIS_BACKOFF_CAP', 1000),
         ],
 
+        // Shared with the ML service, so keys are not prefixed
+        'ml' => [
+            'url' => env('REDIS_URL'),
+            'host' => env('REDIS_HOST', '127.0.0.1'),
+            'username' => env('REDIS_USERNAME'),
+            'password' => env('REDIS_PASSWORD'),
+            'port' => env('REDIS_PORT', '6379'),
+            'database' => env('ML_REDIS_DB', '0'),
+            'options' => [
+                'prefix' => '',
+            ],
+        ],
+
         'cache' => [
             'url' => env('REDIS_URL'),
             'host' => env('REDIS_HOST', '127.0.0.1'),
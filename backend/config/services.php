@@ -39,6 +39,10 @@
         'url' => env('ML_SERVICE_URL', 'http://localhost:8000'),
         'timeout' => env('ML_SERVICE_TIMEOUT', 10),
         'enabled' => env('ML_SERVICE_ENABLED', true),
+        // Publish new comments to a Redis stream instead of scoring them inline
+        'async_sentiment' => env('ML_SENTIMENT_ASYNC', false),
+        'sentiment_stream' => env('ML_SENTIMENT_STREAM', 'comments:sentiment'),
+        'callback_token' => env('ML_CALLBACK_TOKEN'),
     ],
 
 ];
@@ -26,6 +26,9 @@
     Route::get('/posts/{post}', [PostController::class, 'show']);
     Route::get('/posts/{post}/comments', [CommentController::class, 'index']);
 
+    // ML service callback (authenticated with ML_CALLBACK_TOKEN)
+    Route::post('/internal/ml/comment-sentiment', [CommentController::class, 'applySentiment']);
+
     // Authentication routes
     Route::post('/auth/register', [AuthController::class, 'register']);
     Route::post('/auth/login', [AuthController::class, 'login']);
@@ -51,7 +51,7 @@ export const imageService = {
 
       // Perform ML analysis on the image
       console.log('Analyzing image with ML service...')
-      const analysis = await mlService.analyzeImageComplete(file)
+      const analysis = await mlService.analyzeImageComplete(file, { onTags: options.onTags })
 
       if (!analysis.success) {
         throw new Error(`ML analysis failed: ${analysis.error}`)
@@ -104,11 +104,11 @@ export const imageService = {
   },
 
   // Analyze image without uploading (useful for previews)
-  async analyzeImageOnly(file) {
+  async analyzeImageOnly(file, options = {}) {
     try {
       this.validateImage(file)
 
-      const analysis = await mlService.analyzeImageComplete(file)
+      const analysis = await mlService.analyzeImageComplete(file, { onTags: options.onTags })
 
       if (!analysis.success) {
         throw new Error(`ML analysis failed: ${analysis.error}`)
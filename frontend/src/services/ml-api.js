@@ -23,6 +23,10 @@ mlApi.interceptors.request.use(
     if (token) {
       config.headers.Authorization = `Bearer ${token}`
     }
+    // Let the ML service drop work once we have stopped waiting for it
+    if (config.timeout) {
+      config.headers['X-Request-Timeout'] = String(config.timeout / 1000)
+    }
     return config
   },
   (error) => {
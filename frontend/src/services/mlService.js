@@ -3,13 +3,22 @@ import axios from 'axios'
 // Direct ML service calls - use Docker Swarm service name in production
 const ML_BASE_URL = import.meta.env.PROD ? 'http://ml-service:8000' : 'http://localhost:8000'
 
+// Every call tells the ML service how long we wait, so it drops work we gave up on
+const mlAxios = axios.create()
+mlAxios.interceptors.request.use((config) => {
+  if (config.timeout) {
+    config.headers['X-Request-Timeout'] = String(config.timeout / 1000)
+  }
+  return config
+})
+
 export const mlService = {
   // Analyze image using ML service
   async analyzeImage(file) {
     const formData = new FormData()
     formData.append('file', file)
 
-    const response = await axios.post(`${ML_BASE_URL}/image-classification/`, formData, {
+    const response = await mlAxios.post(`${ML_BASE_URL}/image-classification/`, formData, {
       headers: {
         'Content-Type': 'multipart/form-data'
       },
@@ -42,7 +51,7 @@ Example format: "A [object] [action] [location] with [details]"`
         prompt = `Generate a descriptive alt text for a blog post image. The alt text should be concise but descriptive for accessibility purposes. Keep it under 100 characters.`
       }
 
-      const response = await axios.post(`${ML_BASE_URL}/text-generation/text`, {
+      const response = await mlAxios.post(`${ML_BASE_URL}/text-generation/text`, {
         prompt: prompt,
         max_length: 100,
         temperature: 0.7
@@ -98,7 +107,7 @@ Example format: "A [object] [action] [location] with [details]"`
   // Generate text using ML service
   async generateText(prompt, max_length = 100, temperature = 0.7) {
     try {
-      const response = await axios.post(`${ML_BASE_URL}/text-generation/text`, {
+      const response = await mlAxios.post(`${ML_BASE_URL}/text-generation/text`, {
         prompt: prompt,
         max_length: max_length,
         temperature: temperature
@@ -122,7 +131,7 @@ Example format: "A [object] [action] [location] with [details]"`
   // Generate complete blog post using ML service
   async generateBlogPost(options) {
     try {
-      const response = await axios.post(`${ML_BASE_URL}/text-generation/post`, {
+      const response = await mlAxios.post(`${ML_BASE_URL}/text-generation/post`, {
         topic: options.topic,
         tone: options.tone || 'informative',
         target_length: options.target_length || 1000,
@@ -151,23 +160,64 @@ Example format: "A [object] [action] [location] with [details]"`
     }
   },
 
-  // Combined image analysis (classification + alt text with tags)
-  async analyzeImageComplete(file) {
+  // Combined image analysis (classification + alt text with tags) in one request.
+  // The ML service streams NDJSON: a `tags` event as soon as the image is
+  // classified (passed to onTags), then an `alt_text` or `error` event.
+  async analyzeImageComplete(file, { onTags } = {}) {
+    const controller = new AbortController()
+    const timeout = setTimeout(() => controller.abort(), 60000) // 1 minute
+
     try {
-      // First, get image classification to get tags
-      const classification = await this.analyzeImage(file)
+      const formData = new FormData()
+      formData.append('file', file)
+
+      const response = await fetch(`${ML_BASE_URL}/image-classification/analyze`, {
+        method: 'POST',
+        body: formData,
+        headers: { 'X-Request-Timeout': '60' },
+        signal: controller.signal
+      })
 
-      // Extract tags from classification response
-      const tags = classification.tags || classification.predictions?.map(p => p.label) || []
+      if (!response.ok) {
+        const error = await response.json().catch(() => ({}))
+        throw new Error(error.detail || `Image analysis failed with status ${response.status}`)
+      }
 
-      // Generate alt text using the image analysis tags
-      const altText = await this.generateAltText(file, tags)
+      let classification = null
+      let altText = null
+      const handleEvent = (event) => {
+        if (event.event === 'tags') {
+          classification = event
+          if (onTags) onTags(event.tags)
+        } else if (event.event === 'alt_text') {
+          altText = event
+        } else if (event.event === 'error') {
+          console.warn('ML alt text generation failed, using fallback:', event.detail)
+        }
+      }
+
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
+      for (;;) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        const lines = buffer.split('\n')
+        buffer = lines.pop()
+        lines.filter(line => line.trim()).forEach(line => handleEvent(JSON.parse(line)))
+      }
+      if (buffer.trim()) handleEvent(JSON.parse(buffer))
+
+      if (!classification) {
+        throw new Error('Image analysis returned no tags')
+      }
 
       return {
-        classification: classification.tags || classification, // Handle both formats
-        tags: tags, // Include extracted tags
-        alt_text: typeof altText === 'string' ? altText : altText?.generated_text || '',
-        alt_text_prompt: altText?.prompt_used || '',
+        classification: classification.tags,
+        tags: classification.tags,
+        alt_text: altText ? altText.alt_text : this.generateSimpleAltText(file.name),
+        alt_text_prompt: altText ? altText.alt_text_prompt : 'Fallback alt text generation',
         success: true
       }
     } catch (error) {
@@ -176,6 +226,8 @@ Example format: "A [object] [action] [location] with [details]"`
         error: error.message,
         success: false
       }
+    } finally {
+      clearTimeout(timeout)
     }
   }
-}
\ No newline at end of file
+}
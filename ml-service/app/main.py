@@ -1,14 +1,42 @@
-from fastapi import FastAPI
+# Imported first so the import hook also times fastapi and the routers
+from app.services.startup import startup_timer
+startup_timer.install_import_hook()
+
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.datastructures import Headers, MutableHeaders
 import uvicorn
 import os
+import time
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-from app.routes import sentiment, recommendations, image_classification, text_generation
+from app.routes import sentiment, recommendations, image_classification, text_generation, jobs, profiling, model_admin
 from app.services.model_loader import ModelLoader
+from app.services.deadline import RequestDeadlineMiddleware
+from app.services.cache import cache_budget
+from app.services.job_queue import job_queue
+from app.services.model_swap import model_swap
+from app.services.sentiment_stream import sentiment_stream
+from app.services.slo_controller import slo_controller
+from app.services.metrics import (
+    BREAKER_OPEN,
+    MODEL_LATENCY_P95,
+    QUEUE_DEPTH,
+    REQUEST_COUNT,
+    REQUEST_LATENCY,
+    SCHEDULER_SETTING,
+    register_scrape_hook,
+    render_metrics,
+)
+from app.services.profiling import profiler, ADMIN_TOKEN_HEADER, KINDS, PROFILE_HEADER
+from app.services.scheduler import PRIORITIES, scheduler_enabled
+from app.services.warmup import warmup
+
+startup_timer.mark("imports")
 
 app = FastAPI(
     title="BlogML ML Service",
@@ -16,6 +44,9 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Request deadlines and disconnects (innermost, so early 504s still get CORS headers)
+app.add_middleware(RequestDeadlineMiddleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -25,16 +56,118 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# The middlewares below are plain ASGI rather than @app.middleware("http"):
+# Starlette's BaseHTTPMiddleware reads `receive` while it relays a streaming
+# response, which drops the request body of endpoints that stream both ways
+# (/sentiment/stream).
+
+class RequestMetricsMiddleware:
+    """Count requests and time them per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            path = route.path if route else "unmatched"
+            REQUEST_COUNT.labels(method=scope["method"], route=path, status=str(status)).inc()
+            REQUEST_LATENCY.labels(method=scope["method"], route=path).observe(time.perf_counter() - started)
+
+class ProfileRequestsMiddleware:
+    """Profile a single request when an admin sends X-Profile: stacks|cprofile|torch"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        kind = headers.get(PROFILE_HEADER)
+        if kind not in KINDS or not profiler.authorized(headers.get(ADMIN_TOKEN_HEADER)):
+            await self.app(scope, receive, send)
+            return
+
+        with profiler.profile_request(kind, f"{scope['method']} {scope['path']}") as profile:
+            async def send_with_profile_id(message):
+                if message["type"] == "http.response.start":
+                    MutableHeaders(scope=message)["X-Profile-Id"] = profile.id
+                await send(message)
+
+            await self.app(scope, receive, send_with_profile_id)
+
+app.add_middleware(RequestMetricsMiddleware)
+
+if profiler.enabled:
+    app.add_middleware(ProfileRequestsMiddleware)
+
+def _refresh_gauges():
+    for kind in job_queue.kinds:
+        QUEUE_DEPTH.labels(queue=f"jobs:{kind}").set(job_queue.depth(kind))
+    if sentiment_stream.enabled:
+        QUEUE_DEPTH.labels(queue=f"stream:{sentiment_stream.stream}").set(sentiment_stream.depth())
+    for model, scheduler in ModelLoader.schedulers().items():
+        for priority in PRIORITIES:
+            QUEUE_DEPTH.labels(queue=f"scheduler:{model}:{priority}").set(scheduler.depth(priority))
+        SCHEDULER_SETTING.labels(model=model, setting="max_batch_size").set(scheduler.max_batch_size)
+        SCHEDULER_SETTING.labels(model=model, setting="batch_wait_ms").set(scheduler.batch_wait * 1000)
+        SCHEDULER_SETTING.labels(model=model, setting="concurrency").set(scheduler.concurrency)
+        tuning = slo_controller.describe(model)
+        if tuning and tuning["p95_ms"] is not None:
+            MODEL_LATENCY_P95.labels(model=model).set(tuning["p95_ms"] / 1000)
+    for model, state in ModelLoader.get_hf_client().breaker_states().items():
+        BREAKER_OPEN.labels(model=model).set(1 if state["state"] == "open" else 0)
+
+register_scrape_hook("service", _refresh_gauges)
+
 # Include routers (updated routes for API-first approach)
 app.include_router(sentiment.router, prefix="/sentiment", tags=["sentiment"])
 app.include_router(recommendations.router, prefix="/recommendations", tags=["recommendations"])
 app.include_router(image_classification.router, prefix="/image-classification", tags=["image"])
 app.include_router(text_generation.router, prefix="/text-generation", tags=["text-generation"])
+app.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
+app.include_router(profiling.router, prefix="/admin/profiling", tags=["admin"], include_in_schema=profiler.enabled)
+app.include_router(model_admin.router, prefix="/admin/models", tags=["admin"], include_in_schema=model_swap.enabled)
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize ML models on startup"""
-    ModelLoader.initialize_models()
+    with startup_timer.phase("models"):
+        ModelLoader.initialize_models()
+    with startup_timer.phase("job_queue"):
+        job_queue.start()
+    with startup_timer.phase("sentiment_stream"):
+        sentiment_stream.start()
+    slo_controller.start()
+    model_swap.start_listener()
+    warmup.start()
+    startup_timer.finish()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Let job workers finish their current job"""
+    job_queue.stop()
+    sentiment_stream.stop()
+    slo_controller.stop()
+    model_swap.stop()
 
 @app.get("/")
 async def root():
@@ -44,17 +177,99 @@ async def root():
         "endpoints": {
             "sentiment": "/sentiment",
             "sentiment_batch": "/sentiment/batch",
+            "sentiment_ndjson": "/sentiment/stream",
             "recommendations": "/recommendations/user",
             "image_classification": "/image-classification",
+            "image_analysis": "/image-classification/analyze",
             "text_generation": "/text-generation",
-            "health": "/health"
+            "jobs": "/jobs",
+            "models": "/models",
+            "health": "/health",
+            "live": "/live",
+            "ready": "/ready",
+            "metrics": "/metrics",
+            "startup": "/health/startup",
+            "hf_api_health": "/health/hf-api",
+            "sentiment_stream": "/health/sentiment-stream",
+            "scheduler": "/health/scheduler",
+            "cache": "/health/cache"
         }
     }
 
+@app.get("/models")
+async def list_models():
+    """Model variants per task (select one with the `model` field of a request)"""
+    loader = ModelLoader()
+    registry = ModelLoader.registry()
+    tasks = registry.describe(loader.use_hf_api)
+    for task, listing in tasks.items():
+        for entry in listing["variants"]:
+            # Local models load on first use; API variants never load one unless falling back
+            variant = registry.get(task, entry["name"])
+            entry["loaded"] = ModelLoader.get_model(variant.key) is not None
+            # Part of the variant's cache namespaces; changes when the model is swapped
+            entry["version"] = ModelLoader.model_version(variant)
+    return {"tasks": tasks}
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/live")
+async def liveness():
+    """Process is up and serving (restart the container if this fails)"""
+    return {"status": "alive"}
+
+@app.get("/ready")
+async def readiness():
+    """Models are warmed up (route traffic only once this returns 200)"""
+    state = warmup.snapshot()
+    if not warmup.ready:
+        return JSONResponse(status_code=503, content=state)
+    return state
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics"""
+    body, content_type = render_metrics()
+    return Response(content=body, headers={"Content-Type": content_type})
+
+@app.get("/health/startup")
+async def startup_report():
+    """Boot timing: phases, slowest imports, which heavy libraries are loaded and this worker's CPU plan"""
+    return {**startup_timer.report(), "cpu": ModelLoader.cpu_plan().describe()}
+
+@app.get("/health/hf-api")
+async def hf_api_health():
+    """Circuit breaker state per Hugging Face model"""
+    loader = ModelLoader()
+    return {
+        "mode": "api" if loader.use_hf_api else "local",
+        "local_fallback": loader.local_fallback_mode,
+        "breakers": ModelLoader.get_hf_client().breaker_states()
+    }
+
+@app.get("/health/sentiment-stream")
+async def sentiment_stream_health():
+    """Backlog of the comment sentiment stream consumer"""
+    return sentiment_stream.status()
+
+@app.get("/health/scheduler")
+async def scheduler_health():
+    """Priority scheduler per model: current settings, running/queued inputs per class and the SLO controller's view"""
+    return {
+        "enabled": scheduler_enabled(),
+        "models": {
+            model: {**scheduler.status(), "controller": slo_controller.describe(model)}
+            for model, scheduler in ModelLoader.schedulers().items()
+        }
+    }
+
+@app.get("/health/cache")
+async def cache_health():
+    """Bytes and entries each cache namespace holds in Redis, against its budget"""
+    return cache_budget.status()
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
     uvicorn.run(
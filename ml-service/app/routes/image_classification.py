@@ -1,27 +1,73 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
-import io
-import hashlib
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional, Dict, Any, Type
+from contextlib import closing
 import json
 import tempfile
 import os
-from PIL import Image
-import base64
 
+from app.services.cache import cache_get_or_compute, cache_namespace
+from app.services.deadline import DeadlineExceeded
+from app.services.image_upload import (
+    ImageUpload,
+    UploadRejected,
+    check_pixels,
+    form_schema,
+    json_schema,
+    malformed,
+    read_base64_image,
+    read_multipart_image,
+    run_decode,
+    too_many_pixels,
+)
+from app.services.metrics import stage_timer
 from app.services.model_loader import ModelLoader
+from app.services.model_registry import IMAGE_CLASSIFICATION, ModelVariant, UnknownModelError
+from app.services.scheduler import INTERACTIVE, request_priority
+from app.services.text_generation import generate_alt_text, text_generation_variant
 
 router = APIRouter()
 
+class ClassifyImageForm(BaseModel):
+    """Form fields sent along with the image `file`"""
+    cache_key: Optional[str] = None
+    max_tags: int = 10
+    model: Optional[str] = None
+
+class ImageBase64Request(BaseModel):
+    image_data: str  # base64 image (or data: URL), decoded while it is received
+    cache_key: Optional[str] = None
+    max_tags: int = 10
+    model: Optional[str] = None
+
+class AnalyzeImageForm(BaseModel):
+    """Form fields sent along with the image `file` to /analyze"""
+    max_tags: int = 10
+    prompt_tags: int = 5
+    model: Optional[str] = None
+    text_model: Optional[str] = None
+    stream: bool = True
+
 class ImageClassificationResponse(BaseModel):
     tags: List[Dict[str, Any]]  # [{"tag": "dog", "confidence": 0.95}, ...]
     is_safe: bool
     nsfw_score: float
     cached: bool = False
+    model: Optional[str] = None  # variant that classified the image
 
 class BatchImageClassificationResponse(BaseModel):
     results: List[ImageClassificationResponse]
 
+class ImageAnalysisResponse(ImageClassificationResponse):
+    content_hash: str  # sha256 of the uploaded bytes, the classification cache key
+    alt_text: str
+    alt_text_prompt: str
+    alt_text_cached: bool = False
+    text_model: Optional[str] = None  # variant that wrote the alt text
+
 # NSFW-related labels that might be in the model
 NSFW_LABELS = {
     'nsfw', 'nudity', 'explicit', 'sexual', 'porn',
@@ -43,168 +89,232 @@ def detect_nsfw_content(predictions: List[Dict], threshold: float = 0.5) -> tupl
     is_safe = nsfw_score < threshold
     return is_safe, nsfw_score
 
-@router.post("/", response_model=ImageClassificationResponse)
-async def classify_image(
-    file: UploadFile = File(...),
-    cache_key: Optional[str] = Form(None),
-    max_tags: int = Form(10)
-):
-    """
-    Classify uploaded image and return tags with confidence scores
-    """
-    if not file.content_type or not file.content_type.startswith('image/'):
-        raise HTTPException(status_code=400, detail="File must be an image")
+def image_variant(name: Optional[str]) -> ModelVariant:
+    """Registry variant a request asked for (400 for unknown names)"""
+    try:
+        return ModelLoader.variant(IMAGE_CLASSIFICATION, name)
+    except UnknownModelError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+def parse_fields(form: Type[BaseModel], fields: dict) -> BaseModel:
+    """Validate the fields that came with an upload (422, like FastAPI's own parameters)"""
     try:
-        # Read and validate image
-        contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
-
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-
-        # Resize image if too large (to prevent memory issues)
-        if image.size[0] > 1024 or image.size[1] > 1024:
-            image.thumbnail((1024, 1024))
-
-        # Try cache first
-        redis_client = ModelLoader.get_redis_client()
-        if cache_key and redis_client:
-            cached_result = redis_client.get(f"image_class:{cache_key}")
-            if cached_result:
-                result = json.loads(cached_result)
-                result["cached"] = True
-                return ImageClassificationResponse(**result)
-
-        # Get classification using Hugging Face API or local model
-        # Save image to temporary file for API calls
+        return form.model_validate(fields)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+def open_image(upload: ImageUpload):
+    """Decode an upload into an RGB image of at most 1024x1024"""
+    with stage_timer("image_decode", model="image_classification"):
+        from PIL import Image, UnidentifiedImageError
+
+        try:
+            # Reads the header only: the size is known before any pixel is decoded
+            image = Image.open(upload.file)
+            check_pixels(*image.size)
+
+            # Full-size pixels only ever exist on the decode threads
+            return run_decode(decode_pixels, image)
+        except Image.DecompressionBombError:
+            # Pillow refuses sizes far over its own limit while reading the header
+            raise too_many_pixels()
+        except (UnidentifiedImageError, SyntaxError, OSError) as e:
+            raise malformed(f"Cannot decode {upload.format} image: {str(e)}")
+
+def decode_pixels(image):
+    """Pixels of an opened image, as RGB of at most 1024x1024"""
+    # JPEGs decode straight at a reduced scale when they are larger than needed
+    image.draft('RGB', (1024, 1024))
+    image.load()
+
+    # Convert to RGB if necessary
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    # Resize image if too large (to prevent memory issues)
+    if image.size[0] > 1024 or image.size[1] > 1024:
+        image.thumbnail((1024, 1024))
+    return image
+
+def classify(image, variant: ModelVariant, max_tags: int) -> dict:
+    """Tags and NSFW verdict of a decoded image (ImageClassificationResponse fields)"""
+    # Get classification using Hugging Face API or local model
+    # Save image to temporary file for API calls
+    with stage_timer("image_encode", model="image_classification"):
         with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
             image.save(temp_file, format='JPEG')
             temp_file_path = temp_file.name
 
+    try:
+        predictions = ModelLoader.classify_image(temp_file_path, model=variant.name)
+    finally:
+        # Clean up temporary file
+        os.unlink(temp_file_path)
+
+    # Filter to top N tags and format response
+    top_predictions = predictions[:max_tags]
+    tags = []
+    for pred in top_predictions:
+        tags.append({
+            "tag": pred['label'].lower().replace('_', ' '),
+            "confidence": float(pred['score']),
+            "is_auto_generated": True
+        })
+
+    # NSFW detection
+    is_safe, nsfw_score = detect_nsfw_content(predictions)
+
+    return {
+        "tags": tags,
+        "is_safe": is_safe,
+        "nsfw_score": nsfw_score,
+        "cached": False,
+        "model": variant.name
+    }
+
+@router.post("/", response_model=ImageClassificationResponse, dependencies=[Depends(request_priority(INTERACTIVE))],
+             openapi_extra=form_schema(ClassifyImageForm))
+async def classify_image(request: Request):
+    """
+    Classify an uploaded image (multipart `file`) and return tags with confidence scores
+
+    The upload is streamed: non-images are refused from their first bytes
+    (415), and uploads over UPLOAD_MAX_MB or IMAGE_MAX_PIXELS with a 413.
+    """
+    with stage_timer("upload_read", model="image_classification"):
+        upload, fields = await read_multipart_image(request)
+
+    with closing(upload):
+        form = parse_fields(ClassifyImageForm, fields)
+        variant = image_variant(form.model)
+        namespace = cache_namespace("image_class", variant)
+
         try:
-            predictions = ModelLoader.classify_image(temp_file_path)
-        finally:
-            # Clean up temporary file
-            os.unlink(temp_file_path)
-
-        # Filter to top N tags and format response
-        top_predictions = predictions[:max_tags]
-        tags = []
-        for pred in top_predictions:
-            tags.append({
-                "tag": pred['label'].lower().replace('_', ' '),
-                "confidence": float(pred['score']),
-                "is_auto_generated": True
-            })
-
-        # NSFW detection
-        is_safe, nsfw_score = detect_nsfw_content(predictions)
-
-        response_data = {
-            "tags": tags,
-            "is_safe": is_safe,
-            "nsfw_score": nsfw_score,
-            "cached": False
-        }
-
-        # Cache the result
-        if cache_key and redis_client:
-            redis_client.setex(
-                f"image_class:{cache_key}",
-                3600,  # 1 hour cache
-                json.dumps(response_data)
-            )
+            response_data = await classify_cached(upload, variant, form.max_tags, namespace, form.cache_key)
+            return ImageClassificationResponse(**response_data)
 
-        return ImageClassificationResponse(**response_data)
+        except (DeadlineExceeded, UploadRejected):
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Image classification failed: {str(e)}")
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Image classification failed: {str(e)}")
+@router.post("/base64", response_model=ImageClassificationResponse, dependencies=[Depends(request_priority(INTERACTIVE))],
+             openapi_extra=json_schema(ImageBase64Request))
+async def classify_image_base64(request: Request):
+    """
+    Classify a base64 image sent as JSON (ImageBase64Request)
 
-@router.post("/base64", response_model=ImageClassificationResponse)
-async def classify_image_base64(
-    image_data: str,
-    cache_key: Optional[str] = None,
-    max_tags: int = 10
-):
+    `image_data` is decoded as the body arrives, so the base64 text is never
+    held whole; the same limits as uploads apply.
     """
-    Classify image from base64 string
+    with stage_timer("upload_read", model="image_classification"):
+        upload, body = await read_base64_image(request)
+
+    with closing(upload):
+        form = parse_fields(ImageBase64Request, body)
+        variant = image_variant(form.model)
+        namespace = cache_namespace("image_class", variant)
+
+        try:
+            response_data = await classify_cached(upload, variant, form.max_tags, namespace, form.cache_key)
+            return ImageClassificationResponse(**response_data)
+
+        except (DeadlineExceeded, UploadRejected):
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Base64 image classification failed: {str(e)}")
+
+async def classify_cached(upload: ImageUpload, variant: ModelVariant, max_tags: int, namespace: str,
+                          cache_key: Optional[str]) -> dict:
     """
-    try:
-        # Decode base64
-        image_bytes = base64.b64decode(image_data)
-        image = Image.open(io.BytesIO(image_bytes))
-
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-
-        # Resize if needed
-        if image.size[0] > 1024 or image.size[1] > 1024:
-            image.thumbnail((1024, 1024))
-
-        # Try cache
-        redis_client = ModelLoader.get_redis_client()
-        if cache_key and redis_client:
-            cached_result = redis_client.get(f"image_class:{cache_key}")
-            if cached_result:
-                result = json.loads(cached_result)
-                result["cached"] = True
-                return ImageClassificationResponse(**result)
-
-        # Classification using Hugging Face API or local model
-        # Save image to temporary file for API calls
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp_file:
-            image.save(temp_file, format='JPEG')
-            temp_file_path = temp_file.name
+    Classification of an upload, through the cache (single-flight) when the
+    caller names a cache_key; the image is only decoded on a miss
+    """
+    def compute() -> dict:
+        return classify(open_image(upload), variant, max_tags)
+
+    if not cache_key:
+        return await run_in_threadpool(compute)
+
+    response_data, shared = await run_in_threadpool(
+        cache_get_or_compute, namespace, cache_key, compute, variant.cache_ttl
+    )
+    if shared:
+        response_data["cached"] = True
+    return response_data
+
+@router.post("/analyze", dependencies=[Depends(request_priority(INTERACTIVE))],
+             openapi_extra=form_schema(AnalyzeImageForm))
+async def analyze_image(request: Request):
+    """
+    Classify an image and write its alt text in one request
+
+    The classification is cached by the sha256 of the uploaded bytes and the
+    alt text by its prompt, so re-uploading an image is answered from Redis.
+    With `stream` (default) the response is NDJSON: a `tags` event as soon as
+    the image is classified, then an `alt_text` event (or an `error` event if
+    generation fails). Otherwise one ImageAnalysisResponse is returned.
+    """
+    # The hash is computed while the upload streams in
+    with stage_timer("upload_read", model="image_classification"):
+        upload, fields = await read_multipart_image(request)
+
+    with closing(upload):
+        form = parse_fields(AnalyzeImageForm, fields)
+        max_tags, prompt_tags, stream = form.max_tags, form.prompt_tags, form.stream
+        variant = image_variant(form.model)
+        text_variant = text_generation_variant(form.text_model)
+        namespace = cache_namespace("image_class", variant)
 
         try:
-            predictions = ModelLoader.classify_image(temp_file_path)
-        finally:
-            # Clean up temporary file
-            os.unlink(temp_file_path)
-
-        # Format response
-        top_predictions = predictions[:max_tags]
-        tags = []
-        for pred in top_predictions:
-            tags.append({
-                "tag": pred['label'].lower().replace('_', ' '),
-                "confidence": float(pred['score']),
-                "is_auto_generated": True
-            })
-
-        # NSFW detection
-        is_safe, nsfw_score = detect_nsfw_content(predictions)
-
-        response_data = {
-            "tags": tags,
-            "is_safe": is_safe,
-            "nsfw_score": nsfw_score,
-            "cached": False
-        }
-
-        # Cache result
-        if cache_key and redis_client:
-            redis_client.setex(
-                f"image_class:{cache_key}",
-                3600,
-                json.dumps(response_data)
+            content_hash = upload.sha256
+            cache_key = f"sha256:{content_hash}:{max_tags}"
+
+            classification, shared = await run_in_threadpool(
+                cache_get_or_compute, namespace, cache_key,
+                lambda: classify(open_image(upload), variant, max_tags), variant.cache_ttl
             )
+            if shared:
+                classification["cached"] = True
+            classification["content_hash"] = content_hash
 
-        return ImageClassificationResponse(**response_data)
+        except (DeadlineExceeded, UploadRejected):
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Image analysis failed: {str(e)}")
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Base64 image classification failed: {str(e)}")
+    if not stream:
+        try:
+            alt_text = await run_in_threadpool(generate_alt_text, classification["tags"], text_variant, prompt_tags)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Alt text generation failed: {str(e)}")
+        return ImageAnalysisResponse(**classification, **alt_text)
+
+    async def events():
+        yield json.dumps({"event": "tags", **classification}) + "\n"
+        try:
+            # Off the event loop so the tags event is flushed while the model runs
+            alt_text = await run_in_threadpool(generate_alt_text, classification["tags"], text_variant, prompt_tags)
+            yield json.dumps({"event": "alt_text", **alt_text}) + "\n"
+        except Exception as e:
+            yield json.dumps({"event": "error", "stage": "alt_text", "detail": f"Alt text generation failed: {str(e)}"}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
 
 @router.get("/labels")
-async def get_available_labels():
+async def get_available_labels(model: Optional[str] = None):
     """
-    Get available labels from the image classification model
+    Get available labels from an image classification model variant
     """
     try:
-        classifier = ModelLoader.get_model('image_classifier')
+        variant = ModelLoader.variant(IMAGE_CLASSIFICATION, model)
+    except UnknownModelError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        classifier = ModelLoader.load_local_model(variant)
         if hasattr(classifier.model.config, 'id2label'):
             labels = classifier.model.config.id2label
             return {"labels": list(labels.values())}
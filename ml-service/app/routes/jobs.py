@@ -0,0 +1,168 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import Any, Dict, List, Optional
+import asyncio
+import json
+
+from app.routes import text_generation
+from app.services.job_queue import job_queue, TERMINAL_STATES
+from app.services.model_loader import ModelLoader, normalize_sentiment_label
+from app.services.model_registry import SENTIMENT
+from app.services.scheduler import BULK, parse_priority
+
+router = APIRouter()
+
+class JobSubmitRequest(BaseModel):
+    kind: str
+    payload: Dict[str, Any] = {}
+    timeout: Optional[float] = None  # seconds; dropped if not finished by then (default: no limit)
+    priority: Optional[str] = None  # scheduler priority class of its model calls (default: bulk)
+
+class JobResponse(BaseModel):
+    job_id: str
+    kind: str
+    status: str  # queued, running, succeeded, failed
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    deadline: Optional[float] = None
+    priority: Optional[str] = None
+
+class BatchSentimentJobPayload(BaseModel):
+    texts: List[str]
+    batch_size: Optional[int] = None  # default: the variant's batch_size
+    model: Optional[str] = None  # sentiment registry variant
+
+# Job kinds: payload schema (validated at submit time) and handler
+async def _run_blog_post(payload: dict) -> dict:
+    request = text_generation.BlogPostGenerationRequest(**payload)
+    return (await text_generation.generate_blog_post(request)).model_dump()
+
+async def _run_outline(payload: dict) -> dict:
+    request = text_generation.OutlineGenerationRequest(**payload)
+    return (await text_generation.generate_outline(request)).model_dump()
+
+async def _run_text(payload: dict) -> dict:
+    request = text_generation.TextGenerationRequest(**payload)
+    return (await text_generation.generate_text(request)).model_dump()
+
+def _run_batch_sentiment(payload: dict) -> dict:
+    request = BatchSentimentJobPayload(**payload)
+    variant = ModelLoader.variant(SENTIMENT, request.model)
+    predictions = ModelLoader.analyze_sentiment_batch(request.texts, batch_size=request.batch_size, model=variant.name)
+    return {
+        "model": variant.name,
+        "results": [
+            {
+                "sentiment": normalize_sentiment_label(prediction['label']),
+                "confidence": float(prediction['score']),
+                "stage": prediction.get('stage')
+            }
+            for prediction in predictions
+        ]
+    }
+
+JOB_KINDS = {
+    "text_generation.post": (text_generation.BlogPostGenerationRequest, _run_blog_post, 2),
+    "text_generation.outline": (text_generation.OutlineGenerationRequest, _run_outline, 2),
+    "text_generation.text": (text_generation.TextGenerationRequest, _run_text, 2),
+    "sentiment.batch": (BatchSentimentJobPayload, _run_batch_sentiment, 1),
+}
+
+for _kind, (_schema, _handler, _concurrency) in JOB_KINDS.items():
+    job_queue.register(_kind, _handler, concurrency=_concurrency)
+
+def _to_response(job: dict) -> JobResponse:
+    return JobResponse(
+        job_id=job['id'],
+        kind=job['kind'],
+        status=job['status'],
+        result=job['result'],
+        error=job['error'],
+        created_at=job['created_at'],
+        started_at=job['started_at'],
+        finished_at=job['finished_at'],
+        deadline=job.get('deadline'),
+        priority=job.get('priority')
+    )
+
+@router.post("/", response_model=JobResponse, status_code=202)
+async def submit_job(request: JobSubmitRequest):
+    """
+    Queue a long-running job and return its ID immediately
+    """
+    if request.kind not in JOB_KINDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown job kind '{request.kind}'. Available: {', '.join(JOB_KINDS)}"
+        )
+
+    if request.timeout is not None and request.timeout <= 0:
+        raise HTTPException(status_code=400, detail="Timeout must be positive")
+
+    try:
+        priority = parse_priority(request.priority) if request.priority else BULK
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid priority: {str(e)}")
+
+    schema = JOB_KINDS[request.kind][0]
+    try:
+        schema(**request.payload)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=json.loads(e.json()))
+
+    try:
+        job = job_queue.submit(request.kind, request.payload, timeout=request.timeout, priority=priority)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Job submission failed: {str(e)}")
+
+    return JSONResponse(
+        status_code=202,
+        content=_to_response(job).model_dump(),
+        headers={"Location": f"/jobs/{job['id']}"}
+    )
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str, wait: float = 0.0):
+    """
+    Get job status and result. Pass ?wait=N to long-poll up to N seconds (max 30)
+    """
+    if wait > 0:
+        job = await job_queue.wait(job_id, timeout=min(wait, 30.0))
+    else:
+        job = job_queue.get(job_id)
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return _to_response(job)
+
+@router.get("/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """
+    Subscribe to job status changes as server-sent events until the job finishes
+    """
+    if not job_queue.get(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        last_status = None
+        while True:
+            job = job_queue.get(job_id)
+            if not job:
+                yield "event: expired\ndata: {}\n\n"
+                return
+
+            if job['status'] != last_status:
+                last_status = job['status']
+                yield f"data: {_to_response(job).model_dump_json()}\n\n"
+
+            if job['status'] in TERMINAL_STATES:
+                return
+
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
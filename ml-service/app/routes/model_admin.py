@@ -0,0 +1,60 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from pydantic import BaseModel
+from typing import Any, Dict, Optional
+
+from app.services.model_registry import UnknownModelError
+from app.services.model_swap import model_swap
+
+router = APIRouter()
+
+class SwapRequest(BaseModel):
+    """Registry options of the new version; omitted ones keep their current value"""
+    model: Optional[str] = None
+    revision: Optional[str] = None
+    api_model: Optional[str] = None
+    bundle: Optional[str] = None
+    cascade_model: Optional[str] = None
+    cascade_threshold: Optional[float] = None
+
+class SwapAccepted(BaseModel):
+    id: str
+    workers: int  # workers that received the swap
+    status_url: str
+
+class SwapStatus(BaseModel):
+    id: str
+    status: str  # loading, warming, swapped or failed (across all workers)
+    workers: Dict[str, Dict[str, Any]]
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Model admin endpoints do not exist unless MODEL_ADMIN_TOKEN is set, and need it"""
+    if not model_swap.enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not model_swap.authorized(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@router.post("/{task}/{name}/swap", response_model=SwapAccepted, status_code=202, dependencies=[Depends(require_admin)])
+async def swap_model(task: str, name: str, request: SwapRequest):
+    """
+    Load a new version of a model variant in the background, warm it and
+    swap it in without dropping requests; follow progress at status_url
+    """
+    changes = request.model_dump(exclude_none=True)
+    try:
+        accepted = model_swap.request(task, name, changes)
+    except (KeyError, UnknownModelError) as e:
+        raise HTTPException(status_code=404, detail=f"Unknown model variant {task}/{name}: {str(e)}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid swap: {str(e)}")
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return SwapAccepted(**accepted, status_url=f"/admin/models/swaps/{accepted['id']}")
+
+@router.get("/swaps/{swap_id}", response_model=SwapStatus, dependencies=[Depends(require_admin)])
+async def swap_status(swap_id: str):
+    """Progress of a swap on every worker that took part"""
+    status = model_swap.status(swap_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Swap {swap_id} not found")
+    return SwapStatus(**status)
@@ -0,0 +1,107 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+from typing import List, Optional
+import asyncio
+
+from app.services.profiling import profiler, Profile, CPROFILE, DONE, RUNNING, STACKS
+
+router = APIRouter()
+
+class SampleRequest(BaseModel):
+    kind: str = STACKS  # stacks (all threads) or cprofile (event loop thread and model calls)
+    duration: float = 10.0  # seconds, capped by PROFILING_MAX_SECONDS
+    interval_ms: float = 10.0  # stack sampling interval
+    include_idle: bool = False  # keep threads parked on locks/queues/selectors
+
+class TorchProfileRequest(BaseModel):
+    passes: int = 1  # local forward passes to trace
+
+class ProfileSummary(BaseModel):
+    id: str
+    kind: str
+    label: str
+    pid: int
+    status: str  # running, done, failed
+    started_at: float
+    finished_at: Optional[float] = None
+    samples: int
+    traces: List[str] = []
+    error: Optional[str] = None
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Profiling endpoints do not exist unless enabled, and need the admin token"""
+    if not profiler.enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profiler.authorized(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+def _get_profile(profile_id: str) -> Profile:
+    profile = profiler.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found on this worker")
+    return profile
+
+@router.post("/sample", response_model=ProfileSummary, status_code=202, dependencies=[Depends(require_admin)])
+async def start_sample(request: SampleRequest):
+    """
+    Start a time-boxed profile of this worker; fetch the result from /profiles/{id}
+    """
+    if request.kind not in (STACKS, CPROFILE):
+        raise HTTPException(status_code=400, detail=f"Kind must be one of: {STACKS}, {CPROFILE}")
+
+    if request.duration <= 0 or request.interval_ms <= 0:
+        raise HTTPException(status_code=400, detail="duration and interval_ms must be positive")
+
+    try:
+        if request.kind == CPROFILE:
+            profile = profiler.cprofile(request.duration, asyncio.get_running_loop())
+        else:
+            profile = profiler.sample(request.duration, request.interval_ms / 1000.0, request.include_idle)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        # cProfile refuses to start while another profiler owns the thread
+        raise HTTPException(status_code=409, detail=f"Could not start profiler: {str(e)}")
+
+    return ProfileSummary(**profile.summary())
+
+@router.post("/torch", response_model=ProfileSummary, status_code=202, dependencies=[Depends(require_admin)])
+async def arm_torch_profile(request: TorchProfileRequest):
+    """
+    Record torch.profiler traces of the next local model forward passes
+    """
+    if not 1 <= request.passes <= 50:
+        raise HTTPException(status_code=400, detail="passes must be between 1 and 50")
+
+    profile = profiler.arm_torch(request.passes)
+    return ProfileSummary(**profile.summary())
+
+@router.get("/profiles", response_model=List[ProfileSummary], dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """
+    Recent profiles kept by this worker
+    """
+    return [ProfileSummary(**summary) for summary in profiler.summaries()]
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(profile_id: str):
+    """
+    Profile output: collapsed stacks (flamegraph.pl / speedscope), pstats text or trace paths
+    """
+    profile = _get_profile(profile_id)
+
+    if profile.status == RUNNING:
+        raise HTTPException(status_code=409, detail=f"Profile {profile_id} is still running")
+
+    if profile.status != DONE:
+        raise HTTPException(status_code=500, detail=f"Profile {profile_id} failed: {profile.error}")
+
+    return PlainTextResponse(profile.output)
+
+@router.get("/profiles/{profile_id}/summary", response_model=ProfileSummary, dependencies=[Depends(require_admin)])
+async def get_profile_summary(profile_id: str):
+    """
+    Profile status without the output
+    """
+    return ProfileSummary(**_get_profile(profile_id).summary())
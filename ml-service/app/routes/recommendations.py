@@ -1,12 +1,10 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import json
 import hashlib
 
+from app.services.metrics import stage_timer
 from app.services.model_loader import ModelLoader
 
 router = APIRouter()
@@ -43,13 +41,22 @@ class SimilarPostsResponse(BaseModel):
 
 class RecommendationEngine:
     def __init__(self):
-        self.vectorizer = TfidfVectorizer(
-            max_features=5000,
-            stop_words='english',
-            ngram_range=(1, 2)
-        )
-
-    def extract_features(self, posts: List[PostContent]) -> np.ndarray:
+        # scikit-learn takes most of a second to import, so it is loaded on first use
+        self._vectorizer = None
+
+    @property
+    def vectorizer(self):
+        if self._vectorizer is None:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+
+            self._vectorizer = TfidfVectorizer(
+                max_features=5000,
+                stop_words='english',
+                ngram_range=(1, 2)
+            )
+        return self._vectorizer
+
+    def extract_features(self, posts: List[PostContent]):
         """Extract TF-IDF features from posts"""
         texts = []
         for post in posts:
@@ -123,16 +130,18 @@ async def get_user_recommendations(request: RecommendationRequest):
 
     try:
         # Get collaborative filtering scores
-        cf_scores = recommendation_engine.collaborative_filtering(
-            request.user_profile,
-            request.available_posts
-        )
+        with stage_timer("collaborative_filtering", model="recommendations"):
+            cf_scores = recommendation_engine.collaborative_filtering(
+                request.user_profile,
+                request.available_posts
+            )
 
         # Get content-based scores
-        cb_scores = recommendation_engine.content_based_filtering(
-            request.user_profile,
-            request.available_posts
-        )
+        with stage_timer("content_based_filtering", model="recommendations"):
+            cb_scores = recommendation_engine.content_based_filtering(
+                request.user_profile,
+                request.available_posts
+            )
 
         # Combine scores (weighted average)
         combined_scores = {}
@@ -170,14 +179,19 @@ async def get_similar_posts(request: SimilarPostsRequest):
     if not request.similar_posts:
         raise HTTPException(status_code=400, detail="No similar posts provided")
 
+    import numpy as np
+    from sklearn.metrics.pairwise import cosine_similarity
+
     try:
         # Create feature matrix for all posts
         all_posts = [request.post_content] + request.similar_posts
-        features = recommendation_engine.extract_features(all_posts)
+        with stage_timer("tfidf", model="recommendations"):
+            features = recommendation_engine.extract_features(all_posts)
 
         # Calculate similarity scores
-        target_vector = features[0:1]  # First post is the target
-        similarities = cosine_similarity(target_vector, features[1:]).flatten()
+        with stage_timer("similarity", model="recommendations"):
+            target_vector = features[0:1]  # First post is the target
+            similarities = cosine_similarity(target_vector, features[1:]).flatten()
 
         # Get top similar posts
         top_indices = np.argsort(similarities)[::-1][:request.num_similar]
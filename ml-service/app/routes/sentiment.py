@@ -1,29 +1,111 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
-import hashlib
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from typing import Dict, List, Optional
 import json
+import asyncio
+import hashlib
 
-from app.services.model_loader import ModelLoader
+from app.services.cache import cache_get, cache_get_many, cache_namespace, cache_set, cache_set_many
+from app.services.deadline import DeadlineExceeded
+from app.services.document_sentiment import AGGREGATIONS, analyze_document
+from app.services.model_loader import ModelLoader, normalize_sentiment_label
+from app.services.model_registry import SENTIMENT, ModelVariant, UnknownModelError
+from app.services.scheduler import BULK, INTERACTIVE, STANDARD, request_priority
 
 router = APIRouter()
 
+# /sentiment/stream: longest accepted input line and micro-batches read ahead of scoring
+STREAM_MAX_LINE_BYTES = 1024 * 1024
+STREAM_READ_AHEAD = 2
+
 class SentimentRequest(BaseModel):
     text: str
     cache_key: Optional[str] = None
+    model: Optional[str] = None  # registry variant, e.g. "distilbert" (default: the configured default)
 
 class SentimentResponse(BaseModel):
     sentiment: str  # POSITIVE, NEGATIVE, NEUTRAL
     confidence: float
     cached: bool = False
+    token_count: Optional[int] = None  # tokens in the input text
+    truncated: bool = False  # input was longer than the model window
+    model: Optional[str] = None  # variant that produced the result
+    stage: Optional[str] = None  # cascade variants: "ngram" (cheap first stage) or "model"
 
 class BatchSentimentRequest(BaseModel):
     texts: List[str]
+    model: Optional[str] = None
 
 class BatchSentimentResponse(BaseModel):
     results: List[SentimentResponse]
+    total_tokens: Optional[int] = None
+    truncated_count: int = 0
+
+class DocumentSentimentRequest(BaseModel):
+    text: str
+    aggregation: str = "length_weighted"  # mean, length_weighted, max_negative
+    window_tokens: int = 510  # tokens per window (capped at the model window)
+    overlap_tokens: int = 64  # tokens shared by consecutive windows
+    include_chunks: bool = False
+    cache_key: Optional[str] = None
+    model: Optional[str] = None
+
+class SentimentChunk(BaseModel):
+    start: int  # character offsets into the text
+    end: int
+    token_count: int
+    sentiment: str
+    confidence: float
+    scores: Dict[str, float]
 
-@router.post("/", response_model=SentimentResponse)
+class DocumentSentimentResponse(BaseModel):
+    sentiment: str  # POSITIVE, NEGATIVE, NEUTRAL
+    confidence: float
+    scores: Dict[str, float]
+    aggregation: str
+    num_chunks: int
+    token_count: int
+    chunks: Optional[List[SentimentChunk]] = None
+    cached: bool = False
+    model: Optional[str] = None
+
+def sentiment_variant(name: Optional[str]) -> ModelVariant:
+    """Registry variant a request asked for (400 for unknown names)"""
+    try:
+        return ModelLoader.variant(SENTIMENT, name)
+    except UnknownModelError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def format_sentiment_result(result, model: Optional[str] = None) -> dict:
+    """Turn a raw model prediction into SentimentResponse fields"""
+    # Handle both the new Twitter model and fallback for old models
+    if isinstance(result, dict) and 'label' in result:
+        sentiment = normalize_sentiment_label(result['label'])
+        # Get score from either 'score' or if results is a list of dictionaries
+        if 'score' in result:
+            confidence = float(result['score'])
+        else:
+            # For models that return list of predictions
+            confidence = 0.0
+    else:
+        # Fallback for unexpected format
+        sentiment = 'NEUTRAL'
+        confidence = 0.0
+
+    return {
+        "sentiment": sentiment,
+        "confidence": confidence,
+        "cached": False,
+        "token_count": result.get('token_count') if isinstance(result, dict) else None,
+        "truncated": bool(result.get('truncated')) if isinstance(result, dict) else False,
+        "model": model,
+        "stage": result.get('stage') if isinstance(result, dict) else None
+    }
+
+@router.post("/", response_model=SentimentResponse, dependencies=[Depends(request_priority(INTERACTIVE))])
 async def analyze_sentiment(request: SentimentRequest):
     """
     Analyze sentiment of a given text
@@ -31,68 +113,78 @@ async def analyze_sentiment(request: SentimentRequest):
     if not request.text.strip():
         raise HTTPException(status_code=400, detail="Text cannot be empty")
 
+    variant = sentiment_variant(request.model)
+    namespace = cache_namespace("sentiment", variant)
+
     try:
         # Try cache first
-        redis_client = ModelLoader.get_redis_client()
         cache_key = request.cache_key or hashlib.md5(request.text.encode()).hexdigest()
-        cached_result = None
-
-        if redis_client:
-            cached_result = redis_client.get(f"sentiment:{cache_key}")
+        cached_result = cache_get(namespace, cache_key)
 
         if cached_result:
-            result = json.loads(cached_result)
-            result["cached"] = True
-            return SentimentResponse(**result)
+            cached_result["cached"] = True
+            return SentimentResponse(**cached_result)
 
         # Get prediction using either API or local model
-        result = ModelLoader.analyze_sentiment(request.text)[0]
-
-        # Map label to match our schema
-        # Twitter RoBERTa model returns: 'LABEL_0': Negative, 'LABEL_1': Neutral, 'LABEL_2': Positive
-        label_map = {
-            'LABEL_0': 'NEGATIVE',
-            'LABEL_1': 'NEUTRAL',
-            'LABEL_2': 'POSITIVE',
-            'POSITIVE': 'POSITIVE',
-            'NEGATIVE': 'NEGATIVE',
-            'NEUTRAL': 'NEUTRAL'
-        }
-
-        # Handle both the new Twitter model and fallback for old models
-        if isinstance(result, dict) and 'label' in result:
-            sentiment = label_map.get(result['label'].upper(), 'NEUTRAL')
-            # Get score from either 'score' or if results is a list of dictionaries
-            if 'score' in result:
-                confidence = float(result['score'])
-            else:
-                # For models that return list of predictions
-                confidence = 0.0
-        else:
-            # Fallback for unexpected format
-            sentiment = 'NEUTRAL'
-            confidence = 0.0
+        result = (await run_in_threadpool(ModelLoader.analyze_sentiment, request.text, model=variant.name))[0]
+        response_data = format_sentiment_result(result, variant.name)
 
-        response_data = {
-            "sentiment": sentiment,
-            "confidence": confidence,
-            "cached": False
-        }
-
-        # Cache the result
-        if redis_client:
-            redis_client.setex(
-                f"sentiment:{cache_key}",
-                3600,  # 1 hour cache
-                json.dumps(response_data)
-            )
+        # Cache the result (not the NEUTRAL stand-in for a failed API call)
+        if not result.get('fallback'):
+            cache_set(namespace, cache_key, response_data, ttl=variant.cache_ttl)
 
         return SentimentResponse(**response_data)
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Sentiment analysis failed: {str(e)}")
 
-@router.post("/batch", response_model=BatchSentimentResponse)
+def score_texts(texts: List[str], variant: ModelVariant) -> List[dict]:
+    """SentimentResponse fields for each text: cached results, then one length-bucketed batch for the misses"""
+    namespace = cache_namespace("sentiment", variant)
+    results: List[Optional[dict]] = [None] * len(texts)
+    if not texts:
+        return results
+
+    cache_keys = [hashlib.md5(text.encode()).hexdigest() for text in texts]
+
+    # One round-trip for all cache lookups
+    cached_values = cache_get_many(namespace, cache_keys)
+
+    pending = []
+    for index, (text, cached_result) in enumerate(zip(texts, cached_values)):
+        if not text.strip():
+            results[index] = {
+                "sentiment": "NEUTRAL",
+                "confidence": 0.0,
+                "cached": False,
+                "model": variant.name
+            }
+        elif cached_result:
+            cached_result["cached"] = True
+            results[index] = cached_result
+        else:
+            pending.append(index)
+
+    # Score all cache misses together in length-bucketed batches
+    if pending:
+        # Like /sentiment/, a text the API fails on comes back NEUTRAL rather than failing the batch
+        predictions = ModelLoader.analyze_sentiment_batch(
+            [texts[i] for i in pending], model=variant.name, fallback_neutral=True
+        )
+
+        to_cache = {}
+        for index, prediction in zip(pending, predictions):
+            response_data = format_sentiment_result(prediction, variant.name)
+            results[index] = response_data
+            if not prediction.get('fallback'):
+                to_cache[cache_keys[index]] = response_data
+        cache_set_many(namespace, to_cache, ttl=variant.cache_ttl)
+
+    return results
+
+@router.post("/batch", response_model=BatchSentimentResponse, dependencies=[Depends(request_priority(STANDARD))])
 async def analyze_batch_sentiment(request: BatchSentimentRequest):
     """
     Analyze sentiment for multiple texts
@@ -103,24 +195,223 @@ async def analyze_batch_sentiment(request: BatchSentimentRequest):
     if len(request.texts) > 100:
         raise HTTPException(status_code=400, detail="Maximum 100 texts allowed per batch")
 
-    results = []
+    variant = sentiment_variant(request.model)
 
     try:
-        for text in request.texts:
-            if not text.strip():
-                results.append(SentimentResponse(
-                    sentiment="NEUTRAL",
-                    confidence=0.0,
-                    cached=False
-                ))
-                continue
-
-            # Create individual request
-            individual_request = SentimentRequest(text=text)
-            result = await analyze_sentiment(individual_request)
-            results.append(result)
-
-        return BatchSentimentResponse(results=results)
+        results = [SentimentResponse(**result) for result in await run_in_threadpool(score_texts, request.texts, variant)]
+        token_counts = [result.token_count for result in results if result.token_count is not None]
+
+        return BatchSentimentResponse(
+            results=results,
+            total_tokens=sum(token_counts) if token_counts else None,
+            truncated_count=sum(1 for result in results if result.truncated)
+        )
+
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch sentiment analysis failed: {str(e)}")
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that leaves `receive` to the endpoint.
+
+    StreamingResponse listens for disconnects on `receive`, which would
+    swallow the request body chunks an endpoint is still reading while it
+    streams its response. Here a disconnect surfaces as ClientDisconnect from
+    request.stream() instead.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+def parse_stream_line(line: bytes) -> dict:
+    """One NDJSON input line: a JSON string or {"text": ..., "id": ...}"""
+    item = json.loads(line)
+    if isinstance(item, str):
+        return {"text": item}
+    if isinstance(item, dict) and isinstance(item.get("text"), str):
+        return item
+    raise ValueError('expected a JSON string or an object with a "text" string')
+
+@router.post("/stream", dependencies=[Depends(request_priority(BULK))])
+async def stream_sentiment(request: Request, model: Optional[str] = None, batch_size: Optional[int] = None):
+    """
+    Score an NDJSON stream of texts with no size limit
+
+    Each request line is a JSON string or {"text": ..., "id": ...}. The body
+    is read incrementally and scored in micro-batches of `batch_size`
+    (default: the variant's batch_size), with at most STREAM_READ_AHEAD
+    batches buffered, so memory stays flat for any input size. Each result
+    is streamed back as soon as its batch finishes, as one line with `index`
+    (the input line number), `id` when given, and the /sentiment/ response
+    fields. Lines that cannot be parsed or scored get an `error` line
+    instead. The response ends with a `summary` line, which says why
+    scoring stopped early (`dropped`) when the request deadline passed.
+
+    Clients must read the response while they upload. curl and libcurl do;
+    a client that sends the whole body before it reads anything stalls once
+    the socket buffers fill.
+    """
+    variant = sentiment_variant(model)
+    size = max(1, batch_size or variant.batch_size)
+    batches: asyncio.Queue = asyncio.Queue(maxsize=STREAM_READ_AHEAD)
+
+    async def read_batches():
+        batch, buffer, index, discarding = [], b"", 0, False
+
+        async def add(item: dict):
+            nonlocal batch, index
+            batch.append((index, item))
+            index += 1
+            if len(batch) >= size:
+                await batches.put(batch)
+                batch = []
+
+        async def take(line: bytes):
+            if not line.strip():
+                return
+            try:
+                item = parse_stream_line(line)
+            except ValueError as e:
+                item = {"error": f"Invalid input line: {e}"}
+            await add(item)
+
+        try:
+            async for chunk in request.stream():
+                if discarding:
+                    # Rest of an oversized line
+                    if b"\n" not in chunk:
+                        continue
+                    chunk = chunk.split(b"\n", 1)[1]
+                    discarding = False
+
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    await take(line)
+
+                if len(buffer) > STREAM_MAX_LINE_BYTES:
+                    await add({"error": f"Input line longer than {STREAM_MAX_LINE_BYTES} bytes"})
+                    buffer, discarding = b"", True
+
+            if not discarding:
+                await take(buffer)
+            if batch:
+                await batches.put(batch)
+        except ClientDisconnect:
+            pass
+        finally:
+            await batches.put(None)
+
+    async def results():
+        reader = asyncio.create_task(read_batches())
+        count = errors = truncated = tokens = 0
+        dropped = None
+        try:
+            while True:
+                batch = await batches.get()
+                if batch is None:
+                    break
+
+                valid = [(index, item) for index, item in batch if "error" not in item]
+                try:
+                    # Off the event loop so the next batch is read while this one is scored
+                    scored = await run_in_threadpool(score_texts, [item["text"] for _, item in valid], variant)
+                    outcomes = dict(zip((index for index, _ in valid), scored))
+                except DeadlineExceeded as e:
+                    # Out of time or the client left: the rest is not worth scoring
+                    dropped = e.detail
+                    break
+                except Exception as e:
+                    outcomes = {index: {"error": f"Sentiment analysis failed: {str(e)}"} for index, _ in valid}
+
+                lines = []
+                for index, item in batch:
+                    outcome = {"error": item["error"]} if "error" in item else outcomes[index]
+                    line = {"index": index, **({"id": item["id"]} if "id" in item else {}), **outcome}
+                    count += 1
+                    if "error" in outcome:
+                        errors += 1
+                    else:
+                        truncated += 1 if outcome.get("truncated") else 0
+                        tokens += outcome.get("token_count") or 0
+                    lines.append(json.dumps(line))
+                yield "\n".join(lines) + "\n"
+
+            yield json.dumps({"summary": {
+                "count": count,
+                "errors": errors,
+                "truncated_count": truncated,
+                "total_tokens": tokens,
+                "model": variant.name,
+                **({"dropped": dropped} if dropped else {})
+            }}) + "\n"
+        finally:
+            reader.cancel()
+
+    return DuplexStreamingResponse(results(), media_type="application/x-ndjson")
+
+@router.post("/document", response_model=DocumentSentimentResponse, dependencies=[Depends(request_priority(STANDARD))])
+async def analyze_document_sentiment(request: DocumentSentimentRequest):
+    """
+    Analyze sentiment of a whole document (post or long comment) without truncation
+    """
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="Text cannot be empty")
+
+    if request.aggregation not in AGGREGATIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Aggregation must be one of: {', '.join(AGGREGATIONS)}"
+        )
+
+    variant = sentiment_variant(request.model)
+    namespace = cache_namespace("sentiment_doc", variant)
+
+    # Windows are capped at the model window, so the overlap is checked against the capped size
+    tokenizer = await run_in_threadpool(ModelLoader.get_sentiment_tokenizer, variant.name)
+    window_tokens = min(request.window_tokens, tokenizer.budget) if tokenizer else request.window_tokens
+    if request.window_tokens < 16 or not 0 <= request.overlap_tokens < window_tokens // 2:
+        raise HTTPException(
+            status_code=400,
+            detail=f"window_tokens must be at least 16 and overlap_tokens less than half of the window "
+                   f"({window_tokens} tokens for {variant.name})"
+        )
+
+    try:
+        # The settings are part of the key even when the caller names the document
+        document_key = request.cache_key or hashlib.md5(request.text.encode()).hexdigest()
+        cache_key = f"{document_key}:{request.aggregation}:{window_tokens}:{request.overlap_tokens}"
+
+        cached_result = cache_get(namespace, cache_key)
+        if cached_result:
+            cached_result["cached"] = True
+            if not request.include_chunks:
+                cached_result["chunks"] = None
+            return DocumentSentimentResponse(**cached_result)
+
+        result = await run_in_threadpool(
+            analyze_document,
+            request.text,
+            window_tokens,
+            request.overlap_tokens,
+            request.aggregation,
+            model=variant.name
+        )
+        result["model"] = variant.name
+
+        # Cache with chunks so either variant of the request can be served
+        cache_set(namespace, cache_key, result, ttl=variant.cache_ttl)
+
+        if not request.include_chunks:
+            result["chunks"] = None
+
+        return DocumentSentimentResponse(**result, cached=False)
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Batch sentiment analysis failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Document sentiment analysis failed: {str(e)}")
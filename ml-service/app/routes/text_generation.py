@@ -1,11 +1,16 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional, Dict, Any
 import re
 import hashlib
-import json
 
+from app.services.cache import cache_get_or_compute, cache_namespace, cache_set
+from app.services.deadline import DeadlineExceeded
+from app.services.metrics import stage_timer
 from app.services.model_loader import ModelLoader
+from app.services.scheduler import INTERACTIVE, STANDARD, request_priority
+from app.services.text_generation import text_generation_variant, text_service
 
 router = APIRouter()
 
@@ -15,23 +20,27 @@ class TextGenerationRequest(BaseModel):
     temperature: float = 0.7
     num_beams: int = 4
     cache_key: Optional[str] = None
+    model: Optional[str] = None  # registry variant (default: the configured default)
 
 class OutlineGenerationRequest(BaseModel):
     topic: str
     num_sections: int = 5
     target_audience: str = "general"
+    model: Optional[str] = None
 
 class BlogPostGenerationRequest(BaseModel):
     topic: str
     outline: Optional[List[str]] = None
     tone: str = "informative"  # informative, casual, formal, creative
     target_length: int = 1000
+    model: Optional[str] = None
 
 class TextGenerationResponse(BaseModel):
     generated_text: str
     prompt_used: str
     generation_params: Dict[str, Any]
     cached: bool = False
+    model: Optional[str] = None  # variant that produced the text
 
 class OutlineResponse(BaseModel):
     outline: List[str]
@@ -44,60 +53,7 @@ class BlogPostResponse(BaseModel):
     sections: List[str]
     metadata: Dict[str, Any]
 
-class TextGenerationService:
-    @staticmethod
-    def clean_generated_text(text: str) -> str:
-        """Clean and format generated text"""
-        # Remove extra whitespace
-        text = re.sub(r'\s+', ' ', text).strip()
-
-        # Remove potential prompt repetition
-        lines = text.split('\n')
-        cleaned_lines = []
-        for line in lines:
-            if len(cleaned_lines) > 0 and line.strip() == cleaned_lines[-1].strip():
-                continue
-            cleaned_lines.append(line)
-
-        return '\n'.join(cleaned_lines)
-
-    @staticmethod
-    def create_blog_post_prompt(topic: str, outline: List[str] = None, tone: str = "informative") -> str:
-        """Create a prompt for blog post generation"""
-        tone_instructions = {
-            "informative": "Write in an informative and educational tone with clear explanations.",
-            "casual": "Write in a friendly, conversational tone that engages readers.",
-            "formal": "Write in a professional and formal tone suitable for business audiences.",
-            "creative": "Write in a creative and engaging tone with vivid descriptions."
-        }
-
-        base_prompt = f"Write a comprehensive blog post about: {topic}\n\n"
-        base_prompt += f"Style: {tone_instructions.get(tone, tone_instructions['informative'])}\n\n"
-
-        if outline:
-            base_prompt += "Structure:\n"
-            for i, section in enumerate(outline, 1):
-                base_prompt += f"{i}. {section}\n"
-            base_prompt += "\n"
-
-        base_prompt += "Please write a well-structured blog post that covers the topic thoroughly."
-
-        return base_prompt
-
-    @staticmethod
-    def create_outline_prompt(topic: str, num_sections: int, audience: str) -> str:
-        """Create a prompt for outline generation"""
-        prompt = f"Create a detailed outline for a blog post about: {topic}\n\n"
-        prompt += f"Target audience: {audience}\n"
-        prompt += f"Number of sections: {num_sections}\n\n"
-        prompt += "Generate a logical structure with main sections and key points for each section.\n"
-        prompt += "Format as a numbered list of section titles."
-
-        return prompt
-
-text_service = TextGenerationService()
-
-@router.post("/text", response_model=TextGenerationResponse)
+@router.post("/text", response_model=TextGenerationResponse, dependencies=[Depends(request_priority(INTERACTIVE))])
 async def generate_text(request: TextGenerationRequest):
     """
     Generate text using FLAN-T5 model
@@ -108,63 +64,73 @@ async def generate_text(request: TextGenerationRequest):
     if request.max_length > 2048:
         raise HTTPException(status_code=400, detail="Max length cannot exceed 2048")
 
+    variant = text_generation_variant(request.model)
+    namespace = cache_namespace("text_gen", variant)
+
     try:
         # Try cache first
-        redis_client = ModelLoader.get_redis_client()
+        prompt_sha256 = hashlib.sha256(request.prompt.encode()).hexdigest()
         cache_key = request.cache_key or hashlib.md5(
             f"{request.prompt}_{request.max_length}_{request.temperature}".encode()
         ).hexdigest()
 
-        if redis_client:
-            cached_result = redis_client.get(f"text_gen:{cache_key}")
-            if cached_result:
-                result = json.loads(cached_result)
-                result["cached"] = True
-                return TextGenerationResponse(**result)
-
-        # Generate text using Hugging Face API or local model
-        result = ModelLoader.generate_text(
-            request.prompt,
-            max_length=request.max_length
-        )
-
-        # Handle different response formats
-        if isinstance(result, dict):
-            # New API response format (chat completions)
-            generated_text = result.get('generated_text', 'Text generation failed')
-            generation_params = result.get('generation_params', {})
-        else:
-            # Legacy string response format
-            generated_text = result
-            generation_params = {
-                "max_length": request.max_length,
-                "temperature": request.temperature,
-                "num_beams": request.num_beams
+        def generate() -> dict:
+            # Generate text using Hugging Face API or local model
+            result = ModelLoader.generate_text(request.prompt, max_length=request.max_length, model=variant.name)
+
+            # Handle different response formats
+            if isinstance(result, dict):
+                # New API response format (chat completions)
+                generated_text = result.get('generated_text', 'Text generation failed')
+                generation_params = result.get('generation_params', {})
+            else:
+                # Legacy string response format
+                generated_text = result
+                generation_params = {
+                    "max_length": request.max_length,
+                    "temperature": request.temperature,
+                    "num_beams": request.num_beams
+                }
+
+            with stage_timer("postprocess", model="text_generation"):
+                cleaned_text = text_service.clean_generated_text(generated_text)
+
+            # The prompt is stored as a hash; responses echo the caller's own
+            return {
+                "generated_text": cleaned_text,
+                "prompt_sha256": prompt_sha256,
+                "generation_params": generation_params,
+                "cached": False,
+                "model": variant.name
             }
 
-        cleaned_text = text_service.clean_generated_text(generated_text)
-
-        response_data = {
-            "generated_text": cleaned_text,
-            "prompt_used": request.prompt,
-            "generation_params": generation_params,
-            "cached": False
-        }
+        def cacheable(data: dict) -> bool:
+            # Not the stand-in answer for a failed API call, or it would outlive the outage
+            return not data["generation_params"].get("error")
 
-        # Cache the result
-        if redis_client:
-            redis_client.setex(
-                f"text_gen:{cache_key}",
-                3600,  # 1 hour cache
-                json.dumps(response_data)
-            )
+        # Cache first, else generate once across workers (concurrent misses wait for the
+        # leader), off the event loop so a client that disconnects meanwhile is noticed
+        response_data, shared = await run_in_threadpool(
+            cache_get_or_compute, namespace, cache_key, generate, variant.cache_ttl, cacheable
+        )
+        if shared and response_data.get("prompt_sha256") != prompt_sha256:
+            # The caller's cache_key was last used for another prompt: a miss, whose result replaces it
+            response_data = await run_in_threadpool(generate)
+            if cacheable(response_data):
+                await run_in_threadpool(cache_set, namespace, cache_key, response_data, variant.cache_ttl)
+            shared = False
+        if shared:
+            response_data["cached"] = True
+        response_data["prompt_used"] = request.prompt
 
         return TextGenerationResponse(**response_data)
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Text generation failed: {str(e)}")
 
-@router.post("/outline", response_model=OutlineResponse)
+@router.post("/outline", response_model=OutlineResponse, dependencies=[Depends(request_priority(STANDARD))])
 async def generate_outline(request: OutlineGenerationRequest):
     """
     Generate an outline for a blog post
@@ -175,6 +141,8 @@ async def generate_outline(request: OutlineGenerationRequest):
     if request.num_sections < 3 or request.num_sections > 10:
         raise HTTPException(status_code=400, detail="Number of sections must be between 3 and 10")
 
+    variant = text_generation_variant(request.model)
+
     try:
         # Create outline prompt
         prompt = text_service.create_outline_prompt(
@@ -188,7 +156,8 @@ async def generate_outline(request: OutlineGenerationRequest):
             prompt=prompt,
             max_length=300,
             temperature=0.6,
-            num_beams=5
+            num_beams=5,
+            model=variant.name
         )
 
         result = await generate_text(generation_request)
@@ -214,10 +183,12 @@ async def generate_outline(request: OutlineGenerationRequest):
             estimated_sections=len(outline)
         )
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Outline generation failed: {str(e)}")
 
-@router.post("/post", response_model=BlogPostResponse)
+@router.post("/post", response_model=BlogPostResponse, dependencies=[Depends(request_priority(STANDARD))])
 async def generate_blog_post(request: BlogPostGenerationRequest):
     """
     Generate a complete blog post
@@ -228,6 +199,8 @@ async def generate_blog_post(request: BlogPostGenerationRequest):
     if request.target_length > 5000:
         raise HTTPException(status_code=400, detail="Target length cannot exceed 5000 words")
 
+    variant = text_generation_variant(request.model)
+
     try:
         # Generate outline if not provided
         outline = request.outline
@@ -235,7 +208,8 @@ async def generate_blog_post(request: BlogPostGenerationRequest):
             outline_request = OutlineGenerationRequest(
                 topic=request.topic,
                 num_sections=5,
-                target_audience="general"
+                target_audience="general",
+                model=variant.name
             )
             outline_response = await generate_outline(outline_request)
             outline = outline_response.outline
@@ -255,7 +229,8 @@ async def generate_blog_post(request: BlogPostGenerationRequest):
             prompt=prompt,
             max_length=max_length,
             temperature=0.7,
-            num_beams=4
+            num_beams=4,
+            model=variant.name
         )
 
         result = await generate_text(generation_request)
@@ -266,7 +241,8 @@ async def generate_blog_post(request: BlogPostGenerationRequest):
             prompt=title_prompt,
             max_length=50,
             temperature=0.8,
-            num_beams=3
+            num_beams=3,
+            model=variant.name
         )
         title_result = await generate_text(title_request)
 
@@ -280,14 +256,17 @@ async def generate_blog_post(request: BlogPostGenerationRequest):
                 "tone": request.tone,
                 "target_length": request.target_length,
                 "actual_length": len(result.generated_text.split()),
-                "generated_with": "FLAN-T5"
+                "generated_with": "FLAN-T5",
+                "model": variant.name
             }
         )
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Blog post generation failed: {str(e)}")
 
-@router.post("/expand")
+@router.post("/expand", dependencies=[Depends(request_priority(STANDARD))])
 async def expand_text(
     text: str,
     expansion_type: str = "paragraph",
@@ -319,5 +298,7 @@ async def expand_text(
         result = await generate_text(generation_request)
         return result
 
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Text expansion failed: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,499 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.services import cache_codec
+from app.services.deadline import check_deadline, remaining_budget
+from app.services.metrics import (
+    CACHE_ENTRY_BYTES,
+    CACHE_REJECTED,
+    CACHE_USAGE,
+    SINGLE_FLIGHT,
+    record_cache,
+    stage_timer,
+)
+from app.services.model_loader import ModelLoader
+from app.services.model_registry import ModelVariant
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 3600  # 1 hour cache
+
+# Why an entry was not cached (label of mlservice_cache_rejected_total)
+TOO_LARGE = "too_large"
+OVER_BUDGET = "over_budget"
+VERSION_CHANGED = "version_changed"
+
+
+# Namespace -> (prefix, variant) it was made for, to check its version again at write time
+_namespaces: Dict[str, Tuple[str, ModelVariant]] = {}
+
+
+def cache_namespace(prefix: str, variant: ModelVariant) -> str:
+    """
+    Namespace for results of `variant`: <prefix>:<variant>:<model version>,
+    so results of another model, revision or backend are never served
+    """
+    namespace = f"{prefix}:{variant.name}:{ModelLoader.model_version(variant)}"
+    _namespaces[namespace] = (prefix, variant)
+    return namespace
+
+
+def _version_changed(namespace: str) -> bool:
+    """
+    Whether the variant's version moved on since `namespace` was made, e.g.
+    its circuit opened and the local fallback took over: results computed
+    meanwhile may come from either backend, so they are not cached
+    """
+    made_for = _namespaces.get(namespace)
+    return made_for is not None and cache_namespace(*made_for) != namespace
+
+
+def cache_get(namespace: str, key: str) -> Optional[Any]:
+    """Look up a cached value under `namespace:key` (None on miss or without Redis)"""
+    redis_client = ModelLoader.get_redis_binary_client()
+    if not redis_client:
+        return None
+
+    with stage_timer("cache_get", model=namespace, backend="redis"):
+        cached = redis_client.get(f"{namespace}:{key}")
+
+    record_cache(namespace, cached is not None)
+    return cache_codec.decode(cached) if cached else None
+
+
+def cache_get_many(namespace: str, keys: List[str]) -> List[Optional[Any]]:
+    """Look up several keys in one round-trip"""
+    redis_client = ModelLoader.get_redis_binary_client()
+    if not redis_client or not keys:
+        return [None] * len(keys)
+
+    with stage_timer("cache_get", model=namespace, backend="redis"):
+        values = redis_client.mget([f"{namespace}:{key}" for key in keys])
+
+    results = []
+    for value in values:
+        record_cache(namespace, value is not None)
+        results.append(cache_codec.decode(value) if value else None)
+    return results
+
+
+def cache_set(namespace: str, key: str, value: Any, ttl: int = DEFAULT_TTL):
+    """Store a value under `namespace:key`, if the namespace's budget admits it"""
+    cache_set_many(namespace, {key: value}, ttl=ttl)
+
+
+def cache_set_many(namespace: str, items: dict, ttl: int = DEFAULT_TTL):
+    """Store several {key: value} pairs in one pipelined round-trip"""
+    redis_client = ModelLoader.get_redis_binary_client()
+    if not redis_client or not items:
+        return
+
+    if _version_changed(namespace):
+        CACHE_REJECTED.labels(namespace=namespace, reason=VERSION_CHANGED).inc(len(items))
+        return
+
+    with stage_timer("cache_set", model=namespace, backend="redis"):
+        admitted = []
+        pending = 0  # admitted from this batch, not in the usage yet
+        for key, value in items.items():
+            data, encoding = cache_codec.encode(value)
+            CACHE_ENTRY_BYTES.labels(namespace=namespace, encoding=encoding).observe(len(data))
+            reason = cache_budget.admit(namespace, len(data), pending)
+            if reason:
+                CACHE_REJECTED.labels(namespace=namespace, reason=reason).inc()
+                continue
+            admitted.append((key, data))
+            pending += len(data)
+        if not admitted:
+            return
+
+        pipe = redis_client.pipeline(transaction=False)
+        for key, data in admitted:
+            pipe.setex(f"{namespace}:{key}", ttl, data)
+        cache_budget.record(pipe, namespace, [len(data) for _, data in admitted], ttl)
+        pipe.execute()
+
+
+class CacheBudget:
+    """
+    Bytes each cache namespace holds in Redis, and size-aware admission
+    against its share of memory.
+
+    Every write adds the encoded size of its entries to a ledger hash
+    (cache:ledger:<namespace>) under the time bucket it was written in,
+    along with the TTL. Buckets older than that are dropped when read, so the
+    ledger sums what the namespace's live entries take, shared by all
+    workers. Overwritten or evicted entries count until they would have
+    expired.
+
+    CACHE_BUDGET_MB gives namespaces (or their variant or family, e.g.
+    `text_gen:flan-t5` or `text_gen` for `text_gen:flan-t5:<version>`) a
+    budget. An entry is admitted only if the namespace stays within it,
+    so a full namespace takes new entries again as old ones expire.
+    Each worker checks against the ledger as of its last refresh plus its
+    own writes since, so other workers' writes within CACHE_LEDGER_REFRESH
+    can take a namespace over its budget until they expire; nothing can
+    keep it growing. Entries larger than CACHE_MAX_ENTRY_KB are never
+    cached.
+    """
+
+    def __init__(self):
+        self.max_entry = int(os.getenv('CACHE_MAX_ENTRY_KB', 1024)) * 1024
+        self.refresh = float(os.getenv('CACHE_LEDGER_REFRESH', 5))
+        self.budgets: Dict[str, int] = {}
+        for item in filter(None, (part.strip() for part in os.getenv('CACHE_BUDGET_MB', '').split(','))):
+            name, _, megabytes = item.partition('=')
+            self.budgets[name.strip()] = int(float(megabytes) * 1024 * 1024)
+        # namespace -> [fetched_at, bytes, entries], from the ledger plus this worker's writes since
+        self._usage: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def budget(self, namespace: str) -> Optional[int]:
+        """Budget of the most specific configured prefix of `namespace`"""
+        parts = namespace.split(':')
+        for length in range(len(parts), 0, -1):
+            budget = self.budgets.get(':'.join(parts[:length]))
+            if budget is not None:
+                return budget
+        return None
+
+    @staticmethod
+    def _ledger(namespace: str) -> str:
+        return f"cache:ledger:{namespace}"
+
+    @staticmethod
+    def _bucket_width(ttl: int) -> int:
+        # About 60 buckets per TTL, at least a minute each
+        return max(60, ttl // 60)
+
+    def admit(self, namespace: str, size: int, pending: int = 0) -> Optional[str]:
+        """
+        Why an entry of `size` bytes should not be cached (None to cache it);
+        `pending`: bytes admitted alongside it that are not recorded yet
+        """
+        if size > self.max_entry:
+            return TOO_LARGE
+        budget = self.budget(namespace)
+        if budget is None:
+            return None
+
+        used, _ = self.usage(namespace)
+        if used + pending + size <= budget:
+            return None
+        return OVER_BUDGET
+
+    def record(self, pipe, namespace: str, sizes: List[int], ttl: int):
+        """Queue the ledger update for entries being written on `pipe`"""
+        width = self._bucket_width(ttl)
+        bucket = int(time.time() // width)
+        ledger = self._ledger(namespace)
+        pipe.hincrby(ledger, f"{bucket}:bytes", sum(sizes))
+        pipe.hincrby(ledger, f"{bucket}:entries", len(sizes))
+        pipe.hset(ledger, "ttl", ttl)
+        pipe.expire(ledger, ttl + width)
+
+        with self._lock:
+            usage = self._usage.get(namespace)
+            if usage is not None:
+                usage[1] += sum(sizes)
+                usage[2] += len(sizes)
+
+    def usage(self, namespace: str) -> Tuple[int, int]:
+        """(bytes, entries) the namespace holds, refreshed from the ledger every CACHE_LEDGER_REFRESH seconds"""
+        with self._lock:
+            usage = self._usage.get(namespace)
+            if usage is not None and time.monotonic() - usage[0] < self.refresh:
+                return usage[1], usage[2]
+
+        used, entries = self._read_ledger(namespace)
+        with self._lock:
+            self._usage[namespace] = [time.monotonic(), used, entries]
+        CACHE_USAGE.labels(namespace=namespace).set(used)
+        return used, entries
+
+    def _read_ledger(self, namespace: str) -> Tuple[int, int]:
+        redis_client = ModelLoader.get_redis_client()
+        if not redis_client:
+            return 0, 0
+
+        ledger = self._ledger(namespace)
+        counts = redis_client.hgetall(ledger)
+        ttl = int(counts.pop("ttl", DEFAULT_TTL))
+        width = self._bucket_width(ttl)
+        oldest = int((time.time() - ttl) // width)
+        used = entries = 0
+        expired = []
+        for field, value in counts.items():
+            bucket, _, kind = field.partition(':')
+            if int(bucket) < oldest:
+                expired.append(field)
+            elif kind == 'bytes':
+                used += int(value)
+            else:
+                entries += int(value)
+        if expired:
+            redis_client.hdel(ledger, *expired)
+        return used, entries
+
+    def status(self) -> dict:
+        """Ledger usage and budget of every namespace with live entries"""
+        redis_client = ModelLoader.get_redis_client()
+        if not redis_client:
+            return {"redis": False, "namespaces": {}}
+
+        namespaces = {}
+        for ledger in sorted(redis_client.scan_iter(match=self._ledger("*"))):
+            namespace = ledger[len(self._ledger("")):]
+            used, entries = self._read_ledger(namespace)
+            budget = self.budget(namespace)
+            namespaces[namespace] = {
+                "bytes": used,
+                "entries": entries,
+                "average_bytes": round(used / entries) if entries else None,
+                "budget_bytes": budget
+            }
+        return {"redis": True, "max_entry_bytes": self.max_entry, "namespaces": namespaces}
+
+
+# Global instance
+cache_budget = CacheBudget()
+
+
+# Single-flight roles (label of mlservice_single_flight_total)
+LEADER = "leader"
+FOLLOWER = "follower"
+TAKEOVER = "takeover"
+TIMEOUT = "timeout"
+
+
+class Lease:
+    """
+    Short Redis lease (SET NX PX) held while computing a cache entry.
+
+    Renewed every third of its TTL while held, so a long generation keeps
+    it, and left to expire if this process dies, so a waiter can take
+    over. Renewal and release are compare-and-set on our token, so a
+    lease that already lapsed and went to someone else is left alone.
+    """
+
+    def __init__(self, client, name: str, ttl_ms: int):
+        self.client = client
+        self.name = name
+        self.ttl_ms = ttl_ms
+        self.token = uuid.uuid4().hex
+        self._released = threading.Event()
+
+    def acquire(self) -> bool:
+        if not self.client.set(self.name, self.token, nx=True, px=self.ttl_ms):
+            return False
+        threading.Thread(target=self._renew, name=f"lease-{self.name}", daemon=True).start()
+        return True
+
+    def release(self):
+        self._released.set()
+        self._if_held(lambda pipe: pipe.delete(self.name))
+
+    def _renew(self):
+        while not self._released.wait(self.ttl_ms / 3000.0):
+            if not self._if_held(lambda pipe: pipe.pexpire(self.name, self.ttl_ms)):
+                return
+
+    def _if_held(self, action) -> bool:
+        """Queue `action` in a transaction that only runs while the lease is still ours"""
+        import redis
+
+        try:
+            with self.client.pipeline() as pipe:
+                pipe.watch(self.name)
+                if pipe.get(self.name) != self.token:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                action(pipe)
+                pipe.execute()
+                return True
+        except redis.WatchError:
+            return False
+        except redis.RedisError as e:
+            logger.warning(f"Lease {self.name} update failed: {e}")
+            return False
+
+
+class _LocalFlight:
+    """A miss of one key that this process is already resolving (computing or waiting on Redis)"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.data: Optional[bytes] = None  # encoded result, None if the attempt failed
+
+
+# In-process single-flight: key -> the flight other threads of this worker join
+_local_flights: Dict[str, _LocalFlight] = {}
+_local_lock = threading.Lock()
+
+
+def cache_get_or_compute(namespace: str, key: str, compute: Callable[[], Any], ttl: int = DEFAULT_TTL,
+                         cacheable: Optional[Callable[[Any], bool]] = None) -> Tuple[Any, bool]:
+    """
+    Cached value of `namespace:key`, computing it with `compute()` on a miss.
+    Returns (value, shared): shared is True when the value came from the
+    cache or from another worker rather than from this call.
+
+    Single-flight across workers and replicas: the first caller to miss
+    takes a lease on the key and computes; everyone else who misses
+    meanwhile waits for its result instead of paying for the same
+    generation. The leader caches the result, then publishes it on a
+    channel the waiters subscribe to (they also poll the cache and the
+    lease, in case the message is missed). If the leader fails or dies,
+    its lease is released or expires and one waiter takes over. A waiter
+    stops waiting after SINGLE_FLIGHT_WAIT seconds or at its request
+    deadline, whichever is sooner.
+
+    Within a process only the first thread to miss a key takes part in
+    that; the others wait on it in memory, without a Redis connection of
+    their own, and take its place if it fails.
+
+    Only values `cacheable` accepts (all by default) are cached; waiters
+    still get the others through the channel.
+    """
+    cached = cache_get(namespace, key)
+    if cached is not None:
+        return cached, True
+
+    redis_client = ModelLoader.get_redis_client()
+    if not redis_client or os.getenv('SINGLE_FLIGHT_ENABLED', 'true').lower() != 'true':
+        return _compute_and_store(namespace, key, compute, ttl, cacheable), False
+
+    name = f"{namespace}:{key}"
+    give_up = time.monotonic() + remaining_budget(float(os.getenv('SINGLE_FLIGHT_WAIT', 60)))
+
+    while True:
+        with _local_lock:
+            flight = _local_flights.get(name)
+            leading = flight is None
+            if leading:
+                flight = _local_flights[name] = _LocalFlight()
+        if leading:
+            break
+
+        with stage_timer("single_flight_wait", model=namespace, backend="local"):
+            outcome = _follow_local(flight, give_up)
+        if outcome == FOLLOWER:
+            SINGLE_FLIGHT.labels(namespace=namespace, role=FOLLOWER).inc()
+            # Decoded per caller, since routes annotate the value they return
+            return cache_codec.decode(flight.data), True
+        if outcome == TIMEOUT:
+            SINGLE_FLIGHT.labels(namespace=namespace, role=TIMEOUT).inc()
+            return _compute_and_store(namespace, key, compute, ttl, cacheable), False
+        # This worker's attempt failed: one of its waiters tries next
+
+    try:
+        value, shared = _single_flight(redis_client, namespace, key, compute, ttl, cacheable, give_up)
+        flight.data = cache_codec.encode(value)[0]
+        return value, shared
+    finally:
+        with _local_lock:
+            _local_flights.pop(name, None)
+        flight.done.set()
+
+
+def _follow_local(flight: _LocalFlight, give_up: float) -> str:
+    """Wait for this worker's own attempt at the key: FOLLOWER, TAKEOVER (it failed) or TIMEOUT"""
+    poll = float(os.getenv('SINGLE_FLIGHT_POLL_MS', 250)) / 1000.0
+    while True:
+        check_deadline("single_flight")
+        remaining = give_up - time.monotonic()
+        if remaining <= 0:
+            return TIMEOUT
+        if flight.done.wait(timeout=min(poll, remaining)):
+            return TAKEOVER if flight.data is None else FOLLOWER
+
+
+def _single_flight(redis_client, namespace: str, key: str, compute: Callable[[], Any], ttl: int,
+                   cacheable: Optional[Callable[[Any], bool]], give_up: float) -> Tuple[Any, bool]:
+    """Lead or follow the other workers' attempts at the key through its Redis lease"""
+    binary_client = ModelLoader.get_redis_binary_client()
+    lease = Lease(redis_client, f"lease:{namespace}:{key}", int(os.getenv('SINGLE_FLIGHT_LEASE_MS', 10000)))
+    channel = f"single_flight:{namespace}:{key}"
+    role = LEADER
+
+    while True:
+        if lease.acquire():
+            SINGLE_FLIGHT.labels(namespace=namespace, role=role).inc()
+            return _lead(lease, binary_client, channel, namespace, key, compute, ttl, cacheable), False
+
+        with stage_timer("single_flight_wait", model=namespace, backend="redis"):
+            outcome, value = _follow(binary_client, lease.name, channel, namespace, key, give_up)
+        if outcome == FOLLOWER:
+            SINGLE_FLIGHT.labels(namespace=namespace, role=FOLLOWER).inc()
+            return value, True
+        if outcome == TIMEOUT:
+            SINGLE_FLIGHT.labels(namespace=namespace, role=TIMEOUT).inc()
+            return _compute_and_store(namespace, key, compute, ttl, cacheable), False
+        # The leader went away without a result: race the other waiters for the lease
+        role = TAKEOVER
+
+
+def _compute_and_store(namespace: str, key: str, compute: Callable[[], Any], ttl: int,
+                       cacheable: Optional[Callable[[Any], bool]]) -> Any:
+    value = compute()
+    if cacheable is None or cacheable(value):
+        cache_set(namespace, key, value, ttl=ttl)
+    return value
+
+
+def _lead(lease: Lease, client, channel: str, namespace: str, key: str, compute: Callable[[], Any], ttl: int,
+          cacheable: Optional[Callable[[Any], bool]]) -> Any:
+    """Compute under the lease, then hand the result to the waiters"""
+    try:
+        value = _compute_and_store(namespace, key, compute, ttl, cacheable)
+    except BaseException:
+        # Wake the waiters so one of them takes over instead of waiting out the lease
+        _publish(client, channel, b"")
+        lease.release()
+        raise
+    _publish(client, channel, cache_codec.encode(value)[0])
+    lease.release()
+    return value
+
+
+def _publish(client, channel: str, message: bytes):
+    """Send the encoded result (empty: none is coming) to the waiters on `channel`"""
+    try:
+        client.publish(channel, message)
+    except Exception as e:
+        logger.warning(f"Single-flight publish on {channel} failed: {e}")
+
+
+def _follow(client, lease_name: str, channel: str, namespace: str, key: str, give_up: float) -> Tuple[str, Any]:
+    """
+    Wait for another worker's result: (FOLLOWER, value), (TAKEOVER, None)
+    once its lease is gone without one, or (TIMEOUT, None)
+    """
+    poll = float(os.getenv('SINGLE_FLIGHT_POLL_MS', 250)) / 1000.0
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(channel)
+    try:
+        while True:
+            check_deadline("single_flight")
+            # Subscribed first, so a result that lands after this check is also published to us
+            cached = client.get(f"{namespace}:{key}")
+            if cached:
+                return FOLLOWER, cache_codec.decode(cached)
+            if not client.exists(lease_name):
+                return TAKEOVER, None
+
+            remaining = give_up - time.monotonic()
+            if remaining <= 0:
+                return TIMEOUT, None
+            message = pubsub.get_message(timeout=min(poll, remaining))
+            if message and message['type'] == 'message':
+                if message['data']:
+                    return FOLLOWER, cache_codec.decode(message['data'])
+                return TAKEOVER, None
+    finally:
+        pubsub.close()
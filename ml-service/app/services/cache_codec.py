@@ -0,0 +1,52 @@
+import os
+import json
+import threading
+from typing import Any, Tuple
+
+import msgpack
+import zstandard
+
+# First byte of an encoded value
+MSGPACK = b"\x01"
+MSGPACK_ZSTD = b"\x02"
+
+# Encodings (label of mlservice_cache_entry_bytes)
+ENCODINGS = {MSGPACK: "msgpack", MSGPACK_ZSTD: "msgpack+zstd"}
+
+# zstd (de)compressors are not thread-safe; the threadpool gets one each
+_local = threading.local()
+
+
+def _compressor() -> zstandard.ZstdCompressor:
+    if not hasattr(_local, 'compressor'):
+        _local.compressor = zstandard.ZstdCompressor(level=int(os.getenv('CACHE_ZSTD_LEVEL', 3)))
+        _local.decompressor = zstandard.ZstdDecompressor()
+    return _local.compressor
+
+
+def _decompressor() -> zstandard.ZstdDecompressor:
+    _compressor()
+    return _local.decompressor
+
+
+def encode(value: Any) -> Tuple[bytes, str]:
+    """
+    Cache value as bytes, and the encoding used: msgpack, zstd-compressed
+    when it is at least CACHE_COMPRESS_MIN_BYTES and compression helps
+    """
+    packed = msgpack.packb(value, use_bin_type=True)
+    if len(packed) >= int(os.getenv('CACHE_COMPRESS_MIN_BYTES', 512)):
+        compressed = _compressor().compress(packed)
+        if len(compressed) < len(packed):
+            return MSGPACK_ZSTD + compressed, ENCODINGS[MSGPACK_ZSTD]
+    return MSGPACK + packed, ENCODINGS[MSGPACK]
+
+
+def decode(data: bytes) -> Any:
+    """Value of an encoded cache entry (JSON entries written before the codec still decode)"""
+    header, body = data[:1], data[1:]
+    if header == MSGPACK:
+        return msgpack.unpackb(body, raw=False)
+    if header == MSGPACK_ZSTD:
+        return msgpack.unpackb(_decompressor().decompress(body), raw=False)
+    return json.loads(data)
@@ -0,0 +1,148 @@
+import os
+import re
+import json
+import zlib
+import logging
+from typing import List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Which stage of a cascade answered (reported as `stage` in responses)
+NGRAM_STAGE = "ngram"
+MODEL_STAGE = "model"
+
+DEFAULT_FEATURES = 2 ** 18
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def cascade_model_path(path: str) -> str:
+    """Relative cascade model paths are resolved against MODEL_CACHE_DIR"""
+    if os.path.isabs(path):
+        return path
+    return os.path.join(os.getenv('MODEL_CACHE_DIR', './models'), path)
+
+
+class HashedNgramFeaturizer:
+    """
+    Bag of hashed word n-grams (the hashing trick), L2 normalised.
+
+    Tokens are lowercased words plus single punctuation/emoji characters, so
+    "!!!" and ":(" still carry signal. Every n-gram is hashed with crc32 into
+    `n_features` buckets; a second hash bit picks the sign so collisions
+    tend to cancel out instead of adding up.
+    """
+
+    def __init__(self, n_features: int = DEFAULT_FEATURES, ngram_max: int = 2):
+        if n_features & (n_features - 1):
+            raise ValueError("n_features must be a power of two")
+        self.n_features = n_features
+        self.ngram_max = ngram_max
+
+    def features(self, text: str) -> Tuple[List[int], List[float]]:
+        """(indices, values) of one text"""
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        counts = {}
+        for n in range(1, self.ngram_max + 1):
+            for start in range(len(tokens) - n + 1):
+                digest = zlib.crc32(" ".join(tokens[start:start + n]).encode())
+                index = digest & (self.n_features - 1)
+                sign = -1.0 if digest & 0x80000000 else 1.0
+                counts[index] = counts.get(index, 0.0) + sign
+
+        norm = sum(value * value for value in counts.values()) ** 0.5 or 1.0
+        return list(counts.keys()), [value / norm for value in counts.values()]
+
+    def transform(self, texts: Sequence[str]):
+        """scipy CSR matrix of the texts (used for training)"""
+        from scipy.sparse import csr_matrix
+
+        indices, values, indptr = [], [], [0]
+        for text in texts:
+            row_indices, row_values = self.features(text)
+            indices.extend(row_indices)
+            values.extend(row_values)
+            indptr.append(len(indices))
+        return csr_matrix((values, indices, indptr), shape=(len(texts), self.n_features))
+
+
+class NgramSentimentClassifier:
+    """
+    Linear (softmax) classifier over hashed n-grams: the cheap first stage
+    of the sentiment cascade.
+
+    Scoring a comment is a few dozen row lookups in a weight matrix, orders
+    of magnitude cheaper than a transformer forward pass or an API call.
+    Trained by scripts/train_cascade.py and stored as a plain .npz file.
+    """
+
+    def __init__(self, weights, bias, labels: List[str], featurizer: HashedNgramFeaturizer, meta: dict = None):
+        self.weights = weights  # (n_features, n_labels) float32
+        self.bias = bias
+        self.labels = labels
+        self.featurizer = featurizer
+        self.meta = meta or {}
+
+    @classmethod
+    def load(cls, path: str) -> "NgramSentimentClassifier":
+        import numpy as np
+
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            featurizer = HashedNgramFeaturizer(meta['n_features'], meta['ngram_max'])
+            return cls(data['weights'], data['bias'], meta['labels'], featurizer, meta)
+
+    def save(self, path: str):
+        import numpy as np
+
+        meta = {
+            **self.meta,
+            'labels': self.labels,
+            'n_features': self.featurizer.n_features,
+            'ngram_max': self.featurizer.ngram_max
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temp_path = f"{path}.tmp.npz"
+        np.savez_compressed(temp_path, weights=self.weights, bias=self.bias, meta=np.array(json.dumps(meta)))
+        os.replace(temp_path, path)
+
+    def predict_proba(self, texts: Sequence[str]):
+        """(len(texts), n_labels) label probabilities"""
+        import numpy as np
+
+        logits = np.tile(self.bias, (len(texts), 1))
+        for row, text in enumerate(texts):
+            indices, values = self.featurizer.features(text)
+            if indices:
+                logits[row] += np.asarray(values, dtype=np.float32) @ self.weights[indices]
+
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True)
+
+
+class SentimentCascade:
+    """
+    Cheap stage in front of a sentiment variant.
+
+    The n-gram classifier answers every input whose top probability reaches
+    `threshold`; only the rest escalate to the variant's model (local
+    transformer or Hugging Face API).
+    """
+
+    def __init__(self, classifier: NgramSentimentClassifier, threshold: float):
+        self.classifier = classifier
+        self.threshold = threshold
+
+    def answer(self, texts: Sequence[str]) -> List[Optional[dict]]:
+        """{'label', 'score'} for confidently classified texts, None for those that escalate"""
+        if not texts:
+            return []
+
+        answers = []
+        for probabilities in self.classifier.predict_proba(texts):
+            best = int(probabilities.argmax())
+            score = float(probabilities[best])
+            if score >= self.threshold:
+                answers.append({'label': self.classifier.labels[best], 'score': score})
+            else:
+                answers.append(None)
+        return answers
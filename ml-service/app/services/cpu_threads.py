@@ -0,0 +1,225 @@
+import os
+import logging
+import tempfile
+from dataclasses import dataclass
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# CPU_AFFINITY modes (anything else is an explicit list of core sets)
+AFFINITY_OFF = "off"
+AFFINITY_AUTO = "auto"
+
+# Thread pool sizes read by OpenMP, MKL and the tokenizers crate when they start
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "RAYON_NUM_THREADS")
+
+
+def parse_cores(spec: str) -> List[int]:
+    """'0-3,8,10-11' -> [0, 1, 2, 3, 8, 10, 11]"""
+    cores = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            cores.update(range(int(first), int(last) + 1))
+        else:
+            cores.add(int(part))
+    return sorted(cores)
+
+
+def format_cores(cores: List[int]) -> str:
+    """[0, 1, 2, 3, 8] -> '0-3,8'"""
+    ranges = []
+    for core in sorted(cores):
+        if ranges and core == ranges[-1][1] + 1:
+            ranges[-1][1] = core
+        else:
+            ranges.append([core, core])
+    return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+
+def available_cores() -> List[int]:
+    """Cores this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def cpu_quota() -> Optional[float]:
+    """CPUs granted by the container's cgroup quota (cpu.max / cfs_quota_us), None if unlimited"""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as handle:
+            quota, period = handle.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as handle:
+            quota = int(handle.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as handle:
+            period = int(handle.read())
+        return quota / period if quota > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def worker_count() -> int:
+    """Server processes sharing the node: WORKER_COUNT, else uvicorn's WEB_CONCURRENCY"""
+    return max(1, int(os.getenv("WORKER_COUNT") or os.getenv("WEB_CONCURRENCY") or 1))
+
+
+class WorkerSlot:
+    """
+    Index of this worker among the `count` server processes.
+
+    uvicorn does not number its workers, so each one takes the first free
+    slot-<n>.lock in CPU_SLOT_DIR with a non-blocking flock and keeps the file
+    open for its lifetime. The kernel releases the lock when the process
+    exits, so a restarted worker gets the slot (and cores) of the one it
+    replaces.
+    """
+
+    _handle = None
+    _index: Optional[int] = None
+
+    @classmethod
+    def claim(cls, count: int) -> Optional[int]:
+        """This process's slot, None when all are taken or locking is unsupported"""
+        if cls._handle is not None:
+            return cls._index
+
+        try:
+            import fcntl
+        except ImportError:
+            return None
+
+        directory = os.getenv("CPU_SLOT_DIR") or os.path.join(tempfile.gettempdir(), "blogml-cpu-slots")
+        os.makedirs(directory, exist_ok=True)
+        for index in range(count):
+            handle = open(os.path.join(directory, f"slot-{index}.lock"), "w")
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                continue
+            handle.write(str(os.getpid()))
+            handle.flush()
+            cls._handle, cls._index = handle, index
+            return index
+        return None
+
+
+@dataclass
+class CpuPlan:
+    """
+    Threads and cores of this worker.
+
+    Configured with:
+      CPU_THREADS          intra-op threads per worker: auto (cores / workers) or a number
+      CPU_INTEROP_THREADS  torch inter-op threads (default 1)
+      CPU_AFFINITY         off, auto (disjoint equal core sets per worker) or
+                           explicit sets such as "0-3;4-7", one per worker
+      WORKER_COUNT         workers on the node (default: WEB_CONCURRENCY, else 1)
+    """
+    workers: int
+    slot: Optional[int]
+    intra_op_threads: int
+    inter_op_threads: int
+    affinity: str
+    cores: Optional[List[int]] = None  # pinned cores, None when not pinned
+
+    @classmethod
+    def from_env(cls) -> "CpuPlan":
+        workers = worker_count()
+        affinity = (os.getenv("CPU_AFFINITY") or AFFINITY_OFF).strip().lower()
+        threads = (os.getenv("CPU_THREADS") or "auto").strip().lower()
+        inter_op = max(1, int(os.getenv("CPU_INTEROP_THREADS", 1)))
+
+        cores = available_cores()
+        slot = None
+        pinned = None
+        if affinity != AFFINITY_OFF:
+            if not hasattr(os, "sched_setaffinity"):
+                logger.warning("⚠️  CPU affinity is not supported on this platform, workers are not pinned")
+            else:
+                core_sets = cls._core_sets(affinity, cores, workers)
+                slot = WorkerSlot.claim(len(core_sets))
+                if slot is None:
+                    logger.warning(f"⚠️  All {len(core_sets)} CPU slots are taken, this worker is not pinned")
+                else:
+                    pinned = core_sets[slot]
+
+        if threads == "auto":
+            if pinned:
+                intra_op = len(pinned)
+            else:
+                budget = len(cores)
+                quota = cpu_quota()
+                if quota:
+                    budget = min(budget, max(1, int(quota)))
+                intra_op = max(1, budget // workers)
+        else:
+            intra_op = max(1, int(threads))
+
+        return cls(workers=workers, slot=slot, intra_op_threads=intra_op, inter_op_threads=inter_op,
+                   affinity=affinity, cores=pinned)
+
+    @staticmethod
+    def _core_sets(affinity: str, cores: List[int], workers: int) -> List[List[int]]:
+        if affinity != AFFINITY_AUTO:
+            sets = [parse_cores(spec) for spec in affinity.split(";") if spec.strip()]
+            if not sets or not all(sets):
+                raise ValueError(f"CPU_AFFINITY must be off, auto or core sets like '0-3;4-7', got {affinity!r}")
+            return sets
+
+        if len(cores) < workers:
+            # Fewer cores than workers: share them round-robin, one core each
+            return [[cores[index % len(cores)]] for index in range(workers)]
+        return [cores[index * len(cores) // workers:(index + 1) * len(cores) // workers] for index in range(workers)]
+
+    def apply(self):
+        """Pin the process and size native thread pools; call before torch or onnxruntime start"""
+        if self.cores:
+            # sched_setaffinity only moves the calling thread; pin the ones already running too
+            try:
+                threads = [int(tid) for tid in os.listdir("/proc/self/task")]
+            except OSError:
+                threads = [0]
+            for tid in threads:
+                try:
+                    os.sched_setaffinity(tid, self.cores)
+                except OSError:
+                    pass
+
+        for name in THREAD_ENV_VARS:
+            os.environ.setdefault(name, str(self.intra_op_threads))
+
+        pinning = f"cores {format_cores(self.cores)} (slot {self.slot})" if self.cores else "not pinned"
+        logger.info(f"🧵 CPU: {self.intra_op_threads} intra-op / {self.inter_op_threads} inter-op thread(s), "
+                    f"{pinning}, {self.workers} worker(s)")
+
+    def configure_torch(self):
+        """Apply the thread counts to torch (once per process)"""
+        import torch
+
+        if torch.get_num_threads() != self.intra_op_threads:
+            torch.set_num_threads(self.intra_op_threads)
+        try:
+            torch.set_num_interop_threads(self.inter_op_threads)
+        except RuntimeError:
+            # Only settable before the first inter-op parallel work; keep what is running
+            pass
+
+    def describe(self) -> dict:
+        return {
+            "workers": self.workers,
+            "slot": self.slot,
+            "intra_op_threads": self.intra_op_threads,
+            "inter_op_threads": self.inter_op_threads,
+            "affinity": self.affinity,
+            "cores": format_cores(self.cores) if self.cores else None
+        }
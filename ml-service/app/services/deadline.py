@@ -0,0 +1,251 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Optional
+from urllib.parse import parse_qs
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+
+from app.services.metrics import DROPPED_WORK
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_HEADER = "X-Request-Timeout"  # seconds the caller is willing to wait
+DEADLINE_HEADER = "X-Request-Deadline"  # unix time at which the caller gives up
+TIMEOUT_PARAM = "timeout"  # query parameter equivalent of TIMEOUT_HEADER
+
+# Drop reasons (label of mlservice_dropped_work_total)
+EXPIRED = "deadline"
+DISCONNECTED = "disconnected"
+
+# nginx's status for requests whose client went away; nobody reads it, but metrics do
+CLIENT_CLOSED_REQUEST = 499
+
+# Deadline of the request (or job) being served
+_current: contextvars.ContextVar[Optional["Deadline"]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(HTTPException):
+    """Work dropped because its caller can no longer use the result"""
+
+    def __init__(self, stage: str, reason: str):
+        if reason == DISCONNECTED:
+            super().__init__(status_code=CLIENT_CLOSED_REQUEST, detail=f"Client disconnected, dropped before {stage}")
+        else:
+            super().__init__(status_code=504, detail=f"Request deadline exceeded, dropped before {stage}")
+        self.stage = stage
+        self.reason = reason
+
+    def __str__(self) -> str:
+        return self.detail
+
+
+class Deadline:
+    """
+    When the caller stops waiting (unix time, None for no limit) and whether
+    it has already gone. Shared between the event loop, which notices
+    disconnects, and the threads doing the work, which check it.
+    """
+
+    def __init__(self, at: Optional[float] = None):
+        self.at = at
+        self.margin = float(os.getenv('DEADLINE_MARGIN_MS', 50)) / 1000.0
+        self._disconnected = threading.Event()
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        return cls(time.time() + seconds)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, None without a deadline"""
+        return None if self.at is None else self.at - time.time()
+
+    def mark_disconnected(self):
+        self._disconnected.set()
+
+    @property
+    def disconnected(self) -> bool:
+        return self._disconnected.is_set()
+
+    def reason(self) -> Optional[str]:
+        """Why work for this caller should be dropped now, None while it is still wanted"""
+        if self._disconnected.is_set():
+            return DISCONNECTED
+        # Work that cannot even start before the margin runs out will not finish in time
+        if self.at is not None and self.at - time.time() <= self.margin:
+            return EXPIRED
+        return None
+
+    def check(self, stage: str):
+        """Raise DeadlineExceeded (and count the drop) if the caller is gone or out of time"""
+        reason = self.reason()
+        if reason:
+            DROPPED_WORK.labels(stage=stage, reason=reason).inc()
+            raise DeadlineExceeded(stage, reason)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    """Make `deadline` the one check_deadline() sees, in this thread and the tasks/threads it starts"""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def check_deadline(stage: str):
+    """Drop the current work before `stage` if its caller is gone or out of time (no-op without a deadline)"""
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.check(stage)
+
+
+def remaining_budget(default: float) -> float:
+    """`default` seconds, or less if the current deadline is closer"""
+    deadline = _current.get()
+    remaining = deadline.remaining() if deadline else None
+    if remaining is None:
+        return default
+    return max(0.0, min(default, remaining))
+
+
+def generation_stopping_criteria():
+    """Stopping criteria that end local generation early once the caller is gone or out of time"""
+    deadline = _current.get()
+    if deadline is None:
+        return None
+
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    class DeadlineCriteria(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs) -> bool:
+            return deadline.reason() is not None
+
+    return StoppingCriteriaList([DeadlineCriteria()])
+
+
+def request_deadline(headers: Headers, query_string: bytes) -> Deadline:
+    """
+    Deadline of an incoming request: X-Request-Deadline (unix time), else
+    X-Request-Timeout or ?timeout= (seconds), else REQUEST_TIMEOUT_DEFAULT
+    (seconds, 0 for none). Raises ValueError for malformed values.
+    """
+    deadline = headers.get(DEADLINE_HEADER)
+    if deadline:
+        return Deadline(float(deadline))
+
+    timeout = headers.get(TIMEOUT_HEADER) or parse_qs(query_string.decode('latin-1')).get(TIMEOUT_PARAM, [None])[0]
+    if timeout is None:
+        timeout = os.getenv('REQUEST_TIMEOUT_DEFAULT', '0')
+    seconds = float(timeout)
+    if seconds < 0:
+        raise ValueError(f"{TIMEOUT_HEADER} must not be negative")
+    return Deadline.after(seconds) if seconds > 0 else Deadline()
+
+
+class DisconnectWatch:
+    """
+    Relays request messages to the app and, once the body has been read,
+    keeps listening for http.disconnect on its behalf, so work running on
+    a thread (or blocking the loop) can see that its caller left.
+
+    All `receive` calls go through here: the app gets the body as usual and
+    later calls (StreamingResponse's disconnect listener) wait for the
+    watcher instead of competing with it for messages.
+    """
+
+    def __init__(self, receive, deadline: Deadline, has_body: bool):
+        self._receive = receive
+        self.deadline = deadline
+        self._body_read = not has_body
+        self._empty_body_sent = has_body
+        self._disconnected = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        if self._body_read:
+            self._listen_in_background()
+
+    async def receive(self):
+        if self._body_read:
+            if not self._empty_body_sent:
+                # Bodyless request: the watcher consumes the real (empty) message
+                self._empty_body_sent = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await self._disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        message = await self._receive()
+        if message["type"] == "http.disconnect":
+            self._set_disconnected()
+        elif not message.get("more_body", False):
+            self._body_read = True
+            self._listen_in_background()
+        return message
+
+    def _listen_in_background(self):
+        self._task = asyncio.get_running_loop().create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            message = await self._receive()
+            if message["type"] == "http.disconnect":
+                self._set_disconnected()
+                return
+
+    def _set_disconnected(self):
+        self.deadline.mark_disconnected()
+        self._disconnected.set()
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+
+class RequestDeadlineMiddleware:
+    """
+    Attach a Deadline to every HTTP request (see request_deadline) and mark
+    it when the client disconnects. Inference checks it with
+    check_deadline(), so work nobody is waiting for any more is dropped
+    instead of holding a worker. Requests that arrive already expired get
+    a 504 straight away.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        try:
+            deadline = request_deadline(headers, scope.get("query_string", b""))
+        except ValueError as e:
+            response = JSONResponse(status_code=400, content={"detail": f"Invalid request deadline: {str(e)}"})
+            await response(scope, receive, send)
+            return
+
+        if deadline.reason():
+            DROPPED_WORK.labels(stage="admission", reason=EXPIRED).inc()
+            response = JSONResponse(status_code=504, content={"detail": "Request deadline exceeded on arrival"})
+            await response(scope, receive, send)
+            return
+
+        has_body = headers.get("content-length", "0") != "0" or "transfer-encoding" in headers
+        watch = DisconnectWatch(receive, deadline, has_body)
+        try:
+            with deadline_scope(deadline):
+                await self.app(scope, watch.receive, send)
+        finally:
+            watch.stop()
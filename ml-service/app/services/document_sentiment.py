@@ -0,0 +1,100 @@
+import logging
+from typing import Dict, List, Optional
+
+from app.services.model_loader import ModelLoader, normalize_sentiment_label
+from app.services.tokenization import TextWindow
+
+logger = logging.getLogger(__name__)
+
+LABELS = ('NEGATIVE', 'NEUTRAL', 'POSITIVE')
+
+AGGREGATIONS = ('mean', 'length_weighted', 'max_negative')
+
+
+def label_scores(predictions: List[dict]) -> Dict[str, float]:
+    """Collapse raw label predictions into {'NEGATIVE': p, 'NEUTRAL': p, 'POSITIVE': p}"""
+    scores = {label: 0.0 for label in LABELS}
+    for prediction in predictions:
+        label = normalize_sentiment_label(prediction.get('label', 'NEUTRAL'))
+        scores[label] = max(scores[label], float(prediction.get('score', 0.0)))
+    return scores
+
+
+def aggregate(windows: List[TextWindow], window_scores: List[Dict[str, float]], method: str) -> Dict[str, float]:
+    """
+    Combine per-window label scores into one document distribution.
+
+    mean: plain average of the window distributions
+    length_weighted: average weighted by each window's token count
+    max_negative: the most negative window decides when it is labeled NEGATIVE
+        (one hostile paragraph makes the post negative); otherwise falls back
+        to length_weighted
+    """
+    if method not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregation '{method}'. Available: {', '.join(AGGREGATIONS)}")
+
+    if method == 'max_negative':
+        most_negative = max(window_scores, key=lambda scores: scores['NEGATIVE'])
+        if max(most_negative, key=most_negative.get) == 'NEGATIVE':
+            return dict(most_negative)
+        method = 'length_weighted'
+
+    if method == 'length_weighted':
+        weights = [window.token_count for window in windows]
+    else:
+        weights = [1] * len(windows)
+
+    total = sum(weights) or 1
+    return {
+        label: sum(weight * scores[label] for weight, scores in zip(weights, window_scores)) / total
+        for label in LABELS
+    }
+
+
+def analyze_document(text: str, window_tokens: int, overlap_tokens: int, method: str,
+                     model: Optional[str] = None) -> dict:
+    """
+    Score a document of any length.
+
+    The text is split into overlapping token windows that each fit the model,
+    all windows are scored in a single batch and the window scores are
+    aggregated into one label and confidence. `model` picks the sentiment
+    variant (default: the registry default).
+    """
+    tokenizer = ModelLoader.get_sentiment_tokenizer(model)
+    if tokenizer is None:
+        raise RuntimeError("Document sentiment requires the sentiment tokenizer (models/sentiment/tokenizer.json)")
+
+    # Variants with a smaller model window get smaller windows; keep the overlap under half of one
+    window_tokens = min(window_tokens, tokenizer.budget)
+    overlap_tokens = min(overlap_tokens, window_tokens // 2 - 1)
+
+    windows = tokenizer.windows(text, window_tokens, overlap_tokens)
+    predictions = ModelLoader.analyze_sentiment_windows([window.text for window in windows], model=model)
+    window_scores = [label_scores(prediction) for prediction in predictions]
+
+    document_scores = aggregate(windows, window_scores, method)
+    sentiment = max(document_scores, key=document_scores.get)
+
+    chunks = []
+    for window, scores in zip(windows, window_scores):
+        window_label = max(scores, key=scores.get)
+        chunks.append({
+            'start': window.start,
+            'end': window.end,
+            'token_count': window.token_count,
+            'sentiment': window_label,
+            'confidence': scores[window_label],
+            'scores': scores
+        })
+
+    return {
+        'sentiment': sentiment,
+        'confidence': document_scores[sentiment],
+        'scores': document_scores,
+        'aggregation': method,
+        'num_chunks': len(windows),
+        # Consecutive windows share overlap_tokens tokens
+        'token_count': windows[0].token_count + sum(window.token_count - overlap_tokens for window in windows[1:]),
+        'chunks': chunks
+    }
@@ -0,0 +1,321 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Optional
+
+import requests
+from urllib3 import Timeout
+from urllib3.exceptions import HTTPError as URLLib3Error
+
+from app.services.deadline import DeadlineExceeded, check_deadline, remaining_budget
+from app.services.profiling import run_profiled
+
+logger = logging.getLogger(__name__)
+
+# Breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Bytes per read of a streamed response body
+READ_CHUNK_BYTES = 65536
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the API while a model's breaker is open"""
+
+
+class HFAPIError(Exception):
+    """Raised when the API call failed after retries"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitBreaker:
+    """
+    Per-model circuit breaker.
+
+    Opens after `failure_threshold` consecutive failures, rejects calls for
+    `reset_timeout` seconds, then lets a single probe through (half-open).
+    A successful probe closes the breaker, a failed one re-opens it.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.total_failures = 0
+        self.total_successes = 0
+        self.rejected = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.total_successes += 1
+            self.consecutive_failures = 0
+            if self.state != CLOSED:
+                logger.info(f"✅ Circuit for {self.name} closed")
+            self.state = CLOSED
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.total_failures += 1
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"⚠️  Circuit for {self.name} opened after {self.consecutive_failures} failures")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """The call was abandoned (its caller left): neither success nor failure, but free the probe slot"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    @property
+    def rejecting(self) -> bool:
+        """Whether a call made now would be rejected (open, or half-open with a probe out)"""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self.opened_at < self.reset_timeout
+            return self.state == HALF_OPEN and self._probe_in_flight
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "total_failures": self.total_failures,
+                "total_successes": self.total_successes,
+                "rejected": self.rejected,
+                "open_for_seconds": round(time.monotonic() - self.opened_at, 1) if self.opened_at else None
+            }
+
+
+class HFClient:
+    """
+    Hugging Face router client with per-model circuit breakers, jittered
+    retries on 429/5xx within a time budget and optional hedged requests.
+
+    HF_API_BASE_URL can point at a local stub server (scripts/stub_hf_server.py)
+    for testing.
+    """
+
+    def __init__(self):
+        self.base_url = os.getenv('HF_API_BASE_URL', 'https://router.huggingface.co').rstrip('/')
+        self.failure_threshold = int(os.getenv('HF_BREAKER_FAILURES', 5))
+        self.reset_timeout = float(os.getenv('HF_BREAKER_RESET_SECONDS', 30))
+        self.max_retries = int(os.getenv('HF_MAX_RETRIES', 3))
+        self.backoff_base = float(os.getenv('HF_RETRY_BACKOFF_SECONDS', 0.5))
+        self.hedge_after = float(os.getenv('HF_HEDGE_AFTER_MS', 0)) / 1000.0
+        self.session = requests.Session()
+        self.session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=32))
+        self.session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=32))
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        self._hedge_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hf-hedge")
+
+    def inference_url(self, model_name: str) -> str:
+        return f"{self.base_url}/hf-inference/models/{model_name}"
+
+    def chat_completions_url(self) -> str:
+        return f"{self.base_url}/v1/chat/completions"
+
+    def breaker(self, model_name: str) -> CircuitBreaker:
+        with self._lock:
+            if model_name not in self._breakers:
+                self._breakers[model_name] = CircuitBreaker(
+                    model_name, self.failure_threshold, self.reset_timeout
+                )
+            return self._breakers[model_name]
+
+    def breaker_states(self) -> Dict[str, dict]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+    def post(self, model_name: str, url: str, payload: dict, headers: dict,
+             timeout: float, hedge: bool = False) -> dict:
+        """
+        POST to the API on behalf of `model_name`.
+
+        `timeout` is the total time budget for all attempts. Raises
+        CircuitOpenError without a network call while the breaker is open
+        and HFAPIError once retries or the budget are exhausted. If the
+        request's deadline passes meanwhile it raises DeadlineExceeded and
+        the breaker is not charged for a failure the API did not cause.
+        """
+        breaker = self.breaker(model_name)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {model_name}")
+
+        try:
+            if hedge and self.hedge_after > 0:
+                result = self._hedged(url, payload, headers, timeout)
+            else:
+                result = self._with_retries(url, payload, headers, timeout)
+        except DeadlineExceeded:
+            breaker.release()
+            raise
+        except HFAPIError as e:
+            # Cut short by the caller's deadline rather than failed by the API?
+            try:
+                check_deadline("hf_api")
+            except DeadlineExceeded:
+                breaker.release()
+                raise
+            # Client errors (bad token, bad input) say nothing about API health
+            if e.status_code is None or e.status_code in RETRYABLE_STATUS:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+
+        breaker.record_success()
+        return result
+
+    def _with_retries(self, url: str, payload: dict, headers: dict, budget: float) -> dict:
+        deadline = time.monotonic() + remaining_budget(budget)
+        last_error: Optional[HFAPIError] = None
+
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            try:
+                response, body = self._post_once(url, payload, headers, deadline)
+            except requests.exceptions.RequestException as e:
+                last_error = HFAPIError(f"Request failed: {e}")
+                retry_after = None
+            else:
+                if response.status_code < 400:
+                    return json.loads(body)
+
+                last_error = HFAPIError(
+                    f"HTTP {response.status_code}: {body[:200].decode(errors='replace')}",
+                    status_code=response.status_code
+                )
+                if response.status_code not in RETRYABLE_STATUS:
+                    raise last_error
+                retry_after = response.headers.get('Retry-After')
+
+            if attempt == self.max_retries:
+                break
+
+            # Full jitter backoff, honouring Retry-After when the API sends one
+            delay = random.uniform(0, self.backoff_base * (2 ** attempt))
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            if time.monotonic() + delay >= deadline:
+                break
+            # No point retrying for a caller that is gone
+            check_deadline("hf_api_retry")
+
+            logger.warning(f"Hugging Face API attempt {attempt + 1} failed ({last_error}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+        raise last_error or HFAPIError("Time budget exhausted")
+
+    def _post_once(self, url: str, payload: dict, headers: dict, deadline: float) -> tuple:
+        """
+        One POST that finishes by `deadline` (a time.monotonic() value).
+
+        A plain requests timeout applies to each socket read, so a response
+        trickling in could outlast the budget. Connecting and waiting for the
+        headers share a total timeout instead, and the body is streamed with
+        the socket timeout cut to the time left before every read.
+        """
+        remaining = deadline - time.monotonic()
+        response = self.session.post(url, headers=headers, json=payload,
+                                     timeout=Timeout(total=remaining), stream=True)
+        try:
+            raw = response.raw
+            read = getattr(raw, 'read1', raw.read)
+            body = bytearray()
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise requests.exceptions.Timeout("Time budget exhausted while reading the response")
+                sock = getattr(getattr(raw, 'connection', None), 'sock', None)
+                if sock is not None:
+                    sock.settimeout(remaining)
+                try:
+                    chunk = read(READ_CHUNK_BYTES, decode_content=True)
+                except (URLLib3Error, OSError) as e:
+                    raise requests.exceptions.ConnectionError(e)
+                if not chunk:
+                    return response, bytes(body)
+                body += chunk
+        finally:
+            response.close()
+
+    def _submit_hedge(self, url: str, payload: dict, headers: dict, budget: float) -> Future:
+        """One attempt on the hedge pool, in a copy of the caller's context: its deadline and profiling"""
+        context = contextvars.copy_context()
+        return self._hedge_pool.submit(context.run, run_profiled, self._with_retries, url, payload, headers, budget)
+
+    def _hedged(self, url: str, payload: dict, headers: dict, budget: float) -> dict:
+        """Send a duplicate request if the first is slower than hedge_after; first success wins"""
+        deadline = time.monotonic() + budget
+        primary = self._submit_hedge(url, payload, headers, budget)
+
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done:
+            return primary.result()
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return primary.result()
+
+        secondary = self._submit_hedge(url, payload, headers, remaining)
+        pending = {primary, secondary}
+        last_error = None
+
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                try:
+                    return future.result()
+                except HFAPIError as e:
+                    last_error = e
+
+        raise last_error or HFAPIError("Time budget exhausted")
@@ -0,0 +1,460 @@
+import os
+import re
+import json
+import base64
+import hashlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+
+from app.services.deadline import check_deadline
+from app.services.metrics import UPLOAD_REJECTED
+
+# Why an upload was refused (label of mlservice_upload_rejected_total)
+TOO_LARGE = "too_large"
+TOO_MANY_PIXELS = "too_many_pixels"
+NOT_AN_IMAGE = "not_an_image"
+MALFORMED = "malformed"
+
+# Leading bytes of the formats PIL decodes for us
+SIGNATURES = (
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+)
+SNIFF_BYTES = 12
+
+MAX_BYTES = int(float(os.getenv('UPLOAD_MAX_MB', 20)) * 1024 * 1024)
+MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', 25_000_000))
+SPOOL_BYTES = int(os.getenv('UPLOAD_SPOOL_KB', 256)) * 1024  # kept in memory, the rest goes to a temp file
+FIELDS_MAX_BYTES = int(os.getenv('UPLOAD_FIELDS_MAX_KB', 64)) * 1024  # form fields / the rest of a JSON body
+
+# Full-size decodes run on these few threads only (each can take up to IMAGE_MAX_PIXELS * 4
+# bytes); spread over the whole threadpool, every thread's malloc arena would keep its peak
+_decoder = ThreadPoolExecutor(
+    max_workers=int(os.getenv('IMAGE_DECODE_CONCURRENCY', 2)), thread_name_prefix="image-decode"
+)
+
+
+class UploadRejected(HTTPException):
+    """Upload refused before (or while) it was read"""
+
+    def __init__(self, status_code: int, reason: str, detail: str):
+        super().__init__(status_code=status_code, detail=detail)
+        self.reason = reason
+        UPLOAD_REJECTED.labels(reason=reason).inc()
+
+    def __str__(self) -> str:
+        return self.detail
+
+
+def too_large() -> UploadRejected:
+    return UploadRejected(413, TOO_LARGE, f"Image larger than {MAX_BYTES // (1024 * 1024)} MB")
+
+
+def malformed(detail: str) -> UploadRejected:
+    return UploadRejected(400, MALFORMED, detail)
+
+
+def sniff_image(head: bytes) -> Optional[str]:
+    """Format of an image from its first SNIFF_BYTES bytes (None if it is not one we decode)"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    for signature, image_format in SIGNATURES:
+        if head.startswith(signature):
+            return image_format
+    return None
+
+
+class ImageUpload:
+    """
+    An uploaded image, received chunk by chunk.
+
+    The first bytes are checked against known image signatures before
+    anything is kept, the size is capped at UPLOAD_MAX_MB and the sha256 is
+    computed on the way in. Up to UPLOAD_SPOOL_KB stays in memory; larger
+    uploads spill to a temporary file, so concurrent large uploads do not
+    add up in RAM.
+    """
+
+    def __init__(self, content_type: Optional[str] = None):
+        self.content_type = content_type
+        self.format: Optional[str] = None
+        self.size = 0
+        self.file = SpooledTemporaryFile(max_size=SPOOL_BYTES)
+        self._sha256 = hashlib.sha256()
+        self._head = b""
+
+    @property
+    def sha256(self) -> str:
+        return self._sha256.hexdigest()
+
+    @property
+    def in_memory(self) -> bool:
+        return not getattr(self.file, '_rolled', True)
+
+    def write(self, data: bytes):
+        if not data:
+            return
+        self.size += len(data)
+        if self.size > MAX_BYTES:
+            raise too_large()
+        if self.format is None:
+            self._head += data[:SNIFF_BYTES]
+            if len(self._head) >= SNIFF_BYTES:
+                self._sniff()
+        self._sha256.update(data)
+        self.file.write(data)
+
+    async def write_async(self, data: bytes):
+        """write(), on the threadpool once the upload lives on disk"""
+        if self.in_memory and self.file.tell() + len(data) <= SPOOL_BYTES:
+            self.write(data)
+        else:
+            await run_in_threadpool(self.write, data)
+
+    def finish(self) -> "ImageUpload":
+        """Check the complete upload and rewind it for decoding"""
+        if self.size == 0:
+            raise malformed("Empty image")
+        if self.format is None:
+            self._sniff()
+        self.file.seek(0)
+        return self
+
+    def _sniff(self):
+        self.format = sniff_image(self._head)
+        if self.format is None:
+            raise UploadRejected(415, NOT_AN_IMAGE, "File must be an image (JPEG, PNG, GIF, WebP, BMP or TIFF)")
+
+    def close(self):
+        self.file.close()
+
+
+def run_decode(fn: Callable[..., Any], *args) -> Any:
+    """fn(*args) on one of the IMAGE_DECODE_CONCURRENCY decode threads, waiting for a free one"""
+    return _decoder.submit(contextvars.copy_context().run, fn, *args).result()
+
+
+def too_many_pixels(image: str = "Image") -> UploadRejected:
+    return UploadRejected(413, TOO_MANY_PIXELS, f"{image} exceeds the limit of {MAX_PIXELS} pixels")
+
+
+def check_pixels(width: int, height: int):
+    """Refuse images whose decoded size would exceed IMAGE_MAX_PIXELS (decompression bombs)"""
+    if width * height > MAX_PIXELS:
+        raise too_many_pixels(f"Image of {width}x{height} pixels")
+
+
+def check_content_length(request: Request, limit: int):
+    """413 straight away when the declared body is over `limit`, without reading it"""
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > limit:
+        raise too_large()
+
+
+def form_schema(form: Type[BaseModel], file_field: str = "file") -> dict:
+    """openapi_extra documenting a multipart body of `form` fields and one image file"""
+    schema = form.model_json_schema()
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "required": [file_field, *schema.get("required", [])],
+        "properties": {file_field: {"type": "string", "format": "binary"}, **schema["properties"]}
+    }}}}}
+
+
+def json_schema(body: Type[BaseModel]) -> dict:
+    """openapi_extra documenting a JSON body of `body`"""
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": body.model_json_schema()}}}}
+
+
+async def read_multipart_image(request: Request, file_field: str = "file") -> Tuple[ImageUpload, Dict[str, str]]:
+    """
+    Stream a multipart/form-data body: the `file_field` part into an
+    ImageUpload, the other (non-file) fields into a dict. Rejections happen
+    as soon as the offending bytes arrive, without reading the rest.
+    """
+    from multipart.multipart import MultipartParser, parse_options_header
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise malformed("Expected a multipart/form-data body")
+    limit = MAX_BYTES + FIELDS_MAX_BYTES
+    check_content_length(request, limit)
+
+    fields: Dict[str, str] = {}
+    upload: Optional[ImageUpload] = None
+    pending = []  # file data received during parser.write, written after it returns
+    part = {}
+
+    def on_part_begin():
+        part.clear()
+        part.update(headers={}, header=b"", value=b"", data=b"", name=None, file=False)
+
+    def on_header_field(data: bytes, start: int, end: int):
+        part["header"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int):
+        part["value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][part["header"].lower()] = part["value"]
+        part["header"], part["value"] = b"", b""
+
+    def on_headers_finished():
+        nonlocal upload
+        _, options = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        if b"name" not in options:
+            raise malformed('Multipart part without a "name"')
+        part["name"] = options[b"name"].decode("utf-8", "replace")
+        if b"filename" not in options:
+            return
+        if part["name"] != file_field or upload is not None:
+            raise malformed(f"Unexpected file field {part['name']!r}")
+        content_type = part["headers"].get(b"content-type", b"").decode("latin-1")
+        if content_type and not content_type.startswith("image/"):
+            raise UploadRejected(415, NOT_AN_IMAGE, "File must be an image")
+        upload = ImageUpload(content_type or None)
+        part["file"] = True
+
+    def on_part_data(data: bytes, start: int, end: int):
+        if part["file"]:
+            pending.append(data[start:end])
+            return
+        part["data"] += data[start:end]
+        if sum(len(value) for value in fields.values()) + len(part["data"]) > FIELDS_MAX_BYTES:
+            raise malformed(f"Form fields larger than {FIELDS_MAX_BYTES // 1024} KB")
+
+    def on_part_end():
+        if not part["file"]:
+            fields[part["name"]] = part["data"].decode("utf-8", "replace")
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    received = 0
+    try:
+        async for chunk in request.stream():
+            # Counted here as well, for multipart overhead (python-multipart truncates silently past max_size)
+            received += len(chunk)
+            if received > limit:
+                raise too_large()
+            try:
+                parser.write(chunk)
+            except ValueError as e:
+                raise malformed(f"Invalid multipart body: {str(e)}")
+            for data in pending:
+                await upload.write_async(data)
+            pending.clear()
+        parser.finalize()
+        if upload is None:
+            raise UploadRejected(422, MALFORMED, f"Missing image file field {file_field!r}")
+        return upload.finish(), fields
+    except ClientDisconnect:
+        check_deadline("upload_read")
+        raise
+    except BaseException:
+        if upload is not None:
+            upload.close()
+        raise
+
+
+_QUOTE_OR_ESCAPE = re.compile(rb'["\\]')
+_JSON_ESCAPES = {ord("/"): b"/", ord("n"): b"", ord("r"): b"", ord("t"): b""}  # whitespace is not base64
+_URLSAFE = bytes.maketrans(b"-_", b"+/")
+
+
+class Base64JsonReader:
+    """
+    Incremental reader of a JSON object whose `field` member is a base64
+    image (optionally a data: URL).
+
+    The field's string is never held whole: its characters go through a
+    streaming base64 decoder into an ImageUpload as they arrive. The rest
+    of the object (a few small fields) is kept, with an empty string in
+    place of the image, and parsed at the end.
+    """
+
+    def __init__(self, field: str, upload: ImageUpload):
+        self.field = field.encode()
+        self.upload = upload
+        self.rest = bytearray()
+        self.found = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._string = bytearray()
+        self._last_string = b""
+        self._value_next = False
+        # State while streaming the image string
+        self._capturing = False
+        self._escape = b""
+        self._prefix: Optional[bytearray] = bytearray()  # until a data: URL prefix is ruled out or skipped
+        self._quantum = b""
+        self._padded = False
+
+    def feed(self, chunk: bytes):
+        i, n = 0, len(chunk)
+        while i < n:
+            if self._capturing:
+                i = self._capture(chunk, i)
+                continue
+
+            c = chunk[i]
+            i += 1
+            self.rest.append(c)
+            if len(self.rest) > FIELDS_MAX_BYTES:
+                raise malformed(f"JSON fields other than the image larger than {FIELDS_MAX_BYTES // 1024} KB")
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif c == 0x5C:  # backslash
+                    self._escaped = True
+                elif c == 0x22:  # closing quote
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_string = bytes(self._string)
+                    continue
+                if self._depth == 1:
+                    self._string.append(c)
+            elif c == 0x22:
+                if self._value_next:
+                    self._value_next = False
+                    self._capturing = self.found = True
+                else:
+                    self._in_string = True
+                    self._string.clear()
+            elif c in b"{[":
+                self._depth += 1
+            elif c in b"}]":
+                self._depth -= 1
+            elif c == 0x3A:  # colon
+                self._value_next = self._depth == 1 and not self.found and self._last_string == self.field
+            elif c not in b" \t\r\n":
+                self._value_next = False
+
+    def _capture(self, chunk: bytes, i: int) -> int:
+        """Consume image string bytes from chunk[i:]; returns where it stopped"""
+        if self._escape:
+            self._escape += chunk[i:i + 1]
+            i += 1
+            if self._escape[1:2] == b"u":
+                if len(self._escape) < 6:
+                    return i
+                try:
+                    self._decode(chr(int(self._escape[2:], 16)).encode("ascii"))
+                except ValueError:
+                    raise malformed(f"Invalid escape in {self.field.decode()!r}")
+            elif self._escape[1] in _JSON_ESCAPES:
+                self._decode(_JSON_ESCAPES[self._escape[1]])
+            else:
+                raise malformed(f"Invalid escape in {self.field.decode()!r}")
+            self._escape = b""
+            return i
+
+        match = _QUOTE_OR_ESCAPE.search(chunk, i)
+        end = match.start() if match else len(chunk)
+        self._decode(chunk[i:end])
+        if match is None:
+            return end
+        if chunk[end] == 0x22:
+            self._capturing = False
+            self.rest += b'"'
+        else:
+            self._escape = b"\\"
+        return end + 1
+
+    def _decode(self, data: bytes):
+        data = data.translate(_URLSAFE, b" \t\r\n")
+        if self._prefix is not None:
+            self._prefix += data
+            if len(self._prefix) < 5:
+                return
+            if not self._prefix.startswith(b"data:"):
+                data, self._prefix = bytes(self._prefix), None
+            elif b"," in self._prefix:
+                data, self._prefix = self._prefix.split(b",", 1)[1], None
+            elif len(self._prefix) > 256:
+                raise malformed("Invalid data: URL")
+            else:
+                return
+
+        data = self._quantum + data
+        usable = len(data) - len(data) % 4
+        self._quantum = data[usable:]
+        if usable:
+            if self._padded:
+                raise malformed("Invalid base64 image: data after padding")
+            block = data[:usable]
+            self._padded = block.endswith(b"=")
+            try:
+                self.upload.write(base64.b64decode(block, validate=True))
+            except ValueError as e:
+                raise malformed(f"Invalid base64 image: {str(e)}")
+
+    def finish(self) -> dict:
+        """The object's other members ({field: ""} in place of the image)"""
+        if self._capturing or self._escape:
+            raise malformed("Invalid JSON body: unterminated string")
+        if self._prefix:
+            self._decode_tail(bytes(self._prefix))
+        if self._quantum:
+            self._decode_tail(b"")
+        try:
+            body = json.loads(bytes(self.rest))
+        except ValueError as e:
+            raise malformed(f"Invalid JSON body: {str(e)}")
+        if not isinstance(body, dict):
+            raise malformed("Invalid JSON body: expected an object")
+        return body
+
+    def _decode_tail(self, data: bytes):
+        """Last, possibly unpadded, base64 characters"""
+        self._prefix = None
+        data = self._quantum + data
+        self._quantum = b""
+        if len(data) % 4 == 1:
+            raise malformed("Invalid base64 image: truncated")
+        self._decode(data + b"=" * (-len(data) % 4))
+
+
+async def read_base64_image(request: Request, field: str = "image_data") -> Tuple[ImageUpload, dict]:
+    """
+    Stream a JSON body with a base64 image in `field` into an ImageUpload;
+    returns it with the other members of the object.
+    """
+    # base64 takes 4 bytes for every 3
+    check_content_length(request, MAX_BYTES * 4 // 3 + 4 + FIELDS_MAX_BYTES)
+    upload = ImageUpload()
+    reader = Base64JsonReader(field, upload)
+    try:
+        async for chunk in request.stream():
+            reader.feed(chunk)
+        body = reader.finish()
+        if not reader.found:
+            raise UploadRejected(422, MALFORMED, f"Missing {field!r} (a base64 string)")
+        return upload.finish(), body
+    except ClientDisconnect:
+        check_deadline("upload_read")
+        raise
+    except BaseException:
+        upload.close()
+        raise
@@ -0,0 +1,389 @@
+import os
+import json
+import time
+import uuid
+import queue
+import asyncio
+import inspect
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from app.services.cache import Lease
+from app.services.deadline import Deadline, DeadlineExceeded, deadline_scope
+from app.services.metrics import STAGE_LATENCY
+from app.services.model_loader import ModelLoader
+from app.services.scheduler import BULK, priority_scope
+
+logger = logging.getLogger(__name__)
+
+# Job lifecycle
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+TERMINAL_STATES = {SUCCEEDED, FAILED}
+
+
+class InMemoryJobStore:
+    """Process-local stand-in for Redis (single worker / development only)"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._jobs: Dict[str, dict] = {}
+        self._queues: Dict[str, queue.Queue] = {}
+        self._lock = threading.Lock()
+
+    def _queue(self, kind: str) -> queue.Queue:
+        with self._lock:
+            if kind not in self._queues:
+                self._queues[kind] = queue.Queue()
+            return self._queues[kind]
+
+    def save(self, job: dict):
+        with self._lock:
+            self._jobs[job['id']] = dict(job)
+
+    def load(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def push(self, kind: str, job_id: str):
+        self._queue(kind).put(job_id)
+
+    def pop(self, kind: str, timeout: float) -> Optional[str]:
+        try:
+            return self._queue(kind).get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def depth(self, kind: str) -> int:
+        return self._queue(kind).qsize()
+
+    # Jobs die with the process that runs them here, so there is nothing to reclaim
+    def claim(self, job_id: str) -> Optional[Lease]:
+        return None
+
+    def ack(self, kind: str, job_id: str):
+        pass
+
+    def unleased(self, kind: str) -> List[str]:
+        return []
+
+
+class RedisJobStore:
+    """
+    Jobs shared across uvicorn workers and replicas through Redis.
+
+    A popped job is moved (BLMOVE) to the kind's processing list rather
+    than removed, and its worker holds a lease on it that is renewed while
+    the job runs. The entry leaves the processing list when the job
+    finishes; one still there without a lease belongs to a worker that
+    died, and the reaper requeues it.
+    """
+
+    name = "redis"
+
+    def __init__(self, client, ttl: int, visibility_timeout: float):
+        self.client = client
+        self.ttl = ttl
+        self.visibility_ms = int(visibility_timeout * 1000)
+
+    def save(self, job: dict):
+        self.client.setex(f"job:{job['id']}", self.ttl, json.dumps(job))
+
+    def load(self, job_id: str) -> Optional[dict]:
+        data = self.client.get(f"job:{job_id}")
+        return json.loads(data) if data else None
+
+    def push(self, kind: str, job_id: str):
+        self.client.lpush(f"jobs:queue:{kind}", job_id)
+
+    def pop(self, kind: str, timeout: float) -> Optional[str]:
+        return self.client.blmove(
+            f"jobs:queue:{kind}", f"jobs:processing:{kind}", max(1, int(timeout)), "RIGHT", "LEFT"
+        )
+
+    def depth(self, kind: str) -> int:
+        return self.client.llen(f"jobs:queue:{kind}")
+
+    def claim(self, job_id: str) -> Optional[Lease]:
+        """Lease on a popped job, renewed until released"""
+        lease = Lease(self.client, f"jobs:lease:{job_id}", self.visibility_ms)
+        lease.acquire()
+        return lease
+
+    def ack(self, kind: str, job_id: str):
+        """The job is done with (finished, dropped or expired)"""
+        self.client.lrem(f"jobs:processing:{kind}", 1, job_id)
+
+    def unleased(self, kind: str) -> List[str]:
+        """Ids in the processing list whose lease has lapsed (or was not taken yet)"""
+        job_ids = self.client.lrange(f"jobs:processing:{kind}", 0, -1)
+        if not job_ids:
+            return []
+        leases = self.client.mget([f"jobs:lease:{job_id}" for job_id in job_ids])
+        return [job_id for job_id, lease in zip(job_ids, leases) if lease is None]
+
+    def requeue(self, kind: str, job_id: str) -> bool:
+        """Move an abandoned job back to the front of its queue (False if someone else already did)"""
+        if not self.client.lrem(f"jobs:processing:{kind}", 1, job_id):
+            return False
+        self.client.rpush(f"jobs:queue:{kind}", job_id)
+        return True
+
+    def drop(self, kind: str, job_id: str) -> bool:
+        """Take an abandoned job off the processing list for good (False if someone else already did)"""
+        return bool(self.client.lrem(f"jobs:processing:{kind}", 1, job_id))
+
+
+class JobQueue:
+    """
+    Background job queue for long-running work.
+
+    Each job kind has its own queue and its own fixed number of worker
+    threads, so heavy generations are capped independently of everything
+    else. Handlers may be plain functions or coroutines; coroutines are run
+    to completion on the worker thread.
+
+    A job submitted with a timeout is dropped (failed without running) if
+    no worker got to it in time, and runs under that deadline otherwise,
+    so inference inside it stops once the deadline passes.
+
+    Jobs run at the bulk priority class unless submitted with another, so
+    their model calls yield to interactive requests.
+
+    With Redis, a job whose worker process dies is not lost: its lease
+    lapses after JOB_VISIBILITY_TIMEOUT seconds, and a reaper in any
+    worker puts it back on its queue, or fails it once it has been
+    started JOB_MAX_ATTEMPTS times.
+    """
+
+    def __init__(self):
+        self.store = None
+        self.visibility_timeout = float(os.getenv('JOB_VISIBILITY_TIMEOUT', 60))
+        self.reaper_interval = float(os.getenv('JOB_REAPER_INTERVAL', 30))
+        self.max_attempts = max(1, int(os.getenv('JOB_MAX_ATTEMPTS', 2)))
+        self._handlers: Dict[str, Callable[[dict], Any]] = {}
+        self._concurrency: Dict[str, int] = {}
+        self._threads = []
+        self._stopping = threading.Event()
+        self._suspects: Set[tuple] = set()  # (kind, id) seen without a lease by the last sweep
+
+    def register(self, kind: str, handler: Callable[[dict], Any], concurrency: int = 1):
+        """Register a handler for a job kind (JOB_WORKERS_<KIND> overrides concurrency)"""
+        env_name = "JOB_WORKERS_" + kind.upper().replace('.', '_').replace('-', '_')
+        self._handlers[kind] = handler
+        self._concurrency[kind] = max(1, int(os.getenv(env_name, concurrency)))
+
+    @property
+    def kinds(self):
+        return list(self._handlers)
+
+    def _create_store(self):
+        backend = os.getenv('JOB_QUEUE_BACKEND', 'auto').lower()
+        ttl = int(os.getenv('JOB_RESULT_TTL', 86400))
+
+        if backend in ('auto', 'redis'):
+            redis_client = ModelLoader.get_redis_client()
+            if redis_client:
+                return RedisJobStore(redis_client, ttl, self.visibility_timeout)
+            if backend == 'redis':
+                raise RuntimeError("JOB_QUEUE_BACKEND=redis but Redis is not available")
+            logger.warning("⚠️  Redis unavailable, jobs are kept in this process only")
+
+        return InMemoryJobStore()
+
+    def start(self):
+        """Create the store and start worker threads for every registered kind"""
+        if self._threads:
+            return
+
+        self.store = self._create_store()
+        self._stopping.clear()
+
+        for kind, workers in self._concurrency.items():
+            for index in range(workers):
+                thread = threading.Thread(
+                    target=self._worker,
+                    args=(kind,),
+                    name=f"job-{kind}-{index}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+        if isinstance(self.store, RedisJobStore):
+            thread = threading.Thread(target=self._reaper, name="job-reaper", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        logger.info(
+            f"✅ Job queue started ({self.store.name}): "
+            + ", ".join(f"{kind} x{n}" for kind, n in self._concurrency.items())
+        )
+
+    def stop(self, timeout: float = 5.0):
+        """Signal workers to stop after their current job"""
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def submit(self, kind: str, payload: dict, timeout: Optional[float] = None, priority: str = BULK) -> dict:
+        """Queue a job and return its initial record; `timeout` seconds bound queueing plus running"""
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self.store is None:
+            raise RuntimeError("Job queue not started")
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'kind': kind,
+            'status': QUEUED,
+            'payload': payload,
+            'result': None,
+            'error': None,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'deadline': time.time() + timeout if timeout else None,
+            'priority': priority
+        }
+        self.store.save(job)
+        self.store.push(kind, job['id'])
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        if self.store is None:
+            return None
+        return self.store.load(job_id)
+
+    def depth(self, kind: str) -> int:
+        return self.store.depth(kind) if self.store else 0
+
+    async def wait(self, job_id: str, timeout: float, interval: float = 0.5) -> Optional[dict]:
+        """Poll until the job finishes or the timeout expires"""
+        deadline = time.monotonic() + timeout
+        job = self.get(job_id)
+        while job and job['status'] not in TERMINAL_STATES and time.monotonic() < deadline:
+            await asyncio.sleep(interval)
+            job = self.get(job_id)
+        return job
+
+    def _worker(self, kind: str):
+        while not self._stopping.is_set():
+            try:
+                self.poll(kind)
+            except Exception as e:
+                # A job left unfinished stays in the processing list for the reaper
+                logger.error(f"Job queue worker for {kind} failed: {e}")
+                time.sleep(1.0)
+
+    def poll(self, kind: str, timeout: float = 1.0) -> Optional[str]:
+        """Pop one job of `kind` and run it; returns its id (None if none came within `timeout`)"""
+        job_id = self.store.pop(kind, timeout=timeout)
+        if not job_id:
+            return None
+
+        lease = self.store.claim(job_id)
+        try:
+            self._run(kind, self._handlers[kind], job_id)
+            self.store.ack(kind, job_id)
+        finally:
+            if lease is not None:
+                lease.release()
+        return job_id
+
+    def _run(self, kind: str, handler: Callable[[dict], Any], job_id: str):
+        job = self.store.load(job_id)
+        if not job:
+            # Expired before a worker got to it
+            return
+
+        deadline = Deadline(job.get('deadline'))
+        try:
+            deadline.check("queue")
+        except DeadlineExceeded as e:
+            # Whoever submitted it has stopped waiting; give the worker to the next job
+            logger.warning(f"⏰ Job {job_id} ({kind}) dropped: {e.detail}")
+            job['status'] = FAILED
+            job['error'] = e.detail
+            job['finished_at'] = time.time()
+            self.store.save(job)
+            return
+
+        job['status'] = RUNNING
+        job['started_at'] = time.time()
+        job['attempts'] = job.get('attempts', 0) + 1
+        self.store.save(job)
+
+        try:
+            with deadline_scope(deadline), priority_scope(job.get('priority', BULK)):
+                result = handler(job['payload'])
+                if inspect.iscoroutine(result):
+                    result = asyncio.run(result)
+            job['result'] = result
+            job['status'] = SUCCEEDED
+        except Exception as e:
+            logger.error(f"Job {job_id} ({kind}) failed: {e}")
+            job['error'] = str(getattr(e, 'detail', e))
+            job['status'] = FAILED
+
+        job['finished_at'] = time.time()
+        self.store.save(job)
+
+        STAGE_LATENCY.labels(stage="job_wait", model=kind, backend="").observe(
+            job['started_at'] - job['created_at']
+        )
+        STAGE_LATENCY.labels(stage="job_run", model=kind, backend="").observe(
+            job['finished_at'] - job['started_at']
+        )
+
+
+    def _reaper(self):
+        """Requeue (or fail) jobs left in a processing list by a worker that died"""
+        while not self._stopping.wait(self.reaper_interval):
+            try:
+                self.reap()
+            except Exception as e:
+                logger.error(f"Job reaper failed: {e}")
+
+    def reap(self) -> int:
+        """
+        One sweep; returns how many jobs were reclaimed. An entry only counts
+        as abandoned when the previous sweep also found it without a lease,
+        which leaves a fresh pop time to take its lease.
+        """
+        unleased = {(kind, job_id) for kind in self.kinds for job_id in self.store.unleased(kind)}
+        abandoned, self._suspects = unleased & self._suspects, unleased - self._suspects
+
+        reclaimed = 0
+        for kind, job_id in abandoned:
+            job = self.store.load(job_id)
+            if job is None or job['status'] in TERMINAL_STATES:
+                # Expired, or finished just before its worker died
+                self.store.drop(kind, job_id)
+                continue
+
+            attempts = job.get('attempts', 0)
+            if attempts >= self.max_attempts:
+                if not self.store.drop(kind, job_id):
+                    continue
+                job['status'] = FAILED
+                job['error'] = f"Worker stopped while running the job ({attempts} attempts)"
+                job['finished_at'] = time.time()
+                self.store.save(job)
+                logger.error(f"❌ Job {job_id} ({kind}) failed: its worker stopped {attempts} times")
+            else:
+                if not self.store.requeue(kind, job_id):
+                    continue
+                job['status'] = QUEUED
+                self.store.save(job)
+                logger.warning(f"🔁 Job {job_id} ({kind}) requeued: its worker stopped")
+            reclaimed += 1
+        return reclaimed
+
+job_queue = JobQueue()
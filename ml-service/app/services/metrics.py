@@ -0,0 +1,207 @@
+import os
+import time
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+logger = logging.getLogger(__name__)
+
+# Backends for the `backend` label
+LOCAL = "local"
+HF_API = "hf_api"
+
+# Latency buckets from sub-millisecond cache hits up to full LLM generations
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+REQUEST_COUNT = Counter(
+    "mlservice_http_requests_total",
+    "HTTP requests by route and status",
+    ["method", "route", "status"]
+)
+
+REQUEST_LATENCY = Histogram(
+    "mlservice_http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS
+)
+
+STAGE_LATENCY = Histogram(
+    "mlservice_stage_duration_seconds",
+    "Latency of individual pipeline stages (cache, decode, tokenize, inference, hf_api, ...)",
+    ["stage", "model", "backend"],
+    buckets=LATENCY_BUCKETS
+)
+
+CACHE_REQUESTS = Counter(
+    "mlservice_cache_requests_total",
+    "Cache lookups by namespace and result (hit/miss)",
+    ["namespace", "result"]
+)
+
+BATCH_SIZE = Histogram(
+    "mlservice_batch_size",
+    "Inputs per model call",
+    ["model", "backend"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+
+QUEUE_DEPTH = Gauge(
+    "mlservice_queue_depth",
+    "Items waiting in a queue",
+    ["queue"],
+    multiprocess_mode="livesum"
+)
+
+CASCADE_DECISIONS = Counter(
+    "mlservice_cascade_inputs_total",
+    "Inputs answered by each stage of a sentiment cascade (ngram or model)",
+    ["model", "stage"]
+)
+
+STREAM_MESSAGES = Counter(
+    "mlservice_stream_messages_total",
+    "Redis stream entries by outcome (scored, retried, dead_lettered)",
+    ["stream", "outcome"]
+)
+
+CACHE_ENTRY_BYTES = Histogram(
+    "mlservice_cache_entry_bytes",
+    "Encoded size of values written to the cache",
+    ["namespace", "encoding"],
+    buckets=(128, 512, 2048, 8192, 32768, 131072, 524288, 2097152)
+)
+
+CACHE_REJECTED = Counter(
+    "mlservice_cache_rejected_total",
+    "Values not cached: too_large (over CACHE_MAX_ENTRY_KB), over_budget (namespace over CACHE_BUDGET_MB) "
+    "or version_changed (the model or backend changed while computing them)",
+    ["namespace", "reason"]
+)
+
+UPLOAD_REJECTED = Counter(
+    "mlservice_upload_rejected_total",
+    "Image uploads refused: too_large, too_many_pixels, not_an_image or malformed",
+    ["reason"]
+)
+
+CACHE_USAGE = Gauge(
+    "mlservice_cache_usage_bytes",
+    "Bytes a cache namespace holds in Redis, as last read from its ledger",
+    ["namespace"],
+    multiprocess_mode="max"
+)
+
+SINGLE_FLIGHT = Counter(
+    "mlservice_single_flight_total",
+    "Cache misses by single-flight role: leader (computed), follower (got the leader's result), "
+    "takeover (leader gone, computed instead), timeout (waited too long, computed alone)",
+    ["namespace", "role"]
+)
+
+DROPPED_WORK = Counter(
+    "mlservice_dropped_work_total",
+    "Work dropped because its deadline passed or its client disconnected, by stage",
+    ["stage", "reason"]
+)
+
+SCHEDULER_WAIT = Histogram(
+    "mlservice_scheduler_wait_seconds",
+    "Time inputs waited in a model's scheduler queue, by priority class",
+    ["model", "priority"],
+    buckets=LATENCY_BUCKETS
+)
+
+SCHEDULER_SETTING = Gauge(
+    "mlservice_scheduler_setting",
+    "Current scheduler settings per model (max_batch_size, batch_wait_ms, concurrency), as tuned by the SLO controller",
+    ["model", "setting"],
+    multiprocess_mode="liveall"
+)
+
+MODEL_LATENCY_P95 = Gauge(
+    "mlservice_model_latency_p95_seconds",
+    "p95 latency (queue wait plus model time) the SLO controller last observed per model",
+    ["model"],
+    multiprocess_mode="liveall"
+)
+
+BREAKER_OPEN = Gauge(
+    "mlservice_hf_breaker_open",
+    "1 while the Hugging Face API circuit for a model is open",
+    ["model"],
+    multiprocess_mode="max"
+)
+
+# Callbacks that refresh gauges right before a scrape
+_scrape_hooks: Dict[str, Callable[[], None]] = {}
+
+
+@contextmanager
+def stage_timer(stage: str, model: str = "", backend: str = ""):
+    """
+    Time one stage of a request:
+
+        with stage_timer("inference", model=name, backend=LOCAL):
+            outputs = pipeline(texts)
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(stage=stage, model=model, backend=backend).observe(
+            time.perf_counter() - started
+        )
+
+
+def record_cache(namespace: str, hit: bool):
+    """Count a cache lookup for the hit ratio"""
+    CACHE_REQUESTS.labels(namespace=namespace, result="hit" if hit else "miss").inc()
+
+
+def record_batch(model: str, backend: str, size: int):
+    BATCH_SIZE.labels(model=model, backend=backend).observe(size)
+
+
+def record_cascade(model: str, stage: str, count: int):
+    if count:
+        CASCADE_DECISIONS.labels(model=model, stage=stage).inc(count)
+
+
+def register_scrape_hook(name: str, hook: Callable[[], None]):
+    """Run `hook` before every scrape (e.g. to set queue depth gauges)"""
+    _scrape_hooks[name] = hook
+
+
+def render_metrics() -> tuple:
+    """Return (body, content_type) for the /metrics endpoint"""
+    for name, hook in list(_scrape_hooks.items()):
+        try:
+            hook()
+        except Exception as e:
+            logger.warning(f"Metrics hook {name} failed: {e}")
+
+    # With several uvicorn workers, PROMETHEUS_MULTIPROC_DIR makes every
+    # worker write its samples to shared files that are merged here
+    multiproc_dir: Optional[str] = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if multiproc_dir:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+
+    from prometheus_client import REGISTRY
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
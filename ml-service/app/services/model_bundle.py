@@ -0,0 +1,127 @@
+import os
+import json
+import hashlib
+import logging
+from pathlib import Path
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_MANIFEST = "bundle.json"
+BUNDLE_FORMAT = 1
+
+# How much of a bundle is checked before loading it
+VERIFY_OFF = "off"
+VERIFY_SIZE = "size"
+VERIFY_SHA256 = "sha256"
+
+
+class BundleError(Exception):
+    """Raised when a model bundle is missing, stale or corrupt"""
+
+
+def bundle_root() -> Path:
+    """MODEL_BUNDLE_DIR (default: <MODEL_CACHE_DIR>/bundles)"""
+    default = os.path.join(os.getenv('MODEL_CACHE_DIR', './models'), 'bundles')
+    return Path(os.getenv('MODEL_BUNDLE_DIR', default))
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(8 * 1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelBundle:
+    """
+    A converted model written by scripts/convert_models.py: safetensors
+    weights, config, tokenizer/image processor files, an optional ONNX graph
+    and bundle.json with the size and sha256 of every file.
+
+    Loading from a bundle is a plain local from_pretrained (no hub cache
+    resolution, no pickle deserialisation, never any network access).
+    """
+
+    def __init__(self, key: str, path: Path, manifest: dict):
+        self.key = key
+        self.path = path
+        self.manifest = manifest
+
+    @classmethod
+    def find(cls, key: str) -> Optional["ModelBundle"]:
+        path = bundle_root() / key
+        manifest_path = path / BUNDLE_MANIFEST
+        if not manifest_path.exists():
+            return None
+
+        try:
+            manifest = json.loads(manifest_path.read_text())
+        except (OSError, ValueError) as e:
+            raise BundleError(f"Unreadable bundle manifest {manifest_path}: {e}")
+
+        if manifest.get('format') != BUNDLE_FORMAT:
+            raise BundleError(f"Bundle {path} has format {manifest.get('format')}, expected {BUNDLE_FORMAT}")
+        return cls(key, path, manifest)
+
+    @property
+    def model_name(self) -> str:
+        return self.manifest.get('model_name', '')
+
+    @property
+    def fingerprint(self) -> str:
+        """Short digest of the bundled files (from the manifest, nothing is read)"""
+        files = json.dumps(self.manifest.get('files', {}), sort_keys=True)
+        return hashlib.sha256(files.encode()).hexdigest()[:16]
+
+    @property
+    def onnx_path(self) -> Optional[Path]:
+        name = self.manifest.get('onnx')
+        return self.path / name if name else None
+
+    def file_path(self, name: str) -> Optional[Path]:
+        """Path of a bundled file, None if the bundle does not have it"""
+        return self.path / name if name in self.manifest.get('files', {}) else None
+
+    def verify(self, mode: str = VERIFY_SIZE):
+        """Check bundled files against the manifest (size only by default, sha256 on request)"""
+        if mode == VERIFY_OFF:
+            return
+
+        for name, expected in self.manifest.get('files', {}).items():
+            path = self.path / name
+            if not path.exists():
+                raise BundleError(f"Bundle {self.key} is missing {name}")
+            if path.stat().st_size != expected['size']:
+                raise BundleError(f"Bundle {self.key}: {name} has the wrong size")
+            if mode == VERIFY_SHA256 and file_sha256(path) != expected['sha256']:
+                raise BundleError(f"Bundle {self.key}: {name} does not match its sha256")
+
+
+def model_source(key: str, model_name: str) -> Tuple[str, Optional[ModelBundle]]:
+    """
+    Where to load a local model from: its bundle directory when a bundle for
+    the same model exists, otherwise the hub id (transformers cache/network).
+
+    MODEL_BUNDLE_REQUIRED=true turns a missing or invalid bundle into an error
+    instead of a hub fallback, so a node never downloads at boot.
+    """
+    required = os.getenv('MODEL_BUNDLE_REQUIRED', 'false').lower() == 'true'
+    verify_mode = os.getenv('MODEL_BUNDLE_VERIFY', VERIFY_SIZE).lower()
+
+    try:
+        bundle = ModelBundle.find(key)
+        if bundle is None:
+            raise BundleError(f"No bundle for {key} in {bundle_root()}")
+        if bundle.model_name != model_name:
+            raise BundleError(f"Bundle {key} holds {bundle.model_name}, configured model is {model_name}")
+        bundle.verify(verify_mode)
+    except BundleError as e:
+        if required:
+            raise
+        logger.info(f"{e}; loading {model_name} through the Hugging Face cache")
+        return model_name, None
+
+    logger.info(f"📦 Loading {key} from bundle {bundle.path}")
+    return str(bundle.path), bundle
@@ -1,24 +1,92 @@
 import os
-import torch
-from transformers import (
-    AutoTokenizer,
-    AutoModelForSequenceClassification,
-    AutoModelForSeq2SeqLM,
-    pipeline
-)
-from PIL import Image
-import redis
+import json
+import hashlib
 import logging
-import requests
-from typing import Optional
+import threading
+import contextvars
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+from app.services.cascade import MODEL_STAGE, NGRAM_STAGE, NgramSentimentClassifier, SentimentCascade, cascade_model_path
+from app.services.cpu_threads import CpuPlan
+from app.services.deadline import DeadlineExceeded, check_deadline, generation_stopping_criteria, remaining_budget
+from app.services.hf_client import HFClient
+from app.services.metrics import HF_API, LOCAL, record_batch, record_cascade, stage_timer
+from app.services.model_bundle import BundleError, ModelBundle, model_source
+from app.services.model_registry import (
+    API, IMAGE_CLASSIFICATION, LOCAL as LOCAL_BACKEND, ONNX, SENTIMENT, TASKS, TEXT_GENERATION, ModelRegistry,
+    ModelVariant
+)
+from app.services.profiling import run_profiled, torch_trace
+from app.services.scheduler import ModelScheduler, scheduler_enabled
+from app.services.slo_controller import slo_controller
+from app.services.tokenization import EncodedText, SentimentTokenizer, plan_batches
 
 logger = logging.getLogger(__name__)
 
+# Twitter RoBERTa model returns: 'LABEL_0': Negative, 'LABEL_1': Neutral, 'LABEL_2': Positive
+SENTIMENT_LABEL_MAP = {
+    'LABEL_0': 'NEGATIVE',
+    'LABEL_1': 'NEUTRAL',
+    'LABEL_2': 'POSITIVE',
+    'POSITIVE': 'POSITIVE',
+    'NEGATIVE': 'NEGATIVE',
+    'NEUTRAL': 'NEUTRAL'
+}
+
+def normalize_sentiment_label(label: str) -> str:
+    """Map a raw model label onto POSITIVE / NEGATIVE / NEUTRAL"""
+    return SENTIMENT_LABEL_MAP.get(str(label).upper(), 'NEUTRAL')
+
+# torch, transformers, PIL and redis are imported by the code paths that use
+# them, so API mode starts without loading torch at all
+
+# Variant being hot-swapped in and its models, visible only to the swap's own loading and warm-up
+_staged: contextvars.ContextVar[Optional["StagedVariant"]] = contextvars.ContextVar("staged_variant", default=None)
+
+
+class StagedVariant:
+    """A new version of a variant, loaded next to the one serving traffic until it is installed"""
+
+    def __init__(self, variant: ModelVariant):
+        self.variant = variant
+        self.models: Dict[str, object] = {}
+
+    def covers(self, key: str) -> bool:
+        return key == self.variant.key
+
+
+def _model_keys(variant: ModelVariant) -> List[str]:
+    """Keys of everything ModelLoader holds for a variant"""
+    return [variant.key, f"{variant.key}:tokenizer", f"{variant.key}:cascade"]
+
+def _hub_options(variant: ModelVariant, bundle) -> dict:
+    """from_pretrained options for loading a variant's model from its source"""
+    return {'revision': variant.revision} if variant.revision and bundle is None else {}
+
+def _pipeline_device(device: str = "auto") -> int:
+    if device == "cpu":
+        return -1
+    if device == "cuda":
+        return 0
+    import torch
+    return 0 if torch.cuda.is_available() else -1
+
 class ModelLoader:
     """Singleton class to load and manage ML models"""
 
     _instance = None
     _models = {}
+    _registry = None
+    _hf_client = None
+    _cpu_plan = None
+    _torch_configured = False
+    _load_lock = threading.Lock()
+    _fallback_lock = threading.Lock()
+    _fallback_failed = set()
+    _schedulers = {}
+    _scheduler_lock = threading.Lock()
+    _versions = {}
 
     def __new__(cls):
         if cls._instance is None:
@@ -28,6 +96,8 @@ class ModelLoader:
     @property
     def use_hf_api(self) -> bool:
         """Check if we should use Hugging Face API"""
+        if os.getenv('FORCE_LOCAL_MODELS', '').lower() in ('1', 'true', 'yes'):
+            return False
         return bool(os.getenv('HUGGINGFACE_API_TOKEN') or os.getenv('HF_TOKEN'))
 
     @property
@@ -35,32 +105,182 @@ class ModelLoader:
         """Get Hugging Face API token"""
         return os.getenv('HUGGINGFACE_API_TOKEN') or os.getenv('HF_TOKEN')
 
-    def call_hf_api(self, model_name: str, inputs: dict):
-        """Call Hugging Face API with conditional URL routing"""
-        if not self.use_hf_api:
-            raise ValueError("Hugging Face API token not configured")
+    @property
+    def local_fallback_mode(self) -> str:
+        """HF_LOCAL_FALLBACK: off, lazy (load local models when a breaker opens) or preload"""
+        value = os.getenv('HF_LOCAL_FALLBACK', 'off').lower()
+        if value in ('1', 'true', 'yes'):
+            return 'lazy'
+        return value if value in ('lazy', 'preload') else 'off'
+
+    @classmethod
+    def get_hf_client(cls) -> HFClient:
+        """Shared Hugging Face API client (circuit breakers live here)"""
+        if cls._hf_client is None:
+            cls._hf_client = HFClient()
+        return cls._hf_client
+
+    @classmethod
+    def registry(cls) -> ModelRegistry:
+        """Model variants per task (config/models.yaml), loaded on first use"""
+        if cls._registry is None:
+            cls._registry = ModelRegistry.load()
+        return cls._registry
+
+    @classmethod
+    def cpu_plan(cls) -> CpuPlan:
+        """This worker's thread counts and cores (CPU_THREADS, CPU_AFFINITY), applied on first use"""
+        if cls._cpu_plan is None:
+            plan = CpuPlan.from_env()
+            plan.apply()
+            cls._cpu_plan = plan
+        return cls._cpu_plan
+
+    @classmethod
+    def variant(cls, task: str, name: Optional[str] = None) -> ModelVariant:
+        """The requested variant of a task (its default when name is None); raises UnknownModelError"""
+        variant = cls.registry().get(task, name)
+        staged = _staged.get()
+        return staged.variant if staged is not None and staged.covers(variant.key) else variant
+
+    @classmethod
+    def _store(cls, variant: ModelVariant) -> dict:
+        """Where the variant's models live: the serving set, or the staged one during a hot swap"""
+        staged = _staged.get()
+        return staged.models if staged is not None and staged.covers(variant.key) else cls._instance._models
+
+    @classmethod
+    def model_version(cls, variant: ModelVariant) -> str:
+        """
+        Short fingerprint of what answers for a variant: backend, model id
+        (and revision or bundle contents) and the settings that change its
+        results. Cache namespaces include it, so a different model or mode
+        never serves results cached for another.
+        """
+        if cls._instance is None:
+            cls._instance = cls()
+        # An API variant served by its local fallback (circuit open) answers with the local model
+        api = variant.uses_api(cls._instance.use_hf_api) and not cls.serving_fallback(variant)
+
+        staged = _staged.get()
+        cacheable = staged is None or not staged.covers(variant.key)
+        if cacheable and (variant.key, api) in cls._versions:
+            return cls._versions[(variant.key, api)]
+
+        if api:
+            identity = {"backend": API, "model": variant.api_model_name}
+        else:
+            identity = {
+                "backend": ONNX if variant.backend == ONNX else LOCAL_BACKEND,
+                "model": variant.model,
+                "revision": variant.revision,
+                "bundle": cls._bundle_fingerprint(variant)
+            }
+        if variant.task == SENTIMENT:
+            identity.update(max_tokens=variant.max_tokens, cascade_model=variant.cascade_model,
+                            cascade_threshold=variant.cascade_threshold if variant.cascade_model else None)
+
+        version = hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()[:10]
+        if cacheable:
+            cls._versions[(variant.key, api)] = version
+        return version
+
+    @classmethod
+    def _bundle_fingerprint(cls, variant: ModelVariant) -> Optional[str]:
+        try:
+            bundle = ModelBundle.find(variant.bundle_name)
+        except BundleError:
+            return None
+        if bundle is None or bundle.model_name != variant.model:
+            return None
+        return bundle.fingerprint
+
+    @classmethod
+    @contextmanager
+    def staging(cls, variant: ModelVariant):
+        """
+        Load and run a new version of `variant` without touching the one
+        serving traffic: within this context (and the threads it starts)
+        the variant resolves to the new version, its models load into a
+        separate set and model calls bypass the scheduler. Install the
+        set with install_variant() afterwards.
+        """
+        if cls._instance is None:
+            cls.initialize_models()
+        staged = StagedVariant(variant)
+        token = _staged.set(staged)
+        try:
+            yield staged
+        finally:
+            _staged.reset(token)
+
+    @classmethod
+    def prepare_variant(cls, variant: ModelVariant):
+        """Load everything a variant serves with (inside staging(), the new version's models)"""
+        instance = cls._instance
+        if not variant.uses_api(instance.use_hf_api) or instance.local_fallback_mode == 'preload':
+            cls.load_local_model(variant)
+        if variant.task == SENTIMENT:
+            cls.get_sentiment_tokenizer(variant.name)
+            cls.get_cascade(variant)
 
-        headers = {
+    @classmethod
+    def install_variant(cls, staged: StagedVariant) -> List[object]:
+        """
+        Make a staged version the one serving its variant and return the
+        models it replaced. Requests already holding the old models finish
+        with them; later ones get the new ones.
+        """
+        variant = staged.variant
+        instance = cls._instance
+        replaced = []
+        with cls._load_lock:
+            # Models before the registry entry: a request that resolved the old entry just
+            # before may run the new model, but never the reverse (old results under the new version)
+            for key in _model_keys(variant):
+                old = instance._models.get(key)
+                if key in staged.models:
+                    instance._models[key] = staged.models[key]
+                else:
+                    instance._models.pop(key, None)
+                if old is not None:
+                    replaced.append(old)
+            cls.registry().replace(variant)
+            for api in (True, False):
+                cls._versions.pop((variant.key, api), None)
+            cls._fallback_failed.discard(variant.key)
+        return replaced
+
+    def _hf_headers(self) -> dict:
+        return {
             "Authorization": f"Bearer {self.hf_token}",
             "Content-Type": "application/json"
         }
 
-        # Use router URL for sentiment and image analysis models
-        # Use inference API URL for text generation models
-        if any(model in model_name.lower() for model in ['sentiment', 'roberta', 'resnet', 'image']):
-            api_url = f"https://router.huggingface.co/hf-inference/models/{model_name}"
-            timeout = 30
+    def call_hf_api(self, variant: ModelVariant, inputs: dict):
+        """Call the Hugging Face API for a variant, routed by its task"""
+        if not self.hf_token:
+            raise ValueError("Hugging Face API token not configured")
+
+        check_deadline("hf_api")
+        client = ModelLoader.get_hf_client()
+        model_name = variant.api_model_name
+
+        if variant.task == TEXT_GENERATION:
+            # Text generation goes through the router chat completions API
+            api_url = client.chat_completions_url()
+            timeout = remaining_budget(float(os.getenv('HF_GENERATION_TIMEOUT', 60)))
+            hedge = False
         else:
-            # Text generation models use inference API
-            # api_url = f"https://api-inference.huggingface.co/models/{model_name}"
-            api_url = "https://router.huggingface.co/v1/chat/completions"
-            timeout = 60
+            api_url = client.inference_url(model_name)
+            timeout = remaining_budget(float(os.getenv('HF_INFERENCE_TIMEOUT', 30)))
+            # Classification is idempotent and cheap, so it may be hedged
+            hedge = True
 
         try:
-            response = requests.post(api_url, headers=headers, json=inputs, timeout=timeout)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
+            with stage_timer("hf_api", model=model_name, backend=HF_API):
+                return client.post(model_name, api_url, inputs, self._hf_headers(), timeout, hedge=hedge)
+        except Exception as e:
             logger.error(f"Hugging Face API call failed: {e}")
             raise
 
@@ -73,53 +293,36 @@ class ModelLoader:
         instance = cls._instance
 
         try:
+            # Before any model starts its thread pools
+            cls.cpu_plan()
+
+            registry = cls.registry()
+            defaults = [registry.default(task) for task in TASKS]
+
             # Check if using Hugging Face API
             if instance.use_hf_api:
                 logger.info("🤖 Using Hugging Face API (no local downloads needed)")
                 logger.info(f"Token configured: {'✅' if instance.hf_token else '❌'}")
-
-                # Create API wrappers instead of loading local models
-                instance._models['sentiment_api'] = {
-                    'model': 'cardiffnlp/twitter-roberta-base-sentiment-latest'
-                }
-                instance._models['text_generation_api'] = {
-                    # 'model': 'katanemo/Arch-Router-1.5B'
-                    'model': 'openai/gpt-oss-120b:fastest'
-                }
-                instance._models['image_classification_api'] = {
-                    'model': 'microsoft/resnet-50'
-                }
-
-                logger.info("✅ Hugging Face API configuration loaded!")
             else:
                 logger.info("📁 Using local models (download required)")
 
-                # Initialize sentiment analysis model locally
-                logger.info("Loading sentiment analysis model...")
-                instance._models['sentiment'] = pipeline(
-                    "sentiment-analysis",
-                    model="cardiffnlp/twitter-roberta-base-sentiment-latest",
-                    device=0 if torch.cuda.is_available() else -1
-                )
-
-                # Initialize text generation model locally
-                logger.info("Loading text generation model...")
-                model_name = "google/flan-t5-small"  # Smaller for local use
-                instance._models['text_tokenizer'] = AutoTokenizer.from_pretrained(model_name)
-                instance._models['text_generator'] = AutoModelForSeq2SeqLM.from_pretrained(model_name)
-
-                # Initialize image classification model locally
-                logger.info("Loading image classification model...")
-                instance._models['image_classifier'] = pipeline(
-                    "image-classification",
-                    model="microsoft/resnet-50",
-                    device=0 if torch.cuda.is_available() else -1
-                )
+            # Default variants served locally are loaded now, other variants on first request
+            for variant in defaults:
+                if not variant.uses_api(instance.use_hf_api):
+                    cls.load_local_model(variant)
+                elif instance.local_fallback_mode == 'preload':
+                    logger.info(f"📁 Preloading local fallback for {variant.key}...")
+                    cls.load_local_model(variant)
 
-                logger.info("✅ Local models loaded successfully!")
+            logger.info("✅ Models ready: " + ", ".join(
+                f"{variant.task}={variant.name} ({variant.describe(instance.use_hf_api)['backend']})"
+                for variant in defaults
+            ))
 
             # Initialize Redis client for caching
             logger.info("Connecting to Redis...")
+            import redis
+
             try:
                 instance._models['redis'] = redis.Redis(
                     host=os.getenv('REDIS_HOST', 'localhost'),
@@ -128,11 +331,19 @@ class ModelLoader:
                     decode_responses=True
                 )
                 # Test Redis connection
-                instance._models['redis'].ping()
+                with stage_timer("redis_connect", backend="redis"):
+                    instance._models['redis'].ping()
+                # Cached values are binary (see cache_codec)
+                instance._models['redis_binary'] = redis.Redis(
+                    host=os.getenv('REDIS_HOST', 'localhost'),
+                    port=int(os.getenv('REDIS_PORT', 6379)),
+                    db=0
+                )
                 logger.info("✅ Redis connected successfully!")
             except redis.ConnectionError:
                 logger.warning("⚠️  Redis connection failed, caching disabled")
                 instance._models['redis'] = None
+                instance._models['redis_binary'] = None
 
             logger.info("🎉 Model initialization complete!")
 
@@ -140,6 +351,184 @@ class ModelLoader:
             logger.error(f"❌ Error loading models: {e}")
             raise
 
+    @classmethod
+    def load_sentiment_model(cls, model: Optional[str] = None):
+        """Load only a sentiment backend (used by bulk workers that need nothing else)"""
+        if cls._instance is None:
+            cls._instance = cls()
+
+        variant = cls.variant(SENTIMENT, model)
+        if not variant.uses_api(cls._instance.use_hf_api):
+            cls.load_local_model(variant)
+
+    @classmethod
+    def load_local_model(cls, variant: ModelVariant):
+        """The local model of a variant, loaded once on first use"""
+        if cls._instance is None:
+            cls._instance = cls()
+
+        models = cls._store(variant)
+        model = models.get(variant.key)
+        if model is not None:
+            return model
+
+        loader = {
+            SENTIMENT: cls._load_local_sentiment,
+            TEXT_GENERATION: cls._load_local_text_generator,
+            IMAGE_CLASSIFICATION: cls._load_local_image_classifier,
+        }[variant.task]
+
+        # A staged set is private to its swap, which must not hold up lazy loads of live models
+        with cls._load_lock if models is cls._instance._models else nullcontext():
+            if models.get(variant.key) is None:
+                plan = cls.cpu_plan()
+                if variant.backend != ONNX and not cls._torch_configured:
+                    plan.configure_torch()
+                    cls._torch_configured = True
+                logger.info(f"Loading {variant.key} ({variant.model})...")
+                models[variant.key] = loader(variant)
+        return models[variant.key]
+
+    @classmethod
+    def _load_local_sentiment(cls, variant: ModelVariant):
+        if variant.backend == ONNX:
+            from app.services.onnx_classifier import OnnxTextClassifier
+
+            _, bundle = model_source(variant.bundle_name, variant.model)
+            if bundle is None:
+                raise ValueError(
+                    f"{variant.key} runs on onnxruntime and needs a converted bundle "
+                    f"(scripts/convert_models.py {variant.bundle_name} --onnx)"
+                )
+            plan = cls.cpu_plan()
+            return OnnxTextClassifier(bundle, threads=variant.threads or plan.intra_op_threads,
+                                      inter_op_threads=plan.inter_op_threads, max_length=variant.max_tokens)
+
+        from transformers import pipeline
+
+        source, bundle = model_source(variant.bundle_name, variant.model)
+        return pipeline(
+            "sentiment-analysis",
+            model=source,
+            device=_pipeline_device(variant.device),
+            **_hub_options(variant, bundle)
+        )
+
+    @classmethod
+    def _load_local_text_generator(cls, variant: ModelVariant):
+        from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+
+        source, bundle = model_source(variant.bundle_name, variant.model)
+        offline = {'local_files_only': True} if bundle else _hub_options(variant, bundle)
+        return {
+            'tokenizer': AutoTokenizer.from_pretrained(source, **offline),
+            'model': AutoModelForSeq2SeqLM.from_pretrained(source, **offline)
+        }
+
+    @classmethod
+    def _load_local_image_classifier(cls, variant: ModelVariant):
+        from transformers import pipeline
+
+        source, bundle = model_source(variant.bundle_name, variant.model)
+        return pipeline(
+            "image-classification",
+            model=source,
+            device=_pipeline_device(variant.device),
+            **_hub_options(variant, bundle)
+        )
+
+    @classmethod
+    def use_api_for(cls, variant: ModelVariant) -> bool:
+        """
+        Whether a variant should go to the Hugging Face API right now.
+
+        False for local variants, and also for API variants while their
+        circuit breaker is open and HF_LOCAL_FALLBACK allows serving them
+        from the local model instead.
+        """
+        instance = cls._instance
+        if not variant.uses_api(instance.use_hf_api):
+            return False
+
+        if instance.local_fallback_mode == 'off':
+            return True
+
+        if not cls.get_hf_client().breaker(variant.api_model_name).rejecting:
+            return True
+
+        with cls._fallback_lock:
+            if variant.key in cls._fallback_failed:
+                return True
+            try:
+                cls.load_local_model(variant)
+            except Exception as e:
+                logger.error(f"❌ Local fallback for {variant.key} unavailable: {e}")
+                cls._fallback_failed.add(variant.key)
+                return True
+
+        logger.debug(f"{variant.key} circuit open, serving from local model")
+        return False
+
+    @classmethod
+    def serving_fallback(cls, variant: ModelVariant) -> bool:
+        """Whether an API variant's requests go to its local model right now (see use_api_for)"""
+        instance = cls._instance
+        if instance is None or not variant.uses_api(instance.use_hf_api) or instance.local_fallback_mode == 'off':
+            return False
+        if variant.key in cls._fallback_failed:
+            return False
+        return cls.get_hf_client().breaker(variant.api_model_name).rejecting
+
+    @classmethod
+    def scheduler(cls, variant: ModelVariant) -> Optional[ModelScheduler]:
+        """Priority scheduler in front of a variant's model, created on first use (None when disabled)"""
+        if not scheduler_enabled():
+            return None
+        staged = _staged.get()
+        if staged is not None and staged.covers(variant.key):
+            # A version being swapped in runs its warm-up inline, never batched with live traffic
+            return None
+        if variant.key in cls._schedulers:
+            return cls._schedulers[variant.key]
+
+        uses_api = variant.uses_api(cls._instance.use_hf_api)
+        concurrency = variant.concurrency or int(
+            os.getenv('SCHEDULER_API_CONCURRENCY', 8) if uses_api else os.getenv('SCHEDULER_CONCURRENCY', 2)
+        )
+        if variant.task == SENTIMENT:
+            tokenizer = cls.get_sentiment_tokenizer(variant.name)
+            batch_wait_ms = variant.batch_wait_ms
+            if batch_wait_ms is None:
+                batch_wait_ms = float(os.getenv('SCHEDULER_BATCH_WAIT_MS', 5))
+            scheduler = ModelScheduler(
+                variant.key,
+                # Resolved per batch, so a hot-swapped variant takes effect
+                run_batch=lambda texts, name=variant.name: cls._run_sentiment_model(texts, cls.variant(SENTIMENT, name)),
+                max_batch_size=variant.batch_size,
+                max_batch_cost=variant.max_batch_tokens if tokenizer else None,
+                batch_wait=batch_wait_ms / 1000.0,
+                concurrency=concurrency
+            )
+        else:
+            # Generation and image classification run one input at a time
+            scheduler = ModelScheduler(variant.key, concurrency=concurrency)
+
+        with cls._scheduler_lock:
+            if variant.key not in cls._schedulers:
+                cls._schedulers[variant.key] = scheduler
+                slo_controller.watch(scheduler, variant.p95_target_ms)
+            return cls._schedulers[variant.key]
+
+    @classmethod
+    def schedulers(cls) -> dict:
+        return dict(cls._schedulers)
+
+    @classmethod
+    def _run_scheduled(cls, variant: ModelVariant, fn):
+        """Run one model call through the variant's scheduler (inline when scheduling is disabled)"""
+        scheduler = cls.scheduler(variant)
+        return scheduler.call(fn) if scheduler is not None else run_profiled(fn)
+
     @classmethod
     def get_model(cls, model_name: str):
         """Get a loaded model by name"""
@@ -154,76 +543,298 @@ class ModelLoader:
         return cls.get_model('redis')
 
     @classmethod
-    def analyze_sentiment(cls, text: str):
-        """Analyze sentiment using either local model or Hugging Face API"""
+    def get_redis_binary_client(cls):
+        """Redis client that returns bytes (for encoded cache values)"""
+        return cls.get_model('redis_binary')
+
+    @classmethod
+    def _bundle_file(cls, variant: ModelVariant, name: str) -> Optional[str]:
+        """Path of a file in the variant's converted bundle, if there is one for its model"""
+        try:
+            bundle = ModelBundle.find(variant.bundle_name)
+        except BundleError as e:
+            logger.warning(f"⚠️  {e}")
+            return None
+        if bundle is None or bundle.model_name != variant.model:
+            return None
+        path = bundle.file_path(name)
+        return str(path) if path else None
+
+    @classmethod
+    def get_sentiment_tokenizer(cls, model: Optional[str] = None) -> Optional[SentimentTokenizer]:
+        """Tokenization stage for a sentiment variant's inputs (loaded on first use)"""
         if cls._instance is None:
             cls.initialize_models()
 
         instance = cls._instance
+        variant = cls.variant(SENTIMENT, model)
+        models = cls._store(variant)
+        key = f"{variant.key}:tokenizer"
+
+        if key not in models:
+            # Fall back to a copy of the local pipeline's fast tokenizer if
+            # tokenizer.json has not been downloaded
+            fallback = None
+            if variant.uses_api(instance.use_hf_api):
+                sentiment_model = models.get(variant.key)
+            else:
+                sentiment_model = cls.load_local_model(variant)
+            pipeline_tokenizer = getattr(sentiment_model, 'tokenizer', None)
+            if getattr(pipeline_tokenizer, 'is_fast', False):
+                from tokenizers import Tokenizer
+                fallback = Tokenizer.from_str(pipeline_tokenizer.backend_tokenizer.to_str())
+
+            bundled = cls._bundle_file(variant, 'tokenizer.json')
+            if variant.primary:
+                tokenizer = SentimentTokenizer.from_env(fallback, default_path=bundled, max_tokens=variant.max_tokens)
+            else:
+                path = bundled or os.path.join(os.getenv('MODEL_CACHE_DIR', './models'), variant.bundle_name, 'tokenizer.json')
+                tokenizer = SentimentTokenizer.load(
+                    path, fallback, max_tokens=variant.max_tokens,
+                    head_tokens=int(os.getenv('SENTIMENT_HEAD_TOKENS', 128))
+                )
+            models[key] = tokenizer
 
-        if instance.use_hf_api:
-            # Use Hugging Face API
+        return models[key]
+
+    @classmethod
+    def get_cascade(cls, variant: ModelVariant) -> Optional[SentimentCascade]:
+        """The variant's cheap first stage, if it has one (loaded on first use)"""
+        if not variant.cascade_model:
+            return None
+
+        models = cls._store(variant)
+        key = f"{variant.key}:cascade"
+        if key not in models:
+            path = cascade_model_path(variant.cascade_model)
             try:
-                api_config = instance._models.get('sentiment_api')
-                if not api_config:
-                    raise ValueError("Sentiment API not configured")
+                classifier = NgramSentimentClassifier.load(path)
+                logger.info(f"Loaded cascade first stage for {variant.key} from {path} (threshold {variant.cascade_threshold})")
+                models[key] = SentimentCascade(classifier, variant.cascade_threshold)
+            except (OSError, KeyError, ValueError) as e:
+                logger.warning(f"⚠️  Cascade model for {variant.key} unavailable ({e}), every input goes to {variant.model}")
+                models[key] = None
 
-                response = instance.call_hf_api(
-                    api_config['model'],
-                    {"inputs": text}
-                )
+        return models[key]
 
-                # Format API response to match expected structure
-                if isinstance(response, list) and len(response) > 0:
-                    # Handle nested list structure: [[{'label': 'positive', 'score': 0.97}, ...]]
-                    if len(response) == 1 and isinstance(response[0], list):
-                        predictions = response[0]
-                    else:
-                        predictions = response
-
-                    # Take the highest scoring prediction
-                    # API returns: [{'label': 'positive', 'score': 0.97}, {'label': 'neutral', 'score': 0.02}, ...]
-                    best_prediction = max(predictions, key=lambda x: x.get('score', 0.0))
-                    return [{
-                        'label': best_prediction.get('label', 'NEUTRAL'),
-                        'score': best_prediction.get('score', 0.0)
-                    }]
-                else:
-                    return [{'label': 'NEUTRAL', 'score': 0.0}]
-            except Exception as e:
-                logger.error(f"Hugging Face API sentiment analysis failed: {e}")
-                # Fallback to neutral
-                return [{'label': 'NEUTRAL', 'score': 0.0}]
-        else:
-            # Use local model
-            sentiment_model = cls.get_model('sentiment')
-            if sentiment_model:
-                return sentiment_model(text)
+    @classmethod
+    def encode_sentiment_inputs(cls, texts: List[str], model: Optional[str] = None) -> List[EncodedText]:
+        """Count tokens and truncate texts to the sentiment model window"""
+        tokenizer = cls.get_sentiment_tokenizer(model)
+        if tokenizer is None:
+            return [EncodedText(text, None, False) for text in texts]
+        with stage_timer("tokenize", model=cls.variant(SENTIMENT, model).model):
+            return tokenizer.encode(texts)
+
+    @classmethod
+    def _pipeline_truncation(cls, variant: ModelVariant) -> dict:
+        """Safety net so the local pipeline never sees more than the model window"""
+        tokenizer = cls.get_sentiment_tokenizer(variant.name)
+        return {'truncation': True, 'max_length': tokenizer.max_tokens if tokenizer else variant.max_tokens}
+
+    @classmethod
+    def analyze_sentiment(cls, text: str, model: Optional[str] = None):
+        """Analyze sentiment using either local model or Hugging Face API"""
+        if cls._instance is None:
+            cls.initialize_models()
+
+        variant = cls.variant(SENTIMENT, model)
+        encoded = cls.encode_sentiment_inputs([text], variant.name)[0]
+        token_info = {'token_count': encoded.token_count, 'truncated': encoded.truncated}
+
+        cascade = cls.get_cascade(variant)
+        if cascade is not None:
+            # The n-gram stage sees the whole text, it has no window
+            with stage_timer("cascade", model=variant.model, backend=LOCAL):
+                answer = cascade.answer([text])[0]
+            if answer is not None:
+                record_cascade(variant.model, NGRAM_STAGE, 1)
+                return [{**answer, **token_info, 'stage': NGRAM_STAGE}]
+            record_cascade(variant.model, MODEL_STAGE, 1)
+
+        check_deadline("inference")
+        token_info['stage'] = MODEL_STAGE
+
+        lengths = [encoded.token_count] if encoded.token_count is not None else None
+        prediction = cls._predict_sentiment_or_neutral([encoded.text], variant, lengths)[0]
+        return [{**prediction, **token_info}]
+
+    @classmethod
+    def _predict_sentiment_or_neutral(cls, texts: List[str], variant: ModelVariant,
+                                      lengths: Optional[List[int]]) -> List[dict]:
+        """
+        _predict_sentiment_batch, falling back to NEUTRAL when the Hugging Face
+        API fails. A failed batch is retried text by text, so only the texts
+        the API still cannot score come back NEUTRAL (with 'fallback': True,
+        which callers do not cache). Local models still raise.
+        """
+        api = cls.use_api_for(variant)
+        try:
+            return cls._predict_sentiment_batch(texts, variant=variant, lengths=lengths)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            if not api:
+                raise
+            logger.error(f"Hugging Face API sentiment analysis failed for {len(texts)} text(s): {e}")
+
+        if len(texts) == 1:
+            return [{'label': 'NEUTRAL', 'score': 0.0, 'fallback': True}]
+        results = []
+        for position, text in enumerate(texts):
+            results.extend(cls._predict_sentiment_or_neutral(
+                [text], variant, lengths[position:position + 1] if lengths else None
+            ))
+        return results
+
+    @classmethod
+    def analyze_sentiment_batch(cls, texts: List[str], batch_size: int = None,
+                                model: Optional[str] = None, fallback_neutral: bool = False) -> List[dict]:
+        """
+        Analyze a list of texts, returning one {'label', 'score', 'token_count', 'truncated'} per text.
+
+        Texts are truncated to the model window and scored in length-bucketed
+        batches (limits from the variant's registry entry); results come back
+        in input order. For variants with a cascade, texts the n-gram stage is
+        confident about never reach the model; 'stage' says who answered.
+
+        With fallback_neutral, texts the Hugging Face API fails on come back
+        NEUTRAL as in analyze_sentiment instead of failing the whole call.
+        """
+        if cls._instance is None:
+            cls.initialize_models()
+
+        if not texts:
+            return []
+
+        variant = cls.variant(SENTIMENT, model)
+        scheduler = cls.scheduler(variant)
+        # The scheduler's batch size is the one the SLO controller is tuning
+        batch_size = batch_size or (scheduler.max_batch_size if scheduler else variant.batch_size)
+
+        encoded = cls.encode_sentiment_inputs(texts, variant.name)
+        tokenizer = cls.get_sentiment_tokenizer(variant.name)
+        lengths = [
+            min(item.token_count, tokenizer.budget) if item.token_count is not None else len(item.text)
+            for item in encoded
+        ]
+
+        results: List[dict] = [None] * len(texts)
+        pending = list(range(len(texts)))
+
+        cascade = cls.get_cascade(variant)
+        if cascade is not None:
+            with stage_timer("cascade", model=variant.model, backend=LOCAL):
+                answers = cascade.answer(texts)
+            pending = []
+            for index, answer in enumerate(answers):
+                if answer is None:
+                    pending.append(index)
+                    continue
+                results[index] = {
+                    **answer,
+                    'token_count': encoded[index].token_count,
+                    'truncated': encoded[index].truncated,
+                    'stage': NGRAM_STAGE
+                }
+            record_cascade(variant.model, NGRAM_STAGE, len(texts) - len(pending))
+            record_cascade(variant.model, MODEL_STAGE, len(pending))
+
+        pending_lengths = [lengths[index] for index in pending]
+        max_batch_tokens = variant.max_batch_tokens if tokenizer else float('inf')
+        for batch in plan_batches(pending_lengths, batch_size, max_batch_tokens):
+            batch = [pending[position] for position in batch]
+            batch_texts = [encoded[i].text for i in batch]
+            batch_lengths = [lengths[i] for i in batch] if tokenizer else None
+            if fallback_neutral:
+                predictions = cls._predict_sentiment_or_neutral(batch_texts, variant, batch_lengths)
             else:
-                raise ValueError("No sentiment model available")
+                predictions = cls._predict_sentiment_batch(batch_texts, variant=variant, lengths=batch_lengths)
+            for index, prediction in zip(batch, predictions):
+                results[index] = {
+                    **prediction,
+                    'token_count': encoded[index].token_count,
+                    'truncated': encoded[index].truncated,
+                    'stage': MODEL_STAGE
+                }
+
+        return results
 
     @classmethod
-    def generate_text(cls, prompt: str, max_length: int = 100):
+    def _predict_sentiment_batch(cls, texts: List[str], all_scores: bool = False,
+                                 variant: Optional[ModelVariant] = None,
+                                 lengths: Optional[List[int]] = None) -> List:
+        """
+        Score texts through the variant's scheduler, which may batch them
+        with other callers' texts (lengths: token counts, for its batch budget).
+
+        Returns the best {'label', 'score'} per text, or with all_scores=True
+        the full list of label scores per text.
+        """
+        variant = variant or cls.variant(SENTIMENT)
+
+        # Checked per batch, so a long batch job stops between batches once its caller is gone
+        check_deadline("inference")
+
+        scheduler = cls.scheduler(variant)
+        if scheduler is not None:
+            scores = scheduler.submit(texts, costs=lengths)
+        else:
+            scores = run_profiled(cls._run_sentiment_model, texts, variant)
+
+        if all_scores:
+            return scores
+        results = []
+        for predictions in scores:
+            best_prediction = max(predictions, key=lambda x: x.get('score', 0.0))
+            results.append({
+                'label': best_prediction.get('label', 'NEUTRAL'),
+                'score': best_prediction.get('score', 0.0)
+            })
+        return results
+
+    @classmethod
+    def _run_sentiment_model(cls, texts: List[str], variant: ModelVariant) -> List[List[dict]]:
+        """Run one batch through the API or the local pipeline, returning all label scores per text"""
+        instance = cls._instance
+
+        if cls.use_api_for(variant):
+            record_batch(variant.api_model_name, HF_API, len(texts))
+            response = instance.call_hf_api(variant, {"inputs": texts})
+
+            # API returns one list of label scores per input text
+            if not isinstance(response, list) or len(response) != len(texts):
+                raise ValueError(f"Unexpected batch response from Hugging Face API: {response}")
+            return [[predictions] if isinstance(predictions, dict) else predictions for predictions in response]
+        else:
+            sentiment_model = cls.load_local_model(variant)
+            record_batch(variant.model, LOCAL, len(texts))
+            with stage_timer("inference", model=variant.model, backend=LOCAL), torch_trace("sentiment"):
+                return sentiment_model(texts, batch_size=len(texts), top_k=None, **cls._pipeline_truncation(variant))
+
+    @classmethod
+    def analyze_sentiment_windows(cls, texts: List[str], model: Optional[str] = None) -> List[List[dict]]:
+        """Score texts that already fit the model window in one batch, returning all label scores"""
+        if cls._instance is None:
+            cls.initialize_models()
+
+        if not texts:
+            return []
+        return cls._predict_sentiment_batch(texts, all_scores=True, variant=cls.variant(SENTIMENT, model))
+
+    @classmethod
+    def generate_text(cls, prompt: str, max_length: int = 100, model: Optional[str] = None):
         """Generate text using either local model or Hugging Face API"""
         if cls._instance is None:
             cls.initialize_models()
 
         instance = cls._instance
+        variant = cls.variant(TEXT_GENERATION, model)
+        check_deadline("inference")
 
-        if instance.use_hf_api:
+        if cls.use_api_for(variant):
             # Use Hugging Face Router API (chat completions format)
             try:
-                api_config = instance._models.get('text_generation_api')
-                if not api_config:
-                    raise ValueError("Text generation API not configured")
-
-                # For text generation, use the router chat completions API
-                api_url = "https://router.huggingface.co/v1/chat/completions"
-                headers = {
-                    "Authorization": f"Bearer {instance.hf_token}",
-                    "Content-Type": "application/json"
-                }
-
                 payload = {
                     "messages": [
                         {
@@ -231,15 +842,13 @@ class ModelLoader:
                             "content": prompt
                         }
                     ],
-                    "model": api_config['model'],
+                    "model": variant.api_model_name,
                     "stream": False,
                     "max_tokens": max_length,
                     "temperature": 0.7
                 }
 
-                response = requests.post(api_url, headers=headers, json=payload, timeout=60)
-                response.raise_for_status()
-                result = response.json()
+                result = cls._run_scheduled(variant, lambda: instance.call_hf_api(variant, payload))
                 # print('result', result)
 
                 # Extract the generated content from chat completion response
@@ -306,7 +915,7 @@ class ModelLoader:
                             'generated_text': content.strip(),
                             'prompt_used': prompt,
                             'generation_params': {
-                                'model': api_config['model'],
+                                'model': variant.api_model_name,
                                 'max_tokens': max_length,
                                 'temperature': 0.7
                             },
@@ -329,6 +938,8 @@ class ModelLoader:
                         'cached': False
                     }
 
+            except DeadlineExceeded:
+                raise
             except Exception as e:
                 logger.error(f"Hugging Face API text generation failed: {e}")
                 return {
@@ -339,60 +950,70 @@ class ModelLoader:
                 }
         else:
             # Use local model
-            tokenizer = cls.get_model('text_tokenizer')
-            generator = cls.get_model('text_generator')
-            if tokenizer and generator:
-                inputs = tokenizer(prompt, return_tensors="pt")
-                outputs = generator.generate(
-                    inputs,
-                    max_length=max_length,
-                    num_return_sequences=1,
-                    temperature=0.7,
-                    do_sample=True,
-                    pad_token_id=tokenizer.eos_token_id
-                )
-                return tokenizer.decode(outputs[0], skip_special_tokens=True)
-            else:
-                return "Text generation not available locally. Configure HUGGINGFACE_API_TOKEN to use cloud API."
+            local = cls.load_local_model(variant)
+            tokenizer, generator = local['tokenizer'], local['model']
+            inputs = tokenizer(prompt, return_tensors="pt")
+
+            def generate():
+                with stage_timer("inference", model=variant.model, backend=LOCAL), torch_trace("text_generation"):
+                    return generator.generate(
+                        **inputs,
+                        max_length=max_length,
+                        num_return_sequences=1,
+                        temperature=0.7,
+                        do_sample=True,
+                        pad_token_id=tokenizer.eos_token_id,
+                        # Stop mid-generation once the caller is gone or out of time
+                        stopping_criteria=generation_stopping_criteria()
+                    )
+
+            outputs = cls._run_scheduled(variant, generate)
+            check_deadline("generation")
+            return tokenizer.decode(outputs[0], skip_special_tokens=True)
 
     @classmethod
-    def classify_image(cls, image_path: str):
+    def classify_image(cls, image_path: str, model: Optional[str] = None):
         """Classify image using either local model or Hugging Face API"""
         if cls._instance is None:
             cls.initialize_models()
 
         instance = cls._instance
+        variant = cls.variant(IMAGE_CLASSIFICATION, model)
+        check_deadline("inference")
 
-        if instance.use_hf_api:
+        if cls.use_api_for(variant):
             # Use Hugging Face API
             try:
-                api_config = instance._models.get('image_classification_api')
-                if not api_config:
-                    raise ValueError("Image classification API not configured")
-
                 # For API, we need to send image as base64
                 import base64
 
                 with open(image_path, "rb") as image_file:
                     image_data = base64.b64encode(image_file.read()).decode('utf-8')
 
-                response = instance.call_hf_api(
-                    api_config['model'],
+                response = cls._run_scheduled(variant, lambda: instance.call_hf_api(
+                    variant,
                     {
                         "inputs": image_data
                     }
-                )
+                ))
 
                 return response
+            except DeadlineExceeded:
+                raise
             except Exception as e:
                 logger.error(f"Hugging Face API image classification failed: {e}")
                 return [{"label": "unknown", "score": 0.0}]
         else:
             # Use local model
-            classifier = cls.get_model('image_classifier')
-            if classifier:
-                # Open image with PIL
-                image = Image.open(image_path)
-                return classifier(image)
-            else:
-                return [{"label": "unknown", "score": 0.0}]
\ No newline at end of file
+            classifier = cls.load_local_model(variant)
+
+            # Open image with PIL
+            from PIL import Image
+
+            image = Image.open(image_path)
+
+            def classify():
+                with stage_timer("inference", model=variant.model, backend=LOCAL), torch_trace("image_classification"):
+                    return classifier(image)
+
+            return cls._run_scheduled(variant, classify)
\ No newline at end of file
@@ -0,0 +1,205 @@
+import os
+import logging
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Tasks the service serves
+SENTIMENT = "sentiment"
+TEXT_GENERATION = "text_generation"
+IMAGE_CLASSIFICATION = "image_classification"
+TASKS = (SENTIMENT, TEXT_GENERATION, IMAGE_CLASSIFICATION)
+
+# Backends
+AUTO = "auto"  # Hugging Face API when a token is configured, local otherwise
+API = "api"
+LOCAL = "local"
+ONNX = "onnx"  # onnxruntime on a converted bundle (text classification only)
+BACKENDS = (AUTO, API, LOCAL, ONNX)
+
+DEFAULT_REGISTRY_PATH = Path(__file__).resolve().parents[2] / "config" / "models.yaml"
+
+
+class UnknownModelError(ValueError):
+    """Raised when a request names a model variant the registry does not have"""
+
+
+@dataclass
+class ModelVariant:
+    """One way of serving a task: which model, where it runs and its limits"""
+    task: str
+    name: str
+    model: str  # hub id for local inference (and the API unless api_model is set)
+    revision: Optional[str] = None  # hub branch, tag or commit of `model` (ignored when loading a bundle)
+    api_model: Optional[str] = None
+    backend: str = AUTO
+    bundle: Optional[str] = None  # converted bundle name (scripts/convert_models.py)
+    batch_size: int = 32
+    max_batch_tokens: int = 8192
+    max_tokens: int = 512  # model window including special tokens
+    device: str = "auto"  # auto, cpu or cuda
+    threads: Optional[int] = None  # onnxruntime intra-op threads (default: the worker's CPU_THREADS)
+    cache_ttl: int = 3600
+    concurrency: Optional[int] = None  # batches in flight (default: SCHEDULER_CONCURRENCY, SCHEDULER_API_CONCURRENCY)
+    batch_wait_ms: Optional[float] = None  # how long a sentiment batch waits to fill (default: SCHEDULER_BATCH_WAIT_MS)
+    p95_target_ms: Optional[float] = None  # latency target the SLO controller tunes the scheduler towards
+    cascade_model: Optional[str] = None  # n-gram first stage (scripts/train_cascade.py), sentiment only
+    cascade_threshold: float = 0.9  # confidence the first stage needs to answer on its own
+    description: str = ""
+    default: bool = field(default=False, repr=False)
+
+    @property
+    def key(self) -> str:
+        return f"{self.task}:{self.name}"
+
+    @property
+    def api_model_name(self) -> str:
+        return self.api_model or self.model
+
+    @property
+    def bundle_name(self) -> str:
+        """Bundle (and models/ download) directory name, <task>.<variant> unless configured"""
+        return self.bundle or f"{self.task}.{self.name}"
+
+    @property
+    def primary(self) -> bool:
+        """Whether this variant owns the task's legacy paths (models/<task>, SENTIMENT_TOKENIZER_PATH)"""
+        return self.bundle_name == self.task
+
+    def uses_api(self, api_available: bool) -> bool:
+        """Whether this variant is served by the Hugging Face API"""
+        if self.backend == API:
+            return True
+        return self.backend == AUTO and api_available
+
+    def describe(self, api_available: bool) -> dict:
+        return {
+            "name": self.name,
+            "model": self.api_model_name if self.uses_api(api_available) else self.model,
+            "revision": None if self.uses_api(api_available) else self.revision,
+            "backend": API if self.uses_api(api_available) else (ONNX if self.backend == ONNX else LOCAL),
+            "default": self.default,
+            "batch_size": self.batch_size,
+            "max_tokens": self.max_tokens,
+            "cache_ttl": self.cache_ttl,
+            "p95_target_ms": self.p95_target_ms,
+            "cascade": {"model": self.cascade_model, "threshold": self.cascade_threshold} if self.cascade_model else None,
+            "description": self.description
+        }
+
+
+def _env_defaults(task: str) -> dict:
+    """Limits that were configured through the environment before the registry existed"""
+    if task != SENTIMENT:
+        return {}
+    return {
+        'batch_size': int(os.getenv('SENTIMENT_BATCH_SIZE', 32)),
+        'max_batch_tokens': int(os.getenv('SENTIMENT_MAX_BATCH_TOKENS', 8192)),
+        'max_tokens': int(os.getenv('SENTIMENT_MAX_TOKENS', 512)),
+    }
+
+
+class ModelRegistry:
+    """
+    Declarative list of the variants each task can be served with.
+
+    Loaded from MODEL_REGISTRY_PATH (default: config/models.yaml). A task's
+    default variant can be overridden with <TASK>_MODEL_VARIANT, e.g.
+    SENTIMENT_MODEL_VARIANT=distilbert. Requests pick a variant by name.
+    """
+
+    def __init__(self, tasks: Dict[str, Dict[str, ModelVariant]], defaults: Dict[str, str]):
+        self._tasks = tasks
+        self._defaults = defaults
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "ModelRegistry":
+        import yaml
+
+        path = Path(path or os.getenv('MODEL_REGISTRY_PATH', DEFAULT_REGISTRY_PATH))
+        with open(path) as handle:
+            config = yaml.safe_load(handle) or {}
+        return cls.from_dict(config.get('tasks', {}), source=str(path))
+
+    @classmethod
+    def from_dict(cls, config: dict, source: str = "registry") -> "ModelRegistry":
+        allowed = {item.name for item in fields(ModelVariant)} - {'task', 'name', 'default'}
+        tasks: Dict[str, Dict[str, ModelVariant]] = {}
+        defaults: Dict[str, str] = {}
+
+        for task, task_config in config.items():
+            if task not in TASKS:
+                raise ValueError(f"{source}: unknown task {task} (expected one of: {', '.join(TASKS)})")
+
+            variants = task_config.get('variants') or {}
+            if not variants:
+                raise ValueError(f"{source}: task {task} has no variants")
+
+            default = os.getenv(f"{task.upper()}_MODEL_VARIANT") or task_config.get('default') or next(iter(variants))
+            if default not in variants:
+                raise ValueError(f"{source}: default variant {default} of {task} is not defined")
+
+            tasks[task] = {}
+            for name, options in variants.items():
+                options = options or {}
+                unknown = set(options) - allowed
+                if unknown:
+                    raise ValueError(f"{source}: {task}.{name} has unknown option(s): {', '.join(sorted(unknown))}")
+                if 'model' not in options:
+                    raise ValueError(f"{source}: {task}.{name} needs a model")
+                if options.get('backend', AUTO) not in BACKENDS:
+                    raise ValueError(f"{source}: {task}.{name} backend must be one of: {', '.join(BACKENDS)}")
+                if options.get('backend') == ONNX and task != SENTIMENT:
+                    raise ValueError(f"{source}: the onnx backend only serves {SENTIMENT}")
+                if options.get('cascade_model') and task != SENTIMENT:
+                    raise ValueError(f"{source}: cascades are only supported for {SENTIMENT}")
+                if not 0.0 < float(options.get('cascade_threshold', 0.9)) <= 1.0:
+                    raise ValueError(f"{source}: {task}.{name} cascade_threshold must be in (0, 1]")
+
+                tasks[task][name] = ModelVariant(
+                    task=task, name=name, default=name == default,
+                    **{**_env_defaults(task), **options}
+                )
+            defaults[task] = default
+
+        missing = [task for task in TASKS if task not in tasks]
+        if missing:
+            raise ValueError(f"{source}: no variants for {', '.join(missing)}")
+
+        return cls(tasks, defaults)
+
+    def get(self, task: str, name: Optional[str] = None) -> ModelVariant:
+        """The named variant of `task`, or its default"""
+        variants = self._tasks[task]
+        name = name or self._defaults[task]
+        if name not in variants:
+            raise UnknownModelError(
+                f"Unknown {task} model '{name}'. Available: {', '.join(variants)}"
+            )
+        return variants[name]
+
+    def replace(self, variant: ModelVariant):
+        """Serve `variant` in place of the one with its task and name (hot swap)"""
+        if variant.name not in self._tasks[variant.task]:
+            raise UnknownModelError(f"Unknown {variant.task} model '{variant.name}'")
+        self._tasks[variant.task][variant.name] = variant
+
+    def default(self, task: str) -> ModelVariant:
+        return self.get(task)
+
+    def variants(self, task: str) -> List[ModelVariant]:
+        return list(self._tasks[task].values())
+
+    def all_variants(self) -> List[ModelVariant]:
+        return [variant for task in TASKS for variant in self._tasks[task].values()]
+
+    def describe(self, api_available: bool) -> dict:
+        return {
+            task: {
+                "default": self._defaults[task],
+                "variants": [variant.describe(api_available) for variant in self.variants(task)]
+            }
+            for task in TASKS
+        }
@@ -0,0 +1,293 @@
+import gc
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import logging
+import secrets
+import weakref
+import threading
+import dataclasses
+from typing import Dict, List, Optional
+
+from app.services.model_loader import ModelLoader
+from app.services.model_registry import ModelVariant
+from app.services.warmup import warmup
+
+logger = logging.getLogger(__name__)
+
+# Swap lifecycle
+LOADING = "loading"
+WARMING = "warming"
+SWAPPED = "swapped"
+FAILED = "failed"
+
+# Registry options a swap can change; anything else (backend, limits) needs a restart
+SWAPPABLE = ("model", "revision", "api_model", "bundle", "cascade_model", "cascade_threshold")
+
+CHANNEL = "model_swap"  # pub/sub channel every worker listens on
+
+
+def _weak_refs(model) -> List[weakref.ref]:
+    """Weak references to a loaded model (or the parts of a {tokenizer, model} dict)"""
+    refs = []
+    for part in (model.values() if isinstance(model, dict) else [model]):
+        try:
+            refs.append(weakref.ref(part))
+        except TypeError:
+            pass
+    return refs
+
+
+class ModelSwap:
+    """One worker's swap of one variant to a new version"""
+
+    def __init__(self, swap_id: str, task: str, name: str, changes: dict, worker: str):
+        self.id = swap_id
+        self.task = task
+        self.name = name
+        self.changes = changes
+        self.worker = worker
+        self.status = LOADING
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.from_version: Optional[str] = None
+        self.to_version: Optional[str] = None
+        self.warmup: List[dict] = []
+        self.old_released: Optional[bool] = None
+        self.error: Optional[str] = None
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "task": self.task,
+            "variant": self.name,
+            "changes": self.changes,
+            "worker": self.worker,
+            "status": self.status,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "from_version": self.from_version,
+            "to_version": self.to_version,
+            "warmup": self.warmup,
+            "old_released": self.old_released,
+            "error": self.error
+        }
+
+
+class ModelSwapper:
+    """
+    Zero-downtime replacement of a variant's model.
+
+    A swap loads the new version next to the serving one
+    (ModelLoader.staging), warms it with the warm-up inputs, then installs
+    it in one step. Requests that already hold the old model finish with
+    it; the old model is released once they have, within
+    MODEL_SWAP_DRAIN_TIMEOUT seconds. If loading or warming fails, the
+    serving version is left untouched.
+
+    Swaps are broadcast over Redis pub/sub, so every worker of every
+    replica swaps, and each reports its progress under the swap id.
+    Without Redis only the worker that received the request swaps.
+    Disabled unless MODEL_ADMIN_TOKEN is set.
+    """
+
+    def __init__(self):
+        self.admin_token = os.getenv('MODEL_ADMIN_TOKEN', '')
+        self.enabled = bool(self.admin_token)
+        self.drain_timeout = float(os.getenv('MODEL_SWAP_DRAIN_TIMEOUT', 60))
+        self.status_ttl = int(os.getenv('MODEL_SWAP_STATUS_TTL', 86400))
+        self.worker = f"{socket.gethostname()}-{os.getpid()}"
+        self._swaps: Dict[str, ModelSwap] = {}
+        self._active: Dict[str, str] = {}  # variant key -> id of the swap running on this worker
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._listener: Optional[threading.Thread] = None
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return self.enabled and bool(token) and secrets.compare_digest(token, self.admin_token)
+
+    def target(self, task: str, name: str, changes: dict) -> ModelVariant:
+        """
+        The variant `name` of `task` with `changes` applied. Raises
+        UnknownModelError for unknown variants and ValueError for changes a
+        swap cannot make.
+        """
+        variant = ModelLoader.variant(task, name)
+        if not changes:
+            raise ValueError("Nothing to change")
+        unknown = set(changes) - set(SWAPPABLE)
+        if unknown:
+            raise ValueError(f"Cannot swap {', '.join(sorted(unknown))} (swappable: {', '.join(SWAPPABLE)})")
+        if not 0.0 < float(changes.get('cascade_threshold', variant.cascade_threshold)) <= 1.0:
+            raise ValueError("cascade_threshold must be in (0, 1]")
+        return dataclasses.replace(variant, **changes)
+
+    def request(self, task: str, name: str, changes: dict) -> dict:
+        """Validate a swap and start it on every worker; returns its id and how many workers got it"""
+        key = self.target(task, name, changes).key
+        with self._lock:
+            if key in self._active:
+                raise RuntimeError(f"{key} is already being swapped ({self._active[key]})")
+        swap_id = uuid.uuid4().hex[:12]
+
+        redis_client = ModelLoader.get_redis_client()
+        if redis_client and self._listener is not None:
+            message = json.dumps({"id": swap_id, "task": task, "name": name, "changes": changes})
+            workers = redis_client.publish(CHANNEL, message)
+        else:
+            self.start(swap_id, task, name, changes)
+            workers = 1
+        return {"id": swap_id, "workers": workers}
+
+    def start(self, swap_id: str, task: str, name: str, changes: dict) -> ModelSwap:
+        """Run a swap on this worker in the background"""
+        key = ModelLoader.variant(task, name).key
+        swap = ModelSwap(swap_id, task, name, changes, self.worker)
+        with self._lock:
+            self._swaps[swap_id] = swap
+            running = self._active.get(key)
+            if running is None:
+                self._active[key] = swap_id
+
+        if running is not None:
+            swap.status = FAILED
+            swap.error = f"{key} is already being swapped ({running})"
+            swap.finished_at = time.time()
+            self._report(swap)
+            raise RuntimeError(swap.error)
+
+        self._report(swap)
+        threading.Thread(target=self._run, args=(swap, key), name=f"model-swap-{swap_id}", daemon=True).start()
+        return swap
+
+    def _run(self, swap: ModelSwap, key: str):
+        try:
+            current = ModelLoader.variant(swap.task, swap.name)
+            target = self.target(swap.task, swap.name, swap.changes)
+            swap.from_version = ModelLoader.model_version(current)
+            logger.info(f"🔄 Swapping {key}: {swap.changes}")
+
+            with ModelLoader.staging(target) as staged:
+                ModelLoader.prepare_variant(target)
+                swap.to_version = ModelLoader.model_version(target)
+                swap.status = WARMING
+                self._report(swap)
+                swap.warmup = warmup.warm_variant(target)
+
+            replaced = ModelLoader.install_variant(staged)
+            swap.status = SWAPPED
+            self._report(swap)
+            logger.info(f"✅ {key} swapped to version {swap.to_version}")
+
+            swap.old_released = self._release(replaced)
+            if not swap.old_released:
+                logger.warning(f"⚠️  Old version of {key} still in use after {self.drain_timeout:g}s")
+        except Exception as e:
+            swap.status = FAILED
+            swap.error = str(e)
+            logger.error(f"❌ Swap of {key} failed, keeping the current version: {e}")
+        finally:
+            swap.finished_at = time.time()
+            with self._lock:
+                self._active.pop(key, None)
+            self._report(swap)
+
+    def _release(self, replaced: List[object]) -> bool:
+        """Wait for requests still using the replaced models to finish, then free them"""
+        # Only weak references from here on, so this thread does not keep them alive
+        refs = [ref for model in replaced for ref in _weak_refs(model)]
+        replaced.clear()
+
+        deadline = time.monotonic() + self.drain_timeout
+        while True:
+            gc.collect()
+            if all(ref() is None for ref in refs):
+                break
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.5)
+
+        torch = sys.modules.get('torch')
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        return True
+
+    def _report(self, swap: ModelSwap):
+        """Publish this worker's progress under the swap id"""
+        redis_client = ModelLoader.get_redis_client()
+        if not redis_client:
+            return
+        try:
+            pipe = redis_client.pipeline()
+            pipe.hset(f"model_swap:{swap.id}", swap.worker, json.dumps(swap.summary()))
+            pipe.expire(f"model_swap:{swap.id}", self.status_ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Could not report swap {swap.id}: {e}")
+
+    def status(self, swap_id: str) -> Optional[dict]:
+        """Progress of a swap on every worker that took it (None if unknown)"""
+        redis_client = ModelLoader.get_redis_client()
+        if redis_client:
+            workers = {worker: json.loads(summary) for worker, summary in redis_client.hgetall(f"model_swap:{swap_id}").items()}
+        else:
+            swap = self._swaps.get(swap_id)
+            workers = {swap.worker: swap.summary()} if swap else {}
+        if not workers:
+            return None
+
+        statuses = {summary["status"] for summary in workers.values()}
+        if FAILED in statuses:
+            status = FAILED
+        elif statuses == {SWAPPED}:
+            status = SWAPPED
+        else:
+            status = WARMING if WARMING in statuses else LOADING
+        return {"id": swap_id, "status": status, "workers": workers}
+
+    def start_listener(self):
+        """Take part in swaps requested on any worker (needs Redis)"""
+        if not self.enabled or self._listener is not None:
+            return
+        if not ModelLoader.get_redis_client():
+            logger.warning("⚠️  Redis unavailable, model swaps only apply to the worker that receives them")
+            return
+        self._stopping.clear()
+        self._listener = threading.Thread(target=self._listen, name="model-swap-listener", daemon=True)
+        self._listener.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._listener is not None:
+            self._listener.join(timeout=2)
+            self._listener = None
+
+    def _listen(self):
+        pubsub = None
+        while not self._stopping.is_set():
+            try:
+                if pubsub is None:
+                    pubsub = ModelLoader.get_redis_client().pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(CHANNEL)
+                message = pubsub.get_message(timeout=1.0)
+                if not message or message['type'] != 'message':
+                    continue
+                request = json.loads(message['data'])
+                self.start(request['id'], request['task'], request['name'], request['changes'])
+            except RuntimeError as e:
+                logger.warning(f"⚠️  {e}")
+            except Exception as e:
+                logger.error(f"Model swap listener error: {e}")
+                if pubsub is not None:
+                    pubsub.close()
+                    pubsub = None
+                self._stopping.wait(1.0)
+        if pubsub is not None:
+            pubsub.close()
+
+
+# Global instance
+model_swap = ModelSwapper()
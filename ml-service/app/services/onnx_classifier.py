@@ -0,0 +1,82 @@
+import json
+import logging
+from typing import List, Optional, Union
+
+from app.services.model_bundle import ModelBundle
+
+logger = logging.getLogger(__name__)
+
+
+class OnnxTextClassifier:
+    """
+    Text classification on onnxruntime, called like the transformers
+    sentiment pipeline (same arguments and output shapes).
+
+    Runs the ONNX graph of a converted bundle with the bundle's
+    tokenizer.json, so neither torch nor transformers is imported.
+    """
+
+    def __init__(self, bundle: ModelBundle, threads: Optional[int] = None, inter_op_threads: int = 1,
+                 max_length: int = 512):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        if bundle.onnx_path is None:
+            raise ValueError(f"Bundle {bundle.key} has no ONNX graph (convert it with --onnx)")
+        tokenizer_path = bundle.file_path('tokenizer.json')
+        if tokenizer_path is None:
+            raise ValueError(f"Bundle {bundle.key} has no tokenizer.json")
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = inter_op_threads
+        self.session = onnxruntime.InferenceSession(
+            str(bundle.onnx_path), options, providers=['CPUExecutionProvider']
+        )
+        self.input_names = {item.name for item in self.session.get_inputs()}
+
+        config = json.loads((bundle.path / 'config.json').read_text())
+        self.labels = {int(index): label for index, label in config.get('id2label', {}).items()}
+
+        self.tokenizer = Tokenizer.from_file(str(tokenizer_path))
+        pad_id = config.get('pad_token_id') or 0
+        self.tokenizer.enable_padding(pad_id=pad_id, pad_token=self.tokenizer.id_to_token(pad_id) or "<pad>")
+        self.max_length = max_length
+
+    def _scores(self, texts: List[str], max_length: int):
+        import numpy as np
+
+        self.tokenizer.enable_truncation(max_length=max_length)
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            'input_ids': np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            'attention_mask': np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        }
+        logits = self.session.run(['logits'], {name: value for name, value in inputs.items() if name in self.input_names})[0]
+
+        # Softmax per row, as the pipeline does for single-label classification
+        exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        return exp / exp.sum(axis=-1, keepdims=True)
+
+    def __call__(self, inputs: Union[str, List[str]], batch_size: Optional[int] = None, top_k: Optional[int] = 1,
+                 truncation: bool = True, max_length: Optional[int] = None):
+        single = isinstance(inputs, str)
+        texts = [inputs] if single else list(inputs)
+        max_length = max_length or self.max_length
+        batch_size = batch_size or len(texts) or 1
+
+        results = []
+        for start in range(0, len(texts), batch_size):
+            for row in self._scores(texts[start:start + batch_size], max_length):
+                ranked = sorted(
+                    ({'label': self.labels.get(index, f"LABEL_{index}"), 'score': float(score)}
+                     for index, score in enumerate(row)),
+                    key=lambda item: item['score'], reverse=True
+                )
+                results.append(ranked if top_k is None else (ranked[0] if top_k == 1 else ranked[:top_k]))
+
+        # For one string the pipeline returns [best] with top_k=1, else the ranked list itself
+        if single:
+            return [results[0]] if top_k == 1 else results[0]
+        return results
@@ -0,0 +1,421 @@
+import os
+import sys
+import time
+import uuid
+import pstats
+import cProfile
+import logging
+import secrets
+import threading
+import contextvars
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from io import StringIO
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Profile kinds
+STACKS = "stacks"  # sampled stacks from sys._current_frames, collapsed format
+CPROFILE = "cprofile"  # deterministic profile of the event loop thread and the threads running model calls
+TORCH = "torch"  # torch.profiler trace of local model forward passes
+KINDS = (STACKS, CPROFILE, TORCH)
+
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+PROFILE_HEADER = "X-Profile"
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
+# Leaf frames in these files are threads parked on a lock, queue or selector
+IDLE_FILES = ("threading.py", "selectors.py", "queue.py")
+IDLE_FUNCTIONS = {"select", "poll", "sleep", "accept"}
+
+# Torch trace for the current request (set by the per-request profiling middleware)
+_request_torch: contextvars.ContextVar[Optional["Profile"]] = contextvars.ContextVar("request_torch", default=None)
+# Stacks or cProfile of the current request; threads doing its work join it through profile_thread()
+_request_profile: contextvars.ContextVar[Optional["Profile"]] = contextvars.ContextVar("request_profile", default=None)
+
+
+class Profile:
+    """One profiling session and its output"""
+
+    def __init__(self, kind: str, label: str = ""):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.label = label
+        self.pid = os.getpid()
+        self.status = RUNNING
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.samples = 0
+        self.output = ""  # collapsed stacks or pstats text
+        self.traces = []  # torch chrome trace files
+        self.error: Optional[str] = None
+        # Threads working for this profile right now, and the cProfiles they recorded
+        self.threads: Set[int] = set()
+        self.thread_profilers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def finish(self, output: str = "", error: Optional[str] = None):
+        self.output = output
+        self.error = error
+        self.status = FAILED if error else DONE
+        self.finished_at = time.time()
+
+    def collect_thread_profilers(self) -> List[cProfile.Profile]:
+        """cProfiles recorded by work threads so far (calls still running are left out)"""
+        with self._lock:
+            return list(self.thread_profilers)
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "label": self.label,
+            "pid": self.pid,
+            "status": self.status,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "samples": self.samples,
+            "traces": self.traces,
+            "error": self.error
+        }
+
+
+class StackSampler:
+    """
+    Samples the Python stacks of all (or selected) threads every `interval`
+    seconds and counts them in flamegraph.pl / speedscope collapsed format:
+
+        MainThread;run (base_events.py:604);analyze_sentiment (model_loader.py:410) 37
+    """
+
+    def __init__(self, profile: Profile, interval: float, thread_ids: Optional[Set[int]] = None,
+                 include_idle: bool = False):
+        self.profile = profile
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.include_idle = include_idle
+        self.counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, duration: Optional[float] = None):
+        self._thread = threading.Thread(
+            target=self._run, args=(duration,), name=f"profiler-{self.profile.id}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _run(self, duration: Optional[float]):
+        own = threading.get_ident()
+        deadline = time.monotonic() + duration if duration else None
+        names: Dict[int, str] = {}
+
+        try:
+            while not self._stop.wait(self.interval):
+                if deadline and time.monotonic() >= deadline:
+                    break
+                frames = sys._current_frames()
+                if any(ident not in names for ident in frames):
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in frames.items():
+                    if ident == own or (self.thread_ids and ident not in self.thread_ids):
+                        continue
+                    stack = self._collapse(frame)
+                    if stack:
+                        self.counts[f"{names.get(ident, ident)};{stack}"] += 1
+                self.profile.samples += 1
+            self.profile.finish(self.collapsed())
+        except Exception as e:
+            logger.error(f"Stack sampler {self.profile.id} failed: {e}")
+            self.profile.finish(error=str(e))
+
+    def _collapse(self, frame) -> Optional[str]:
+        leaf = frame.f_code
+        if not self.include_idle and (
+            leaf.co_filename.endswith(IDLE_FILES) or leaf.co_name in IDLE_FUNCTIONS
+        ):
+            return None
+
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.counts.most_common())
+
+
+class Profiler:
+    """
+    Opt-in profiling for a live worker.
+
+    Disabled unless PROFILING_ENABLED=true and PROFILING_ADMIN_TOKEN is set;
+    when disabled the only cost left in the request path is one attribute
+    check per local forward pass.
+    """
+
+    def __init__(self):
+        self.admin_token = os.getenv('PROFILING_ADMIN_TOKEN', '')
+        self.enabled = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+        if self.enabled and not self.admin_token:
+            logger.warning("⚠️  PROFILING_ENABLED is set without PROFILING_ADMIN_TOKEN, profiling stays disabled")
+            self.enabled = False
+
+        self.max_seconds = float(os.getenv('PROFILING_MAX_SECONDS', 60))
+        self.request_interval = float(os.getenv('PROFILING_REQUEST_INTERVAL_MS', 1)) / 1000.0
+        self.trace_dir = os.getenv('PROFILING_DIR', '/tmp/blogml-profiles')
+        self.keep = int(os.getenv('PROFILING_KEEP', 20))
+
+        self._profiles: "OrderedDict[str, Profile]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._active: Optional[Profile] = None
+        self._torch_profile: Optional[Profile] = None
+        self._torch_passes = 0
+        # Checked on every forward pass / model call, so kept as plain attributes
+        self.torch_armed = False
+        self.cprofile_running = False
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return self.enabled and bool(token) and secrets.compare_digest(token, self.admin_token)
+
+    def _store(self, profile: Profile) -> Profile:
+        with self._lock:
+            self._profiles[profile.id] = profile
+            while len(self._profiles) > self.keep:
+                self._profiles.popitem(last=False)
+        return profile
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def summaries(self) -> Iterable[dict]:
+        with self._lock:
+            profiles = list(self._profiles.values())
+        return [profile.summary() for profile in reversed(profiles)]
+
+    def _claim(self, profile: Profile):
+        """Only one time-boxed worker profile at a time"""
+        with self._lock:
+            if self._active and self._active.status == RUNNING:
+                raise RuntimeError(f"Profile {self._active.id} is still running")
+            self._active = profile
+
+    def sample(self, duration: float, interval: float, include_idle: bool = False) -> Profile:
+        """Sample every thread of this worker for `duration` seconds"""
+        profile = Profile(STACKS, label=f"{duration:g}s")
+        self._claim(profile)
+        StackSampler(profile, interval, include_idle=include_idle).start(min(duration, self.max_seconds))
+        return self._store(profile)
+
+    def cprofile(self, duration: float, loop) -> Profile:
+        """
+        cProfile the calling (event loop) thread for `duration` seconds,
+        together with every model call that runs meanwhile.
+
+        Must be called from the event loop thread. Inference runs on the
+        threadpool and the scheduler's dispatcher threads, which are
+        profiled call by call through profile_thread().
+        """
+        profile = Profile(CPROFILE, label=f"{duration:g}s")
+        self._claim(profile)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            profile.finish(error=str(e))
+            raise
+        self.cprofile_running = True
+
+        def finish():
+            self.cprofile_running = False
+            profiler.disable()
+            profile.finish(format_stats(profiler, *profile.collect_thread_profilers()))
+
+        loop.call_later(min(duration, self.max_seconds), finish)
+        return self._store(profile)
+
+    def arm_torch(self, passes: int) -> Profile:
+        """Trace the next `passes` local forward passes with torch.profiler"""
+        profile = Profile(TORCH, label=f"{passes} pass(es)")
+        with self._lock:
+            self._torch_profile = profile
+            self._torch_passes = passes
+            self.torch_armed = True
+        return self._store(profile)
+
+    def _take_torch_pass(self) -> Optional[Profile]:
+        request_profile = _request_torch.get()
+        if request_profile is not None:
+            return request_profile
+
+        with self._lock:
+            if self._torch_passes <= 0:
+                return None
+            self._torch_passes -= 1
+            profile = self._torch_profile
+            if self._torch_passes == 0:
+                self.torch_armed = False
+            return profile
+
+    def _thread_profile(self) -> Optional[Profile]:
+        """Profile the calling thread's model call belongs to: its request's, or a running worker cProfile"""
+        profile = _request_profile.get()
+        if profile is None and self.cprofile_running:
+            profile = self._active
+        if profile is None or profile.status != RUNNING:
+            return None
+        return profile
+
+    @contextmanager
+    def profile_request(self, kind: str, label: str):
+        """
+        Profile a single request; yields the Profile whose id goes in the
+        response. Besides the event loop thread, the threads running the
+        request's model calls are included while they do (profile_thread()).
+        """
+        profile = self._store(Profile(kind, label=label))
+
+        if kind == TORCH:
+            token = _request_torch.set(profile)
+            try:
+                yield profile
+            finally:
+                _request_torch.reset(token)
+                profile.finish(
+                    "\n".join(profile.traces),
+                    error=None if profile.traces else "No local forward pass ran"
+                )
+            return
+
+        token = _request_profile.set(profile)
+        try:
+            if kind == CPROFILE:
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                except ValueError as e:
+                    # Another cProfile session owns the thread
+                    profile.finish(error=str(e))
+                    yield profile
+                    return
+                try:
+                    yield profile
+                finally:
+                    profiler.disable()
+                    profile.finish(format_stats(profiler, *profile.collect_thread_profilers()))
+                return
+
+            # The sampler reads profile.threads as work threads join and leave it
+            profile.threads.add(threading.get_ident())
+            sampler = StackSampler(profile, self.request_interval, thread_ids=profile.threads, include_idle=True)
+            sampler.start()
+            try:
+                yield profile
+            finally:
+                sampler.stop()
+        finally:
+            _request_profile.reset(token)
+
+
+def format_stats(profiler: cProfile.Profile, *others: cProfile.Profile, limit: int = 60) -> str:
+    output = StringIO()
+    stats = pstats.Stats(profiler, *others, stream=output)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+    return output.getvalue()
+
+
+profiler = Profiler()
+
+
+@contextmanager
+def profile_thread():
+    """
+    Include the calling thread in the profile its work belongs to (the
+    current request's, or a running worker cProfile) until the block ends;
+    a no-op when nothing is being profiled. Wraps model calls, which run on
+    threadpool and dispatcher threads rather than the event loop thread.
+    """
+    profile = profiler._thread_profile()
+    if profile is None:
+        yield
+        return
+
+    ident = threading.get_ident()
+    with profile._lock:
+        if ident in profile.threads:
+            # Already part of it further up this thread's stack
+            profile = None
+        else:
+            profile.threads.add(ident)
+    if profile is None:
+        yield
+        return
+
+    thread_profiler = None
+    if profile.kind == CPROFILE:
+        thread_profiler = cProfile.Profile()
+        try:
+            thread_profiler.enable()
+        except ValueError:
+            # The thread is already being cProfiled by someone else
+            thread_profiler = None
+    try:
+        yield
+    finally:
+        if thread_profiler is not None:
+            thread_profiler.disable()
+        with profile._lock:
+            profile.threads.discard(ident)
+            if thread_profiler is not None:
+                profile.thread_profilers.append(thread_profiler)
+
+
+def run_profiled(fn: Callable[..., Any], *args) -> Any:
+    """fn(*args) inside profile_thread()"""
+    with profile_thread():
+        return fn(*args)
+
+
+@contextmanager
+def torch_trace(label: str):
+    """
+    Wrap a local forward pass; records a torch.profiler chrome trace when a
+    torch profile is armed for this request or worker, otherwise a no-op.
+    """
+    if not profiler.torch_armed and _request_torch.get() is None:
+        yield
+        return
+
+    profile = profiler._take_torch_pass()
+    if profile is None:
+        yield
+        return
+
+    import torch
+    from torch.profiler import ProfilerActivity, profile as torch_profile
+
+    activities = [ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(ProfilerActivity.CUDA)
+
+    with torch_profile(activities=activities, record_shapes=True) as trace:
+        yield
+
+    os.makedirs(profiler.trace_dir, exist_ok=True)
+    path = os.path.join(profiler.trace_dir, f"{profile.id}-{label}-{len(profile.traces)}.json")
+    trace.export_chrome_trace(path)
+    profile.traces.append(path)
+    profile.samples += 1
+    if profile.kind == TORCH and _request_torch.get() is None and not profiler.torch_armed:
+        profile.finish(path)
@@ -0,0 +1,421 @@
+import os
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import Header, HTTPException
+
+from app.services.deadline import Deadline, DeadlineExceeded, current_deadline, deadline_scope
+from app.services.metrics import SCHEDULER_WAIT
+from app.services.profiling import run_profiled
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, most urgent first
+INTERACTIVE = "interactive"  # someone is looking at a spinner (comment posted, alt text in the editor)
+STANDARD = "standard"  # wanted soon, nobody blocked on it
+BULK = "bulk"  # backfills, recommendation refreshes, batch jobs
+PRIORITIES = (INTERACTIVE, STANDARD, BULK)
+
+PRIORITY_HEADER = "X-Priority"
+
+# How often a waiting caller looks at its deadline
+_POLL_SECONDS = 0.05
+
+# Priority class of the request (or job) being served
+_current: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_priority", default=None)
+
+
+def parse_priority(value: str) -> str:
+    priority = value.strip().lower()
+    if priority not in PRIORITIES:
+        raise ValueError(f"{value!r} is not one of: {', '.join(PRIORITIES)}")
+    return priority
+
+
+def current_priority() -> str:
+    """Priority class of the current work (STANDARD outside requests and jobs)"""
+    return _current.get() or STANDARD
+
+
+@contextmanager
+def priority_scope(priority: str):
+    """Run model calls made here (and in threads started from here) at `priority`"""
+    token = _current.set(priority)
+    try:
+        yield priority
+    finally:
+        _current.reset(token)
+
+
+def request_priority(default: str):
+    """
+    Route dependency that sets the priority class of a request: the
+    X-Priority header when the caller sends one, the endpoint's default
+    otherwise.
+    """
+    async def dependency(x_priority: Optional[str] = Header(
+        None, description=f"Priority class: {', '.join(PRIORITIES)} (default: {default})"
+    )):
+        try:
+            priority = parse_priority(x_priority) if x_priority else default
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid {PRIORITY_HEADER}: {str(e)}")
+        # Dependencies run in the endpoint's task, so this lasts for the request
+        _current.set(priority)
+        return priority
+
+    return dependency
+
+
+def _class_settings(name: str, default: str) -> Dict[str, int]:
+    """Parse "interactive=8,standard=3,bulk=1" style settings"""
+    settings = {priority: 0 for priority in PRIORITIES}
+    for entry in os.getenv(name, default).split(','):
+        if not entry.strip():
+            continue
+        priority, _, value = entry.partition('=')
+        settings[parse_priority(priority)] = int(value)
+    return settings
+
+
+class Work:
+    """One input waiting for (or running on) a model"""
+
+    __slots__ = ('payload', 'cost', 'priority', 'deadline', 'context', 'enqueued',
+                 'started', 'cancelled', 'done', 'result', 'error')
+
+    def __init__(self, payload: Any, cost: int, priority: str, deadline: Optional[Deadline]):
+        self.payload = payload
+        self.cost = cost
+        self.priority = priority
+        self.deadline = deadline
+        self.context = contextvars.copy_context()
+        self.enqueued = time.monotonic()
+        self.started = False
+        self.cancelled = False
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class ModelScheduler:
+    """
+    Weighted-fair queue in front of one model.
+
+    Callers enqueue inputs with the priority class of their request and
+    block until a dispatcher thread has run them. Up to `concurrency`
+    batches run at once. Each free slot picks the next input by weighted
+    fair queueing over the classes (SCHEDULER_WEIGHTS), so bulk work keeps
+    moving but interactive inputs overtake it. SCHEDULER_RESERVED keeps
+    slots free for a class: other classes may only start a batch while
+    the reserved slots stay available.
+
+    Batchable models (run_batch given) merge queued inputs of one class,
+    from any number of callers, into batches of up to max_batch_size inputs
+    (and max_batch_cost, the padded token count). A batch holds a single
+    class, so an interactive input never rides along in a bulk-sized
+    forward pass. Standard and bulk batches wait up to batch_wait seconds
+    to fill; interactive ones leave at once. Batch formation is
+    preemptible: when a more urgent class queues while a batch is still
+    waiting to fill, its inputs go back to the front of their queue and
+    the slot is handed over.
+
+    Without run_batch every input is a callable run on its own.
+    """
+
+    def __init__(self, name: str, run_batch: Optional[Callable[[List[Any]], List[Any]]] = None,
+                 max_batch_size: int = 1, max_batch_cost: Optional[int] = None,
+                 batch_wait: float = 0.0, concurrency: int = 1):
+        self.name = name
+        self._run_batch = run_batch
+        self.max_batch_size = max_batch_size if run_batch else 1
+        self.max_batch_cost = max_batch_cost
+        self.batch_wait = batch_wait
+        self.concurrency = max(1, concurrency)
+        self.weights = _class_settings('SCHEDULER_WEIGHTS', 'interactive=8,standard=3,bulk=1')
+        self.reserved = _class_settings('SCHEDULER_RESERVED', 'interactive=1')
+
+        self._cond = threading.Condition()
+        self._queues: Dict[str, deque] = {priority: deque() for priority in PRIORITIES}
+        self._finish: Dict[str, float] = {priority: 0.0 for priority in PRIORITIES}  # virtual finish time
+        self._clock = 0.0
+        self._running: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+        self._dispatchers: List[threading.Thread] = []
+        self._batches = 0
+        # Since the last take_stats(): (latency, queue wait) per input, (size, limit) per batch
+        self._latencies: deque = deque(maxlen=10000)
+        self._batch_sizes: deque = deque(maxlen=10000)
+
+    @property
+    def batched(self) -> bool:
+        return self._run_batch is not None
+
+    # Callers
+
+    def submit(self, payloads: List[Any], costs: Optional[List[int]] = None) -> List[Any]:
+        """Run `payloads` at the current priority class; results in input order"""
+        if not payloads:
+            return []
+        priority = current_priority()
+        deadline = current_deadline()
+        works = [
+            Work(payload, costs[index] if costs else 1, priority, deadline)
+            for index, payload in enumerate(payloads)
+        ]
+
+        with self._cond:
+            self._ensure_dispatchers()
+            for work in works:
+                queue = self._queues[priority]
+                if not queue:
+                    # A class that was idle does not bank credit for the time it had nothing queued
+                    self._finish[priority] = max(self._finish[priority], self._clock)
+                queue.append(work)
+            self._cond.notify_all()
+
+        try:
+            return [self._wait(work) for work in works]
+        except BaseException:
+            with self._cond:
+                for work in works:
+                    work.cancelled = work.cancelled or not work.started
+            raise
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """Run `fn` in a model slot at the current priority class"""
+        return self.submit([fn])[0]
+
+    def _wait(self, work: Work):
+        while not work.done.wait(_POLL_SECONDS if work.deadline else None):
+            if work.deadline.reason() is None:
+                continue
+            with self._cond:
+                if work.started:
+                    # Already on the model: the result is on its way
+                    continue
+                work.cancelled = True
+            work.deadline.check("queue")
+        if work.error is not None:
+            raise work.error
+        return work.result
+
+    # Dispatchers
+
+    def tune(self, max_batch_size: Optional[int] = None, batch_wait: Optional[float] = None,
+             concurrency: Optional[int] = None):
+        """Change batch limits and how many batches may run at once, effective for the next batch"""
+        with self._cond:
+            if max_batch_size is not None and self._run_batch is not None:
+                self.max_batch_size = max(1, max_batch_size)
+            if batch_wait is not None:
+                self.batch_wait = max(0.0, batch_wait)
+            if concurrency is not None:
+                self.concurrency = max(1, concurrency)
+                self._ensure_dispatchers()
+            self._cond.notify_all()
+
+    def take_stats(self) -> tuple:
+        """
+        ([(latency, queue wait)] per input, [(size, max_batch_size)] per batch)
+        since the previous call. Bulk inputs count only their time on the
+        model: waiting behind other classes is what they are for.
+        """
+        with self._cond:
+            latencies, batches = list(self._latencies), list(self._batch_sizes)
+            self._latencies.clear()
+            self._batch_sizes.clear()
+        return latencies, batches
+
+    def _ensure_dispatchers(self):
+        while len(self._dispatchers) < self.concurrency:
+            thread = threading.Thread(
+                target=self._dispatch, name=f"scheduler-{self.name}-{len(self._dispatchers)}", daemon=True
+            )
+            self._dispatchers.append(thread)
+            thread.start()
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                priority = self._startable()
+                while priority is None:
+                    self._cond.wait()
+                    priority = self._startable()
+                self._running[priority] += 1
+                batch = self._form_batch(priority)
+
+            try:
+                if batch:
+                    self._execute(batch)
+            finally:
+                with self._cond:
+                    self._release(priority)
+
+    def _release(self, priority: str):
+        self._running[priority] -= 1
+        self._cond.notify_all()
+
+    def _reservations(self) -> Dict[str, int]:
+        """Reserved slots per class, capped so one slot is always left for everybody"""
+        left = self.concurrency - 1
+        reservations = {}
+        for priority in PRIORITIES:
+            reservations[priority] = min(self.reserved[priority], left)
+            left -= reservations[priority]
+        return reservations
+
+    def _may_start(self, priority: str) -> bool:
+        free = self.concurrency - sum(self._running.values())
+        reservations = self._reservations()
+        held_back = sum(
+            max(0, reservations[other] - self._running[other])
+            for other in PRIORITIES if other != priority
+        )
+        return free > held_back
+
+    def _next_class(self, classes) -> Optional[str]:
+        """The class whose next input finishes first in virtual time"""
+        waiting = [priority for priority in classes if self._queues[priority]]
+        if not waiting:
+            return None
+        return min(waiting, key=lambda priority: self._finish[priority] + 1.0 / max(self.weights[priority], 1))
+
+    def _startable(self) -> Optional[str]:
+        """Class a free slot may start a batch for now, None if none"""
+        return self._next_class([priority for priority in PRIORITIES if self._may_start(priority)])
+
+    def _pop(self, priority: str) -> Optional[Work]:
+        """Take the next live input of a class, failing the ones nobody waits for any more"""
+        queue = self._queues[priority]
+        while queue:
+            work = queue.popleft()
+            if work.cancelled:
+                continue
+            self._finish[priority] += 1.0 / max(self.weights[priority], 1)
+            self._clock = self._finish[priority]
+            if work.deadline is not None and work.deadline.reason():
+                try:
+                    work.deadline.check("queue")
+                except DeadlineExceeded as e:
+                    work.error = e
+                work.done.set()
+                continue
+            work.started = True
+            return work
+        return None
+
+    def _fits(self, batch: List[Work], work: Work) -> bool:
+        if self.max_batch_cost is None:
+            return True
+        # Batches are padded to their longest input
+        longest = max([work.cost] + [item.cost for item in batch])
+        return longest * (len(batch) + 1) <= self.max_batch_cost
+
+    def _form_batch(self, priority: str) -> List[Work]:
+        """
+        Take inputs of `priority` in arrival order until the batch is full or
+        its wait is over (lock held). Returns [] if formation was preempted.
+        """
+        queue = self._queues[priority]
+        batch: List[Work] = []
+        closes = None
+        while len(batch) < self.max_batch_size:
+            if queue:
+                if batch and not self._fits(batch, queue[0]):
+                    break
+                work = self._pop(priority)
+                if work is not None:
+                    batch.append(work)
+                    if closes is None:
+                        closes = work.enqueued + self.batch_wait
+                continue
+
+            # Interactive batches leave at once, nobody waits for company
+            if not batch or priority == INTERACTIVE:
+                break
+            remaining = closes - time.monotonic()
+            if remaining <= 0:
+                break
+            if self._more_urgent_waiting(priority):
+                self._requeue(priority, batch)
+                return []
+            self._cond.wait(remaining)
+        return batch
+
+    def _more_urgent_waiting(self, priority: str) -> bool:
+        return any(self._queues[other] for other in PRIORITIES[:PRIORITIES.index(priority)])
+
+    def _requeue(self, priority: str, batch: List[Work]):
+        """Put a preempted batch back at the front of its queue, refunding its fair share"""
+        for work in reversed(batch):
+            work.started = False
+            self._queues[priority].appendleft(work)
+        self._finish[priority] -= len(batch) / max(self.weights[priority], 1)
+
+    def _execute(self, batch: List[Work]):
+        self._batches += 1
+        started = time.monotonic()
+        for work in batch:
+            SCHEDULER_WAIT.labels(model=self.name, priority=work.priority).observe(started - work.enqueued)
+        try:
+            if self._run_batch is None:
+                # Callables run with their caller's context: deadline, profiling, priority
+                results = [batch[0].context.run(run_profiled, batch[0].payload)]
+            elif len(batch) == 1:
+                results = batch[0].context.run(run_profiled, self._run_batch, [batch[0].payload])
+            else:
+                # A shared batch runs for several callers, none of whose deadlines applies to it
+                results = batch[0].context.run(run_profiled, self._run_shared, [work.payload for work in batch])
+            for work, result in zip(batch, results):
+                work.result = result
+        except BaseException as e:
+            for work in batch:
+                work.error = e
+        finally:
+            finished = time.monotonic()
+            with self._cond:
+                self._batch_sizes.append((len(batch), self.max_batch_size))
+                for work in batch:
+                    queued = 0.0 if work.priority == BULK else started - work.enqueued
+                    self._latencies.append((queued + finished - started, queued))
+            for work in batch:
+                work.done.set()
+
+    def _run_shared(self, payloads: List[Any]) -> List[Any]:
+        with deadline_scope(None):
+            return self._run_batch(payloads)
+
+    # Introspection
+
+    def depth(self, priority: str) -> int:
+        with self._cond:
+            return sum(1 for work in self._queues[priority] if not work.cancelled)
+
+    def status(self) -> dict:
+        with self._cond:
+            return {
+                "concurrency": self.concurrency,
+                "max_batch_size": self.max_batch_size,
+                "max_batch_cost": self.max_batch_cost,
+                "batch_wait_ms": round(self.batch_wait * 1000, 1),
+                "batches": self._batches,
+                "classes": {
+                    priority: {
+                        "weight": self.weights[priority],
+                        "reserved": self._reservations()[priority],
+                        "running": self._running[priority],
+                        "queued": sum(1 for work in self._queues[priority] if not work.cancelled)
+                    }
+                    for priority in PRIORITIES
+                }
+            }
+
+
+def scheduler_enabled() -> bool:
+    """SCHEDULER_ENABLED=false runs inference on the calling thread, unscheduled"""
+    return os.getenv('SCHEDULER_ENABLED', 'true').lower() not in ('0', 'false', 'no')
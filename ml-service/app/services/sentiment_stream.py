@@ -0,0 +1,287 @@
+import os
+import time
+import socket
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from app.services.metrics import STAGE_LATENCY, STREAM_MESSAGES
+from app.services.model_loader import ModelLoader, normalize_sentiment_label
+from app.services.model_registry import SENTIMENT, UnknownModelError
+from app.services.scheduler import STANDARD, parse_priority, priority_scope
+
+logger = logging.getLogger(__name__)
+
+# Message outcomes (label of mlservice_stream_messages_total)
+SCORED = "scored"
+RETRIED = "retried"
+DEAD_LETTERED = "dead_lettered"
+
+
+def sentiment_score(label: str, confidence: float) -> float:
+    """Same 0..1 score CommentController::calculateSentimentScore stores"""
+    if label == 'POSITIVE':
+        return 0.5 + confidence * 0.5
+    if label == 'NEGATIVE':
+        return 0.5 - confidence * 0.5
+    return 0.5
+
+
+class PoisonMessage(ValueError):
+    """A stream entry that can never be scored (dead-lettered without retries)"""
+
+
+class SentimentStreamConsumer:
+    """
+    Scores comments published to a Redis stream, as a consumer group.
+
+    The backend XADDs {comment_id, text[, model]} to SENTIMENT_STREAM instead
+    of calling /sentiment/ while the user waits. Worker threads read batches
+    with XREADGROUP, score them with one analyze_sentiment_batch call per
+    model variant, then publish {comment_id, sentiment, confidence, score, ...}
+    to SENTIMENT_STREAM_RESULTS (and POST them to SENTIMENT_STREAM_CALLBACK_URL
+    when set) and XACK the entries.
+
+    Entries of a failed batch stay pending and are reclaimed with XAUTOCLAIM
+    once idle for SENTIMENT_STREAM_RETRY_IDLE_MS, by this or any other
+    consumer, so a crashed worker's messages are retried too. After
+    SENTIMENT_STREAM_MAX_ATTEMPTS deliveries (or straight away for malformed
+    entries) they move to SENTIMENT_STREAM_DLQ with the last error.
+    """
+
+    def __init__(self):
+        self.stream = os.getenv('SENTIMENT_STREAM', 'comments:sentiment')
+        self.group = os.getenv('SENTIMENT_STREAM_GROUP', 'ml-sentiment')
+        self.consumer = os.getenv('SENTIMENT_STREAM_CONSUMER') or f"{socket.gethostname()}-{os.getpid()}"
+        self.results_stream = os.getenv('SENTIMENT_STREAM_RESULTS', 'comments:sentiment:results')
+        self.dead_letter_stream = os.getenv('SENTIMENT_STREAM_DLQ', 'comments:sentiment:dead')
+        self.results_maxlen = int(os.getenv('SENTIMENT_STREAM_MAXLEN', 100000))
+        self.batch_size = int(os.getenv('SENTIMENT_STREAM_BATCH', 32))
+        self.block_ms = int(os.getenv('SENTIMENT_STREAM_BLOCK_MS', 1000))
+        # Nobody waits on the comment form, but results are shown soon after
+        self.priority = parse_priority(os.getenv('SENTIMENT_STREAM_PRIORITY', STANDARD))
+        self.max_attempts = max(1, int(os.getenv('SENTIMENT_STREAM_MAX_ATTEMPTS', 3)))
+        self.retry_idle_ms = int(os.getenv('SENTIMENT_STREAM_RETRY_IDLE_MS', 30000))
+        self.callback_url = os.getenv('SENTIMENT_STREAM_CALLBACK_URL')
+        self.callback_token = os.getenv('SENTIMENT_STREAM_CALLBACK_TOKEN')
+        self.callback_timeout = float(os.getenv('SENTIMENT_STREAM_CALLBACK_TIMEOUT', 10))
+        self.workers = max(1, int(os.getenv('SENTIMENT_STREAM_WORKERS', 1)))
+
+        self.client = None
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+        self._last_errors: Dict[str, str] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return os.getenv('SENTIMENT_STREAM_ENABLED', 'false').lower() == 'true'
+
+    def start(self):
+        """Create the consumer group and start the worker threads (SENTIMENT_STREAM_ENABLED=true)"""
+        if self._threads or not self.enabled:
+            return
+
+        self.client = ModelLoader.get_redis_client()
+        if not self.client:
+            logger.warning("⚠️  Redis unavailable, sentiment stream consumer not started")
+            return
+
+        import redis
+
+        try:
+            self.client.xgroup_create(self.stream, self.group, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+        self._stopping.clear()
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker,
+                args=(f"{self.consumer}-{index}",),
+                name=f"sentiment-stream-{index}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+        logger.info(f"✅ Sentiment stream consumer started: {self.stream} -> {self.results_stream} "
+                    f"(group {self.group}, x{self.workers})")
+
+    def stop(self, timeout: float = 5.0):
+        """Signal workers to stop after their current batch"""
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def status(self) -> dict:
+        """Consumer group backlog: entries not yet read (lag) and read but not acked (pending)"""
+        if not self._threads or not self.client:
+            return {"enabled": self.enabled, "running": False}
+
+        group = next((item for item in self.client.xinfo_groups(self.stream) if item['name'] == self.group), {})
+        return {
+            "enabled": True,
+            "running": True,
+            "stream": self.stream,
+            "group": self.group,
+            "workers": len(self._threads),
+            "lag": group.get('lag'),
+            "pending": group.get('pending'),
+            "dead_letters": self.client.xlen(self.dead_letter_stream)
+        }
+
+    def depth(self) -> int:
+        """Unread plus unacknowledged entries (for the queue depth gauge)"""
+        if not self._threads or not self.client:
+            return 0
+        try:
+            status = self.status()
+            return (status.get('lag') or 0) + (status.get('pending') or 0)
+        except Exception:
+            return 0
+
+    def _worker(self, consumer: str):
+        while not self._stopping.is_set():
+            try:
+                self.poll(consumer)
+            except Exception as e:
+                logger.error(f"Sentiment stream consumer {consumer} failed: {e}")
+                time.sleep(1.0)
+
+    def poll(self, consumer: str) -> int:
+        """One round for `consumer`: reclaim idle entries or read new ones, then score them (returns how many)"""
+        entries = self._reclaim(consumer)
+        if not entries:
+            response = self.client.xreadgroup(
+                self.group, consumer, {self.stream: '>'}, count=self.batch_size, block=self.block_ms
+            )
+            entries = [(entry_id, fields, 1) for _, messages in response or [] for entry_id, fields in messages]
+        if entries:
+            with priority_scope(self.priority):
+                self.process(entries)
+        return len(entries)
+
+    def _reclaim(self, consumer: str) -> List[Tuple[str, dict, int]]:
+        """Pending entries idle for retry_idle_ms (failed or from a dead consumer), with delivery counts"""
+        claimed = self.client.xautoclaim(
+            self.stream, self.group, consumer, min_idle_time=self.retry_idle_ms, start_id='0-0', count=self.batch_size
+        )
+        messages = [(entry_id, fields) for entry_id, fields in claimed[1] if fields]
+        if not messages:
+            return []
+
+        # Delivery counts of exactly the claimed entries: a range over all
+        # consumers could be filled by other consumers' entries in between
+        pipe = self.client.pipeline(transaction=False)
+        for entry_id, _ in messages:
+            pipe.xpending_range(self.stream, self.group, min=entry_id, max=entry_id, count=1, consumername=consumer)
+        deliveries = {item['message_id']: item['times_delivered'] for pending in pipe.execute() for item in pending}
+
+        entries = []
+        for entry_id, fields in messages:
+            attempts = deliveries.get(entry_id, 1)
+            if attempts > self.max_attempts:
+                error = self._last_errors.pop(entry_id, None) or "retries exhausted"
+                self._dead_letter(entry_id, fields, error, attempts - 1)
+            else:
+                entries.append((entry_id, fields, attempts))
+        if entries:
+            STREAM_MESSAGES.labels(stream=self.stream, outcome=RETRIED).inc(len(entries))
+        return entries
+
+    def process(self, entries: List[Tuple[str, dict, int]]):
+        """Score (entry_id, fields, attempt) entries and publish + ack them; failures stay pending"""
+        by_model: Dict[Optional[str], List[Tuple[str, dict]]] = defaultdict(list)
+        for entry_id, fields, attempt in entries:
+            try:
+                self._validate(fields)
+            except PoisonMessage as e:
+                self._dead_letter(entry_id, fields, str(e), attempt)
+                continue
+            by_model[fields.get('model') or None].append((entry_id, fields))
+
+        for model, batch in by_model.items():
+            started = time.perf_counter()
+            try:
+                results = self._score(batch, model)
+                self._publish(batch, results)
+            except Exception as e:
+                error = str(getattr(e, 'detail', e)).splitlines()[0] if str(e) else type(e).__name__
+                logger.warning(f"⚠️  {len(batch)} stream entries failed, retrying later: {error}")
+                for entry_id, _ in batch:
+                    self._last_errors[entry_id] = error
+                continue
+
+            for entry_id, _ in batch:
+                self._last_errors.pop(entry_id, None)
+            STREAM_MESSAGES.labels(stream=self.stream, outcome=SCORED).inc(len(batch))
+            STAGE_LATENCY.labels(stage="stream_batch", model="sentiment", backend="").observe(
+                time.perf_counter() - started
+            )
+
+    def _validate(self, fields: dict):
+        if not fields.get('comment_id'):
+            raise PoisonMessage("entry has no comment_id")
+        if not (fields.get('text') or '').strip():
+            raise PoisonMessage("entry has no text")
+        try:
+            ModelLoader.variant(SENTIMENT, fields.get('model') or None)
+        except UnknownModelError as e:
+            raise PoisonMessage(str(e))
+
+    def _score(self, batch: List[Tuple[str, dict]], model: Optional[str]) -> List[dict]:
+        variant = ModelLoader.variant(SENTIMENT, model)
+        predictions = ModelLoader.analyze_sentiment_batch([fields['text'] for _, fields in batch], model=variant.name)
+
+        results = []
+        for (entry_id, fields), prediction in zip(batch, predictions):
+            label = normalize_sentiment_label(prediction['label'])
+            confidence = float(prediction['score'])
+            results.append({
+                'comment_id': fields['comment_id'],
+                'sentiment': label,
+                'confidence': confidence,
+                'score': sentiment_score(label, confidence),
+                'model': variant.name,
+                'stage': prediction.get('stage') or '',
+                'entry_id': entry_id
+            })
+        return results
+
+    def _publish(self, batch: List[Tuple[str, dict]], results: List[dict]):
+        """Deliver results (callback first, so a failed callback leaves the entries pending) and ack"""
+        if self.callback_url:
+            import httpx
+
+            headers = {'X-ML-Callback-Token': self.callback_token} if self.callback_token else {}
+            with STAGE_LATENCY.labels(stage="stream_callback", model="sentiment", backend="http").time():
+                response = httpx.post(self.callback_url, json={'results': results}, headers=headers,
+                                      timeout=self.callback_timeout)
+            response.raise_for_status()
+
+        pipe = self.client.pipeline(transaction=True)
+        for result in results:
+            pipe.xadd(self.results_stream, {key: str(value) for key, value in result.items()},
+                      maxlen=self.results_maxlen, approximate=True)
+        pipe.xack(self.stream, self.group, *[entry_id for entry_id, _ in batch])
+        pipe.execute()
+
+    def _dead_letter(self, entry_id: str, fields: dict, error: str, attempts: int):
+        logger.warning(f"☠️  Stream entry {entry_id} (comment {fields.get('comment_id')}) dead-lettered: {error}")
+        pipe = self.client.pipeline(transaction=True)
+        pipe.xadd(self.dead_letter_stream, {
+            **fields,
+            'entry_id': entry_id,
+            'error': error,
+            'attempts': str(attempts),
+            'failed_at': str(time.time())
+        }, maxlen=self.results_maxlen, approximate=True)
+        pipe.xack(self.stream, self.group, entry_id)
+        pipe.execute()
+        STREAM_MESSAGES.labels(stream=self.stream, outcome=DEAD_LETTERED).inc()
+
+
+sentiment_stream = SentimentStreamConsumer()
@@ -0,0 +1,207 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from app.services.scheduler import ModelScheduler
+
+logger = logging.getLogger(__name__)
+
+# What a tick decided (last_action in /health/scheduler)
+IDLE = "idle"  # too few samples to judge
+HOLD = "hold"  # within target, nothing to gain
+INCREASE = "increase"
+DECREASE = "decrease"
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ModelTuning:
+    """Target, bounds and last decision of the controller for one model"""
+
+    def __init__(self, scheduler: ModelScheduler, target: float, growth: float, max_batch_wait: float):
+        self.scheduler = scheduler
+        self.target = target
+        self.batched = scheduler.batched
+        # Settings move between these bounds; the configured values are the starting point
+        self.min_batch_size = 1
+        self.max_batch_size = max(1, int(scheduler.max_batch_size * growth))
+        self.max_batch_wait = max(scheduler.batch_wait, max_batch_wait)
+        # Shrinking below one free slot per reservation would undo SCHEDULER_RESERVED
+        self.min_concurrency = min(scheduler.concurrency, 1 + sum(scheduler.reserved.values()))
+        self.max_concurrency = max(self.min_concurrency, int(scheduler.concurrency * growth))
+        self.p95: Optional[float] = None
+        self.samples = 0
+        self.last_action = IDLE
+        self.adjusted_at: Optional[float] = None
+        self.adjustments = 0
+
+    def describe(self) -> dict:
+        return {
+            "p95_target_ms": round(self.target * 1000, 1),
+            "p95_ms": round(self.p95 * 1000, 1) if self.p95 is not None else None,
+            "samples": self.samples,
+            "last_action": self.last_action,
+            "adjusted_at": self.adjusted_at,
+            "adjustments": self.adjustments,
+            "bounds": {
+                "max_batch_size": [self.min_batch_size, self.max_batch_size] if self.batched else None,
+                "batch_wait_ms": [0.0, round(self.max_batch_wait * 1000, 1)] if self.batched else None,
+                "concurrency": [self.min_concurrency, self.max_concurrency]
+            }
+        }
+
+
+class SloController:
+    """
+    AIMD tuning of each model's scheduler against its p95 latency target.
+
+    Every CONTROLLER_INTERVAL seconds it takes the latencies the scheduler
+    saw (queue wait plus time on the model, per input) and compares their
+    p95 with the variant's p95_target_ms:
+
+    - Over target, it backs off multiplicatively (CONTROLLER_BACKOFF). If
+      most of the latency was spent waiting for a slot, it adds a slot
+      instead of shrinking. Otherwise the model itself is slow (too-large
+      batches, too many in flight on the same cores), so batch size and
+      concurrency shrink. The batch wait always shrinks.
+    - Comfortably under target (below CONTROLLER_HEADROOM of it), it grows
+      additively where that buys throughput. Batch size grows when batches
+      leave full, concurrency when inputs queue for a slot, and the batch
+      wait when batches do find company. A wait that mostly ships single
+      inputs is pure latency, so it shrinks.
+
+    Settings stay between 1 (or one more than the reserved slots) and
+    CONTROLLER_GROWTH times their configured values; the batch wait is
+    capped at CONTROLLER_MAX_BATCH_WAIT_MS. Variants without a
+    p95_target_ms keep their static settings.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv('CONTROLLER_ENABLED', 'true').lower() == 'true'
+        self.interval = float(os.getenv('CONTROLLER_INTERVAL', 5))
+        self.min_samples = int(os.getenv('CONTROLLER_MIN_SAMPLES', 20))
+        self.headroom = float(os.getenv('CONTROLLER_HEADROOM', 0.8))
+        self.backoff = float(os.getenv('CONTROLLER_BACKOFF', 0.5))
+        self.growth = float(os.getenv('CONTROLLER_GROWTH', 2))
+        self.batch_step = int(os.getenv('CONTROLLER_BATCH_STEP', 4))
+        self.wait_step = float(os.getenv('CONTROLLER_BATCH_WAIT_STEP_MS', 1)) / 1000.0
+        self.max_batch_wait = float(os.getenv('CONTROLLER_MAX_BATCH_WAIT_MS', 50)) / 1000.0
+        self._models: Dict[str, ModelTuning] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def watch(self, scheduler: ModelScheduler, p95_target_ms: Optional[float]):
+        """Tune `scheduler` towards `p95_target_ms` (ignored without a target)"""
+        if not p95_target_ms:
+            return
+        with self._lock:
+            self._models[scheduler.name] = ModelTuning(
+                scheduler, p95_target_ms / 1000.0, self.growth, self.max_batch_wait
+            )
+
+    def describe(self, model: str) -> Optional[dict]:
+        tuning = self._models.get(model)
+        if tuning is None:
+            return None
+        return {"enabled": self.enabled, **tuning.describe()}
+
+    def start(self):
+        """Start the control loop in the background"""
+        if not self.enabled or self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="slo-controller", daemon=True)
+        self._thread.start()
+        logger.info(f"✅ SLO controller started (every {self.interval:g}s)")
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval)
+            self._thread = None
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            with self._lock:
+                models = list(self._models.values())
+            for tuning in models:
+                try:
+                    self.tick(tuning)
+                except Exception as e:
+                    logger.error(f"SLO controller failed for {tuning.scheduler.name}: {e}")
+
+    def tick(self, tuning: ModelTuning):
+        """One control step for one model"""
+        latencies, batches = tuning.scheduler.take_stats()
+        tuning.samples = len(latencies)
+        if len(latencies) < self.min_samples:
+            tuning.p95 = None
+            tuning.last_action = IDLE
+            return
+
+        tuning.p95 = percentile([latency for latency, _ in latencies], 0.95)
+        total = sum(latency for latency, _ in latencies)
+        # Share of the latency spent waiting for a slot (and for the batch to fill)
+        queueing = sum(queued for _, queued in latencies) / total if total > 0 else 0.0
+        full = sum(1 for size, limit in batches if size >= limit) / len(batches) if batches else 0.0
+        singles = sum(1 for size, _ in batches if size == 1) / len(batches) if batches else 1.0
+
+        scheduler = tuning.scheduler
+        batch_size, batch_wait, concurrency = scheduler.max_batch_size, scheduler.batch_wait, scheduler.concurrency
+
+        if tuning.p95 > tuning.target:
+            action = DECREASE
+            if queueing > 0.5 and concurrency < tuning.max_concurrency:
+                concurrency += 1
+            else:
+                batch_size = int(batch_size * self.backoff)
+                concurrency = int(concurrency * self.backoff)
+            batch_wait *= self.backoff
+        elif tuning.p95 < tuning.target * self.headroom:
+            action = INCREASE
+            if full >= 0.5:
+                batch_size += self.batch_step
+            if queueing > 0.5:
+                concurrency += 1
+            if singles >= 0.5:
+                batch_wait *= self.backoff
+            elif full < 0.5:
+                batch_wait += self.wait_step
+        else:
+            action = HOLD
+
+        batch_size = min(max(batch_size, tuning.min_batch_size), tuning.max_batch_size)
+        batch_wait = min(max(batch_wait, 0.0), tuning.max_batch_wait)
+        if batch_wait < self.wait_step / 2:
+            batch_wait = 0.0
+        concurrency = min(max(concurrency, tuning.min_concurrency), tuning.max_concurrency)
+
+        settings = {"concurrency": concurrency}
+        if tuning.batched:
+            settings.update(max_batch_size=batch_size, batch_wait=batch_wait)
+        current = {
+            "concurrency": scheduler.concurrency,
+            "max_batch_size": scheduler.max_batch_size,
+            "batch_wait": scheduler.batch_wait
+        }
+        changed = any(abs(value - current[name]) > 1e-9 for name, value in settings.items())
+
+        tuning.last_action = action if changed else HOLD
+        if changed:
+            scheduler.tune(**settings)
+            tuning.adjusted_at = time.time()
+            tuning.adjustments += 1
+            logger.info(
+                f"🎛️  {scheduler.name}: p95 {tuning.p95 * 1000:.0f}ms (target {tuning.target * 1000:.0f}ms), "
+                f"batch {batch_size}, wait {batch_wait * 1000:.1f}ms, concurrency {concurrency}"
+            )
+
+
+# Global instance
+slo_controller = SloController()
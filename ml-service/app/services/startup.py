@@ -0,0 +1,116 @@
+import os
+import sys
+import time
+import logging
+import builtins
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Libraries that only the local-model backend (or a specific route) should load
+HEAVY_MODULES = ("torch", "transformers", "sklearn", "scipy", "PIL", "redis", "numpy", "tokenizers")
+
+SERVICE_PACKAGE = __name__.partition('.')[0]
+
+
+def _import_key(name: str, fromlist) -> Optional[str]:
+    """
+    What a not-yet-loaded import is reported as: the top-level package for
+    libraries, the full module name (or the submodules pulled in through
+    `from package import ...`) for the service's own code
+    """
+    top = name.partition('.')[0]
+    if top != SERVICE_PACKAGE:
+        return top if top and top not in sys.modules else None
+
+    if name not in sys.modules:
+        return name
+
+    package = sys.modules[name]
+    if not fromlist or not hasattr(package, '__path__'):
+        return None
+    missing = [item for item in fromlist if item != '*' and f"{name}.{item}" not in sys.modules]
+    if not missing:
+        return None
+    return f"{name}.{missing[0]}" if len(missing) == 1 else f"{name}.{{{','.join(missing)}}}"
+
+
+class StartupTimer:
+    """
+    Boot-time report: how long imports, model initialisation and the job
+    queue took, plus the slowest top-level packages imported while booting
+    (cumulative seconds, like the right-hand column of `python -X importtime`).
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.imports: Dict[str, float] = {}
+        self.total: Optional[float] = None
+        self._original_import = None
+        self._importing = set()
+
+    def install_import_hook(self):
+        """Time the first import of every top-level package until finish()"""
+        if self._original_import is not None:
+            return
+        self._original_import = original = builtins.__import__
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            key = None if level else _import_key(name, fromlist)
+            if key is None or key in self._importing:
+                return original(name, globals, locals, fromlist, level)
+
+            self._importing.add(key)
+            started = time.perf_counter()
+            try:
+                return original(name, globals, locals, fromlist, level)
+            finally:
+                self._importing.discard(key)
+                self.imports[key] = self.imports.get(key, 0.0) + time.perf_counter() - started
+
+        builtins.__import__ = timed_import
+
+    def _remove_import_hook(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def mark(self, phase: str):
+        """Record the time since boot as `phase` (used for the import phase)"""
+        self.phases[phase] = time.perf_counter() - self.started
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - started
+
+    def finish(self, top: Optional[int] = None):
+        """Stop timing imports and log the report"""
+        self._remove_import_hook()
+        self.total = time.perf_counter() - self.started
+
+        report = self.report(top)
+        phases = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in report['phases'].items())
+        slowest = ", ".join(f"{item['module']} {item['seconds']:.2f}s" for item in report['imports'][:5])
+        loaded = [name for name, present in report['heavy_modules'].items() if present]
+        logger.info(f"⏱️  Startup took {self.total:.2f}s ({phases})")
+        logger.info(f"   Slowest imports: {slowest or 'none recorded'}")
+        logger.info(f"   Heavy modules loaded: {', '.join(loaded) or 'none'}")
+
+    def report(self, top: Optional[int] = None) -> dict:
+        top = top or int(os.getenv('STARTUP_REPORT_TOP', 15))
+        slowest: List[tuple] = sorted(self.imports.items(), key=lambda item: item[1], reverse=True)[:top]
+        return {
+            "total_seconds": round(self.total, 3) if self.total is not None else None,
+            "phases": {name: round(seconds, 3) for name, seconds in self.phases.items()},
+            "imports": [{"module": name, "seconds": round(seconds, 3)} for name, seconds in slowest],
+            "heavy_modules": {name: name in sys.modules for name in HEAVY_MODULES}
+        }
+
+
+startup_timer = StartupTimer()
@@ -0,0 +1,127 @@
+import re
+import hashlib
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from app.services.cache import cache_get_or_compute, cache_namespace
+from app.services.metrics import stage_timer
+from app.services.model_loader import ModelLoader
+from app.services.model_registry import TEXT_GENERATION, ModelVariant, UnknownModelError
+
+
+class TextGenerationService:
+    @staticmethod
+    def clean_generated_text(text: str) -> str:
+        """Clean and format generated text"""
+        # Remove extra whitespace
+        text = re.sub(r'\s+', ' ', text).strip()
+
+        # Remove potential prompt repetition
+        lines = text.split('\n')
+        cleaned_lines = []
+        for line in lines:
+            if len(cleaned_lines) > 0 and line.strip() == cleaned_lines[-1].strip():
+                continue
+            cleaned_lines.append(line)
+
+        return '\n'.join(cleaned_lines)
+
+    @staticmethod
+    def create_blog_post_prompt(topic: str, outline: List[str] = None, tone: str = "informative") -> str:
+        """Create a prompt for blog post generation"""
+        tone_instructions = {
+            "informative": "Write in an informative and educational tone with clear explanations.",
+            "casual": "Write in a friendly, conversational tone that engages readers.",
+            "formal": "Write in a professional and formal tone suitable for business audiences.",
+            "creative": "Write in a creative and engaging tone with vivid descriptions."
+        }
+
+        base_prompt = f"Write a comprehensive blog post about: {topic}\n\n"
+        base_prompt += f"Style: {tone_instructions.get(tone, tone_instructions['informative'])}\n\n"
+
+        if outline:
+            base_prompt += "Structure:\n"
+            for i, section in enumerate(outline, 1):
+                base_prompt += f"{i}. {section}\n"
+            base_prompt += "\n"
+
+        base_prompt += "Please write a well-structured blog post that covers the topic thoroughly."
+
+        return base_prompt
+
+    @staticmethod
+    def create_outline_prompt(topic: str, num_sections: int, audience: str) -> str:
+        """Create a prompt for outline generation"""
+        prompt = f"Create a detailed outline for a blog post about: {topic}\n\n"
+        prompt += f"Target audience: {audience}\n"
+        prompt += f"Number of sections: {num_sections}\n\n"
+        prompt += "Generate a logical structure with main sections and key points for each section.\n"
+        prompt += "Format as a numbered list of section titles."
+
+        return prompt
+
+
+text_service = TextGenerationService()
+
+
+def text_generation_variant(name: Optional[str]) -> ModelVariant:
+    """Registry variant a request asked for (400 for unknown names)"""
+    try:
+        return ModelLoader.variant(TEXT_GENERATION, name)
+    except UnknownModelError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def build_alt_text_prompt(tags: List[str]) -> str:
+    """Alt-text prompt from the image's top tags (formerly built by the frontend)"""
+    if not tags:
+        return ("Generate a descriptive alt text for a blog post image. The alt text should be concise "
+                "but descriptive for accessibility purposes. Keep it under 100 characters.")
+
+    tags_text = ", ".join(tags)
+    prompt = f"Generate a descriptive alt text for accessibility purposes based on these image analysis tags: {tags_text}.\n\n"
+    prompt += "Requirements:\n"
+    prompt += "- Make it concise but descriptive (under 100 characters)\n"
+    prompt += "- Focus on the most important visual elements from the tags\n"
+    prompt += "- Use clear, simple language for screen readers\n"
+    prompt += "- Describe the main scene, objects, and activities\n"
+    prompt += f"- Create a coherent description from these identified elements: {tags_text}\n\n"
+    prompt += 'Example format: "A [object] [action] [location] with [details]"'
+    return prompt
+
+
+def generate_alt_text(tags: List[Dict[str, Any]], variant: ModelVariant, prompt_tags: int) -> dict:
+    """Alt text for an image from its top tags, cached per prompt (single-flight across workers)"""
+    prompt = build_alt_text_prompt([tag["tag"] for tag in tags[:prompt_tags]])
+    namespace = cache_namespace("image_alt", variant)
+    cache_key = hashlib.md5(prompt.encode()).hexdigest()
+
+    def generate() -> dict:
+        result = ModelLoader.generate_text(prompt, max_length=100, model=variant.name)
+        generated_text = result.get('generated_text', '') if isinstance(result, dict) else result
+        failed = isinstance(result, dict) and bool(result.get('generation_params', {}).get('error'))
+
+        with stage_timer("postprocess", model="text_generation"):
+            alt_text = text_service.clean_generated_text(generated_text)
+
+        # The prompt is left out of the cache entry: its key is the prompt's hash
+        data = {
+            "alt_text": alt_text,
+            "alt_text_cached": False,
+            "text_model": variant.name
+        }
+        if failed:
+            # Marks the stand-in answer for a failed API call, so it is not cached past the outage
+            data["generation_failed"] = True
+        return data
+
+    response_data, shared = cache_get_or_compute(
+        namespace, cache_key, generate, variant.cache_ttl,
+        cacheable=lambda data: bool(data["alt_text"]) and not data.get("generation_failed")
+    )
+    response_data.pop("generation_failed", None)
+    if shared:
+        response_data["alt_text_cached"] = True
+    response_data["alt_text_prompt"] = prompt
+    return response_data
@@ -0,0 +1,163 @@
+import os
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# RoBERTa adds <s> and </s> around every input
+SPECIAL_TOKENS = 2
+
+
+@dataclass
+class EncodedText:
+    """A text prepared for the sentiment model"""
+    text: str  # possibly truncated text that is sent to the model
+    token_count: int  # tokens in the original text (without special tokens)
+    truncated: bool
+
+
+@dataclass
+class TextWindow:
+    """A token window over a longer document"""
+    text: str
+    start: int  # character offsets into the document
+    end: int
+    token_count: int
+
+
+class SentimentTokenizer:
+    """
+    Tokenization stage in front of the sentiment model.
+
+    Counts tokens with the bundled fast tokenizer, applies head+tail
+    truncation to inputs longer than the model window and groups inputs of
+    similar length into batches so one long comment does not pad a whole
+    batch to 512 tokens.
+    """
+
+    def __init__(self, tokenizer, max_tokens: int = 512, head_tokens: int = 128):
+        if head_tokens >= max_tokens - SPECIAL_TOKENS:
+            raise ValueError("head_tokens must be smaller than the max_tokens budget")
+
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.head_tokens = head_tokens
+
+        # We count and truncate ourselves
+        self.tokenizer.no_truncation()
+        self.tokenizer.no_padding()
+
+    @classmethod
+    def load(cls, path: str, fallback=None, max_tokens: int = 512,
+             head_tokens: int = 128) -> Optional["SentimentTokenizer"]:
+        """
+        Load tokenizer.json from `path`.
+
+        `fallback` is a tokenizers.Tokenizer to use when the file is missing,
+        e.g. the backend tokenizer of an already loaded pipeline.
+        """
+        from tokenizers import Tokenizer
+
+        # Small model windows keep at most half of the budget from the head
+        head_tokens = min(head_tokens, (max_tokens - SPECIAL_TOKENS) // 2)
+
+        if os.path.exists(path):
+            logger.info(f"Loading sentiment tokenizer from {path}")
+            return cls(Tokenizer.from_file(path), max_tokens, head_tokens)
+
+        if fallback is not None:
+            return cls(fallback, max_tokens, head_tokens)
+
+        logger.warning(f"⚠️  Sentiment tokenizer not found at {path}, inputs are sent untruncated")
+        return None
+
+    @classmethod
+    def from_env(cls, fallback=None, default_path: Optional[str] = None,
+                 max_tokens: Optional[int] = None) -> Optional["SentimentTokenizer"]:
+        """
+        Load from SENTIMENT_TOKENIZER_PATH (default: `default_path`, e.g. the
+        converted model bundle, else <MODEL_CACHE_DIR>/sentiment/tokenizer.json).
+        """
+        path = os.getenv(
+            'SENTIMENT_TOKENIZER_PATH',
+            default_path or os.path.join(os.getenv('MODEL_CACHE_DIR', './models'), 'sentiment', 'tokenizer.json')
+        )
+        return cls.load(
+            path, fallback,
+            max_tokens=max_tokens or int(os.getenv('SENTIMENT_MAX_TOKENS', 512)),
+            head_tokens=int(os.getenv('SENTIMENT_HEAD_TOKENS', 128))
+        )
+
+    @property
+    def budget(self) -> int:
+        """Tokens available for text once special tokens are added"""
+        return self.max_tokens - SPECIAL_TOKENS
+
+    def encode(self, texts: List[str]) -> List[EncodedText]:
+        """Count tokens and apply head+tail truncation"""
+        encodings = self.tokenizer.encode_batch(texts, add_special_tokens=False)
+        encoded = []
+
+        for text, encoding in zip(texts, encodings):
+            token_count = len(encoding.ids)
+            if token_count <= self.budget:
+                encoded.append(EncodedText(text, token_count, False))
+                continue
+
+            # Keep the opening and the conclusion, drop the middle
+            tail_tokens = self.budget - self.head_tokens
+            head_end = encoding.offsets[self.head_tokens - 1][1]
+            tail_start = encoding.offsets[token_count - tail_tokens][0]
+            truncated_text = text[:head_end] + " " + text[tail_start:].lstrip()
+            encoded.append(EncodedText(truncated_text, token_count, True))
+
+        return encoded
+
+    def windows(self, text: str, window_tokens: int, overlap_tokens: int) -> List[TextWindow]:
+        """Split a document into overlapping token windows that each fit the model"""
+        window_tokens = min(window_tokens, self.budget)
+        if overlap_tokens >= window_tokens:
+            raise ValueError("overlap_tokens must be smaller than window_tokens")
+
+        encoding = self.tokenizer.encode(text, add_special_tokens=False)
+        offsets = encoding.offsets
+        token_count = len(encoding.ids)
+
+        if token_count <= window_tokens:
+            return [TextWindow(text, 0, len(text), token_count)]
+
+        windows = []
+        start = 0
+        while True:
+            end = min(start + window_tokens, token_count)
+            char_start, char_end = offsets[start][0], offsets[end - 1][1]
+            windows.append(TextWindow(text[char_start:char_end], char_start, char_end, end - start))
+            if end == token_count:
+                return windows
+            start = end - overlap_tokens
+
+
+def plan_batches(token_counts: List[int], batch_size: int, max_batch_tokens: int) -> List[List[int]]:
+    """
+    Group input indices into length-bucketed batches.
+
+    Inputs are sorted by token count so each batch holds texts of similar
+    length, and a batch is closed early once its padded size
+    (len(batch) * longest) would exceed max_batch_tokens.
+    """
+    order = sorted(range(len(token_counts)), key=lambda i: token_counts[i])
+    batches = []
+    batch = []
+
+    for index in order:
+        longest = token_counts[index] + SPECIAL_TOKENS
+        if batch and (len(batch) >= batch_size or (len(batch) + 1) * longest > max_batch_tokens):
+            batches.append(batch)
+            batch = []
+        batch.append(index)
+
+    if batch:
+        batches.append(batch)
+
+    return batches
@@ -0,0 +1,198 @@
+import os
+import time
+import logging
+import tempfile
+import threading
+from typing import Callable, List, Optional
+
+from app.services.metrics import stage_timer
+from app.services.model_loader import ModelLoader
+from app.services.model_registry import IMAGE_CLASSIFICATION, SENTIMENT, TEXT_GENERATION, ModelVariant
+
+logger = logging.getLogger(__name__)
+
+# Warm-up lifecycle
+PENDING = "pending"
+RUNNING = "running"
+READY = "ready"
+FAILED = "failed"
+
+SHORT_TEXT = "Great post, thanks for sharing!"
+LONG_TEXT = (
+    "I have been following this blog for a while and this article finally explains how the caching "
+    "layer, the background workers and the deployment pipeline fit together. "
+) * 40  # well past the model window, so truncation and full-length batches are exercised
+
+
+class Warmup:
+    """
+    Background warm-up that flips readiness.
+
+    Runs representative dummy inputs through the default variant of every
+    task the service will serve locally (at the configured sentiment batch
+    sizes) so the first real
+    requests do not pay for lazy initialisation, first-call kernel setup or
+    the first Redis round-trip. Calls to the Hugging Face API are skipped
+    unless WARMUP_API=true, since they cost quota and warm nothing locally.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv('WARMUP_ENABLED', 'true').lower() == 'true'
+        self.strict = os.getenv('WARMUP_STRICT', 'false').lower() == 'true'
+        self.include_api = os.getenv('WARMUP_API', 'false').lower() == 'true'
+        self.iterations = max(1, int(os.getenv('WARMUP_ITERATIONS', 2)))
+        self.status = PENDING
+        self.steps: List[dict] = []
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == READY
+
+    def start(self):
+        """Start warming up in the background (readiness flips when done)"""
+        if not self.enabled:
+            self.status = READY
+            logger.info("Warm-up disabled, ready immediately")
+            return
+
+        self.status = RUNNING
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def batch_sizes(self) -> List[int]:
+        default = f"1,{ModelLoader.variant(SENTIMENT).batch_size}"
+        sizes = {int(size) for size in os.getenv('WARMUP_BATCH_SIZES', default).split(',') if size.strip()}
+        return sorted(size for size in sizes if size > 0)
+
+    def _plan(self) -> List[tuple]:
+        """(step name, callable) for every enabled backend"""
+        steps = [
+            ("redis", self._warm_redis),
+            ("sentiment_tokenizer", self._warm_tokenizer),
+        ]
+
+        if self.include_api or not ModelLoader.use_api_for(ModelLoader.variant(SENTIMENT)):
+            for size in self.batch_sizes():
+                steps.append((f"sentiment[batch={size}]", lambda size=size: self._warm_sentiment(size)))
+
+        if self.include_api or not ModelLoader.use_api_for(ModelLoader.variant(TEXT_GENERATION)):
+            steps.append(("text_generation", self._warm_text_generation))
+
+        if self.include_api or not ModelLoader.use_api_for(ModelLoader.variant(IMAGE_CLASSIFICATION)):
+            steps.append(("image_classification", self._warm_image_classification))
+
+        return steps
+
+    def _run(self):
+        logger.info("🔥 Warming up models...")
+        failed = False
+
+        try:
+            plan = self._plan()
+        except Exception as e:
+            logger.error(f"❌ Warm-up planning failed: {e}")
+            plan = []
+            failed = True
+
+        for name, step in plan:
+            failed = not self._run_step(name, step) or failed
+
+        self.finished_at = time.time()
+        elapsed = self.finished_at - self.started_at
+
+        if failed and self.strict:
+            self.status = FAILED
+            logger.error(f"❌ Warm-up failed after {elapsed:.1f}s, staying unready (WARMUP_STRICT=true)")
+        else:
+            self.status = READY
+            if failed:
+                logger.warning(f"⚠️  Warm-up finished with errors in {elapsed:.1f}s, serving anyway")
+            else:
+                logger.info(f"✅ Warm-up complete in {elapsed:.1f}s, ready for traffic")
+
+    def warm_variant(self, variant: ModelVariant) -> List[dict]:
+        """
+        Warm one variant the way start() warms the defaults (used for the
+        new version during a hot swap). Returns the step records; raises
+        on the first failing step.
+        """
+        name = variant.name
+        steps = []
+        if variant.task == SENTIMENT:
+            steps.append((f"{variant.key}:tokenizer", lambda: self._warm_tokenizer(name)))
+        if self.include_api or not ModelLoader.use_api_for(variant):
+            if variant.task == SENTIMENT:
+                for size in self.batch_sizes():
+                    steps.append((f"{variant.key}[batch={size}]", lambda size=size: self._warm_sentiment(size, name)))
+            elif variant.task == TEXT_GENERATION:
+                steps.append((variant.key, lambda: self._warm_text_generation(name)))
+            else:
+                steps.append((variant.key, lambda: self._warm_image_classification(name)))
+
+        records = []
+        for step_name, step in steps:
+            record = self._time_step(step_name, step)
+            records.append(record)
+            if record["error"]:
+                raise RuntimeError(f"Warm-up step {step_name} failed: {record['error']}")
+        return records
+
+    def _run_step(self, name: str, step: Callable[[], None]) -> bool:
+        record = self._time_step(name, step)
+        self.steps.append(record)
+        return record["error"] is None
+
+    def _time_step(self, name: str, step: Callable[[], None]) -> dict:
+        record = {"step": name, "seconds": [], "error": None}
+
+        for _ in range(self.iterations):
+            started = time.perf_counter()
+            try:
+                with stage_timer("warmup", model=name):
+                    step()
+            except Exception as e:
+                record["error"] = str(e)
+                logger.warning(f"⚠️  Warm-up step {name} failed: {e}")
+                return record
+            record["seconds"].append(round(time.perf_counter() - started, 3))
+
+        return record
+
+    def _warm_redis(self):
+        for redis_client in (ModelLoader.get_redis_client(), ModelLoader.get_redis_binary_client()):
+            if redis_client:
+                redis_client.ping()
+
+    def _warm_tokenizer(self, model: Optional[str] = None):
+        ModelLoader.encode_sentiment_inputs([SHORT_TEXT, LONG_TEXT], model)
+
+    def _warm_sentiment(self, size: int, model: Optional[str] = None):
+        # Mixed lengths so both a short and a full-window batch shape run
+        texts = [SHORT_TEXT if index % 2 else LONG_TEXT for index in range(size)]
+        ModelLoader.analyze_sentiment_batch(texts, batch_size=size, model=model)
+
+    def _warm_text_generation(self, model: Optional[str] = None):
+        ModelLoader.generate_text("Write one sentence about blogging.", max_length=32, model=model)
+
+    def _warm_image_classification(self, model: Optional[str] = None):
+        from PIL import Image
+
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as temp_file:
+            Image.new("RGB", (224, 224), (120, 160, 200)).save(temp_file, format="JPEG")
+            temp_file.flush()
+            ModelLoader.classify_image(temp_file.name, model)
+
+    def snapshot(self) -> dict:
+        return {
+            "status": self.status,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "steps": self.steps
+        }
+
+
+warmup = Warmup()
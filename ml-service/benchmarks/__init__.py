@@ -0,0 +1 @@
+"""Benchmark harness for the ML service (see benchmarks/run.py)"""
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Compare two benchmark result files
+
+    python -m benchmarks.compare benchmarks/results/base.json benchmarks/results/new.json
+
+Prints throughput and latency deltas per scenario and concurrency level and
+exits with status 1 when any of them regressed by more than --threshold
+(default 10%), so it can gate CI.
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, Optional, Tuple
+
+# (metric, higher is better)
+METRICS = (
+    ("throughput_rps", True),
+    ("p50", False),
+    ("p95", False),
+    ("p99", False),
+    ("peak_rss_mb", False),
+)
+
+
+def load(path: str) -> Tuple[dict, Dict[Tuple[str, int], dict]]:
+    with open(path) as handle:
+        report = json.load(handle)
+    # Rows of a --cpu-configs sweep are keyed by layout too, e.g. "2xauto:pin/sentiment_batch"
+    results = {(f"{row['cpu']}/{row['scenario']}" if row.get("cpu") else row["scenario"], row["concurrency"]): row
+               for row in report["results"]}
+    return report["meta"], results
+
+
+def metric(row: dict, name: str) -> Optional[float]:
+    if name in row["latency_ms"]:
+        return row["latency_ms"][name]
+    return row.get(name)
+
+
+def change(base: Optional[float], new: Optional[float]) -> Optional[float]:
+    if base is None or new is None or base == 0:
+        return None
+    return (new - base) / base
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=0.10, help="Relative change counted as a regression")
+    parser.add_argument('--ignore-rss', action='store_true', help="Do not fail on memory regressions")
+    args = parser.parse_args()
+
+    base_meta, base_results = load(args.base)
+    new_meta, new_results = load(args.new)
+
+    print(f"base: {base_meta['label']} ({base_meta['target']}/{base_meta['backend']})")
+    print(f"new:  {new_meta['label']} ({new_meta['target']}/{new_meta['backend']})")
+    if (base_meta['target'], base_meta['backend']) != (new_meta['target'], new_meta['backend']):
+        print("⚠️  Runs used different targets or backends, numbers are not comparable")
+
+    header = f"{'scenario':<34}{'c':>4}" + "".join(f"{name:>22}" for name, _ in METRICS)
+    print(header)
+    print("-" * len(header))
+
+    regressions = []
+    for key in sorted(set(base_results) & set(new_results)):
+        base_row, new_row = base_results[key], new_results[key]
+        cells = []
+        for name, higher_is_better in METRICS:
+            old_value, new_value = metric(base_row, name), metric(new_row, name)
+            delta = change(old_value, new_value)
+            if delta is None:
+                cells.append(f"{str(new_value):>22}")
+                continue
+
+            worse = -delta if higher_is_better else delta
+            flag = ""
+            if worse > args.threshold and not (name == "peak_rss_mb" and args.ignore_rss):
+                flag = " !"
+                regressions.append(f"{key[0]} c={key[1]} {name} {delta:+.1%}")
+            cells.append(f"{f'{new_value} ({delta:+.1%}){flag}':>22}")
+        print(f"{key[0]:<34}{key[1]:>4}" + "".join(cells))
+
+    only_base = sorted(set(base_results) - set(new_results))
+    only_new = sorted(set(new_results) - set(base_results))
+    if only_base:
+        print(f"\nOnly in base: {', '.join(f'{name} c={c}' for name, c in only_base)}")
+    if only_new:
+        print(f"Only in new: {', '.join(f'{name} c={c}' for name, c in only_new)}")
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) above {args.threshold:.0%}:")
+        for regression in regressions:
+            print(f"   {regression}")
+        sys.exit(1)
+
+    print(f"\n✅ No regressions above {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
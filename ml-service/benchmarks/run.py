@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Benchmark the ML service endpoints
+
+Drives the FastAPI app at fixed concurrency levels and records throughput,
+latency percentiles and peak RSS per scenario:
+
+    # In-process (httpx ASGI transport), Hugging Face API replaced by the stub server
+    python -m benchmarks.run --concurrency 1,8,32
+
+    # Through a real uvicorn server with two workers and 150ms of fake API latency
+    python -m benchmarks.run --target uvicorn --workers 2 --hf-latency-ms 150
+
+    # Throughput curve over worker / thread / pinning layouts (local models)
+    python -m benchmarks.run --target uvicorn --backend local --cpu-configs 1xauto,2xauto,2xauto:pin,4x1:pin
+
+    # Large recommendation catalogs only
+    python -m benchmarks.run --scenarios 'recommendations_*' --catalog-sizes 1000,100000,1000000
+
+By default the Hugging Face API is served by scripts/stub_hf_server.py so runs
+need no token or network and are reproducible. --backend local benchmarks the
+local models instead (they must be downloaded first).
+
+Results are written to benchmarks/results/<commit>.json; compare two runs with
+
+    python -m benchmarks.compare benchmarks/results/abc123.json benchmarks/results/def456.json
+"""
+
+import argparse
+import asyncio
+import fnmatch
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+
+# Allow "from app..." / "from scripts..." imports when run from anywhere
+sys.path.insert(0, str(SERVICE_DIR))
+
+import httpx
+
+from benchmarks.scenarios import BenchRequest, Scenario, build_scenarios
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# One log line per request would swamp the summary
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+RESULTS_DIR = SERVICE_DIR / "benchmarks" / "results"
+
+
+class CpuConfig(NamedTuple):
+    """One server layout of a --cpu-configs sweep: WORKERSxTHREADS[:pin]"""
+    label: str
+    workers: int
+    threads: str  # CPU_THREADS: a number or auto
+    pin: bool
+
+    @classmethod
+    def parse(cls, spec: str) -> "CpuConfig":
+        layout, _, option = spec.strip().partition(":")
+        workers, _, threads = layout.partition("x")
+        if not workers.isdigit() or not (threads == "auto" or threads.isdigit()) or option not in ("", "pin"):
+            raise argparse.ArgumentTypeError(f"CPU config must look like 2x4, 2xauto or 2xauto:pin, got {spec!r}")
+        return cls(spec.strip(), int(workers), threads, option == "pin")
+
+    def environment(self, env: Dict[str, str], slot_dir: str) -> Dict[str, str]:
+        return {
+            **env,
+            "WORKER_COUNT": str(self.workers),
+            "CPU_THREADS": self.threads,
+            "CPU_AFFINITY": "auto" if self.pin else "off",
+            "CPU_SLOT_DIR": slot_dir
+        }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVICE_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class RSSSampler:
+    """
+    Peak resident memory of the server.
+
+    In-process runs read the kernel's high-water mark for this process (it
+    includes the load generator and never goes down, so it is the peak so far).
+    Uvicorn runs sample the server process tree every `interval` seconds.
+    """
+
+    def __init__(self, pid: Optional[int] = None, interval: float = 0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        if self.pid is not None:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+        else:
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # ru_maxrss is in KiB on Linux and bytes on macOS
+            self.peak_bytes = max_rss if sys.platform == "darwin" else max_rss * 1024
+
+    @property
+    def peak_mb(self) -> float:
+        return round(self.peak_bytes / (1024 * 1024), 1)
+
+    def _sample(self):
+        while not self._stop.is_set():
+            try:
+                self.peak_bytes = max(self.peak_bytes, tree_rss(self.pid))
+            except OSError:
+                pass
+            self._stop.wait(self.interval)
+
+
+def tree_rss(pid: int) -> int:
+    """Total RSS in bytes of a process and all its descendants"""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+
+    if psutil:
+        process = psutil.Process(pid)
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        return total
+
+    # /proc fallback (Linux without psutil)
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        with open(f"/proc/{current}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1]) * 1024
+        for task in os.listdir(f"/proc/{current}/task"):
+            try:
+                with open(f"/proc/{current}/task/{task}/children") as children:
+                    pending.extend(int(child) for child in children.read().split())
+            except OSError:
+                pass
+    return total
+
+
+async def drive(client: httpx.AsyncClient, requests: List[BenchRequest], concurrency: int) -> dict:
+    """Send `requests` with `concurrency` requests in flight (closed loop)"""
+    latencies: List[float] = []
+    errors = 0
+    sample_error: Optional[str] = None
+    position = 0
+
+    async def worker():
+        nonlocal position, errors, sample_error
+        while position < len(requests):
+            request = requests[position]
+            position += 1
+            started = time.perf_counter()
+            try:
+                response = await client.request(request.method, request.path, **request.kwargs())
+                ok = response.status_code < 400
+                if not ok and sample_error is None:
+                    sample_error = f"HTTP {response.status_code}: {response.text[:200]}"
+            except httpx.HTTPError as e:
+                ok = False
+                if sample_error is None:
+                    sample_error = str(e)
+            elapsed = time.perf_counter() - started
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    to_ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        "requests": len(requests),
+        "errors": errors,
+        "sample_error": sample_error,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 2) if duration else None,
+        "latency_ms": {
+            "p50": to_ms(percentile(latencies, 50)),
+            "p95": to_ms(percentile(latencies, 95)),
+            "p99": to_ms(percentile(latencies, 99)),
+            "mean": to_ms(sum(latencies) / len(latencies)) if latencies else None,
+            "max": to_ms(latencies[-1] if latencies else None)
+        }
+    }
+
+
+async def run_scenarios(client: httpx.AsyncClient, scenarios: List[Scenario], args,
+                        server_pid: Optional[int]) -> List[dict]:
+    results = []
+    for scenario in scenarios:
+        count = scenario.requests or args.requests
+        for concurrency in args.concurrency:
+            # Seeded per scenario so the same command always sends the same inputs
+            warmup = scenario.build(random.Random(f"{args.seed}:{scenario.name}:warmup"), args.warmup)
+            requests = scenario.build(random.Random(f"{args.seed}:{scenario.name}:{concurrency}"), count)
+
+            if warmup:
+                await drive(client, warmup, concurrency)
+
+            with RSSSampler(server_pid) as rss:
+                result = await drive(client, requests, concurrency)
+
+            result = {"scenario": scenario.name, "concurrency": concurrency, **result, "peak_rss_mb": rss.peak_mb}
+            results.append(result)
+
+            latency = result["latency_ms"]
+            logger.info(
+                f"{scenario.name:<32} c={concurrency:<3} {result['throughput_rps']:>8} req/s  "
+                f"p50={latency['p50']}ms p95={latency['p95']}ms p99={latency['p99']}ms  "
+                f"errors={result['errors']}  rss={result['peak_rss_mb']}MB"
+            )
+            if result["sample_error"]:
+                logger.warning(f"   first error: {result['sample_error']}")
+    return results
+
+
+def configure_backend(args, stub_url: Optional[str]) -> Dict[str, str]:
+    """Environment for the service under test"""
+    env = dict(os.environ)
+    if args.backend == "stub":
+        env["HUGGINGFACE_API_TOKEN"] = "benchmark-stub"
+        env["HF_API_BASE_URL"] = stub_url
+        env["HF_LOCAL_FALLBACK"] = "off"
+        env.pop("FORCE_LOCAL_MODELS", None)
+    else:
+        env.pop("HUGGINGFACE_API_TOKEN", None)
+        env.pop("HF_TOKEN", None)
+        env["FORCE_LOCAL_MODELS"] = "true"
+    return env
+
+
+async def run_inprocess(scenarios: List[Scenario], args) -> List[dict]:
+    from app.main import app
+
+    # ASGITransport does not send lifespan events
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=args.timeout) as client:
+            return await run_scenarios(client, scenarios, args, server_pid=None)
+    finally:
+        await app.router.shutdown()
+
+
+async def run_uvicorn(scenarios: List[Scenario], args, env: Dict[str, str], workers: int) -> List[dict]:
+    port = free_port()
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning"
+    ]
+    server = subprocess.Popen(command, cwd=SERVICE_DIR, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+
+    try:
+        limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+            deadline = time.monotonic() + args.startup_timeout
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"uvicorn did not become healthy within {args.startup_timeout}s")
+                await asyncio.sleep(0.25)
+
+            logger.info(f"uvicorn ready on {base_url} ({workers} worker(s))")
+            return await run_scenarios(client, scenarios, args, server_pid=server.pid)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+async def run_cpu_configs(scenarios: List[Scenario], args, env: Dict[str, str]) -> List[dict]:
+    """Run every scenario once per CPU layout, results tagged with the layout as `cpu`"""
+    results = []
+    for config in args.cpu_configs:
+        logger.info(f"🧵 CPU config {config.label}: {config.workers} worker(s), CPU_THREADS={config.threads}, "
+                    f"{'pinned' if config.pin else 'not pinned'}")
+        with tempfile.TemporaryDirectory(prefix="cpu-slots-") as slot_dir:
+            rows = await run_uvicorn(scenarios, args, config.environment(env, slot_dir), config.workers)
+        results.extend({"cpu": config.label, **row} for row in rows)
+    return results
+
+
+def log_throughput_curves(results: List[dict], configs: List[CpuConfig], concurrency: List[int]):
+    """Requests per second of each CPU config at each concurrency level, per scenario"""
+    table = {(row["scenario"], row["cpu"], row["concurrency"]): row["throughput_rps"] for row in results}
+    for scenario in dict.fromkeys(row["scenario"] for row in results):
+        logger.info(f"📈 {scenario} throughput (req/s)")
+        logger.info(f"   {'config':<16}" + "".join(f"{f'c={level}':>10}" for level in concurrency))
+        for config in configs:
+            cells = "".join(f"{str(table.get((scenario, config.label, level))):>10}" for level in concurrency)
+            logger.info(f"   {config.label:<16}{cells}")
+
+
+def select_scenarios(available: Dict[str, Scenario], patterns: List[str]) -> List[Scenario]:
+    selected = [scenario for name, scenario in available.items()
+                if any(fnmatch.fnmatch(name, pattern) for pattern in patterns)]
+    if not selected:
+        raise SystemExit(f"No scenario matches {patterns}; available: {', '.join(available)}")
+    return selected
+
+
+def int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the BlogML ML service")
+    parser.add_argument('--target', choices=['inprocess', 'uvicorn'], default='inprocess')
+    parser.add_argument('--backend', choices=['stub', 'local'], default='stub',
+                        help="stub: Hugging Face API served by scripts/stub_hf_server.py; local: local models")
+    parser.add_argument('--scenarios', default='*', help="Comma-separated names or glob patterns")
+    parser.add_argument('--concurrency', type=int_list, default=[1, 8, 32])
+    parser.add_argument('--requests', type=int, default=200, help="Measured requests per scenario and concurrency")
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=32, help="Texts per sentiment batch request")
+    parser.add_argument('--catalog-sizes', type=int_list, default=[1000, 10000],
+                        help="Posts per recommendation request (e.g. 1000,100000,1000000)")
+    parser.add_argument('--catalog-requests', type=int, default=20, help="Measured requests per catalog scenario")
+    parser.add_argument('--hf-latency-ms', type=float, default=50.0, help="Stub Hugging Face API latency")
+    parser.add_argument('--hf-jitter-ms', type=float, default=0.0)
+    parser.add_argument('--workers', type=int, default=1, help="uvicorn workers (--target uvicorn)")
+    parser.add_argument('--cpu-configs', type=lambda value: [CpuConfig.parse(item) for item in value.split(",") if item.strip()],
+                        default=None,
+                        help="Sweep server layouts WORKERSxTHREADS[:pin], e.g. 1xauto,2xauto:pin,4x1:pin "
+                             "(--target uvicorn, overrides --workers)")
+    parser.add_argument('--timeout', type=float, default=300.0, help="Per-request client timeout in seconds")
+    parser.add_argument('--startup-timeout', type=float, default=300.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--label', default=None, help="Result file name (default: current commit)")
+    parser.add_argument('-o', '--output', default=None, help="Result file path")
+    args = parser.parse_args()
+    if args.cpu_configs and args.target != "uvicorn":
+        parser.error("--cpu-configs needs --target uvicorn")
+
+    scenarios = select_scenarios(
+        build_scenarios(args.batch_size, args.catalog_sizes, args.catalog_requests),
+        [pattern.strip() for pattern in args.scenarios.split(",")]
+    )
+
+    stub_url = None
+    if args.backend == "stub":
+        from scripts.stub_hf_server import StubState, serve
+
+        stub_port = free_port()
+        serve("127.0.0.1", stub_port, StubState(args.hf_latency_ms, args.hf_jitter_ms))
+        stub_url = f"http://127.0.0.1:{stub_port}"
+        logger.info(f"Stub Hugging Face API on {stub_url} ({args.hf_latency_ms}ms latency)")
+
+    env = configure_backend(args, stub_url)
+
+    logger.info(f"🚀 Benchmarking {len(scenarios)} scenario(s) {args.target}/{args.backend} at concurrency {args.concurrency}")
+    started = time.time()
+    if args.target == "inprocess":
+        os.environ.clear()
+        os.environ.update(env)
+        results = asyncio.run(run_inprocess(scenarios, args))
+    elif args.cpu_configs:
+        results = asyncio.run(run_cpu_configs(scenarios, args, env))
+        log_throughput_curves(results, args.cpu_configs, args.concurrency)
+    else:
+        results = asyncio.run(run_uvicorn(scenarios, args, env, args.workers))
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "label": args.label or commit,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+            "duration_s": round(time.time() - started, 1),
+            "target": args.target,
+            "backend": args.backend,
+            "workers": args.workers if args.target == "uvicorn" and not args.cpu_configs else None,
+            "cpu_configs": [config.label for config in args.cpu_configs] if args.cpu_configs else None,
+            "hf_latency_ms": args.hf_latency_ms if args.backend == "stub" else None,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("output", "label", "cpu_configs")}
+        },
+        "results": results
+    }
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{args.label or commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    logger.info(f"✅ Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
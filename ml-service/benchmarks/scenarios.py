@@ -0,0 +1,165 @@
+"""
+Benchmark scenarios and synthetic inputs
+
+Every scenario builds its requests up front from a seeded RNG so two runs of
+the same command send byte-identical traffic and client-side encoding is not
+part of the measured latency.
+"""
+
+import io
+import json
+import random
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+WORDS = (
+    "python laravel vue docker redis cache model latency api server frontend "
+    "backend deploy release guide tutorial performance database query index "
+    "machine learning sentiment image text blog post comment review great "
+    "terrible slow fast love hate helpful confusing update security testing "
+    "kubernetes cloud design pattern refactor bug feature library framework"
+).split()
+
+TAGS = ["technology", "programming", "web", "devops", "ai", "design", "career", "news", "tutorial", "opinion"]
+
+
+@dataclass
+class BenchRequest:
+    method: str
+    path: str
+    json: Optional[dict] = None
+    content: Optional[bytes] = None
+    files: Optional[dict] = None
+    data: Optional[dict] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    def kwargs(self) -> dict:
+        kwargs = {"headers": self.headers}
+        for name in ("json", "content", "files", "data"):
+            value = getattr(self, name)
+            if value is not None:
+                kwargs[name] = value
+        return kwargs
+
+
+@dataclass
+class Scenario:
+    name: str
+    build: Callable[[random.Random, int], List[BenchRequest]]
+    requests: Optional[int] = None  # overrides --requests (for very heavy scenarios)
+
+
+def sentence(rng: random.Random, min_words: int = 8, max_words: int = 40) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+
+def sentiment_single(rng: random.Random, count: int) -> List[BenchRequest]:
+    # The request index makes every text unique so the Redis cache never answers
+    return [
+        BenchRequest("POST", "/sentiment/", json={"text": f"{sentence(rng)} #{i}"})
+        for i in range(count)
+    ]
+
+
+def sentiment_batch(batch_size: int):
+    def build(rng: random.Random, count: int) -> List[BenchRequest]:
+        return [
+            BenchRequest("POST", "/sentiment/batch", json={
+                "texts": [f"{sentence(rng)} #{i}.{j}" for j in range(batch_size)]
+            })
+            for i in range(count)
+        ]
+    return build
+
+
+def png_bytes(seed: int, size: int = 224) -> bytes:
+    """A small gradient PNG with a seed-dependent corner so every upload hashes differently"""
+    from PIL import Image
+
+    image = Image.new("RGB", (size, size))
+    pixels = image.load()
+    for x in range(size):
+        for y in range(size):
+            pixels[x, y] = (x % 256, y % 256, (x + y) % 256)
+    for offset in range(4):
+        pixels[offset, 0] = ((seed >> (offset * 8)) & 0xFF, 0, 0)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def image_classify(rng: random.Random, count: int) -> List[BenchRequest]:
+    return [
+        BenchRequest(
+            "POST",
+            "/image-classification/",
+            files={"file": (f"bench_{i}.png", png_bytes(rng.randrange(1 << 32)), "image/png")},
+            data={"max_tags": "5"}
+        )
+        for i in range(count)
+    ]
+
+
+def text_generation(rng: random.Random, count: int) -> List[BenchRequest]:
+    return [
+        BenchRequest("POST", "/text-generation/text", json={
+            "prompt": f"Write an introduction about {sentence(rng, 3, 8)} #{i}",
+            "max_length": 256
+        })
+        for i in range(count)
+    ]
+
+
+def catalog(rng: random.Random, size: int) -> List[dict]:
+    """Synthetic posts shaped like PostContent"""
+    return [
+        {
+            "post_id": post_id,
+            "title": sentence(rng, 3, 8),
+            "content": sentence(rng, 30, 80),
+            "tags": rng.sample(TAGS, rng.randint(1, 3))
+        }
+        for post_id in range(1, size + 1)
+    ]
+
+
+def recommendations_user(size: int):
+    def build(rng: random.Random, count: int) -> List[BenchRequest]:
+        posts = catalog(rng, size)
+        # The catalog dominates the body; serialize it once and reuse the bytes
+        body = json.dumps({
+            "user_profile": {"user_id": 1, "read_posts": [1, 2, 3], "liked_posts": [2]},
+            "available_posts": posts,
+            "num_recommendations": 10
+        }).encode()
+        headers = {"Content-Type": "application/json"}
+        return [BenchRequest("POST", "/recommendations/user", content=body, headers=headers)] * count
+    return build
+
+
+def recommendations_similar(size: int):
+    def build(rng: random.Random, count: int) -> List[BenchRequest]:
+        posts = catalog(rng, size + 1)
+        body = json.dumps({
+            "post_id": posts[0]["post_id"],
+            "post_content": posts[0],
+            "similar_posts": posts[1:],
+            "num_similar": 5
+        }).encode()
+        headers = {"Content-Type": "application/json"}
+        return [BenchRequest("POST", "/recommendations/similar", content=body, headers=headers)] * count
+    return build
+
+
+def build_scenarios(batch_size: int, catalog_sizes: List[int], catalog_requests: int) -> Dict[str, Scenario]:
+    scenarios = [
+        Scenario("sentiment_single", sentiment_single),
+        Scenario("sentiment_batch", sentiment_batch(batch_size)),
+        Scenario("image_classify", image_classify),
+        Scenario("text_generation", text_generation),
+    ]
+    for size in catalog_sizes:
+        scenarios.append(Scenario(f"recommendations_user_{size}", recommendations_user(size), catalog_requests))
+        scenarios.append(Scenario(f"recommendations_similar_{size}", recommendations_similar(size), catalog_requests))
+    return {scenario.name: scenario for scenario in scenarios}
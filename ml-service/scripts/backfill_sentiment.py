@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Bulk offline sentiment backfill for BlogML comments
+
+Re-scores an archive of comments after a model change without going through
+the HTTP API one comment at a time. Input is streamed from disk so the file
+can be arbitrarily large:
+
+    # JSONL, one {"id": ..., "text": ...} object per line
+    python scripts/backfill_sentiment.py comments.jsonl -o scores.jsonl
+
+    # CSV with a header row (column names are configurable)
+    python scripts/backfill_sentiment.py comments.csv -o scores.jsonl --text-field content
+
+    # A different sentiment variant from config/models.yaml
+    python scripts/backfill_sentiment.py comments.jsonl -o scores.jsonl --model distilbert
+
+Records are grouped into chunks which are scored by a pool of worker
+processes (one per core by default). Inside each chunk texts are sorted by
+token length and bucketed before batching so short comments are not padded
+to the longest one.
+
+Results are appended to the output file in input order and a checkpoint is
+written after every chunk. Re-running the same command after an interruption
+resumes from the last checkpoint; pass --restart to start over.
+
+Each output line has the columns stored on the Comment model:
+
+    {"id": 42, "sentiment_label": "POSITIVE", "sentiment_confidence": 0.97, "sentiment_score": 0.985}
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Allow "from app..." imports when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+Record = Tuple[str, str]
+
+
+def detect_format(path: str, requested: str) -> str:
+    """Pick the input format from --format or the file extension"""
+    if requested != 'auto':
+        return requested
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+def read_records(path: str, fmt: str, id_field: str, text_field: str) -> Iterator[Record]:
+    """Stream (id, text) pairs from a JSONL or CSV file"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            for row in csv.DictReader(f):
+                yield row[id_field], row.get(text_field) or ''
+        else:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"Invalid JSON on line {line_number}: {e}")
+                yield row[id_field], row.get(text_field) or ''
+
+
+def read_chunks(records: Iterator[Record], chunk_size: int) -> Iterator[List[Record]]:
+    """Group records into fixed-size chunks"""
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def sentiment_score(label: str, confidence: float) -> float:
+    """Same 0..1 score CommentController::calculateSentimentScore stores"""
+    if label == 'POSITIVE':
+        return 0.5 + confidence * 0.5
+    if label == 'NEGATIVE':
+        return 0.5 - confidence * 0.5
+    return 0.5
+
+
+def init_worker(threads: int, force_local: bool, model: Optional[str] = None):
+    """Process pool initializer: load only the sentiment model once per worker"""
+    if force_local:
+        os.environ['FORCE_LOCAL_MODELS'] = 'true'
+    if model:
+        # Makes the variant the registry default in this worker
+        os.environ['SENTIMENT_MODEL_VARIANT'] = model
+    # ModelLoader applies these to torch / onnxruntime; pool workers are not pinned
+    os.environ['CPU_THREADS'] = str(threads)
+    os.environ['CPU_AFFINITY'] = 'off'
+
+    from app.services.model_loader import ModelLoader
+
+    ModelLoader.load_sentiment_model()
+
+
+def score_chunk(chunk: List[Record], batch_size: int) -> List[Dict]:
+    """Score one chunk in a worker process, returning rows in input order"""
+    from app.services.model_loader import ModelLoader, normalize_sentiment_label
+
+    rows: List[Dict] = [None] * len(chunk)
+
+    # Empty texts never reach the model
+    pending = []
+    for index, (record_id, text) in enumerate(chunk):
+        if text.strip():
+            pending.append(index)
+        else:
+            rows[index] = {
+                'id': record_id,
+                'sentiment_label': 'NEUTRAL',
+                'sentiment_confidence': 0.0,
+                'sentiment_score': 0.5
+            }
+
+    # ModelLoader sorts by token length and buckets the texts into batches
+    predictions = ModelLoader.analyze_sentiment_batch(
+        [chunk[i][1] for i in pending],
+        batch_size=batch_size
+    )
+    for index, prediction in zip(pending, predictions):
+        label = normalize_sentiment_label(prediction['label'])
+        confidence = float(prediction['score'])
+        rows[index] = {
+            'id': chunk[index][0],
+            'sentiment_label': label,
+            'sentiment_confidence': round(confidence, 4),
+            'sentiment_score': round(sentiment_score(label, confidence), 4)
+        }
+
+    return rows
+
+
+class Checkpoint:
+    """Tracks how many input records have been written and where the output ends"""
+
+    def __init__(self, path: Path, input_path: str):
+        self.path = path
+        self.input_path = os.path.abspath(input_path)
+        self.records_done = 0
+        self.output_bytes = 0
+
+    def load(self) -> bool:
+        if not self.path.exists():
+            return False
+        with open(self.path) as f:
+            data = json.load(f)
+        if data.get('input') != self.input_path:
+            raise ValueError(
+                f"Checkpoint {self.path} belongs to {data.get('input')}, not {self.input_path}. "
+                "Use --restart or a different --checkpoint."
+            )
+        self.records_done = data['records_done']
+        self.output_bytes = data['output_bytes']
+        return True
+
+    def save(self):
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'input': self.input_path,
+                'records_done': self.records_done,
+                'output_bytes': self.output_bytes,
+                'updated_at': time.time()
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def run_backfill(args) -> int:
+    fmt = detect_format(args.input, args.format)
+    output_path = Path(args.output)
+    checkpoint = Checkpoint(
+        Path(args.checkpoint) if args.checkpoint else output_path.with_suffix(output_path.suffix + '.ckpt'),
+        args.input
+    )
+
+    if args.model:
+        from app.services.model_registry import SENTIMENT, ModelRegistry, UnknownModelError
+
+        try:
+            ModelRegistry.load().get(SENTIMENT, args.model)
+        except UnknownModelError as e:
+            logger.error(f"❌ {e}")
+            return 1
+
+    if args.restart:
+        checkpoint.path.unlink(missing_ok=True)
+        output_path.unlink(missing_ok=True)
+
+    if checkpoint.load():
+        logger.info(f"🔁 Resuming after {checkpoint.records_done} records")
+    elif output_path.exists() and output_path.stat().st_size > 0:
+        logger.error(f"❌ {output_path} already exists without a checkpoint. Use --restart to overwrite it.")
+        return 1
+
+    records = read_records(args.input, fmt, args.id_field, args.text_field)
+
+    # Skip records that are already in the output
+    for _ in range(checkpoint.records_done):
+        next(records, None)
+
+    workers = args.workers or os.cpu_count() or 1
+    logger.info(
+        f"🚀 Scoring with {workers} worker(s), chunk size {args.chunk_size}, "
+        f"batch size {args.batch_size or 'per variant'}, model {args.model or 'default'}"
+    )
+
+    started = time.time()
+    scored = 0
+
+    with open(output_path, 'a+b') as output:
+        # Drop anything written after the last checkpoint (a partially flushed chunk)
+        output.truncate(checkpoint.output_bytes)
+        output.seek(checkpoint.output_bytes)
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=init_worker,
+            initargs=(args.threads_per_worker, args.local, args.model)
+        ) as pool:
+            in_flight = deque()
+            chunks = read_chunks(records, args.chunk_size)
+            max_in_flight = workers * 2
+
+            def submit_next() -> bool:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    return False
+                in_flight.append(pool.submit(score_chunk, chunk, args.batch_size))
+                return True
+
+            while len(in_flight) < max_in_flight and submit_next():
+                pass
+
+            # Results are consumed in submission order so the checkpoint is
+            # always a clean prefix of the input
+            while in_flight:
+                rows = in_flight.popleft().result()
+                submit_next()
+
+                output.write(''.join(json.dumps(row) + '\n' for row in rows).encode('utf-8'))
+                output.flush()
+                os.fsync(output.fileno())
+
+                checkpoint.records_done += len(rows)
+                checkpoint.output_bytes = output.tell()
+                checkpoint.save()
+
+                scored += len(rows)
+                elapsed = time.time() - started
+                logger.info(
+                    f"✅ {checkpoint.records_done} records done "
+                    f"({scored / elapsed if elapsed else 0.0:.1f}/s this run)"
+                )
+
+    logger.info(f"🎉 Backfill complete: {checkpoint.records_done} records written to {output_path}")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Re-score comment sentiment in bulk")
+    parser.add_argument('input', help="JSONL or CSV file with comment ids and texts")
+    parser.add_argument('-o', '--output', required=True, help="JSONL file to append results to")
+    parser.add_argument('--format', choices=['auto', 'jsonl', 'csv'], default='auto')
+    parser.add_argument('--id-field', default='id')
+    parser.add_argument('--text-field', default='text')
+    parser.add_argument('--checkpoint', help="Checkpoint path (default: <output>.ckpt)")
+    parser.add_argument('--restart', action='store_true', help="Ignore any checkpoint and overwrite the output")
+    parser.add_argument('--workers', type=int, default=0, help="Worker processes (default: all cores)")
+    parser.add_argument('--threads-per-worker', type=int, default=1, help="Torch threads per worker process")
+    parser.add_argument('--chunk-size', type=int, default=1024, help="Records per unit of work")
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help="Texts per model forward pass (default: the variant's batch_size)")
+    parser.add_argument('--model', default=None, help="Sentiment variant from the model registry (default: its default)")
+    parser.add_argument('--local', action='store_true', help="Use the local model even if an HF token is set")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    try:
+        sys.exit(run_backfill(args))
+    except KeyboardInterrupt:
+        logger.warning("⚠️  Interrupted - re-run the same command to resume from the last checkpoint")
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main()
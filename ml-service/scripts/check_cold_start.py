@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Cold-start regression check for the ML service
+
+Boots the app in fresh interpreters (import + startup event, no HTTP server)
+and fails when startup got slower than the budget or when API mode pulled in
+libraries only the local backend needs:
+
+    # Fail if the median cold start exceeds 2.5s or torch/transformers load in API mode
+    python scripts/check_cold_start.py --max-seconds 2.5
+
+    # Record a baseline, later fail on >20% regressions against it
+    python scripts/check_cold_start.py --save-baseline cold_start.json
+    python scripts/check_cold_start.py --baseline cold_start.json --tolerance 0.2
+
+Runs use API mode with a dummy token by default (no network calls are made
+during startup); pass --local to boot the local-model backend instead.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+
+# Must never be imported while booting in API mode
+API_MODE_FORBIDDEN = ("torch", "transformers", "sklearn", "scipy")
+
+BOOT_SNIPPET = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+from app.main import app
+from app.services.startup import startup_timer
+asyncio.run(app.router.startup())
+boot = time.perf_counter() - started
+report = startup_timer.report()
+report['boot_seconds'] = boot
+report['loaded'] = sorted(name for name in sys.modules if '.' not in name)
+asyncio.run(app.router.shutdown())
+print(json.dumps(report))
+"""
+
+
+def boot_once(env: dict) -> dict:
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", BOOT_SNIPPET],
+        cwd=SERVICE_DIR, env=env, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"Boot failed:\n{result.stderr[-2000:]}")
+
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report['wall_seconds'] = wall
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check ML service cold-start time")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--local', action='store_true', help="Boot with local models instead of API mode")
+    parser.add_argument('--max-seconds', type=float, default=None, help="Budget for the median wall time")
+    parser.add_argument('--baseline', default=None, help="Baseline JSON written by --save-baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown against the baseline")
+    parser.add_argument('--save-baseline', default=None)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.local:
+        env.pop('HUGGINGFACE_API_TOKEN', None)
+        env.pop('HF_TOKEN', None)
+        env['FORCE_LOCAL_MODELS'] = 'true'
+    else:
+        env.setdefault('HUGGINGFACE_API_TOKEN', 'cold-start-check')
+        env.pop('FORCE_LOCAL_MODELS', None)
+        env['HF_LOCAL_FALLBACK'] = 'off'
+
+    reports = []
+    for run in range(args.runs):
+        report = boot_once(env)
+        reports.append(report)
+        print(f"run {run + 1}: wall {report['wall_seconds']:.2f}s, "
+              f"in-process {report['boot_seconds']:.2f}s {report['phases']}")
+
+    wall = statistics.median(report['wall_seconds'] for report in reports)
+    boot = statistics.median(report['boot_seconds'] for report in reports)
+    print(f"\nmedian wall {wall:.2f}s (interpreter + imports + startup), in-process {boot:.2f}s")
+    print("slowest imports (last run):")
+    for item in reports[-1]['imports'][:10]:
+        print(f"   {item['module']:<40} {item['seconds']:.3f}s")
+
+    failures = []
+    if not args.local:
+        loaded = set(reports[-1]['loaded'])
+        forbidden = [name for name in API_MODE_FORBIDDEN if name in loaded]
+        if forbidden:
+            failures.append(f"API mode imported {', '.join(forbidden)} at startup")
+
+    if args.max_seconds is not None and wall > args.max_seconds:
+        failures.append(f"median cold start {wall:.2f}s exceeds budget of {args.max_seconds:.2f}s")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        limit = baseline['median_wall_seconds'] * (1 + args.tolerance)
+        print(f"baseline {baseline['median_wall_seconds']:.2f}s, limit {limit:.2f}s")
+        if wall > limit:
+            failures.append(f"median cold start {wall:.2f}s is more than {args.tolerance:.0%} above baseline")
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps({
+            'median_wall_seconds': round(wall, 3),
+            'median_boot_seconds': round(boot, 3),
+            'mode': 'local' if args.local else 'api',
+            'runs': args.runs
+        }, indent=2))
+        print(f"baseline written to {args.save_baseline}")
+
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+
+    print("✅ Cold start OK")
+
+
+if __name__ == "__main__":
+    main()
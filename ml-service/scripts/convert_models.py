@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Convert the local models into fast-loading bundles (run once, at build time)
+
+For each model variant in the registry (config/models.yaml) this writes
+<MODEL_BUNDLE_DIR>/<bundle>/ with safetensors weights, config, tokenizer.json
+(or image processor config), an optional ONNX graph and bundle.json holding
+the size and sha256 of every file. ModelLoader then loads the bundle from
+disk (no hub cache resolution, no pickle deserialisation, no network):
+
+    # Convert from the hub (or the local Hugging Face cache)
+    python scripts/convert_models.py
+
+    # Convert copies fetched by scripts/download_models_simple.py (same models as ModelLoader)
+    python scripts/convert_models.py --source-dir models
+
+    # Only sentiment, with an ONNX export, into a custom directory
+    python scripts/convert_models.py sentiment --onnx --output /opt/bundles
+
+    # A side-by-side variant (bundle name <task>.<variant> unless configured)
+    python scripts/convert_models.py sentiment.distilbert
+
+    # Fail at boot instead of falling back to the hub when a bundle is missing
+    MODEL_BUNDLE_DIR=/opt/bundles MODEL_BUNDLE_REQUIRED=true uvicorn app.main:app
+
+Re-running replaces a bundle atomically; use --check to verify existing
+bundles against their manifests without converting anything.
+"""
+
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import time
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVICE_DIR))
+
+from app.services.model_bundle import (
+    BUNDLE_FORMAT, BUNDLE_MANIFEST, VERIFY_SHA256, BundleError, ModelBundle, bundle_root, file_sha256
+)
+from app.services.model_registry import IMAGE_CLASSIFICATION, SENTIMENT, TEXT_GENERATION, ModelRegistry
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Registry task -> the pipeline task the service loads it with and its ONNX inputs
+PIPELINE_TASKS = {
+    SENTIMENT: ('sentiment-analysis', ('input_ids', 'attention_mask')),
+    TEXT_GENERATION: ('text2text-generation', None),  # encoder-decoder generation is not exported
+    IMAGE_CLASSIFICATION: ('image-classification', ('pixel_values',)),
+}
+
+
+def registry_models() -> dict:
+    """Bundle name -> model and pipeline task for every variant in the registry"""
+    models = {}
+    for variant in ModelRegistry.load().all_variants():
+        task, onnx_inputs = PIPELINE_TASKS[variant.task]
+        models[variant.bundle_name] = {'model_name': variant.model, 'task': task, 'onnx_inputs': onnx_inputs}
+    return models
+
+
+MODELS = registry_models()
+
+
+def resolve_source(key: str, model_name: str, source_dir) -> str:
+    """<source_dir>/<key> when given and present, else the hub id (through the HF cache)"""
+    if source_dir and (Path(source_dir) / key / 'config.json').exists():
+        return str(Path(source_dir) / key)
+    return model_name
+
+
+def export_onnx(model, input_names, path: Path, opset: int):
+    """Trace the model into an ONNX graph returning logits (dynamic batch/sequence axes)"""
+    import torch
+
+    class LogitsOnly(torch.nn.Module):
+        def __init__(self, wrapped):
+            super().__init__()
+            self.wrapped = wrapped
+
+        def forward(self, *inputs):
+            return self.wrapped(**dict(zip(input_names, inputs)), return_dict=True).logits
+
+    config = model.config
+    if 'pixel_values' in input_names:
+        size = getattr(config, 'image_size', 224)
+        dummy = (torch.zeros(1, getattr(config, 'num_channels', 3), size, size),)
+        axes = {'pixel_values': {0: 'batch'}}
+    else:
+        # Real token ids (not the padding id) so the parity check exercises attention
+        input_ids = torch.randint(5, config.vocab_size, (2, 8), generator=torch.Generator().manual_seed(0))
+        dummy = (input_ids, torch.ones_like(input_ids))[:len(input_names)]
+        axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    axes['logits'] = {0: 'batch'}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            # eval() on the wrapper: export restores the wrapper's mode onto the whole model
+            LogitsOnly(model).eval(), dummy, str(path),
+            input_names=list(input_names), output_names=['logits'],
+            dynamic_axes=axes, opset_version=opset, do_constant_folding=True
+        )
+        expected = model(**dict(zip(input_names, dummy)), return_dict=True).logits.numpy()
+
+    # Check the graph against PyTorch when onnxruntime is available
+    try:
+        import onnxruntime
+    except ImportError:
+        logger.info("   onnxruntime not installed, skipping ONNX parity check")
+        return
+
+    session = onnxruntime.InferenceSession(str(path), providers=['CPUExecutionProvider'])
+    actual = session.run(['logits'], {name: value.numpy() for name, value in zip(input_names, dummy)})[0]
+    difference = float(abs(actual - expected).max())
+    if difference > 1e-3:
+        raise RuntimeError(f"ONNX graph differs from PyTorch (max abs difference {difference:.2e})")
+    logger.info(f"   ONNX parity OK (max abs difference {difference:.2e})")
+
+
+def convert(key: str, config: dict, source: str, output: Path, onnx: bool, opset: int) -> Path:
+    from transformers import pipeline
+
+    logger.info(f"🔧 Converting {key}: {config['model_name']} (from {source})")
+    started = time.perf_counter()
+    pipe = pipeline(config['task'], model=source, device=-1)
+
+    staging = output / f".{key}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    try:
+        return _write_bundle(key, config, source, pipe, staging, output, onnx, opset, started)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def _write_bundle(key, config, source, pipe, staging: Path, output: Path, onnx: bool, opset: int,
+                  started: float) -> Path:
+    import torch
+    import transformers
+
+    pipe.model.save_pretrained(staging, safe_serialization=True)
+    if getattr(pipe, 'tokenizer', None) is not None:
+        pipe.tokenizer.save_pretrained(staging)
+    if getattr(pipe, 'image_processor', None) is not None:
+        pipe.image_processor.save_pretrained(staging)
+
+    onnx_name = None
+    if onnx and config['onnx_inputs']:
+        logger.info(f"   Exporting ONNX graph (opset {opset})...")
+        export_onnx(pipe.model, config['onnx_inputs'], staging / 'model.onnx', opset)
+        onnx_name = 'model.onnx'
+    elif onnx:
+        logger.info(f"   Skipping ONNX export for {key} (not supported for {config['task']})")
+
+    files = {
+        path.relative_to(staging).as_posix(): {'size': path.stat().st_size, 'sha256': file_sha256(path)}
+        for path in sorted(staging.rglob('*')) if path.is_file()
+    }
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'key': key,
+        'model_name': config['model_name'],
+        'task': config['task'],
+        'source': source,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'versions': {'transformers': transformers.__version__, 'torch': torch.__version__},
+        'onnx': onnx_name,
+        'files': files
+    }
+    (staging / BUNDLE_MANIFEST).write_text(json.dumps(manifest, indent=2))
+
+    # Swap the new bundle in; a half-written bundle is never visible under its final name
+    target = output / key
+    previous = output / f".{key}.old"
+    shutil.rmtree(previous, ignore_errors=True)
+    if target.exists():
+        os.replace(target, previous)
+    os.replace(staging, target)
+    shutil.rmtree(previous, ignore_errors=True)
+
+    total_mb = sum(item['size'] for item in files.values()) / 1e6
+    logger.info(f"✅ {key} bundle written to {target} ({len(files)} files, {total_mb:.1f} MB, "
+                f"{time.perf_counter() - started:.1f}s)")
+    return target
+
+
+def time_load(key: str, config: dict, path: Path) -> float:
+    """Seconds to load the bundle the way ModelLoader does"""
+    from transformers import pipeline
+
+    started = time.perf_counter()
+    pipeline(config['task'], model=str(path), device=-1)
+    return time.perf_counter() - started
+
+
+def check(keys, output: Path) -> bool:
+    ok = True
+    os.environ['MODEL_BUNDLE_DIR'] = str(output)
+    for key in keys:
+        try:
+            bundle = ModelBundle.find(key)
+            if bundle is None:
+                raise BundleError(f"No bundle for {key} in {output}")
+            bundle.verify(VERIFY_SHA256)
+            logger.info(f"✅ {key}: {bundle.model_name} ({len(bundle.manifest['files'])} files verified)")
+        except BundleError as e:
+            logger.error(f"❌ {e}")
+            ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert models into offline bundles")
+    parser.add_argument('models', nargs='*', help=f"Bundles to build: {', '.join(MODELS)} (default: all)")
+    parser.add_argument('--output', default=None, help="Bundle directory (default: MODEL_BUNDLE_DIR)")
+    parser.add_argument('--source-dir', default=None,
+                        help="Directory with downloaded copies (<dir>/<name>) of the configured models")
+    parser.add_argument('--onnx', action='store_true', help="Also export ONNX graphs where supported")
+    parser.add_argument('--opset', type=int, default=17)
+    parser.add_argument('--check', action='store_true', help="Verify existing bundles and exit")
+    parser.add_argument('--time-load', action='store_true', help="Report how long each bundle takes to load")
+    args = parser.parse_args()
+
+    keys = args.models or list(MODELS.keys())
+    unknown = [key for key in keys if key not in MODELS]
+    if unknown:
+        parser.error(f"Unknown model(s): {', '.join(unknown)}. Available: {', '.join(MODELS)}")
+    output = Path(args.output) if args.output else bundle_root()
+
+    if args.check:
+        sys.exit(0 if check(keys, output) else 1)
+
+    output.mkdir(parents=True, exist_ok=True)
+    failed = []
+    for key in keys:
+        config = MODELS[key]
+        source = resolve_source(key, config['model_name'], args.source_dir)
+        try:
+            path = convert(key, config, source, output, args.onnx, args.opset)
+        except Exception as e:
+            logger.error(f"❌ {key} conversion failed: {e}")
+            failed.append(key)
+            continue
+
+        if args.time_load:
+            logger.info(f"   {key} loads from the bundle in {time_load(key, config, path):.2f}s")
+
+    if failed:
+        logger.error(f"❌ Failed: {', '.join(failed)}")
+        sys.exit(1)
+
+    logger.info(f"🎉 Bundles ready in {output}")
+    logger.info(f"Set MODEL_BUNDLE_DIR={output} (and MODEL_BUNDLE_REQUIRED=true to forbid hub downloads)")
+
+
+if __name__ == "__main__":
+    main()
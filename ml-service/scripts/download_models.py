@@ -14,19 +14,26 @@ Script to download pre-trained models for BlogML ML Service
     See HF_API_SETUP.md for detailed instructions.
 
 Use this script only if you need offline functionality or prefer local models.
+
+Files are fetched in parallel straight from the hub, verified against the hub
+checksums and resumed (HTTP Range) when a previous run was interrupted;
+files that are already present and valid are skipped:
+
+    python scripts/download_models.py                    # all models
+    python scripts/download_models.py sentiment --workers 4
+    HF_ENDPOINT=http://127.0.0.1:8901 python scripts/download_models.py   # mirror / stub_hub_server.py
 """
 
 import os
 import sys
+import argparse
 import logging
-import time
 from pathlib import Path
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, AutoModelForSeq2SeqLM
-from transformers import pipeline
-import torch
-from tqdm import tqdm
-import requests
-import tempfile
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVICE_DIR))
+
+from scripts.hub_download import HubDownloader, CHUNK_SIZE
 
 # Set up logging
 logging.basicConfig(
@@ -39,19 +46,16 @@ logger = logging.getLogger(__name__)
 MODELS = {
     'sentiment': {
         'model_name': 'cardiffnlp/twitter-roberta-base-sentiment-latest',
-        'model_class': AutoModelForSequenceClassification,
         'description': 'Twitter sentiment analysis model (multi-label)',
         'size_mb': '~300MB'
     },
     'text_generation': {
         'model_name': 'google/flan-t5-base',
-        'model_class': AutoModelForSeq2SeqLM,
         'description': 'Text generation model',
         'size_mb': '~900MB'
     },
     'image_classification': {
         'model_name': 'microsoft/resnet-50',
-        'model_class': None,  # Using pipeline for this one
         'description': 'Image classification model',
         'size_mb': '~100MB'
     }
@@ -72,135 +76,35 @@ def check_disk_space():
 
     return True
 
-def download_with_progress(url, filename, description):
-    """Download file with progress bar"""
-    try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-
-        total_size = int(response.headers.get('content-length', 0))
-        block_size = 1024  # 1KB chunks
-
-        with open(filename, 'wb') as file:
-            with tqdm(total=total_size, unit='iB', unit_scale=True, desc=description) as pbar:
-                for data in response.iter_content(block_size):
-                    size = file.write(data)
-                    pbar.update(size)
+def download_models(models, models_dir, args):
+    """
+    Download the given models concurrently (files in parallel, resumable,
+    checksum-verified); returns the keys that downloaded completely
+    """
+    for model_key, model_config in models.items():
+        logger.info(f"📥 {model_config['description']}: {model_config['model_name']} ({model_config['size_mb']})")
+
+    downloader = HubDownloader(
+        endpoint=args.endpoint,
+        workers=args.workers,
+        max_retries=args.retries,
+        chunk_size=args.chunk_mb * 1024 * 1024
+    )
+    repos = {
+        model_key: {'model_name': model_config['model_name'], 'revision': args.revision}
+        for model_key, model_config in models.items()
+    }
+    summary = downloader.download(repos, models_dir)
 
-        return True
-    except Exception as e:
-        logger.error(f"Download failed: {str(e)}")
-        if os.path.exists(filename):
-            os.remove(filename)
-        return False
+    succeeded = []
+    for model_key, result in summary.items():
+        if result['failed']:
+            logger.error(f"❌ {model_key}: {result['failed']} file(s) failed")
+        else:
+            logger.info(f"✅ {model_key}: {result['downloaded']} downloaded, {result['skipped']} already present")
+            succeeded.append(model_key)
 
-def download_model(model_key, model_config, models_dir, max_retries=3):
-    """Download a specific model with progress tracking and retry logic"""
-    logger.info(f"📥 Downloading {model_config['description']}...")
-    logger.info(f"Model: {model_config['model_name']}")
-    logger.info(f"Estimated size: {model_config['size_mb']}")
-
-    model_path = os.path.join(models_dir, model_key)
-    os.makedirs(model_path, exist_ok=True)
-
-    for attempt in range(max_retries):
-        try:
-            if attempt > 0:
-                logger.info(f"Retry attempt {attempt + 1}/{max_retries}...")
-
-            if model_key == 'sentiment':
-                # Download sentiment analysis model
-                logger.info("🔧 Downloading tokenizer...")
-                with tqdm(desc="Downloading tokenizer", unit="files") as pbar:
-                    tokenizer = AutoTokenizer.from_pretrained(
-                        model_config['model_name'],
-                        cache_dir=model_path,
-                        local_files_only=False
-                    )
-                    tokenizer.save_pretrained(model_path)
-                    pbar.update(1)
-
-                logger.info("🧠 Downloading model (this may take a while)...")
-                with tqdm(desc="Downloading model", unit="files") as pbar:
-                    model = model_config['model_class'].from_pretrained(
-                        model_config['model_name'],
-                        cache_dir=model_path,
-                        local_files_only=False
-                    )
-                    model.save_pretrained(model_path)
-                    pbar.update(1)
-
-                logger.info(f"✅ Sentiment model saved to: {model_path}")
-
-            elif model_key == 'text_generation':
-                # Download text generation model
-                logger.info("🔧 Downloading tokenizer...")
-                with tqdm(desc="Downloading tokenizer", unit="files") as pbar:
-                    tokenizer = AutoTokenizer.from_pretrained(
-                        model_config['model_name'],
-                        cache_dir=model_path,
-                        local_files_only=False
-                    )
-                    tokenizer.save_pretrained(model_path)
-                    pbar.update(1)
-
-                logger.info("🧠 Downloading model (this may take a while - it's a large model!)...")
-                with tqdm(desc="Downloading model", unit="files") as pbar:
-                    model = model_config['model_class'].from_pretrained(
-                        model_config['model_name'],
-                        cache_dir=model_path,
-                        local_files_only=False
-                    )
-                    model.save_pretrained(model_path)
-                    pbar.update(1)
-
-                logger.info(f"✅ Text generation model saved to: {model_path}")
-
-            elif model_key == 'image_classification':
-                # Download image classification model using pipeline
-                logger.info("🖼️  Downloading image classification pipeline...")
-                with tqdm(desc="Downloading pipeline", unit="files") as pbar:
-                    classifier = pipeline(
-                        "image-classification",
-                        model=model_config['model_name'],
-                        cache_dir=model_path
-                    )
-
-                    # Save the model and tokenizer
-                    if hasattr(classifier, 'model') and classifier.model:
-                        classifier.model.save_pretrained(model_path)
-                    if hasattr(classifier, 'image_processor') and classifier.image_processor:
-                        classifier.image_processor.save_pretrained(model_path)
-                    elif hasattr(classifier, 'tokenizer') and classifier.tokenizer:
-                        classifier.tokenizer.save_pretrained(model_path)
-
-                    pbar.update(1)
-
-                logger.info(f"✅ Image classification model saved to: {model_path}")
-
-            return True
-
-        except Exception as e:
-            logger.error(f"❌ Attempt {attempt + 1} failed for {model_key}: {str(e)}")
-
-            # Clean up partial download
-            if os.path.exists(model_path):
-                import shutil
-                try:
-                    shutil.rmtree(model_path)
-                    os.makedirs(model_path, exist_ok=True)
-                except:
-                    pass
-
-            if attempt < max_retries - 1:
-                wait_time = (attempt + 1) * 5  # Exponential backoff
-                logger.info(f"Waiting {wait_time} seconds before retry...")
-                time.sleep(wait_time)
-            else:
-                logger.error(f"❌ All {max_retries} attempts failed for {model_key}")
-                return False
-
-    return False
+    return succeeded
 
 def verify_model(model_path):
     """Verify that a model was downloaded correctly"""
@@ -215,16 +119,28 @@ def verify_model(model_path):
 def check_requirements():
     """Check if required packages are installed"""
     try:
-        import tqdm
         import requests
         return True
     except ImportError as e:
         logger.error(f"❌ Missing required package: {str(e)}")
-        logger.info("Please install missing packages with: pip install tqdm requests")
+        logger.info("Please install missing packages with: pip install requests")
         return False
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Download BlogML models from the Hugging Face Hub")
+    parser.add_argument('model', nargs='?', choices=list(MODELS.keys()), help="Download only this model")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('DOWNLOAD_WORKERS', 8)),
+                        help="Files downloaded in parallel")
+    parser.add_argument('--endpoint', default=None, help="Hub endpoint (default: HF_ENDPOINT or huggingface.co)")
+    parser.add_argument('--revision', default='main')
+    parser.add_argument('--retries', type=int, default=5, help="Resumed retries per file")
+    parser.add_argument('--chunk-mb', type=int, default=CHUNK_SIZE // (1024 * 1024))
+    parser.add_argument('--models-dir', default=str(SERVICE_DIR / "models"))
+    return parser.parse_args()
+
 def main():
     """Main function"""
+    args = parse_args()
     logger.info("🚀 Starting BlogML model download...")
 
     # Check requirements
@@ -232,8 +148,8 @@ def main():
         sys.exit(1)
 
     # Create models directory
-    models_dir = Path(__file__).parent.parent / "models"
-    models_dir.mkdir(exist_ok=True)
+    models_dir = Path(args.models_dir)
+    models_dir.mkdir(parents=True, exist_ok=True)
 
     logger.info(f"Models will be saved to: {models_dir}")
 
@@ -241,34 +157,17 @@ def main():
     if not check_disk_space():
         sys.exit(1)
 
-    # Check if specific model requested
-    if len(sys.argv) > 1:
-        requested_model = sys.argv[1]
-        if requested_model not in MODELS:
-            logger.error(f"Unknown model: {requested_model}")
-            logger.info(f"Available models: {', '.join(MODELS.keys())}")
-            sys.exit(1)
-
-        # Download only the requested model
-        model_config = MODELS[requested_model]
-        success = download_model(requested_model, model_config, models_dir)
+    models = {args.model: MODELS[args.model]} if args.model else MODELS
+    succeeded = download_models(models, models_dir, args)
 
-        if success:
-            logger.info(f"✅ Successfully downloaded {requested_model} model!")
+    if args.model:
+        if succeeded:
+            logger.info(f"✅ Successfully downloaded {args.model} model!")
         else:
-            logger.error(f"❌ Failed to download {requested_model} model!")
+            logger.error(f"❌ Failed to download {args.model} model! Re-run to resume.")
             sys.exit(1)
     else:
-        # Download all models
-        logger.info("Downloading all models...")
-
-        success_count = 0
-        for model_key, model_config in MODELS.items():
-            success = download_model(model_key, model_config, models_dir)
-            if success:
-                success_count += 1
-
-        logger.info(f"\n🎉 Download complete! Successfully downloaded {success_count}/{len(MODELS)} models")
+        logger.info(f"\n🎉 Download complete! Successfully downloaded {len(succeeded)}/{len(MODELS)} models")
 
     # Verify all downloads
     logger.info("\n🔍 Verifying downloads...")
@@ -289,8 +188,12 @@ def main():
             f.write("!.gitignore\n")
         logger.info("Created .gitignore in models directory")
 
+    if len(succeeded) < len(models):
+        logger.error("Some files failed; re-run the script to resume the remaining downloads.")
+        sys.exit(1)
+
     logger.info("\n🎊 All done! Models are ready to use.")
     logger.info("Run the FastAPI server to start using the models.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Simple alternative script to download pre-trained models for BlogML ML Service
-This version uses basic huggingface download without progress bars but with better error handling
+This version downloads one model at a time (files still fetched in parallel,
+resumable and checksum-verified) and prints troubleshooting tips on failure
 
 ⚠️  IMPORTANT: This script downloads large ML models locally (1.5GB+ total).
     For better performance and easier setup, we recommend using Hugging Face API:
@@ -20,10 +21,12 @@ Use this script only if you need offline functionality or prefer local models.
 import os
 import sys
 import logging
-import time
 from pathlib import Path
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, AutoModelForSeq2SeqLM
-from transformers import pipeline
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVICE_DIR))
+
+from scripts.hub_download import HubDownloader
 
 # Set up logging
 logging.basicConfig(
@@ -36,19 +39,16 @@ logger = logging.getLogger(__name__)
 MODELS = {
     'sentiment': {
         'model_name': 'cardiffnlp/twitter-roberta-base-sentiment-latest',
-        'model_class': AutoModelForSequenceClassification,
         'description': 'Twitter sentiment analysis model (multi-label)',
         'size_mb': '~300MB'
     },
     'text_generation': {
         'model_name': 'google/flan-t5-small',  # Smaller model for faster download
-        'model_class': AutoModelForSeq2SeqLM,
         'description': 'Text generation model (small)',
         'size_mb': '~300MB'
     },
     'image_classification': {
         'model_name': 'microsoft/resnet-50',
-        'model_class': None,  # Using pipeline for this one
         'description': 'Image classification model',
         'size_mb': '~100MB'
     }
@@ -77,74 +77,15 @@ def download_model_simple(model_key, model_config, models_dir):
     logger.info("⏳ This may take several minutes. Please be patient...")
 
     try:
-        if model_key == 'sentiment':
-            # Download sentiment analysis model
-            model_path = os.path.join(models_dir, 'sentiment')
-
-            logger.info("🔧 Downloading tokenizer...")
-            tokenizer = AutoTokenizer.from_pretrained(
-                model_config['model_name'],
-                trust_remote_code=True,
-                resume_download=True
-            )
-            tokenizer.save_pretrained(model_path)
-            logger.info("✅ Tokenizer downloaded successfully")
-
-            logger.info("🧠 Downloading model...")
-            model = model_config['model_class'].from_pretrained(
-                model_config['model_name'],
-                trust_remote_code=True,
-                resume_download=True
-            )
-            model.save_pretrained(model_path)
-            logger.info("✅ Model downloaded successfully")
-
-            logger.info(f"🎉 Sentiment model saved to: {model_path}")
-
-        elif model_key == 'text_generation':
-            # Download text generation model
-            model_path = os.path.join(models_dir, 'text_generation')
-
-            logger.info("🔧 Downloading tokenizer...")
-            tokenizer = AutoTokenizer.from_pretrained(
-                model_config['model_name'],
-                trust_remote_code=True,
-                resume_download=True
-            )
-            tokenizer.save_pretrained(model_path)
-            logger.info("✅ Tokenizer downloaded successfully")
-
-            logger.info("🧠 Downloading model...")
-            model = model_config['model_class'].from_pretrained(
-                model_config['model_name'],
-                trust_remote_code=True,
-                resume_download=True
-            )
-            model.save_pretrained(model_path)
-            logger.info("✅ Model downloaded successfully")
-
-            logger.info(f"🎉 Text generation model saved to: {model_path}")
-
-        elif model_key == 'image_classification':
-            # Download image classification model using pipeline
-            model_path = os.path.join(models_dir, 'image_classification')
-
-            logger.info("🖼️  Downloading image classification pipeline...")
-            classifier = pipeline(
-                "image-classification",
-                model=model_config['model_name'],
-                trust_remote_code=True
-            )
-
-            # Save the model and tokenizer
-            if hasattr(classifier, 'model') and classifier.model:
-                classifier.model.save_pretrained(model_path)
-            if hasattr(classifier, 'image_processor') and classifier.image_processor:
-                classifier.image_processor.save_pretrained(model_path)
-
-            logger.info("✅ Image classification model downloaded successfully")
-            logger.info(f"🎉 Image classification model saved to: {model_path}")
+        downloader = HubDownloader(workers=int(os.getenv('DOWNLOAD_WORKERS', 4)))
+        summary = downloader.download({model_key: {'model_name': model_config['model_name']}}, models_dir)
+        result = summary[model_key]
+
+        if result['failed']:
+            raise RuntimeError("; ".join(result['errors']))
 
+        logger.info(f"✅ {result['downloaded']} file(s) downloaded, {result['skipped']} already present")
+        logger.info(f"🎉 Model saved to: {os.path.join(models_dir, model_key)}")
         return True
 
     except Exception as e:
@@ -155,7 +96,7 @@ def download_model_simple(model_key, model_config, models_dir):
         logger.error("1. Check your internet connection")
         logger.error("2. Try downloading a smaller model first: python download_models_simple.py sentiment")
         logger.error("3. Make sure you have enough disk space")
-        logger.error("4. Try running the script again (it may resume partial downloads)")
+        logger.error("4. Run the script again: partial downloads resume where they stopped")
 
         return False
 
@@ -237,7 +178,6 @@ def main():
 
     logger.info("\n🎊 All done! Models are ready to use.")
     logger.info("Run the FastAPI server to start using the models.")
-    logger.info("💡 If you had issues, try: pip install --upgrade transformers torch")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,316 @@
+"""
+Parallel, resumable Hugging Face Hub downloader
+
+Fetches the files of one or more model repos straight from the hub (no
+transformers/torch import), several files at a time:
+
+- every file is streamed in large chunks to `<name>.part` and renamed into
+  place only after its checksum matched the hub manifest (sha256 for LFS
+  files, the git blob sha1 for small files);
+- an interrupted download resumes from the `.part` file with an HTTP Range
+  request;
+- files that are already present and valid are skipped; verified sizes,
+  mtimes and hashes are remembered in `.download-manifest.json` so re-runs
+  do not re-hash gigabytes.
+
+HF_ENDPOINT (or --endpoint) points the downloader at a mirror or at
+scripts/stub_hub_server.py for testing.
+"""
+
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Network reads are 1 MiB (a dropped connection loses at most one read);
+# writes and hashing go through 8 MiB buffers
+READ_SIZE = 1024 * 1024
+CHUNK_SIZE = 8 * 1024 * 1024
+MANIFEST_NAME = ".download-manifest.json"
+
+# Files needed to load a model with transformers; other weight formats are skipped
+DEFAULT_ALLOW_PATTERNS = (
+    "*.json",
+    "*.txt",
+    "*.model",
+    "*.safetensors",
+    "pytorch_model*.bin",
+)
+# Only fetched when the repo has no safetensors weights
+FALLBACK_WEIGHTS = "pytorch_model*.bin"
+
+
+class DownloadError(Exception):
+    """Raised when a file could not be downloaded and verified"""
+
+
+@dataclass
+class RemoteFile:
+    repo_id: str
+    filename: str
+    size: Optional[int]
+    sha256: Optional[str] = None  # LFS files
+    blob_id: Optional[str] = None  # git blob sha1 for regular files
+
+    @property
+    def expected(self) -> Optional[str]:
+        return self.sha256 or self.blob_id
+
+
+class FileHasher:
+    """sha256 for LFS files, git blob sha1 (sha1 of 'blob <size>\\0' + content) otherwise"""
+
+    def __init__(self, remote: RemoteFile):
+        self.remote = remote
+        if remote.sha256:
+            self._hash = hashlib.sha256()
+        else:
+            self._hash = hashlib.sha1()
+            if remote.size is not None:
+                self._hash.update(f"blob {remote.size}\0".encode())
+
+    def update(self, data: bytes):
+        self._hash.update(data)
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+def hash_file(path: Path, remote: RemoteFile) -> FileHasher:
+    hasher = FileHasher(remote)
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher
+
+
+class HubDownloader:
+    def __init__(self, endpoint: Optional[str] = None, token: Optional[str] = None,
+                 workers: int = 8, max_retries: int = 5, chunk_size: int = CHUNK_SIZE,
+                 read_size: int = READ_SIZE, timeout: float = 60.0):
+        self.endpoint = (endpoint or os.getenv('HF_ENDPOINT', 'https://huggingface.co')).rstrip('/')
+        self.token = token or os.getenv('HUGGINGFACE_API_TOKEN') or os.getenv('HF_TOKEN')
+        self.workers = workers
+        self.max_retries = max_retries
+        self.chunk_size = chunk_size
+        self.read_size = min(read_size, chunk_size)
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(workers, 10))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._manifest_lock = threading.Lock()
+        self._progress_lock = threading.Lock()
+        self.bytes_downloaded = 0
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"} if self.token else {}
+
+    def list_files(self, repo_id: str, revision: str = "main",
+                   allow_patterns: Sequence[str] = DEFAULT_ALLOW_PATTERNS) -> List[RemoteFile]:
+        """Files of `repo_id` at `revision` that match `allow_patterns`, with sizes and hashes"""
+        url = f"{self.endpoint}/api/models/{repo_id}/revision/{revision}"
+        response = self.session.get(url, params={"blobs": "true"}, headers=self.headers, timeout=self.timeout)
+        if response.status_code >= 400:
+            raise DownloadError(f"Could not list {repo_id}@{revision}: HTTP {response.status_code}")
+
+        siblings = response.json().get("siblings", [])
+        names = [sibling["rfilename"] for sibling in siblings]
+        has_safetensors = any(name.endswith(".safetensors") for name in names)
+
+        files = []
+        for sibling in siblings:
+            name = sibling["rfilename"]
+            if not any(fnmatch.fnmatch(name, pattern) for pattern in allow_patterns):
+                continue
+            if has_safetensors and fnmatch.fnmatch(name, FALLBACK_WEIGHTS):
+                continue
+            lfs = sibling.get("lfs") or {}
+            files.append(RemoteFile(
+                repo_id=repo_id,
+                filename=name,
+                size=lfs.get("size", sibling.get("size")),
+                sha256=lfs.get("sha256"),
+                blob_id=None if lfs else sibling.get("blobId")
+            ))
+        return files
+
+    def file_url(self, remote: RemoteFile, revision: str) -> str:
+        return f"{self.endpoint}/{remote.repo_id}/resolve/{revision}/{remote.filename}"
+
+    # Manifest of files already verified in a model directory
+
+    def _load_manifest(self, target_dir: Path) -> Dict[str, dict]:
+        path = target_dir / MANIFEST_NAME
+        try:
+            return json.loads(path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _record_verified(self, target_dir: Path, remote: RemoteFile, path: Path):
+        with self._manifest_lock:
+            manifest = self._load_manifest(target_dir)
+            stat = path.stat()
+            manifest[remote.filename] = {
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "hash": remote.expected
+            }
+            temp = target_dir / f"{MANIFEST_NAME}.tmp"
+            temp.write_text(json.dumps(manifest, indent=2))
+            os.replace(temp, target_dir / MANIFEST_NAME)
+
+    def is_valid(self, target_dir: Path, remote: RemoteFile, rehash: bool = False) -> bool:
+        """Whether the local copy of `remote` is complete and matches the manifest"""
+        path = target_dir / remote.filename
+        if not path.exists():
+            return False
+
+        stat = path.stat()
+        if remote.size is not None and stat.st_size != remote.size:
+            return False
+
+        if not rehash:
+            entry = self._load_manifest(target_dir).get(remote.filename)
+            if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime \
+                    and entry["hash"] == remote.expected:
+                return True
+
+        if remote.expected and hash_file(path, remote).hexdigest() != remote.expected:
+            return False
+
+        self._record_verified(target_dir, remote, path)
+        return True
+
+    def download_file(self, remote: RemoteFile, target_dir: Path, revision: str = "main") -> str:
+        """Download one file with Range resume and retries; returns 'skipped' or 'downloaded'"""
+        if self.is_valid(target_dir, remote):
+            return "skipped"
+
+        final_path = target_dir / remote.filename
+        part_path = final_path.with_name(final_path.name + ".part")
+        final_path.parent.mkdir(parents=True, exist_ok=True)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._fetch(remote, part_path, revision)
+                break
+            except (requests.exceptions.RequestException, DownloadError) as e:
+                if attempt == self.max_retries:
+                    raise DownloadError(f"{remote.repo_id}/{remote.filename}: {e}") from e
+                delay = random.uniform(0, min(30.0, 2 ** attempt))
+                logger.warning(f"⚠️  {remote.filename} attempt {attempt + 1} failed ({e}), resuming in {delay:.1f}s")
+                time.sleep(delay)
+
+        # Verify before moving into place so a model directory never holds a corrupt file
+        if remote.expected:
+            digest = hash_file(part_path, remote).hexdigest()
+            if digest != remote.expected:
+                part_path.unlink()
+                raise DownloadError(
+                    f"{remote.repo_id}/{remote.filename}: checksum mismatch "
+                    f"(expected {remote.expected}, got {digest})"
+                )
+
+        os.replace(part_path, final_path)
+        self._record_verified(target_dir, remote, final_path)
+        return "downloaded"
+
+    def _fetch(self, remote: RemoteFile, part_path: Path, revision: str):
+        """Stream into part_path, continuing from its current size when the server allows"""
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        if remote.size is not None and offset > remote.size:
+            part_path.unlink()
+            offset = 0
+        if remote.size is not None and offset == remote.size:
+            return
+
+        headers = dict(self.headers)
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+
+        with self.session.get(self.file_url(remote, revision), headers=headers, stream=True,
+                              timeout=self.timeout) as response:
+            if response.status_code == 416:
+                # Range beyond the end: the part file is stale
+                part_path.unlink()
+                raise DownloadError("Range not satisfiable, restarting")
+            if response.status_code >= 400:
+                raise DownloadError(f"HTTP {response.status_code}")
+
+            if offset and response.status_code != 206:
+                # Server ignored the Range header; start over
+                offset = 0
+
+            with open(part_path, "ab" if offset else "wb", buffering=self.chunk_size) as handle:
+                for chunk in response.iter_content(self.read_size):
+                    handle.write(chunk)
+                    with self._progress_lock:
+                        self.bytes_downloaded += len(chunk)
+
+        if remote.size is not None and part_path.stat().st_size != remote.size:
+            raise DownloadError(
+                f"Incomplete download ({part_path.stat().st_size} of {remote.size} bytes)"
+            )
+
+    def download(self, repos: Dict[str, dict], models_dir: Path) -> Dict[str, dict]:
+        """
+        Download several repos concurrently.
+
+        `repos` maps a local directory name to {'model_name': repo id,
+        'revision': optional, 'allow_patterns': optional}. Returns per
+        directory counts of downloaded/skipped/failed files.
+        """
+        jobs = []
+        summary: Dict[str, dict] = {}
+        for key, config in repos.items():
+            revision = config.get('revision', 'main')
+            summary[key] = {"downloaded": 0, "skipped": 0, "failed": 0, "errors": []}
+            try:
+                files = self.list_files(
+                    config['model_name'], revision, config.get('allow_patterns', DEFAULT_ALLOW_PATTERNS)
+                )
+            except (requests.exceptions.RequestException, DownloadError) as e:
+                logger.error(f"❌ {key}: {e}")
+                summary[key]["failed"] += 1
+                summary[key]["errors"].append(str(e))
+                continue
+
+            total = sum(remote.size or 0 for remote in files)
+            logger.info(f"📥 {key}: {config['model_name']}@{revision}, {len(files)} files, {total / 1e6:.1f} MB")
+            jobs.extend((key, remote, models_dir / key, revision) for remote in files)
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="download") as pool:
+            futures = {
+                pool.submit(self.download_file, remote, target_dir, revision): (key, remote)
+                for key, remote, target_dir, revision in jobs
+            }
+            for future in as_completed(futures):
+                key, remote = futures[future]
+                try:
+                    result = future.result()
+                    summary[key][result] += 1
+                    logger.info(f"   {'✅' if result == 'downloaded' else '⏭️ '} {key}/{remote.filename} {result}")
+                except Exception as e:
+                    summary[key]["failed"] += 1
+                    summary[key]["errors"].append(str(e))
+                    logger.error(f"   ❌ {key}/{remote.filename}: {e}")
+
+        elapsed = time.monotonic() - started
+        rate = self.bytes_downloaded / elapsed / 1e6 if elapsed else 0.0
+        logger.info(f"Transferred {self.bytes_downloaded / 1e6:.1f} MB in {elapsed:.1f}s ({rate:.1f} MB/s)")
+        return summary
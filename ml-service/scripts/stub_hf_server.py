@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Hugging Face router API
+
+Serves the two endpoints the ML service calls, with configurable latency and
+failure injection, so the API client (circuit breakers, retries, hedging,
+local fallback) can be exercised without a token or network access:
+
+    python scripts/stub_hf_server.py --port 8900 --latency-ms 50 --fail-rate 0.2
+
+    HUGGINGFACE_API_TOKEN=stub HF_API_BASE_URL=http://127.0.0.1:8900 \\
+        uvicorn app.main:app
+
+Endpoints:
+    POST /hf-inference/models/<model>   sentiment / image classification scores
+    POST /v1/chat/completions           chat completion with canned content
+    POST /_control                      change latency/failure settings at runtime
+                                        (also fail_next, slow_next/slow_ms, retry_after
+                                        and trickle_ms for scripted scenarios in tests)
+    GET  /_stats                        request counters
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubState:
+    """Runtime-adjustable behaviour shared by all handler threads"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 fail_rate: float = 0.0, fail_status: int = 503):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.fail_next = 0  # the next N requests fail regardless of fail_rate
+        self.slow_next = 0  # the next N requests take slow_ms instead of latency_ms
+        self.slow_ms = 0.0
+        self.retry_after = 0  # Retry-After seconds sent with failures (0 = none)
+        self.trickle_ms = 0.0  # pause between bytes of a response body
+        self.requests = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+
+    def update(self, settings: dict):
+        with self.lock:
+            for key in ('latency_ms', 'jitter_ms', 'fail_rate', 'fail_status', 'fail_next',
+                        'slow_next', 'slow_ms', 'retry_after', 'trickle_ms'):
+                if key in settings:
+                    setattr(self, key, type(getattr(self, key))(settings[key]))
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                'latency_ms': self.latency_ms,
+                'jitter_ms': self.jitter_ms,
+                'fail_rate': self.fail_rate,
+                'fail_status': self.fail_status,
+                'fail_next': self.fail_next,
+                'slow_next': self.slow_next,
+                'slow_ms': self.slow_ms,
+                'retry_after': self.retry_after,
+                'trickle_ms': self.trickle_ms,
+                'requests': self.requests,
+                'failures': self.failures
+            }
+
+
+def classification_scores(text: str) -> list:
+    """Deterministic fake sentiment scores so repeated inputs agree"""
+    rng = random.Random(text)
+    raw = [rng.random() for _ in range(3)]
+    total = sum(raw)
+    labels = ('negative', 'neutral', 'positive')
+    scores = [{'label': label, 'score': value / total} for label, value in zip(labels, raw)]
+    return sorted(scores, key=lambda x: x['score'], reverse=True)
+
+
+def make_handler(state: StubState):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body, retry_after: int = 0, trickle_ms: float = 0.0):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            if retry_after:
+                self.send_header('Retry-After', str(retry_after))
+            self.end_headers()
+            if not trickle_ms:
+                self.wfile.write(data)
+                return
+            for i in range(len(data)):
+                self.wfile.write(data[i:i + 1])
+                self.wfile.flush()
+                time.sleep(trickle_ms / 1000.0)
+
+        def do_GET(self):
+            if self.path == '/_stats':
+                self._send(200, state.snapshot())
+            else:
+                self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+
+            if self.path == '/_control':
+                state.update(payload)
+                self._send(200, state.snapshot())
+                return
+
+            with state.lock:
+                state.requests += 1
+                latency = state.latency_ms + random.uniform(0, state.jitter_ms)
+                if state.slow_next > 0:
+                    state.slow_next -= 1
+                    latency = state.slow_ms
+                fail = random.random() < state.fail_rate
+                if state.fail_next > 0:
+                    state.fail_next -= 1
+                    fail = True
+                if fail:
+                    state.failures += 1
+                fail_status = state.fail_status
+                retry_after = state.retry_after
+                trickle_ms = state.trickle_ms
+
+            time.sleep(latency / 1000.0)
+
+            if fail:
+                self._send(fail_status, {'error': 'injected failure'}, retry_after=retry_after)
+            elif self.path.startswith('/hf-inference/models/'):
+                inputs = payload.get('inputs', '')
+                if isinstance(inputs, list):
+                    body = [classification_scores(str(text)) for text in inputs]
+                elif 'resnet' in self.path or 'image' in self.path:
+                    body = [{'label': 'golden retriever', 'score': 0.91},
+                            {'label': 'tennis ball', 'score': 0.05}]
+                else:
+                    body = [classification_scores(str(inputs))]
+                self._send(200, body, trickle_ms=trickle_ms)
+            elif self.path == '/v1/chat/completions':
+                prompt = payload.get('messages', [{}])[-1].get('content', '')
+                self._send(200, {
+                    'choices': [{
+                        'message': {
+                            'role': 'assistant',
+                            'content': f"Stub completion for: {prompt[:80]}"
+                        }
+                    }]
+                }, trickle_ms=trickle_ms)
+            else:
+                self._send(404, {'error': 'not found'})
+
+    return StubHandler
+
+
+def serve(host: str, port: int, state: StubState) -> ThreadingHTTPServer:
+    """Start the stub server in a background thread and return it"""
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Hugging Face router API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--fail-status', type=int, default=503)
+    args = parser.parse_args()
+
+    state = StubState(args.latency_ms, args.jitter_ms, args.fail_rate, args.fail_status)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    server.daemon_threads = True
+    print(f"Stub Hugging Face API listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Hugging Face Hub file endpoints
+
+Serves model repos from a directory (one sub-directory per repo, e.g.
+<root>/google/flan-t5-small/config.json) with the two endpoints the model
+downloader uses, so parallel downloads, Range resume and checksum
+verification can be tested offline:
+
+    python scripts/stub_hub_server.py --root /tmp/hub --port 8901
+
+    HF_ENDPOINT=http://127.0.0.1:8901 python scripts/download_models.py
+
+Endpoints:
+    GET /api/models/<repo>/revision/<rev>   file list with sizes and hashes
+    GET /<repo>/resolve/<rev>/<file>        file contents, honours Range
+    POST /_control                          change throttling/failure settings at runtime
+    GET  /_stats                            request counters
+
+Files of at least --lfs-threshold bytes are reported like LFS files (sha256),
+smaller ones with their git blob sha1, as the hub does. --drop-after cuts
+every response off after that many bytes to simulate flaky connections.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+RESOLVE_PATTERN = re.compile(r'^/(?P<repo>.+?)/resolve/(?P<revision>[^/]+)/(?P<file>.+)$')
+MANIFEST_PATTERN = re.compile(r'^/api/models/(?P<repo>.+?)/revision/(?P<revision>[^/?]+)')
+RANGE_PATTERN = re.compile(r'^bytes=(\d+)-(\d*)$')
+
+
+class HubState:
+    """Runtime-adjustable behaviour shared by all handler threads"""
+
+    def __init__(self, root: Path, lfs_threshold: int = 10 * 1024 * 1024,
+                 throttle_kbps: float = 0.0, drop_after: int = 0, support_range: bool = True):
+        self.root = root
+        self.lfs_threshold = lfs_threshold
+        self.throttle_kbps = throttle_kbps
+        self.drop_after = drop_after
+        self.support_range = support_range
+        self.requests = 0
+        self.range_requests = 0
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+
+    def update(self, settings: dict):
+        with self.lock:
+            for key in ('lfs_threshold', 'throttle_kbps', 'drop_after', 'support_range'):
+                if key in settings:
+                    setattr(self, key, type(getattr(self, key))(settings[key]))
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                'throttle_kbps': self.throttle_kbps,
+                'drop_after': self.drop_after,
+                'support_range': self.support_range,
+                'requests': self.requests,
+                'range_requests': self.range_requests,
+                'bytes_sent': self.bytes_sent
+            }
+
+
+def file_entry(path: Path, name: str, lfs_threshold: int) -> dict:
+    size = path.stat().st_size
+    if size >= lfs_threshold:
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as handle:
+            for chunk in iter(lambda: handle.read(1024 * 1024), b''):
+                sha256.update(chunk)
+        return {'rfilename': name, 'size': size, 'lfs': {'sha256': sha256.hexdigest(), 'size': size}}
+
+    blob = hashlib.sha1(f"blob {size}\0".encode() + path.read_bytes())
+    return {'rfilename': name, 'size': size, 'blobId': blob.hexdigest()}
+
+
+def make_handler(state: HubState):
+    class HubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _repo_dir(self, repo: str):
+            repo_dir = (state.root / repo).resolve()
+            if state.root.resolve() not in repo_dir.parents or not repo_dir.is_dir():
+                return None
+            return repo_dir
+
+        def do_GET(self):
+            with state.lock:
+                state.requests += 1
+
+            if self.path == '/_stats':
+                self._send(200, state.snapshot())
+                return
+
+            match = MANIFEST_PATTERN.match(self.path)
+            if match:
+                self._manifest(match.group('repo'))
+                return
+
+            match = RESOLVE_PATTERN.match(self.path)
+            if match:
+                self._resolve(match.group('repo'), match.group('file'))
+                return
+
+            self._send(404, {'error': 'not found'})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            if self.path == '/_control':
+                state.update(payload)
+                self._send(200, state.snapshot())
+            else:
+                self._send(404, {'error': 'not found'})
+
+        def _manifest(self, repo: str):
+            repo_dir = self._repo_dir(repo)
+            if repo_dir is None:
+                self._send(404, {'error': f'Repository {repo} not found'})
+                return
+
+            siblings = [
+                file_entry(path, path.relative_to(repo_dir).as_posix(), state.lfs_threshold)
+                for path in sorted(repo_dir.rglob('*')) if path.is_file()
+            ]
+            self._send(200, {'id': repo, 'sha': 'stub', 'siblings': siblings})
+
+        def _resolve(self, repo: str, name: str):
+            repo_dir = self._repo_dir(repo)
+            path = (repo_dir / name).resolve() if repo_dir else None
+            if path is None or repo_dir not in path.parents or not path.is_file():
+                self._send(404, {'error': f'Entry {name} not found'})
+                return
+
+            size = path.stat().st_size
+            start, end = 0, size - 1
+            status = 200
+
+            range_header = self.headers.get('Range')
+            if range_header and state.support_range:
+                match = RANGE_PATTERN.match(range_header)
+                if match:
+                    start = int(match.group(1))
+                    end = int(match.group(2)) if match.group(2) else size - 1
+                    if start >= size:
+                        self.send_response(416)
+                        self.send_header('Content-Range', f'bytes */{size}')
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    end = min(end, size - 1)
+                    status = 206
+                    with state.lock:
+                        state.range_requests += 1
+
+            length = end - start + 1
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(length))
+            self.send_header('Accept-Ranges', 'bytes' if state.support_range else 'none')
+            if status == 206:
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+            self.end_headers()
+
+            with state.lock:
+                throttle = state.throttle_kbps
+                budget = state.drop_after or length
+
+            with open(path, 'rb') as handle:
+                handle.seek(start)
+                remaining = min(length, budget)
+                while remaining > 0:
+                    chunk = handle.read(min(64 * 1024, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+                    with state.lock:
+                        state.bytes_sent += len(chunk)
+                    if throttle:
+                        time.sleep(len(chunk) / (throttle * 1024))
+
+            if budget < length:
+                # Cut the connection mid-body
+                self.close_connection = True
+
+    return HubHandler
+
+
+def serve(host: str, port: int, state: HubState) -> ThreadingHTTPServer:
+    """Start the stub hub in a background thread and return it"""
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Hugging Face Hub file server")
+    parser.add_argument('--root', required=True, help="Directory with one sub-directory per repo")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8901)
+    parser.add_argument('--lfs-threshold', type=int, default=10 * 1024 * 1024)
+    parser.add_argument('--throttle-kbps', type=float, default=0.0)
+    parser.add_argument('--drop-after', type=int, default=0)
+    parser.add_argument('--no-range', action='store_true', help="Ignore Range headers")
+    args = parser.parse_args()
+
+    state = HubState(Path(args.root), args.lfs_threshold, args.throttle_kbps, args.drop_after,
+                     support_range=not args.no_range)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    server.daemon_threads = True
+    print(f"Stub Hugging Face Hub serving {os.path.abspath(args.root)} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
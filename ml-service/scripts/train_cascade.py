@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Train the cheap first stage of the sentiment cascade
+
+Fits a hashed word-ngram logistic regression on labeled comments and writes
+it as an .npz file that ModelLoader loads for sentiment variants with a
+`cascade_model` (see config/models.yaml). Export labeled comments from the
+backend first, e.g.
+
+    SELECT content, sentiment_label, sentiment_confidence
+    FROM comments WHERE sentiment_label IS NOT NULL
+
+as JSONL or CSV, then:
+
+    python scripts/train_cascade.py comments.jsonl
+    python scripts/train_cascade.py comments.csv --min-confidence 0.8 --target-accuracy 0.97
+
+A slice of the data is held out to report, per confidence threshold, how
+many comments the n-gram stage would answer on its own (the rest escalate to
+the transformer) and how often those answers agree with the labels. The
+suggested threshold is the lowest one that reaches --target-accuracy.
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import random
+import logging
+import argparse
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+# Allow "from app..." imports when run as a script
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.cascade import HashedNgramFeaturizer, NgramSentimentClassifier, cascade_model_path
+from app.services.model_loader import normalize_sentiment_label
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTPUT = "cascade/sentiment-ngram.npz"
+THRESHOLDS = (0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.98)
+
+
+def read_labeled(path: str, text_field: str, label_field: str, confidence_field: str,
+                 min_confidence: float) -> Iterator[Tuple[str, str]]:
+    """(text, label) pairs from a JSONL or CSV export, skipping low-confidence labels"""
+    with open(path, newline='', encoding='utf-8') as handle:
+        if path.endswith('.csv'):
+            rows = csv.DictReader(handle)
+        else:
+            rows = (json.loads(line) for line in handle if line.strip())
+
+        for row in rows:
+            text, label = row.get(text_field), row.get(label_field)
+            if not text or not label:
+                continue
+            confidence = row.get(confidence_field)
+            if min_confidence and confidence not in (None, '') and float(confidence) < min_confidence:
+                continue
+            yield text, normalize_sentiment_label(label)
+
+
+def threshold_report(classifier: NgramSentimentClassifier, texts: List[str], labels: List[str]) -> List[dict]:
+    """Coverage and accuracy of the n-gram stage on held-out data at each threshold"""
+    probabilities = classifier.predict_proba(texts)
+    predicted = [classifier.labels[int(row.argmax())] for row in probabilities]
+    confidence = probabilities.max(axis=1)
+
+    report = []
+    for threshold in THRESHOLDS:
+        answered = [i for i in range(len(texts)) if confidence[i] >= threshold]
+        correct = sum(1 for i in answered if predicted[i] == labels[i])
+        coverage = len(answered) / len(texts) if texts else 0.0
+        report.append({
+            'threshold': threshold,
+            'coverage': round(coverage, 4),
+            'accuracy': round(correct / len(answered), 4) if answered else None,
+            # Model calls per comment fall by this factor
+            'model_call_reduction': round(1.0 / (1.0 - coverage), 1) if coverage < 1.0 else None
+        })
+    return report
+
+
+def train(texts: List[str], labels: List[str], featurizer: HashedNgramFeaturizer, c: float) -> NgramSentimentClassifier:
+    import numpy as np
+    from sklearn.linear_model import LogisticRegression
+
+    features = featurizer.transform(texts)
+    model = LogisticRegression(C=c, max_iter=1000)
+    model.fit(features, labels)
+
+    weights = model.coef_.T.astype(np.float32)
+    bias = model.intercept_.astype(np.float32)
+    if len(model.classes_) == 2:
+        # Binary models have one weight vector; softmax over [0, z] is sigmoid(z)
+        weights = np.hstack([np.zeros_like(weights), weights])
+        bias = np.array([0.0, bias[0]], dtype=np.float32)
+
+    return NgramSentimentClassifier(weights, bias, [str(label) for label in model.classes_], featurizer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the n-gram first stage of the sentiment cascade")
+    parser.add_argument('input', help="JSONL or CSV export of labeled comments")
+    parser.add_argument('-o', '--output', default=None,
+                        help=f"Model file (default: $MODEL_CACHE_DIR/{DEFAULT_OUTPUT})")
+    parser.add_argument('--text-field', default='content')
+    parser.add_argument('--label-field', default='sentiment_label')
+    parser.add_argument('--confidence-field', default='sentiment_confidence')
+    parser.add_argument('--min-confidence', type=float, default=0.0,
+                        help="Skip comments whose stored label confidence is lower")
+    parser.add_argument('--hash-bits', type=int, default=18, help="2^bits hashed feature buckets")
+    parser.add_argument('--ngram-max', type=int, default=2, help="Longest word n-gram")
+    parser.add_argument('--c', type=float, default=4.0, help="Inverse L2 regularisation strength")
+    parser.add_argument('--holdout', type=float, default=0.2, help="Fraction held out for the threshold report")
+    parser.add_argument('--target-accuracy', type=float, default=0.95,
+                        help="Agreement the suggested threshold must reach on held-out data")
+    parser.add_argument('--seed', type=int, default=13)
+    args = parser.parse_args()
+
+    output = args.output or cascade_model_path(DEFAULT_OUTPUT)
+    rows = list(read_labeled(args.input, args.text_field, args.label_field,
+                             args.confidence_field, args.min_confidence))
+    if len(rows) < 20:
+        logger.error(f"❌ Only {len(rows)} labeled comments in {args.input}, need at least 20")
+        sys.exit(1)
+
+    random.Random(args.seed).shuffle(rows)
+    split = int(len(rows) * (1 - args.holdout)) if args.holdout else len(rows)
+    train_rows, holdout_rows = rows[:split], rows[split:]
+
+    counts = {}
+    for _, label in rows:
+        counts[label] = counts.get(label, 0) + 1
+    logger.info(f"📚 {len(rows)} labeled comments ({', '.join(f'{k}: {v}' for k, v in sorted(counts.items()))}), "
+                f"{len(holdout_rows)} held out")
+
+    featurizer = HashedNgramFeaturizer(2 ** args.hash_bits, args.ngram_max)
+    started = time.perf_counter()
+    classifier = train([text for text, _ in train_rows], [label for _, label in train_rows], featurizer, args.c)
+    logger.info(f"✅ Trained in {time.perf_counter() - started:.1f}s")
+
+    suggested = None
+    report = []
+    if holdout_rows:
+        holdout_texts = [text for text, _ in holdout_rows]
+        started = time.perf_counter()
+        report = threshold_report(classifier, holdout_texts, [label for _, label in holdout_rows])
+        per_text_us = (time.perf_counter() - started) / len(holdout_texts) * 1e6
+
+        logger.info(f"Held-out results (n-gram stage scores a comment in ~{per_text_us:.0f}µs):")
+        logger.info("   threshold  answered  accuracy  model calls")
+        for row in report:
+            accuracy = f"{row['accuracy']:.3f}" if row['accuracy'] is not None else "  -  "
+            reduction = f"÷{row['model_call_reduction']}" if row['model_call_reduction'] else "none"
+            logger.info(f"   {row['threshold']:>9}  {row['coverage']:>8.1%}  {accuracy:>8}  {reduction:>11}")
+
+        suggested = next(
+            (row['threshold'] for row in report if row['accuracy'] is not None and row['accuracy'] >= args.target_accuracy),
+            None
+        )
+        if suggested is None:
+            logger.warning(f"⚠️  No threshold reaches {args.target_accuracy:.0%} agreement; "
+                           f"everything below 1.0 would degrade accuracy")
+        else:
+            logger.info(f"💡 Suggested cascade_threshold: {suggested}")
+
+    classifier.meta = {
+        'trained_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'source': os.path.basename(args.input),
+        'samples': len(train_rows),
+        'holdout': report,
+        'suggested_threshold': suggested
+    }
+    classifier.save(output)
+    logger.info(f"🎉 Cascade model written to {output} ({os.path.getsize(output) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
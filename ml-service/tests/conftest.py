@@ -0,0 +1,31 @@
+import os
+import sys
+from pathlib import Path
+
+import fakeredis
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Nothing in the tests should reach a real model, Redis or the Hugging Face API
+os.environ.setdefault('WARMUP_ENABLED', 'false')
+os.environ.setdefault('REDIS_PORT', '1')
+
+from app.services.model_loader import ModelLoader
+
+
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def redis_client(redis_server, monkeypatch):
+    """fakeredis installed as the service's Redis clients (text and binary)"""
+    client = fakeredis.FakeRedis(server=redis_server, decode_responses=True)
+    binary = fakeredis.FakeRedis(server=redis_server)
+    if ModelLoader._instance is None:
+        monkeypatch.setattr(ModelLoader, '_instance', object.__new__(ModelLoader))
+    monkeypatch.setitem(ModelLoader._models, 'redis', client)
+    monkeypatch.setitem(ModelLoader._models, 'redis_binary', binary)
+    return client
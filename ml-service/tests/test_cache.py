@@ -0,0 +1,191 @@
+import random
+import threading
+import time
+
+import pytest
+
+from app.services import cache
+from app.services.cache import cache_get_or_compute, cache_namespace
+from app.services.hf_client import HFClient
+from app.services.model_loader import ModelLoader
+from app.services.model_registry import API, LOCAL, ModelVariant, SENTIMENT
+
+NAMESPACE = "test_ns"
+
+
+@pytest.fixture
+def follows(redis_client, monkeypatch):
+    """Calls that waited on Redis for another worker"""
+    calls = []
+    follow = cache._follow
+
+    def counting_follow(*args, **kwargs):
+        calls.append(args[3:5])
+        return follow(*args, **kwargs)
+
+    monkeypatch.setenv('SINGLE_FLIGHT_POLL_MS', '20')
+    monkeypatch.setattr(cache, '_follow', counting_follow)
+    return calls
+
+
+def run_threads(count, target):
+    results = [None] * count
+
+    def run(index):
+        results[index] = target()
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    return results
+
+
+def test_concurrent_misses_compute_once(follows):
+    computed = []
+
+    def compute():
+        computed.append(1)
+        time.sleep(0.2)
+        return {"text": "generated"}
+
+    results = run_threads(5, lambda: cache_get_or_compute(NAMESPACE, "k1", compute))
+
+    assert len(computed) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert all(value == {"text": "generated"} for value, _ in results)
+    # Callers get their own copies to annotate
+    assert len({id(value) for value, _ in results}) == 5
+    assert follows == []
+
+
+def test_only_one_thread_waits_on_another_workers_lease(follows, redis_client):
+    # Another worker holds the lease and is computing
+    redis_client.set(f"lease:{NAMESPACE}:k2", "other-worker", px=5000)
+
+    def finish_elsewhere():
+        time.sleep(0.2)
+        cache.cache_set(NAMESPACE, "k2", {"text": "from another worker"})
+        redis_client.delete(f"lease:{NAMESPACE}:k2")
+
+    threading.Thread(target=finish_elsewhere).start()
+    results = run_threads(5, lambda: cache_get_or_compute(NAMESPACE, "k2", lambda: {"text": "local"}))
+
+    assert [value for value, _ in results] == [{"text": "from another worker"}] * 5
+    assert all(shared for _, shared in results)
+    assert follows == [(NAMESPACE, "k2")]
+
+
+def test_a_local_waiter_takes_over_when_the_leader_fails(follows):
+    attempts = []
+
+    def compute():
+        attempts.append(1)
+        time.sleep(0.1)
+        if len(attempts) == 1:
+            raise RuntimeError("generation failed")
+        return {"text": "second try"}
+
+    def call():
+        try:
+            return cache_get_or_compute(NAMESPACE, "k3", compute)
+        except RuntimeError as e:
+            return e
+
+    results = run_threads(3, call)
+
+    assert len(attempts) == 2
+    assert sum(isinstance(result, RuntimeError) for result in results) == 1
+    successes = [result for result in results if isinstance(result, tuple)]
+    assert [value for value, _ in successes] == [{"text": "second try"}] * 2
+    assert sorted(shared for _, shared in successes) == [False, True]
+    assert cache._local_flights == {}
+
+
+def test_budget_stops_admitting_once_full(redis_client, monkeypatch):
+    monkeypatch.setenv('CACHE_BUDGET_MB', f'{NAMESPACE}=0.01')
+    budget = cache.CacheBudget()
+    monkeypatch.setattr(cache, 'cache_budget', budget)
+
+    # Small entries keep coming; the namespace must not grow past its budget
+    for index in range(100):
+        cache.cache_set(NAMESPACE, f"entry{index}", f"{index:04d}" * 100)
+
+    used, entries = budget.usage(NAMESPACE)
+    assert used <= budget.budget(NAMESPACE)
+    assert 0 < entries < 100
+    assert redis_client.exists(f"{NAMESPACE}:entry0")
+    assert not redis_client.exists(f"{NAMESPACE}:entry99")
+
+
+def test_budget_rejects_entries_below_the_average_size_when_full(monkeypatch):
+    monkeypatch.setenv('CACHE_BUDGET_MB', f'{NAMESPACE}=1')
+    budget = cache.CacheBudget()
+    full = budget.budget(NAMESPACE) - 100
+    monkeypatch.setattr(budget, 'usage', lambda namespace: (full, 1000))
+
+    assert budget.admit(NAMESPACE, 100) is None
+    assert budget.admit(NAMESPACE, 101) == cache.OVER_BUDGET
+    assert budget.admit(f"other_{NAMESPACE}", 10 ** 5) is None
+    assert budget.admit(NAMESPACE, budget.max_entry + 1) == cache.TOO_LARGE
+
+
+@pytest.fixture
+def api_variant(redis_client, monkeypatch):
+    """API variant with HF_LOCAL_FALLBACK on; returns a function that opens its circuit"""
+    variant = ModelVariant(task=SENTIMENT, name="test", model="test/model", backend=API)
+    client = HFClient()
+    monkeypatch.setenv('HF_TOKEN', 'stub')
+    monkeypatch.setenv('HF_LOCAL_FALLBACK', 'lazy')
+    monkeypatch.setattr(ModelLoader, '_hf_client', client)
+    monkeypatch.setattr(ModelLoader, '_versions', {})
+    monkeypatch.setattr(ModelLoader, '_fallback_failed', set())
+
+    def open_circuit():
+        breaker = client.breaker(variant.api_model_name)
+        for _ in range(client.failure_threshold):
+            breaker.record_failure()
+
+    return variant, open_circuit
+
+
+def test_fallback_results_get_the_local_namespace(api_variant):
+    variant, open_circuit = api_variant
+    api_namespace = cache_namespace("sentiment", variant)
+
+    open_circuit()
+
+    fallback_namespace = cache_namespace("sentiment", variant)
+    assert fallback_namespace != api_namespace
+    # The same namespace as the model served locally without the API
+    local_variant = ModelVariant(task=SENTIMENT, name="test", model="test/model", backend=LOCAL)
+    ModelLoader._versions.clear()
+    assert fallback_namespace == cache_namespace("sentiment", local_variant)
+
+
+def test_results_are_not_cached_when_the_backend_changed_meanwhile(api_variant, redis_client):
+    variant, open_circuit = api_variant
+    namespace = cache_namespace("sentiment", variant)
+
+    open_circuit()
+    cache.cache_set(namespace, "k", {"label": "POSITIVE"})
+
+    assert not redis_client.exists(f"{namespace}:k")
+    assert cache.cache_get(cache_namespace("sentiment", variant), "k") is None
+
+
+def test_budget_holds_within_a_single_batch(redis_client, monkeypatch):
+    monkeypatch.setenv('CACHE_BUDGET_MB', f'{NAMESPACE}=0.01')
+    budget = cache.CacheBudget()
+    monkeypatch.setattr(cache, 'cache_budget', budget)
+
+    # Each entry fits on its own; together they are several times the budget
+    values = {f"entry{index}": random.Random(index).randbytes(2000).hex() for index in range(20)}
+    cache.cache_set_many(NAMESPACE, values)
+
+    used, entries = budget.usage(NAMESPACE)
+    assert used <= budget.budget(NAMESPACE)
+    assert 0 < entries < 20
+    assert redis_client.exists(f"{NAMESPACE}:entry0")
+    assert not redis_client.exists(f"{NAMESPACE}:entry19")
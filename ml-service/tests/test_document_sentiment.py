@@ -0,0 +1,62 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.routes import sentiment
+from app.services.model_registry import ModelVariant, SENTIMENT
+
+VARIANT = ModelVariant(task=SENTIMENT, name="test", model="test/model")
+
+
+@pytest.fixture
+def documents(monkeypatch):
+    """Route with a 510-token model window, a dict cache and a recording analyzer"""
+    cache, calls = {}, []
+
+    def analyze(text, window_tokens, overlap_tokens, aggregation, model=None):
+        calls.append((window_tokens, overlap_tokens, aggregation))
+        return {
+            'sentiment': 'POSITIVE', 'confidence': 0.9, 'scores': {'POSITIVE': 0.9},
+            'aggregation': aggregation, 'num_chunks': 1, 'token_count': 10, 'chunks': [],
+        }
+
+    monkeypatch.setattr(sentiment, 'sentiment_variant', lambda name: VARIANT)
+    monkeypatch.setattr(sentiment, 'cache_namespace', lambda prefix, variant: f"{prefix}:{variant.name}")
+    monkeypatch.setattr(sentiment, 'cache_get', lambda namespace, key: dict(cache[key]) if key in cache else None)
+    monkeypatch.setattr(sentiment, 'cache_set', lambda namespace, key, value, ttl=None: cache.__setitem__(key, dict(value)))
+    monkeypatch.setattr(sentiment, 'analyze_document', analyze)
+    monkeypatch.setattr(sentiment.ModelLoader, 'get_sentiment_tokenizer',
+                        classmethod(lambda cls, name=None: SimpleNamespace(budget=510)))
+    return calls
+
+
+def analyze_document(**fields):
+    request = sentiment.DocumentSentimentRequest(text="A long post.", **fields)
+    return asyncio.run(sentiment.analyze_document_sentiment(request))
+
+
+def test_overlap_is_checked_against_the_capped_window(documents):
+    with pytest.raises(HTTPException) as error:
+        analyze_document(window_tokens=2000, overlap_tokens=600)
+
+    assert error.value.status_code == 400
+    assert "510 tokens" in error.value.detail
+    assert documents == []
+
+
+def test_window_is_capped_before_analysis(documents):
+    analyze_document(window_tokens=2000, overlap_tokens=200)
+
+    assert documents == [(510, 200, 'length_weighted')]
+
+
+def test_named_documents_are_cached_per_setting(documents):
+    first = analyze_document(cache_key="post-1", aggregation="mean")
+    other = analyze_document(cache_key="post-1", aggregation="max_negative")
+    again = analyze_document(cache_key="post-1", aggregation="mean")
+
+    assert (first.cached, other.cached, again.cached) == (False, False, True)
+    assert other.aggregation == "max_negative"
+    assert [call[2] for call in documents] == ["mean", "max_negative"]
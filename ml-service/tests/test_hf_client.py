@@ -0,0 +1,200 @@
+import os
+import sys
+import time
+import threading
+
+import pytest
+
+from app.services.deadline import Deadline, DeadlineExceeded, deadline_scope
+from app.services.hf_client import CLOSED, HALF_OPEN, OPEN, CircuitOpenError, HFAPIError, HFClient
+from app.services.model_loader import ModelLoader
+from app.services.model_registry import API, ModelVariant, SENTIMENT
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+from stub_hf_server import StubState, serve  # noqa: E402
+
+MODEL = "test/sentiment"
+PAYLOAD = {"inputs": ["good"]}
+
+
+@pytest.fixture
+def stub():
+    state = StubState()
+    server = serve('127.0.0.1', 0, state)
+    yield state, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(stub, monkeypatch):
+    _, base_url = stub
+    monkeypatch.setenv('HF_API_BASE_URL', base_url)
+    monkeypatch.setenv('HF_BREAKER_FAILURES', '2')
+    monkeypatch.setenv('HF_BREAKER_RESET_SECONDS', '0.3')
+    monkeypatch.setenv('HF_MAX_RETRIES', '3')
+    monkeypatch.setenv('HF_RETRY_BACKOFF_SECONDS', '0.01')
+    return HFClient()
+
+
+def post(client, timeout=5.0, hedge=False):
+    return client.post(MODEL, client.inference_url(MODEL), PAYLOAD, {}, timeout, hedge=hedge)
+
+
+def test_breaker_opens_then_closes_after_a_successful_probe(stub, client):
+    state, _ = stub
+    client.max_retries = 0
+    state.update({'fail_rate': 1.0})
+
+    for _ in range(2):
+        with pytest.raises(HFAPIError):
+            post(client)
+    assert client.breaker(MODEL).state == OPEN
+
+    # Rejected without reaching the API
+    with pytest.raises(CircuitOpenError):
+        post(client)
+    assert state.requests == 2
+
+    time.sleep(0.35)
+    assert client.breaker(MODEL).allow()
+    assert client.breaker(MODEL).state == HALF_OPEN
+    # Only one probe while half-open
+    assert not client.breaker(MODEL).allow()
+    client.breaker(MODEL).release()
+
+    state.update({'fail_rate': 0.0})
+    assert len(post(client)) == 1
+    assert client.breaker(MODEL).state == CLOSED
+
+
+def test_failed_probe_reopens_the_breaker(stub, client):
+    state, _ = stub
+    client.max_retries = 0
+    state.update({'fail_rate': 1.0})
+    for _ in range(2):
+        with pytest.raises(HFAPIError):
+            post(client)
+
+    time.sleep(0.35)
+    with pytest.raises(HFAPIError):
+        post(client)
+    assert client.breaker(MODEL).state == OPEN
+    assert state.requests == 3
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_retries_honour_retry_after(stub, client, status):
+    state, _ = stub
+    state.update({'fail_next': 2, 'fail_status': status, 'retry_after': 1})
+
+    started = time.monotonic()
+    assert len(post(client)) == 1
+    assert time.monotonic() - started >= 2.0
+    assert state.requests == 3
+
+
+def test_retry_after_beyond_the_budget_gives_up(stub, client):
+    state, _ = stub
+    state.update({'fail_next': 1, 'retry_after': 5})
+
+    started = time.monotonic()
+    with pytest.raises(HFAPIError) as error:
+        post(client, timeout=1.0)
+    assert error.value.status_code == 503
+    assert time.monotonic() - started < 1.0
+    assert state.requests == 1
+
+
+def test_client_errors_are_not_retried(stub, client):
+    state, _ = stub
+    state.update({'fail_next': 1, 'fail_status': 400})
+
+    with pytest.raises(HFAPIError) as error:
+        post(client)
+    assert error.value.status_code == 400
+    assert state.requests == 1
+    assert client.breaker(MODEL).consecutive_failures == 0
+
+
+def test_budget_covers_a_trickling_body(stub, client):
+    state, _ = stub
+    client.max_retries = 0
+    # Every byte arrives well within a read timeout, the whole body does not
+    state.update({'trickle_ms': 20})
+
+    started = time.monotonic()
+    with pytest.raises(HFAPIError):
+        post(client, timeout=0.5)
+    assert time.monotonic() - started < 0.8
+
+
+def test_slow_request_is_hedged(stub, client):
+    state, _ = stub
+    client.hedge_after = 0.05
+    state.update({'slow_next': 1, 'slow_ms': 2000})
+
+    started = time.monotonic()
+    assert len(post(client, hedge=True)) == 1
+    assert time.monotonic() - started < 1.0
+    assert state.requests == 2
+
+
+def test_hedges_stop_once_the_caller_is_gone(stub, client):
+    state, _ = stub
+    client.hedge_after = 0.02
+    client.max_retries = 1000
+    client.backoff_base = 0.0001
+    state.update({'fail_rate': 1.0})
+    deadline = Deadline.after(10)
+    threading.Timer(0.2, deadline.mark_disconnected).start()
+
+    started = time.monotonic()
+    with deadline_scope(deadline), pytest.raises(DeadlineExceeded):
+        post(client, timeout=3.0, hedge=True)
+    # Both attempts notice the disconnect between retries, well before the budget runs out
+    assert time.monotonic() - started < 1.0
+
+    # Neither attempt keeps spending API calls on a caller that has gone
+    time.sleep(0.05)
+    requests = state.requests
+    time.sleep(0.3)
+    assert state.requests == requests
+
+
+def test_fast_request_is_not_hedged(stub, client):
+    state, _ = stub
+    client.hedge_after = 0.5
+
+    post(client, hedge=True)
+    assert state.requests == 1
+
+
+def test_open_breaker_falls_back_to_the_local_model(stub, client, monkeypatch):
+    state, _ = stub
+    client.max_retries = 0
+    variant = ModelVariant(task=SENTIMENT, name="test", model=MODEL, backend=API)
+    local_calls = []
+
+    def local_model(texts, **kwargs):
+        local_calls.append(list(texts))
+        return [[{'label': 'POSITIVE', 'score': 0.8}] for _ in texts]
+
+    monkeypatch.setenv('HF_TOKEN', 'stub')
+    monkeypatch.setenv('HF_LOCAL_FALLBACK', 'lazy')
+    monkeypatch.setattr(ModelLoader, '_instance', object.__new__(ModelLoader))
+    monkeypatch.setattr(ModelLoader, '_hf_client', client)
+    monkeypatch.setattr(ModelLoader, '_fallback_failed', set())
+    monkeypatch.setattr(ModelLoader, 'scheduler', classmethod(lambda cls, variant: None))
+    monkeypatch.setattr(ModelLoader, 'load_local_model', classmethod(lambda cls, variant: local_model))
+    monkeypatch.setattr(ModelLoader, '_pipeline_truncation', classmethod(lambda cls, variant: {}))
+
+    state.update({'fail_rate': 1.0})
+    for _ in range(2):
+        with pytest.raises(HFAPIError):
+            ModelLoader._run_sentiment_model(["good"], variant)
+    assert local_calls == []
+
+    assert ModelLoader._run_sentiment_model(["good"], variant) == [[{'label': 'POSITIVE', 'score': 0.8}]]
+    assert local_calls == [["good"]]
+    assert state.requests == 2
@@ -0,0 +1,236 @@
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import struct
+import zlib
+
+from typing import Optional
+
+import pytest
+from PIL import Image
+
+from app.routes.image_classification import open_image
+from app.services import image_upload
+from app.services.image_upload import (
+    Base64JsonReader,
+    ImageUpload,
+    UploadRejected,
+    read_base64_image,
+    read_multipart_image,
+)
+
+
+def png_bytes(width=30, height=20) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (1, 2, 3)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def png_header(width, height) -> bytes:
+    """A PNG that declares a size without the pixels to go with it"""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(b"\0" * 10)) + chunk(b"IEND", b""))
+
+
+PNG = png_bytes()
+B64 = base64.b64encode(PNG).decode()
+
+
+class FakeRequest:
+    """Just enough of a starlette Request: headers and a body streamed in `step`-byte chunks"""
+
+    def __init__(self, body: bytes, content_type: str, step: int = 7, content_length: bool = True):
+        self.body = body
+        self.step = step
+        self.headers = {"content-type": content_type}
+        if content_length:
+            self.headers["content-length"] = str(len(body))
+
+    async def stream(self):
+        for i in range(0, len(self.body), self.step):
+            yield self.body[i:i + self.step]
+
+
+def read_json(body: str, step: int):
+    upload = ImageUpload()
+    reader = Base64JsonReader("image_data", upload)
+    data = body.encode()
+    for i in range(0, len(data), step):
+        reader.feed(data[i:i + step])
+    rest = reader.finish()
+    upload.finish()
+    return upload.file.read(), rest, reader.found
+
+
+def escape_every_char(text: str) -> str:
+    return "".join(f"\\u{ord(c):04x}" for c in text)
+
+
+BODIES = {
+    "plain": json.dumps({"max_tags": 3, "image_data": B64, "model": "x/y"}),
+    "escaped_slashes": json.dumps({"image_data": B64, "cache_key": 'a"b'}).replace("/", "\\/"),
+    "unicode_escapes": '{"image_data": "' + escape_every_char(B64[:40]) + B64[40:] + '"}',
+    "data_url": json.dumps({"image_data": "data:image/png;base64," + B64}),
+    "escaped_data_url": json.dumps({"image_data": "data:image/png;base64," + B64}).replace("/", "\\/"),
+    "unpadded": json.dumps({"image_data": B64.rstrip("=")}),
+    "nested_same_key": json.dumps({"options": {"image_data": "AAAA"}, "image_data": B64}),
+    "line_breaks": json.dumps({"image_data": "\n".join(B64[i:i + 76] for i in range(0, len(B64), 76))}),
+    "urlsafe": json.dumps({"image_data": base64.urlsafe_b64encode(PNG).decode()}),
+}
+
+
+@pytest.mark.parametrize("step", [1, 2, 3, 5, 7, 4096])
+@pytest.mark.parametrize("name", sorted(BODIES))
+def test_base64_image_survives_any_chunking(name, step):
+    # Steps of 1-7 bytes split every escape sequence at every position
+    data, rest, found = read_json(BODIES[name], step)
+
+    assert data == PNG
+    assert found
+    assert rest["image_data"] == ""
+
+
+def test_other_members_are_kept():
+    _, rest, _ = read_json(BODIES["plain"], 3)
+    assert rest == {"max_tags": 3, "image_data": "", "model": "x/y"}
+
+    _, rest, _ = read_json(BODIES["nested_same_key"], 3)
+    assert rest["options"] == {"image_data": "AAAA"}
+
+
+@pytest.mark.parametrize("body", [
+    '{"image_data": "!!!!"}',
+    '{"image_data": "AA==AAAA"}',
+    '{"image_data": "\\u00zz"}',
+    '{"image_data": "\\u00e9AAA"}',
+    '{"image_data": "\\x41"}',
+    '{"image_data": "' + B64,
+    '{"image_data": "data:' + "x" * 300 + '"}',
+    '[1]',
+])
+def test_malformed_json_bodies_are_400(body):
+    with pytest.raises(UploadRejected) as error:
+        read_json(body, 5)
+    assert error.value.status_code == 400
+
+
+def test_truncated_base64_is_400():
+    with pytest.raises(UploadRejected) as error:
+        read_json('{"image_data": "AAAAA"}', 4)
+    assert error.value.status_code == 400
+
+
+def read_base64(body: bytes, **kwargs):
+    return asyncio.run(read_base64_image(FakeRequest(body, "application/json", **kwargs)))
+
+
+def test_read_base64_image():
+    upload, body = read_base64(BODIES["data_url"].encode(), step=11)
+
+    assert upload.format == "png"
+    assert upload.file.read() == PNG
+    assert body == {"image_data": ""}
+
+
+def test_base64_over_the_byte_cap_is_413(monkeypatch):
+    monkeypatch.setattr(image_upload, "MAX_BYTES", len(PNG) - 1)
+
+    # Refused from the declared length, and while streaming without one
+    for content_length in (True, False):
+        with pytest.raises(UploadRejected) as error:
+            read_base64(BODIES["plain"].encode(), content_length=content_length)
+        assert error.value.status_code == 413
+        assert error.value.reason == image_upload.TOO_LARGE
+
+
+def test_base64_that_is_not_an_image_is_415():
+    body = json.dumps({"image_data": base64.b64encode(b"just some text, not an image").decode()})
+    with pytest.raises(UploadRejected) as error:
+        read_base64(body.encode())
+    assert error.value.status_code == 415
+
+
+def test_missing_base64_field_is_422():
+    with pytest.raises(UploadRejected) as error:
+        read_base64(json.dumps({"options": {"image_data": B64}}).encode())
+    assert error.value.status_code == 422
+
+
+BOUNDARY = "----test-boundary"
+
+
+def multipart(file_data: bytes, content_type: Optional[str] = "image/png", **fields) -> bytes:
+    parts = [
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in fields.items()
+    ]
+    parts.append(
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="a.png"\r\n'.encode()
+        + (f'Content-Type: {content_type}\r\n' if content_type else '').encode() + b"\r\n" + file_data + b"\r\n"
+    )
+    return b"".join(parts) + f"--{BOUNDARY}--\r\n".encode()
+
+
+def read_multipart(body: bytes, **kwargs):
+    request = FakeRequest(body, f"multipart/form-data; boundary={BOUNDARY}", **kwargs)
+    return asyncio.run(read_multipart_image(request))
+
+
+@pytest.mark.parametrize("step", [1, 13, 65536])
+def test_read_multipart_image(step):
+    upload, fields = read_multipart(multipart(PNG, max_tags="3", model="fast"), step=step)
+
+    assert upload.file.read() == PNG
+    assert upload.sha256 == hashlib.sha256(PNG).hexdigest()
+    assert fields == {"max_tags": "3", "model": "fast"}
+
+
+def test_multipart_over_the_byte_cap_is_413(monkeypatch):
+    monkeypatch.setattr(image_upload, "MAX_BYTES", len(PNG) - 1)
+
+    for content_length in (True, False):
+        with pytest.raises(UploadRejected) as error:
+            read_multipart(multipart(PNG + b"\0" * 2048), content_length=content_length)
+        assert error.value.status_code == 413
+
+
+@pytest.mark.parametrize("content_type,data", [
+    ("text/plain", PNG),
+    ("image/png", b"<html>not an image</html>"),
+    (None, b"%PDF-1.7 not an image either"),
+])
+def test_multipart_that_is_not_an_image_is_415(content_type, data):
+    with pytest.raises(UploadRejected) as error:
+        read_multipart(multipart(data, content_type=content_type))
+    assert error.value.status_code == 415
+    assert error.value.reason == image_upload.NOT_AN_IMAGE
+
+
+def open_upload(data: bytes):
+    upload = ImageUpload()
+    upload.write(data)
+    return open_image(upload.finish())
+
+
+def test_images_over_the_pixel_cap_are_413(monkeypatch):
+    assert open_upload(PNG).size == (30, 20)
+
+    monkeypatch.setattr(image_upload, "MAX_PIXELS", 30 * 20 - 1)
+    with pytest.raises(UploadRejected) as error:
+        open_upload(PNG)
+    assert error.value.status_code == 413
+    assert error.value.reason == image_upload.TOO_MANY_PIXELS
+
+
+@pytest.mark.parametrize("width,height", [(6000, 6000), (20000, 20000)])
+def test_oversized_headers_are_413_before_decoding(width, height, monkeypatch):
+    monkeypatch.setattr(image_upload, "MAX_PIXELS", 25_000_000)
+    # The second is far enough over Pillow's own limit that Image.open refuses it
+    with pytest.raises(UploadRejected) as error:
+        open_upload(png_header(width, height))
+    assert error.value.status_code == 413
+    assert error.value.reason == image_upload.TOO_MANY_PIXELS
@@ -0,0 +1,155 @@
+import threading
+import time
+
+import pytest
+
+from app.services.job_queue import FAILED, QUEUED, SUCCEEDED, JobQueue, RedisJobStore
+
+
+def wait_for(condition, timeout=10.0):
+    until = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < until, "timed out"
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def jobs(redis_client):
+    queue = JobQueue()
+    queue.register("echo", lambda payload: {"echo": payload["value"]})
+    queue.store = RedisJobStore(redis_client, ttl=60, visibility_timeout=0.2)
+    return queue
+
+
+def test_finished_job_leaves_processing_list(jobs, redis_client):
+    job = jobs.submit("echo", {"value": 1})
+    job_id = jobs.store.pop("echo", timeout=1)
+    assert redis_client.lrange("jobs:processing:echo", 0, -1) == [job_id]
+
+    lease = jobs.store.claim(job_id)
+    jobs._run("echo", jobs._handlers["echo"], job_id)
+    jobs.store.ack("echo", job_id)
+    lease.release()
+
+    assert jobs.get(job["id"])["status"] == SUCCEEDED
+    assert redis_client.llen("jobs:processing:echo") == 0
+    assert redis_client.get(f"jobs:lease:{job_id}") is None
+
+
+def test_leased_job_is_not_reaped(jobs):
+    jobs.submit("echo", {"value": 1})
+    job_id = jobs.store.pop("echo", timeout=1)
+    lease = jobs.store.claim(job_id)
+    try:
+        # Renewed every third of the visibility timeout while it runs
+        for _ in range(3):
+            time.sleep(0.15)
+            assert jobs.reap() == 0
+    finally:
+        lease.release()
+
+
+def test_abandoned_job_is_requeued_after_two_sweeps(jobs, redis_client):
+    job = jobs.submit("echo", {"value": 1})
+    job_id = jobs.store.pop("echo", timeout=1)
+    job_record = jobs.get(job_id)
+    job_record.update(status="running", attempts=1)
+    jobs.store.save(job_record)
+    # The worker died: no lease, still in the processing list
+
+    assert jobs.reap() == 0  # only suspected on the first sweep
+    assert jobs.reap() == 1
+
+    assert jobs.get(job["id"])["status"] == QUEUED
+    assert redis_client.llen("jobs:processing:echo") == 0
+    assert jobs.store.pop("echo", timeout=1) == job_id
+
+
+def test_expired_lease_is_reaped(jobs):
+    jobs.submit("echo", {"value": 1})
+    job_id = jobs.store.pop("echo", timeout=1)
+    # A lease that is never renewed, as when its process is killed
+    jobs.store.client.set(f"jobs:lease:{job_id}", "dead", px=100)
+
+    assert jobs.reap() == 0
+    time.sleep(0.2)
+    assert jobs.reap() == 0
+    assert jobs.reap() == 1
+
+
+def test_job_fails_after_max_attempts(jobs, redis_client):
+    job = jobs.submit("echo", {"value": 1})
+    job_id = jobs.store.pop("echo", timeout=1)
+    job_record = jobs.get(job_id)
+    job_record.update(status="running", attempts=jobs.max_attempts)
+    jobs.store.save(job_record)
+
+    jobs.reap()
+    assert jobs.reap() == 1
+
+    failed = jobs.get(job["id"])
+    assert failed["status"] == FAILED
+    assert "Worker stopped" in failed["error"]
+    assert redis_client.llen("jobs:processing:echo") == 0
+    assert redis_client.llen("jobs:queue:echo") == 0
+
+
+def test_finished_job_left_behind_is_dropped(jobs, redis_client):
+    job = jobs.submit("echo", {"value": 1})
+    job_id = jobs.store.pop("echo", timeout=1)
+    jobs._run("echo", jobs._handlers["echo"], job_id)  # died before acking
+
+    jobs.reap()
+    assert jobs.reap() == 0
+    assert jobs.get(job["id"])["status"] == SUCCEEDED
+    assert redis_client.llen("jobs:processing:echo") == 0
+    assert redis_client.llen("jobs:queue:echo") == 0
+
+
+def test_worker_runs_and_acks(redis_client):
+    queue = JobQueue()
+    queue.register("echo", lambda payload: {"echo": payload["value"]})
+    queue.start()
+    try:
+        job = queue.submit("echo", {"value": 7})
+        deadline = time.monotonic() + 5
+        while queue.get(job["id"])["status"] != SUCCEEDED and time.monotonic() < deadline:
+            time.sleep(0.05)
+        finished = queue.get(job["id"])
+        assert finished["result"] == {"echo": 7}
+        assert finished["attempts"] == 1
+        assert redis_client.llen("jobs:processing:echo") == 0
+    finally:
+        queue.stop()
+
+
+def test_worker_survives_a_store_error(jobs, monkeypatch):
+    claim = jobs.store.claim
+    failures = []
+
+    def flaky_claim(job_id):
+        if not failures:
+            failures.append(job_id)
+            raise ConnectionError("Redis went away")
+        return claim(job_id)
+
+    monkeypatch.setattr(jobs.store, 'claim', flaky_claim)
+    first = jobs.submit("echo", {"value": 1})
+    second = jobs.submit("echo", {"value": 2})
+
+    worker = threading.Thread(target=jobs._worker, args=("echo",), daemon=True)
+    worker.start()
+    try:
+        # The worker backs off and carries on with the next job
+        wait_for(lambda: jobs.get(second["id"])["status"] == SUCCEEDED)
+        assert failures == [first["id"]]
+        assert jobs.get(first["id"])["status"] == QUEUED
+
+        # The job whose claim failed is reclaimed by the reaper and run after all
+        jobs.reap()
+        assert jobs.reap() == 1
+        wait_for(lambda: jobs.get(first["id"])["status"] == SUCCEEDED)
+        assert worker.is_alive()
+    finally:
+        jobs._stopping.set()
+        worker.join(5)
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import pytest
+
+from app.routes import sentiment
+from app.services.model_loader import ModelLoader
+from app.services.model_registry import ModelVariant, SENTIMENT
+from app.services.profiling import CPROFILE, STACKS, Profiler
+from app.services.scheduler import ModelScheduler
+from app.services.tokenization import EncodedText
+
+VARIANT = ModelVariant(task=SENTIMENT, name="test", model="test/model")
+
+
+def busy_sentiment_model(texts):
+    """Stands in for a forward pass: keeps its thread busy long enough to be sampled"""
+    until = time.perf_counter() + 0.2
+    while time.perf_counter() < until:
+        pass
+    return [[{'label': 'POSITIVE', 'score': 0.9}] for _ in texts]
+
+
+@pytest.fixture
+def scheduled_model(redis_client, monkeypatch):
+    """/sentiment/ served by busy_sentiment_model on a real scheduler's dispatcher threads"""
+    scheduler = ModelScheduler(VARIANT.key, run_batch=lambda texts: busy_sentiment_model(texts), max_batch_size=4)
+    encode = classmethod(lambda cls, texts, model=None: [EncodedText(text, 3, False) for text in texts])
+
+    monkeypatch.setattr(sentiment, 'sentiment_variant', lambda name: VARIANT)
+    monkeypatch.setattr(sentiment, 'cache_namespace', lambda prefix, variant: f"{prefix}:{variant.name}")
+    monkeypatch.setattr(ModelLoader, 'variant', classmethod(lambda cls, task, name=None: VARIANT))
+    monkeypatch.setattr(ModelLoader, 'encode_sentiment_inputs', encode)
+    monkeypatch.setattr(ModelLoader, 'get_cascade', classmethod(lambda cls, variant: None))
+    monkeypatch.setattr(ModelLoader, 'use_api_for', classmethod(lambda cls, variant: False))
+    monkeypatch.setattr(ModelLoader, 'scheduler', classmethod(lambda cls, variant: scheduler))
+    return scheduler
+
+
+def profiled_sentiment_call(kind):
+    profiler = Profiler()
+    profiler.request_interval = 0.005
+    with profiler.profile_request(kind, "POST /sentiment/") as profile:
+        result = asyncio.run(sentiment.analyze_sentiment(sentiment.SentimentRequest(text="great post")))
+    assert result.sentiment == "POSITIVE"
+    return profile
+
+
+def test_request_stacks_include_the_model_call(scheduled_model):
+    profile = profiled_sentiment_call(STACKS)
+
+    model_stacks = [line for line in profile.output.splitlines() if "busy_sentiment_model" in line]
+    assert model_stacks
+    # Sampled on the dispatcher thread that ran it, under the scheduler
+    assert all(line.startswith(f"scheduler-{VARIANT.key}-") for line in model_stacks)
+    assert any("_execute (scheduler.py" in line for line in model_stacks)
+    # The threads leave the profile once the request's work is done
+    assert len(profile.threads) == 1
+
+
+def test_request_cprofile_includes_the_model_call(scheduled_model):
+    profile = profiled_sentiment_call(CPROFILE)
+
+    assert profile.error is None
+    assert "busy_sentiment_model" in profile.output
+
+
+def test_model_calls_of_other_requests_stay_out(scheduled_model):
+    profiler = Profiler()
+    with profiler.profile_request(CPROFILE, "POST /sentiment/") as profile:
+        pass
+    # Not profiled: runs after (and outside) the profiled request
+    asyncio.run(sentiment.analyze_sentiment(sentiment.SentimentRequest(text="later post")))
+
+    assert "busy_sentiment_model" not in profile.output
+    assert profile.thread_profilers == []
@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+
+from app.services.deadline import Deadline, DeadlineExceeded, deadline_scope
+from app.services.scheduler import BULK, INTERACTIVE, STANDARD, ModelScheduler, priority_scope
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    monkeypatch.setenv('SCHEDULER_WEIGHTS', 'interactive=8,standard=3,bulk=1')
+    monkeypatch.setenv('SCHEDULER_RESERVED', 'interactive=1')
+
+
+class Gate:
+    """A model call that holds its slot until opened"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.opened = threading.Event()
+
+    def __call__(self):
+        self.started.set()
+        assert self.opened.wait(5)
+        return "gate"
+
+
+def submit_in_thread(scheduler, priority, fn, deadline=None):
+    """Call fn through the scheduler from another thread; returns (thread, outcome dict)"""
+    outcome = {}
+
+    def run():
+        with priority_scope(priority), deadline_scope(deadline):
+            try:
+                outcome['result'] = scheduler.call(fn)
+            except Exception as e:
+                outcome['error'] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, outcome
+
+
+def wait_until(condition, timeout=5.0):
+    until = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < until, "timed out"
+        time.sleep(0.005)
+
+
+def test_more_urgent_classes_overtake_queued_bulk_work(settings):
+    scheduler = ModelScheduler("test", concurrency=1)
+    gate = Gate()
+    threads = [submit_in_thread(scheduler, BULK, gate)[0]]
+    assert gate.started.wait(5)
+
+    order = []
+    for priority in (BULK, STANDARD, INTERACTIVE):
+        for _ in range(3):
+            threads.append(submit_in_thread(scheduler, priority, lambda priority=priority: order.append(priority))[0])
+    wait_until(lambda: all(scheduler.depth(priority) == 3 for priority in (BULK, STANDARD, INTERACTIVE)))
+
+    gate.opened.set()
+    for thread in threads:
+        thread.join(5)
+
+    # Interactive goes first, and standard gets its weighted share before bulk runs at all
+    assert order[:2] == [INTERACTIVE, INTERACTIVE]
+    assert sorted(order[:6]) == sorted([INTERACTIVE] * 3 + [STANDARD] * 3)
+    assert order[6:] == [BULK] * 3
+
+
+def test_reserved_slot_keeps_bulk_from_taking_every_slot(settings):
+    scheduler = ModelScheduler("test", concurrency=2)
+    gates = [Gate(), Gate()]
+    threads = [submit_in_thread(scheduler, BULK, gate)[0] for gate in gates]
+    wait_until(lambda: scheduler.status()["classes"][BULK]["running"] == 1 and scheduler.depth(BULK) == 1)
+
+    # The second bulk call waits, while an interactive call gets the reserved slot at once
+    thread, outcome = submit_in_thread(scheduler, INTERACTIVE, lambda: "interactive")
+    thread.join(5)
+    assert outcome == {'result': "interactive"}
+    assert sum(gate.started.is_set() for gate in gates) == 1
+    assert scheduler.depth(BULK) == 1
+
+    for gate in gates:
+        gate.opened.set()
+    for thread in threads:
+        thread.join(5)
+    assert all(gate.started.is_set() for gate in gates)
+
+
+def test_queued_work_is_dropped_once_its_deadline_passes(settings):
+    scheduler = ModelScheduler("test", concurrency=1)
+    gate = Gate()
+    blocker, _ = submit_in_thread(scheduler, BULK, gate)
+    assert gate.started.wait(5)
+
+    ran = []
+    thread, outcome = submit_in_thread(scheduler, INTERACTIVE, lambda: ran.append(1), deadline=Deadline.after(0.2))
+    thread.join(5)
+
+    assert isinstance(outcome['error'], DeadlineExceeded)
+    assert outcome['error'].stage == "queue"
+    assert scheduler.depth(INTERACTIVE) == 0
+
+    gate.opened.set()
+    blocker.join(5)
+    # The slot frees up, but nobody is waiting for that input any more
+    assert scheduler.call(lambda: "next") == "next"
+    assert ran == []
+
+
+def test_started_work_finishes_past_its_deadline(settings):
+    scheduler = ModelScheduler("test", concurrency=1)
+
+    def slow():
+        time.sleep(0.3)
+        return "done"
+
+    thread, outcome = submit_in_thread(scheduler, INTERACTIVE, slow, deadline=Deadline.after(0.1))
+    thread.join(5)
+
+    assert outcome == {'result': "done"}
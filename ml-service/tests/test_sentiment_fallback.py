@@ -0,0 +1,39 @@
+import pytest
+
+from app.services.model_loader import ModelLoader
+from app.services.model_registry import ModelVariant, SENTIMENT
+
+VARIANT = ModelVariant(task=SENTIMENT, name="test", model="test/model")
+
+
+@pytest.fixture
+def api_calls(monkeypatch):
+    """API that fails whole batches containing "bad", and "bad" on its own"""
+    calls = []
+
+    def predict(texts, variant=None, lengths=None):
+        calls.append(list(texts))
+        if "bad" in texts or len(texts) > 2:
+            raise RuntimeError("503 from the API")
+        return [{'label': 'POSITIVE', 'score': 0.9} for _ in texts]
+
+    monkeypatch.setattr(ModelLoader, '_predict_sentiment_batch', classmethod(lambda cls, *a, **k: predict(*a, **k)))
+    return calls
+
+
+def test_failed_api_batch_falls_back_per_text(api_calls, monkeypatch):
+    monkeypatch.setattr(ModelLoader, 'use_api_for', classmethod(lambda cls, variant: True))
+
+    results = ModelLoader._predict_sentiment_or_neutral(["good", "bad", "fine"], VARIANT, [1, 1, 1])
+
+    assert [result['label'] for result in results] == ['POSITIVE', 'NEUTRAL', 'POSITIVE']
+    assert results[1]['fallback'] is True
+    assert 'fallback' not in results[0]
+    assert api_calls == [["good", "bad", "fine"], ["good"], ["bad"], ["fine"]]
+
+
+def test_local_model_errors_still_raise(api_calls, monkeypatch):
+    monkeypatch.setattr(ModelLoader, 'use_api_for', classmethod(lambda cls, variant: False))
+
+    with pytest.raises(RuntimeError):
+        ModelLoader._predict_sentiment_or_neutral(["good", "bad", "fine"], VARIANT, None)
@@ -0,0 +1,137 @@
+import time
+
+import pytest
+
+from app.services.model_loader import ModelLoader
+from app.services.model_registry import ModelVariant, SENTIMENT
+from app.services.sentiment_stream import SentimentStreamConsumer
+
+VARIANT = ModelVariant(task=SENTIMENT, name="test", model="test/model")
+
+
+@pytest.fixture
+def scores(monkeypatch):
+    """Sentiment model stub: scores every text POSITIVE unless `fail` is set"""
+    state = {'fail': False, 'calls': []}
+
+    def analyze(texts, model=None, **kwargs):
+        state['calls'].append(list(texts))
+        if state['fail']:
+            raise RuntimeError("model unavailable")
+        return [{'label': 'POSITIVE', 'score': 0.9} for _ in texts]
+
+    monkeypatch.setattr(ModelLoader, 'variant', classmethod(lambda cls, task, name=None: VARIANT))
+    monkeypatch.setattr(ModelLoader, 'analyze_sentiment_batch', classmethod(lambda cls, texts, **k: analyze(texts, **k)))
+    return state
+
+
+@pytest.fixture
+def consumer(redis_client, scores, monkeypatch):
+    monkeypatch.setenv('SENTIMENT_STREAM_MAX_ATTEMPTS', '2')
+    monkeypatch.setenv('SENTIMENT_STREAM_RETRY_IDLE_MS', '0')
+    monkeypatch.setenv('SENTIMENT_STREAM_BLOCK_MS', '10')
+    stream = SentimentStreamConsumer()
+    stream.client = redis_client
+    redis_client.xgroup_create(stream.stream, stream.group, id='0', mkstream=True)
+    return stream
+
+
+def publish(consumer, count=1, **fields):
+    return [
+        consumer.client.xadd(consumer.stream, {'comment_id': str(i), 'text': f"comment {i}", **fields})
+        for i in range(count)
+    ]
+
+
+def pending(consumer):
+    return consumer.client.xpending(consumer.stream, consumer.group)['pending']
+
+
+def test_entries_are_acked_after_their_results_are_published(consumer):
+    publish(consumer, 2)
+
+    assert consumer.poll("worker-1") == 2
+
+    results = consumer.client.xrange(consumer.results_stream)
+    assert [fields['comment_id'] for _, fields in results] == ['0', '1']
+    assert results[0][1]['sentiment'] == 'POSITIVE'
+    assert pending(consumer) == 0
+
+
+def test_failed_callback_leaves_entries_pending(consumer, monkeypatch):
+    import httpx
+
+    def refuse(*args, **kwargs):
+        raise httpx.ConnectError("backend down")
+
+    consumer.callback_url = "http://backend.invalid/sentiment"
+    monkeypatch.setattr(httpx, 'post', refuse)
+    publish(consumer, 2)
+
+    consumer.poll("worker-1")
+
+    assert consumer.client.xlen(consumer.results_stream) == 0
+    assert pending(consumer) == 2
+
+
+def test_failed_entries_are_retried_through_xautoclaim(consumer, scores):
+    publish(consumer, 2)
+    scores['fail'] = True
+    consumer.poll("worker-1")
+    assert pending(consumer) == 2
+
+    scores['fail'] = False
+    # Another worker picks the idle entries up
+    assert consumer.poll("worker-2") == 2
+
+    assert consumer.client.xlen(consumer.results_stream) == 2
+    assert pending(consumer) == 0
+    assert scores['calls'] == [["comment 0", "comment 1"]] * 2
+
+
+def test_entries_are_dead_lettered_after_max_attempts(consumer, scores):
+    publish(consumer)
+    scores['fail'] = True
+
+    consumer.poll("worker-1")  # first delivery
+    consumer.poll("worker-1")  # reclaimed, second delivery
+    consumer.poll("worker-1")  # reclaimed again: out of attempts
+
+    dead = consumer.client.xrange(consumer.dead_letter_stream)
+    assert len(dead) == 1
+    assert dead[0][1]['error'] == "model unavailable"
+    assert dead[0][1]['attempts'] == '2'
+    assert pending(consumer) == 0
+    assert len(scores['calls']) == 2
+
+
+def test_poison_entries_go_straight_to_the_dead_letter_stream(consumer, scores):
+    consumer.client.xadd(consumer.stream, {'comment_id': '7', 'text': '   '})
+    publish(consumer)
+
+    consumer.poll("worker-1")
+
+    dead = consumer.client.xrange(consumer.dead_letter_stream)
+    assert [(fields['comment_id'], fields['error'], fields['attempts']) for _, fields in dead] == [
+        ('7', "entry has no text", '1')
+    ]
+    assert scores['calls'] == [["comment 0"]]
+    assert pending(consumer) == 0
+
+
+def test_delivery_counts_ignore_other_consumers_entries(consumer, scores):
+    consumer.max_attempts = 1
+    consumer.retry_idle_ms = 50
+    ids = publish(consumer, 6)
+    scores['fail'] = True
+    consumer.poll("worker-1")
+
+    time.sleep(0.1)
+    # worker-2 takes over the middle entries, so they are not idle
+    consumer.client.xclaim(consumer.stream, consumer.group, "worker-2", 0, ids[1:5])
+
+    consumer.poll("worker-1")
+
+    dead = consumer.client.xrange(consumer.dead_letter_stream)
+    assert sorted(fields['entry_id'] for _, fields in dead) == [ids[0], ids[5]]
+    assert pending(consumer) == 4
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from app.routes import text_generation
+from app.services import text_generation as text_generation_service
+from app.services.model_loader import ModelLoader
+from app.services.model_registry import ModelVariant, TEXT_GENERATION
+
+VARIANT = ModelVariant(task=TEXT_GENERATION, name="test", model="test/model")
+
+
+# What ModelLoader.generate_text returns when the API call fails or its circuit is open
+UNAVAILABLE = {'generated_text': "Text generation unavailable", 'generation_params': {'error': True}}
+
+
+class Prompts(list):
+    """Prompts sent to the model; while `down` is set the API fails them"""
+    down = False
+
+
+@pytest.fixture
+def generations(redis_client, monkeypatch):
+    prompts = Prompts()
+
+    def generate(prompt, max_length=100, model=None):
+        prompts.append(prompt)
+        return UNAVAILABLE if prompts.down else f"Text about {prompt}"
+
+    monkeypatch.setattr(text_generation, 'text_generation_variant', lambda name: VARIANT)
+    for module in (text_generation, text_generation_service):
+        monkeypatch.setattr(module, 'cache_namespace', lambda prefix, variant: f"{prefix}:{variant.name}")
+    monkeypatch.setattr(ModelLoader, 'generate_text', classmethod(lambda cls, *a, **k: generate(*a, **k)))
+    return prompts
+
+
+def generate_text(prompt, **fields):
+    request = text_generation.TextGenerationRequest(prompt=prompt, **fields)
+    return asyncio.run(text_generation.generate_text(request))
+
+
+def test_same_prompt_is_served_from_the_cache(generations):
+    first = generate_text("cats", cache_key="post-1")
+    again = generate_text("cats", cache_key="post-1")
+
+    assert (first.cached, again.cached) == (False, True)
+    assert generations == ["cats"]
+
+
+def test_reused_cache_key_with_another_prompt_is_a_miss(generations):
+    generate_text("cats", cache_key="post-1")
+    other = generate_text("dogs", cache_key="post-1")
+
+    assert other.cached is False
+    assert other.generated_text == "Text about dogs"
+    assert other.prompt_used == "dogs"
+    assert generations == ["cats", "dogs"]
+
+    # The key now holds the newer prompt's text
+    assert generate_text("dogs", cache_key="post-1").cached is True
+
+
+def test_failed_generation_is_not_cached(generations):
+    generations.down = True
+    failed = generate_text("cats", cache_key="post-1")
+    assert failed.generated_text == "Text generation unavailable"
+
+    # Once the API is back the prompt is generated again, not served the failure
+    generations.down = False
+    recovered = generate_text("cats", cache_key="post-1")
+    assert (recovered.cached, recovered.generated_text) == (False, "Text about cats")
+    assert generations == ["cats", "cats"]
+
+
+def test_failed_alt_text_is_not_cached(generations):
+    tags = [{"tag": "cat", "confidence": 0.9}]
+
+    generations.down = True
+    failed = text_generation_service.generate_alt_text(tags, VARIANT, 3)
+    assert failed["alt_text"] == "Text generation unavailable"
+    assert "generation_failed" not in failed
+
+    generations.down = False
+    recovered = text_generation_service.generate_alt_text(tags, VARIANT, 3)
+    assert recovered["alt_text_cached"] is False
+    assert recovered["alt_text"].startswith("Text about")
+    assert text_generation_service.generate_alt_text(tags, VARIANT, 3)["alt_text_cached"] is True